@@ -55,39 +55,29 @@ class AnaliseCustosB3:
         print(f"\n📊 OPERAÇÕES BRASILEIRAS ANALISADAS: {len(df_b3)}")
         print("-" * 80)
         
-        # Calcular custos para cada operação
-        results = []
-        for idx, row in df_b3.iterrows():
-            entry_price = row['entry_price']
-            exit_price = row.get('close_price', row.get('exit_price_tp', entry_price))
-            quantity = 100  # Assumir 1 contrato de opção (100 ações)
-            
-            entry_value = entry_price * quantity
-            exit_value = exit_price * quantity
-            
-            # Calcular custos
-            costs = self.calculator.calculate_total_costs(
-                entry_value=entry_value,
-                exit_value=exit_value,
-                instrument_type='options',
-                levar_vencimento=False
-            )
-            
-            results.append({
-                'proposal_id': row['proposal_id'],
-                'underlying': row['underlying'],
-                'entry_value': entry_value,
-                'exit_value': exit_value,
-                'profit_bruto': costs['profit_bruto'],
-                'profit_liquido': costs['profit_liquido'],
-                'total_custos': costs['total_costs'],
-                'custos_operacionais': costs['total_operational_costs'],
-                'impostos': costs['total_taxes'],
-                'profit_pct_bruto': costs['profit_pct_bruto'],
-                'profit_pct_liquido': costs['profit_pct_liquido']
-            })
-        
-        df_custos = pd.DataFrame(results)
+        # Calcular custos de todas as operações de uma vez
+        quantity = 100  # Assumir 1 contrato de opção (100 ações)
+        exit_prices = df_b3['close_price'] if 'close_price' in df_b3.columns else df_b3.get('exit_price_tp', df_b3['entry_price'])
+        costs = self.calculator.calculate_costs_batch(
+            entry_values=df_b3['entry_price'].to_numpy(dtype=float) * quantity,
+            exit_values=exit_prices.to_numpy(dtype=float) * quantity,
+            instrument_types='options',
+            levar_vencimento=False
+        )
+        
+        df_custos = pd.DataFrame({
+            'proposal_id': df_b3['proposal_id'].to_numpy(),
+            'underlying': df_b3['underlying'].to_numpy(),
+            'entry_value': costs['entry_value'],
+            'exit_value': costs['exit_value'],
+            'profit_bruto': costs['profit_bruto'],
+            'profit_liquido': costs['profit_liquido'],
+            'total_custos': costs['total_costs'],
+            'custos_operacionais': costs['total_operational_costs'],
+            'impostos': costs['total_taxes'],
+            'profit_pct_bruto': costs['profit_pct_bruto'],
+            'profit_pct_liquido': costs['profit_pct_liquido']
+        })
         
         # Estatísticas
         print("\n💰 CUSTOS POR OPERAÇÃO:")
@@ -151,34 +141,23 @@ class AnaliseCustosB3:
         
         print(f"\n📊 OPERAÇÕES BRASILEIRAS: {len(df_b3)}")
         
-        # Calcular rentabilidade líquida
-        results = []
-        for idx, row in df_b3.iterrows():
-            entry_price = row['entry_price']
-            exit_price = row.get('close_price', row.get('exit_price_tp', entry_price))
-            quantity = 100
-            
-            entry_value = entry_price * quantity
-            exit_value = exit_price * quantity
-            
-            costs = self.calculator.calculate_total_costs(
-                entry_value=entry_value,
-                exit_value=exit_value,
-                instrument_type='options'
-            )
-            
+        # Calcular rentabilidade líquida (todas as operações de uma vez)
+        quantity = 100
+        exit_prices = df_b3['close_price'] if 'close_price' in df_b3.columns else df_b3.get('exit_price_tp', df_b3['entry_price'])
+        costs = self.calculator.calculate_costs_batch(
+            entry_values=df_b3['entry_price'].to_numpy(dtype=float) * quantity,
+            exit_values=exit_prices.to_numpy(dtype=float) * quantity,
+            instrument_types='options'
+        )
+        
+        df_resultados = pd.DataFrame({
+            'proposal_id': df_b3['proposal_id'].to_numpy(),
+            'underlying': df_b3['underlying'].to_numpy(),
+            'pnl_pct_bruto': df_b3['pnl_pct'].to_numpy(),
             # Rentabilidade líquida real
-            profit_pct_liquido = costs['profit_pct_liquido'] / 100
-            
-            results.append({
-                'proposal_id': row['proposal_id'],
-                'underlying': row['underlying'],
-                'pnl_pct_bruto': row['pnl_pct'],
-                'pnl_pct_liquido': profit_pct_liquido,
-                'resultado': row['resultado']
-            })
-        
-        df_resultados = pd.DataFrame(results)
+            'pnl_pct_liquido': costs['profit_pct_liquido'].to_numpy() / 100,
+            'resultado': df_b3['resultado'].to_numpy()
+        })
         
         # Análise de resultados líquidos
         print("\n📈 ANÁLISE COM CUSTOS DESCONTADOS:")
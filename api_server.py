@@ -3,9 +3,17 @@ API Server para o sistema de trading algorítmico.
 """
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+from datetime import datetime, timedelta
 import traceback
 import logging
 
+import pandas as pd
+
+from src.mark_to_market import get_active_engine
+from src.orders_repository import OrdersRepository
+from src.services import get_services
+from src.trading_schedule import TradingSchedule
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,6 +22,16 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)  # Permitir CORS para o dashboard
 
+
+def _orders_repo() -> OrdersRepository:
+    """Repositório compartilhado pelos handlers (init_db/migração uma vez por processo)."""
+    return get_services().orders_repo
+
+
+def _trading_schedule() -> TradingSchedule:
+    return get_services().trading_schedule
+
+
 # ============================================================================
 # ENDPOINTS BÁSICOS
 # ============================================================================
@@ -30,12 +48,11 @@ def health():
 def get_metrics():
     """Retorna métricas do sistema."""
     try:
-        from src.orders_repository import OrdersRepository
-        orders_repo = OrdersRepository()
+        orders_repo = _orders_repo()
         
         # Buscar métricas básicas
-        proposals_df = orders_repo.get_proposals()
-        executions_df = orders_repo.get_executions()
+        proposals_df = orders_repo.get_proposals(columns=['proposal_id'], parse_metadata=False)
+        executions_df = orders_repo.get_executions(columns=['order_id'])
         
         total_return = 0.0
         if not executions_df.empty:
@@ -65,39 +82,24 @@ def get_metrics():
 def get_agents_activity():
     """Retorna atividade dos agentes."""
     try:
-        from src.orders_repository import OrdersRepository
-        from datetime import datetime, timedelta
-        import pandas as pd
+        orders_repo = _orders_repo()
         
-        orders_repo = OrdersRepository()
-        
-        # Buscar propostas recentes (últimas 24h)
+        # Contagens das últimas 24h agregadas no SQLite (proposal_lifecycle), sem carregar as propostas
         start_date = (datetime.now() - timedelta(days=1)).isoformat()
-        proposals_df = orders_repo.get_proposals(start_date=start_date)
+        summary = orders_repo.get_lifecycle_summary(start_date=start_date)
+        by_strategy = summary['by_strategy']
         
-        # Contar por estratégia
         activities = {
-            'trader_proposals': 0,
-            'daytrade_proposals': 0,
-            'vol_arb_proposals': 0,
-            'pairs_proposals': 0
+            'trader_proposals': summary['total'],
+            'daytrade_proposals': by_strategy.get('daytrade_options', 0),
+            'vol_arb_proposals': by_strategy.get('vol_arb', 0) + by_strategy.get('volatility_arbitrage', 0),
+            'pairs_proposals': by_strategy.get('pairs', 0) + by_strategy.get('pairs_trading', 0)
         }
         
-        if not proposals_df.empty:
-            if 'strategy' in proposals_df.columns:
-                daytrade_count = len(proposals_df[proposals_df['strategy'] == 'daytrade_options'])
-                vol_arb_count = len(proposals_df[proposals_df['strategy'] == 'volatility_arbitrage'])
-                pairs_count = len(proposals_df[proposals_df['strategy'] == 'pairs_trading'])
-                
-                activities['trader_proposals'] = len(proposals_df)
-                activities['daytrade_proposals'] = daytrade_count
-                activities['vol_arb_proposals'] = vol_arb_count
-                activities['pairs_proposals'] = pairs_count
-        
         return jsonify({
             'status': 'success',
             'activities': activities,
-            'last_activity': proposals_df.iloc[-1]['timestamp'].isoformat() if not proposals_df.empty else None
+            'last_activity': summary['last_generated_at']
         })
     except Exception as e:
         logger.error(f"Erro ao buscar atividade: {e}")
@@ -113,12 +115,13 @@ def get_agents_health():
     try:
         from src.agent_health_checker import AgentHealthChecker
         
-        checker = AgentHealthChecker()
+        checker = AgentHealthChecker({})
         health_data = checker.check_all_agents()
         
         return jsonify({
             'status': 'success',
-            'health': health_data
+            'health': health_data,
+            'captures': _orders_repo().get_capture_stats(hours=request.args.get('hours', 2, type=float))
         })
     except Exception as e:
         logger.error(f"Erro ao verificar saúde: {e}")
@@ -133,7 +136,7 @@ def test_agents():
     try:
         from src.agent_health_checker import AgentHealthChecker
         
-        checker = AgentHealthChecker()
+        checker = AgentHealthChecker({})
         results = checker.check_all_agents()
         
         return jsonify({
@@ -155,9 +158,22 @@ def test_agents():
 def get_portfolio_positions():
     """Retorna posições abertas do portfólio."""
     try:
-        from src.orders_repository import OrdersRepository
-        
-        orders_repo = OrdersRepository()
+        # Estado em memória do mark-to-market (quando o monitoramento roda neste processo)
+        engine = get_active_engine()
+        if engine is not None:
+            state = engine.get_state()
+            return jsonify({
+                'status': 'success',
+                'source': 'mtm',
+                'total_positions': state['open_positions'],
+                'total_pnl': float(state['unrealized_pnl']),
+                'total_delta': float(state['total_delta']),
+                'total_gamma': float(state['total_gamma']),
+                'total_vega': float(state['total_vega']),
+                'positions': state['positions']
+            })
+        
+        orders_repo = _orders_repo()
         positions_df = orders_repo.get_open_positions()
         
         positions = []
@@ -188,6 +204,47 @@ def get_portfolio_positions():
             'traceback': traceback.format_exc()
         }), 500
 
+@app.route('/portfolio/pnl', methods=['GET'])
+def get_portfolio_pnl():
+    """Retorna P&L intradiário (realizado e não realizado) por posição, estratégia e ativo-objeto."""
+    try:
+        engine = get_active_engine()
+        if engine is not None:
+            state = engine.get_state()
+            state['status'] = 'success'
+            state['source'] = 'mtm'
+            return jsonify(state)
+        
+        # API em processo separado: usar último snapshot gravado pelo engine
+        snapshot = _orders_repo().get_latest_performance_snapshot()
+        if not snapshot:
+            return jsonify({'status': 'success', 'source': 'none', 'message': 'Nenhum snapshot disponível'})
+        
+        details = snapshot.get('details', {}) or {}
+        return jsonify({
+            'status': 'success',
+            'source': 'snapshot',
+            'timestamp': snapshot.get('timestamp'),
+            'nav': snapshot.get('nav'),
+            'total_pnl': snapshot.get('total_pnl'),
+            'unrealized_pnl': details.get('unrealized_pnl'),
+            'realized_pnl': details.get('realized_pnl'),
+            'open_positions': snapshot.get('open_positions'),
+            'total_delta': snapshot.get('total_delta'),
+            'total_gamma': snapshot.get('total_gamma'),
+            'total_vega': snapshot.get('total_vega'),
+            'by_strategy': details.get('by_strategy', {}),
+            'by_underlying': details.get('by_underlying', {}),
+            'positions': details.get('positions', [])
+        })
+    except Exception as e:
+        logger.error(f"Erro ao buscar P&L: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'traceback': traceback.format_exc()
+        }), 500
+
 # ============================================================================
 # ENDPOINTS DE DAYTRADE
 # ============================================================================
@@ -196,13 +253,8 @@ def get_portfolio_positions():
 def get_daytrade_monitoring():
     """Retorna dados completos de monitoramento do DayTrade."""
     try:
-        from src.orders_repository import OrdersRepository
-        from src.trading_schedule import TradingSchedule
-        from datetime import datetime, timedelta
-        import pandas as pd
-        
-        orders_repo = OrdersRepository()
-        trading_schedule = TradingSchedule()
+        orders_repo = _orders_repo()
+        trading_schedule = _trading_schedule()
         
         # Status do mercado
         b3_time = trading_schedule.get_current_b3_time()
@@ -212,27 +264,14 @@ def get_daytrade_monitoring():
         start_date = (datetime.now() - timedelta(days=1)).isoformat()
         proposals_df = orders_repo.get_proposals(strategy='daytrade_options', start_date=start_date)
         
-        # Avaliações de risco relacionadas
-        evaluations_df = orders_repo.get_risk_evaluations()
-        if not evaluations_df.empty and 'timestamp' in evaluations_df.columns:
-            try:
-                evaluations_df['timestamp'] = pd.to_datetime(evaluations_df['timestamp'], errors='coerce')
-                start_dt = pd.to_datetime(start_date)
-                evaluations_df = evaluations_df[evaluations_df['timestamp'] >= start_dt]
-            except:
-                pass
-        
-        daytrade_evaluations = []
-        if not evaluations_df.empty:
-            for _, eval_row in evaluations_df.iterrows():
-                proposal_id = eval_row.get('proposal_id', '')
-                prop = proposals_df[proposals_df['proposal_id'] == proposal_id] if not proposals_df.empty else pd.DataFrame()
-                if not prop.empty or 'DAYTRADE' in proposal_id.upper() or 'DAYOPT' in proposal_id.upper():
-                    daytrade_evaluations.append(eval_row.to_dict())
+        # Decisões do RiskAgent (agregadas no ciclo de vida das propostas)
+        lifecycle_summary = orders_repo.get_lifecycle_summary(strategy='daytrade_options', start_date=start_date)
         
         # Capturas de dados recentes (últimas 2 horas)
         try:
-            all_captures_df = orders_repo.get_market_data_captures(limit=100)
+            all_captures_df = orders_repo.get_market_data_captures(
+                limit=100, columns=['ticker', 'created_at', 'source'], decode_json=False
+            )
             if not all_captures_df.empty:
                 recent_captures_df = all_captures_df.tail(100).copy()
                 try:
@@ -257,9 +296,11 @@ def get_daytrade_monitoring():
         
         # Estatísticas
         total_proposals = len(proposals_df) if not proposals_df.empty else 0
-        approved_count = sum(1 for e in daytrade_evaluations if e.get('decision') == 'APPROVE')
-        rejected_count = sum(1 for e in daytrade_evaluations if e.get('decision') == 'REJECT')
-        approval_rate = (approved_count / len(daytrade_evaluations) * 100) if daytrade_evaluations else 0
+        decisions = lifecycle_summary['by_decision']
+        evaluated_count = sum(decisions.values())
+        approved_count = decisions.get('APPROVE', 0)
+        rejected_count = decisions.get('REJECT', 0)
+        approval_rate = (approved_count / evaluated_count * 100) if evaluated_count else 0
         
         # Tickers capturados recentemente
         recent_tickers = []
@@ -328,35 +369,22 @@ def get_daytrade_monitoring():
 def get_daytrade_analysis():
     """Retorna análise detalhada de propostas: geradas, aprovadas, rejeitadas com motivos."""
     try:
-        from src.orders_repository import OrdersRepository
-        from datetime import datetime, timedelta
-        import pandas as pd
-        import json
-        
-        orders_repo = OrdersRepository()
+        orders_repo = _orders_repo()
         
         # Período de análise (últimas 24h ou período customizado)
         days = request.args.get('days', 1, type=int)
         start_date = (datetime.now() - timedelta(days=days)).isoformat()
         
-        # Buscar todas as propostas de daytrade
-        proposals_df = orders_repo.get_proposals(strategy='daytrade_options', start_date=start_date)
-        
-        # Buscar todas as avaliações
-        evaluations_df = orders_repo.get_risk_evaluations()
-        if not evaluations_df.empty and 'timestamp' in evaluations_df.columns:
-            try:
-                evaluations_df['timestamp'] = pd.to_datetime(evaluations_df['timestamp'], errors='coerce')
-                start_dt = pd.to_datetime(start_date)
-                evaluations_df = evaluations_df[evaluations_df['timestamp'] >= start_dt]
-            except:
-                pass
+        # Ciclo de vida das propostas de daytrade (geração + decisão do RiskAgent em uma consulta)
+        lifecycle_df = orders_repo.get_proposal_lifecycle(
+            strategy='daytrade_options', start_date=start_date, include_metadata=True
+        )
         
         # Criar análise detalhada
         analysis = {
             'period_days': days,
             'start_date': start_date,
-            'total_proposals': len(proposals_df) if not proposals_df.empty else 0,
+            'total_proposals': len(lifecycle_df),
             'proposals_generated': [],
             'proposals_approved': [],
             'proposals_rejected': [],
@@ -372,55 +400,39 @@ def get_daytrade_analysis():
             }
         }
         
-        if not proposals_df.empty:
-            # Processar cada proposta
-            for _, prop_row in proposals_df.iterrows():
-                proposal_id = prop_row.get('proposal_id', '')
-                proposal_data = prop_row.to_dict()
-                
-                # Buscar avaliação correspondente
-                eval_row = evaluations_df[evaluations_df['proposal_id'] == proposal_id] if not evaluations_df.empty else pd.DataFrame()
-                
-                # Parse metadata se for string
-                metadata = proposal_data.get('metadata', {})
-                if isinstance(metadata, str):
-                    try:
-                        metadata = json.loads(metadata)
-                    except:
-                        metadata = {}
-                
-                proposal_info = {
-                    'proposal_id': proposal_id,
-                    'symbol': proposal_data.get('symbol', 'N/A'),
-                    'timestamp': proposal_data.get('timestamp', ''),
-                    'metadata': metadata
-                }
-                
-                analysis['proposals_generated'].append(proposal_info)
+        for row in lifecycle_df.to_dict('records'):
+            proposal_info = {
+                'proposal_id': row.get('proposal_id', ''),
+                'symbol': row.get('symbol') or 'N/A',
+                'timestamp': row.get('generated_at') or '',
+                'metadata': row.get('metadata') or {},
+                'status': row.get('status')
+            }
+            analysis['proposals_generated'].append(proposal_info)
+            
+            decision = row.get('decision')
+            if not decision:
+                continue
+            reason = row.get('reason') or ''
+            
+            proposal_info['decision'] = decision
+            proposal_info['reason'] = reason
+            proposal_info['evaluation_timestamp'] = row.get('evaluated_at') or ''
+            
+            if decision == 'APPROVE':
+                analysis['proposals_approved'].append(proposal_info)
+            elif decision == 'REJECT':
+                analysis['proposals_rejected'].append(proposal_info)
                 
-                if not eval_row.empty:
-                    decision = eval_row.iloc[0].get('decision', 'PENDING')
-                    reason = eval_row.iloc[0].get('reason', '')
-                    
-                    proposal_info['decision'] = decision
-                    proposal_info['reason'] = reason
-                    proposal_info['evaluation_timestamp'] = eval_row.iloc[0].get('timestamp', '')
-                    
-                    if decision == 'APPROVE':
-                        analysis['proposals_approved'].append(proposal_info)
-                    elif decision == 'REJECT':
-                        analysis['proposals_rejected'].append(proposal_info)
-                        
-                        # Contar motivos de rejeição
-                        reason_key = reason.split(':')[0] if ':' in reason else reason
-                        analysis['rejection_reasons'][reason_key] = analysis['rejection_reasons'].get(reason_key, 0) + 1
+                # Contar motivos de rejeição
+                reason_key = reason.split(':')[0] if ':' in reason else reason
+                analysis['rejection_reasons'][reason_key] = analysis['rejection_reasons'].get(reason_key, 0) + 1
         
         return jsonify({
             'status': 'success',
             'analysis': analysis
         })
     except Exception as e:
-        import traceback
         logger.error(f"Erro ao buscar análise: {e}")
         return jsonify({
             'status': 'error',
@@ -504,9 +516,7 @@ def manual_scan():
 def get_backtest_results():
     """Retorna resultados do backtest."""
     try:
-        from src.orders_repository import OrdersRepository
-        
-        orders_repo = OrdersRepository()
+        orders_repo = _orders_repo()
         snapshots_df = orders_repo.get_performance_snapshots()
         
         snapshots = []
@@ -565,5 +575,4 @@ def list_strategies():
 # ============================================================================
 
 if __name__ == '__main__':
-    import pandas as pd
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -16,6 +16,7 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
 from utils import get_version_info
+from decision_log import get_decision_log
 
 # Configuração da página
 st.set_page_config(
@@ -101,20 +102,15 @@ def load_data():
         except:
             pass
     
-    # Carregar logs (último arquivo de log)
+    # Carregar logs (entradas mais recentes, pelo índice do log de decisões)
     logs_dir = Path('logs')
     if logs_dir.exists():
-        log_files = sorted(logs_dir.glob('decisions-*.jsonl'), reverse=True)
-        if log_files:
-            try:
-                logs = []
-                with open(log_files[0], 'r', encoding='utf-8') as f:
-                    for line in f:
-                        if line.strip():
-                            logs.append(json.loads(line))
+        try:
+            logs = get_decision_log(str(logs_dir)).query(hours=24, limit=5000)
+            if logs:
                 data['logs'] = pd.DataFrame(logs)
-            except:
-                pass
+        except:
+            pass
     
     return data
 
@@ -7,7 +7,6 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import requests
-import json
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -15,6 +14,8 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 
+from src.decision_log import get_decision_log
+
 # Configuração da página
 st.set_page_config(
     page_title="Dashboard Central - Trading Agents",
@@ -251,23 +252,16 @@ def manual_scan():
     except:
         return None
 
-def load_logs():
-    """Carrega logs dos agentes."""
+def load_logs(limit: int = 1000):
+    """Carrega os logs mais recentes dos agentes (índice do log de decisões)."""
     log_dir = Path("logs")
     if not log_dir.exists():
         return []
     
-    logs = []
-    for log_file in sorted(log_dir.glob("*.jsonl"), reverse=True)[:1]:  # Último arquivo
-        try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        logs.append(json.loads(line))
-        except:
-            continue
-    
-    return sorted(logs, key=lambda x: x.get('timestamp', ''), reverse=True)
+    try:
+        return get_decision_log(str(log_dir)).query(limit=limit)
+    except:
+        return []
 
 def main():
     """Função principal do dashboard."""
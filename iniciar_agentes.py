@@ -10,10 +10,8 @@ import sys
 import os
 import logging
 import signal
-import threading
 import time
 from pathlib import Path
-from datetime import datetime, timedelta
 
 # Configurar logging
 logging.basicConfig(
@@ -39,52 +37,17 @@ except ImportError:
 # Variáveis globais para controle de parada
 monitoring_service = None
 health_monitor = None
-health_monitor_thread = None
 
 def signal_handler(sig, frame):
     """Handler para Ctrl+C"""
-    global monitoring_service, health_monitor, health_monitor_thread
+    global monitoring_service
     logger.info("\n\nRecebido sinal de interrupção (Ctrl+C)")
     logger.info("Parando agentes...")
     if monitoring_service:
         monitoring_service.stop_monitoring()
-    if health_monitor_thread and health_monitor_thread.is_alive():
-        logger.info("Parando monitor de saúde...")
     logger.info("Agentes parados com sucesso")
     sys.exit(0)
 
-def run_health_monitor_loop(health_monitor_instance):
-    """Loop do monitor de saúde que roda em thread separada."""
-    logger.info("Monitor de saúde iniciado em thread separada")
-    
-    last_check = datetime.now()
-    check_interval = timedelta(hours=1)  # Verificar a cada hora
-    
-    try:
-        while True:
-            current_time = datetime.now()
-            
-            # Verificar se passou 1 hora desde última verificação
-            if current_time - last_check >= check_interval:
-                logger.info(f"[HEALTH] Executando verificação de saúde ({current_time.strftime('%H:%M:%S')})...")
-                health_monitor_instance.run_health_check()
-                
-                # Verificar se deve enviar relatório (11:00 ou 15:00)
-                current_time_str = current_time.strftime('%H:%M')
-                if current_time_str in ['11:00', '15:00']:
-                    logger.info(f"[HEALTH] Enviando relatório às {current_time_str}...")
-                    health_monitor_instance.send_report(force=True)
-                
-                last_check = current_time
-            
-            # Aguardar 1 minuto antes de verificar novamente
-            time.sleep(60)
-            
-    except Exception as e:
-        logger.error(f"[HEALTH] Erro no loop do monitor de saúde: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-
 def main():
     """Função principal"""
     global monitoring_service
@@ -147,7 +110,7 @@ def main():
     
     # Criar DataHealthMonitor
     try:
-        health_monitor = DataHealthMonitor(config)
+        health_monitor = DataHealthMonitor(config, services=monitoring_service.services)
         logger.info("✅ DataHealthMonitor criado com sucesso")
     except Exception as e:
         logger.error(f"❌ Erro ao criar DataHealthMonitor: {e}")
@@ -204,22 +167,22 @@ def main():
         monitoring_service.start_monitoring(interval_seconds=300)
         logger.info("✅ Agentes de trading iniciados com sucesso!")
         
-        # Iniciar monitor de saúde em thread separada
+        # Monitor de saúde como jobs do agendador do MonitoringService
         if health_monitor:
             try:
                 # Executar verificação inicial
                 logger.info("Executando verificação inicial do monitor de saúde...")
                 health_monitor.run_health_check()
                 
-                # Iniciar thread do monitor de saúde
-                health_monitor_thread = threading.Thread(
-                    target=run_health_monitor_loop,
-                    args=(health_monitor,),
-                    daemon=True,
-                    name="HealthMonitor"
-                )
-                health_monitor_thread.start()
-                logger.info("✅ Monitor de saúde iniciado com sucesso!")
+                scheduler = monitoring_service.scheduler
+                scheduler.add_interval_job('health_check', health_monitor.run_health_check, 3600)
+                for report_time in ('11:00', '15:00'):
+                    scheduler.add_daily_job(
+                        f'health_report_{report_time}',
+                        lambda: health_monitor.send_report(force=True),
+                        at=report_time, window_minutes=30
+                    )
+                logger.info("✅ Monitor de saúde agendado (verificação a cada hora, relatórios 11:00 e 15:00)")
             except Exception as health_err:
                 logger.error(f"❌ Erro ao iniciar monitor de saúde: {health_err}")
                 logger.warning("⚠️  Agentes continuarão funcionando sem monitor de saúde")
@@ -238,22 +201,6 @@ def main():
                 if status.get('last_scan_time'):
                     logger.info(f"Status: Rodando | Último scan: {status['last_scan_time']}")
             
-            # Verificar se thread do monitor de saúde ainda está rodando
-            if health_monitor and health_monitor_thread:
-                if not health_monitor_thread.is_alive():
-                    logger.warning("⚠️  Thread do monitor de saúde parou - tentando reiniciar...")
-                    try:
-                        health_monitor_thread = threading.Thread(
-                            target=run_health_monitor_loop,
-                            args=(health_monitor,),
-                            daemon=True,
-                            name="HealthMonitor"
-                        )
-                        health_monitor_thread.start()
-                        logger.info("✅ Monitor de saúde reiniciado")
-                    except Exception as restart_err:
-                        logger.error(f"❌ Erro ao reiniciar monitor de saúde: {restart_err}")
-            
     except KeyboardInterrupt:
         logger.info("\n\nInterrupção recebida pelo usuário")
     except Exception as e:
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Auditoria de imports e benchmark de inicialização.
+
+Para cada módulo de src/ e para as ferramentas de linha de comando, mede em um processo
+Python novo o tempo de import (via -X importtime) e quais dependências pesadas são
+carregadas (pandas, scipy, yfinance, ...). Nos scripts, mede só os imports de nível de
+módulo, ou seja, o custo até o main() começar.
+
+Uso:
+    python medir_inicializacao.py                 # tabela completa
+    python medir_inicializacao.py --top 5         # + 5 imports mais lentos de cada alvo
+    python medir_inicializacao.py --check 1.0     # sai com erro se alguma CLI passar de 1s
+"""
+
+import argparse
+import ast
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+HEAVY_PACKAGES = ('numpy', 'pandas', 'scipy', 'yfinance', 'flask', 'requests', 'matplotlib', 'streamlit')
+CLI_TOOLS = [
+    'rodar_telegram_polling.py', 'monitorar_daytrade.py', 'verificar_config_atualizada.py',
+    'verificar_created_at.py', 'verificar_problema_ontem.py', 'verificar_todos.py',
+    'configurar_telegram.py', 'configurar_chat_id.py', 'obter_chat_id_simples.py',
+]
+IMPORTTIME_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def _top_level_imports(script: Path) -> str:
+    """Código com apenas os imports de nível de módulo do script (sem executar main)."""
+    tree = ast.parse(script.read_text(encoding='utf-8-sig'))
+    nodes = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return f"import sys; sys.path[:0] = [{str(ROOT)!r}, {str(ROOT / 'src')!r}]\n" + '\n'.join(
+        ast.unparse(node) for node in nodes
+    )
+
+
+def measure(code: str) -> dict:
+    """Executa o código em um processo novo com -X importtime e agrega o resultado."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, int(cumulative_us), len(indent)))
+    top_level = [(name, us) for name, us, depth in imports if depth == 1]
+    loaded = {name.split('.')[0] for name, _, _ in imports}
+    error = result.stderr.strip().splitlines()[-1] if result.returncode else ''
+    return {
+        'seconds': sum(us for _, us in top_level) / 1e6,
+        'heavy': [pkg for pkg in HEAVY_PACKAGES if pkg in loaded],
+        'slowest': sorted(top_level, key=lambda item: -item[1]),
+        'error': error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=0, help='Mostrar os N imports mais lentos de cada alvo')
+    parser.add_argument('--check', type=float, default=None, help='Orçamento (s) para as CLIs; falha se excedido')
+    args = parser.parse_args()
+
+    baseline = measure('pass')['seconds']  # Custo do próprio interpretador (site, encodings)
+    targets = [(f"src.{path.stem}", f"import src.{path.stem}")
+               for path in sorted((ROOT / 'src').glob('*.py')) if path.stem != '__init__']
+    targets += [(tool, _top_level_imports(ROOT / tool)) for tool in CLI_TOOLS if (ROOT / tool).exists()]
+
+    print(f"{'alvo':40s} {'import (s)':>10s}  dependências pesadas")
+    print('-' * 90)
+    over_budget = []
+    for name, code in targets:
+        stats = measure(code)
+        seconds = max(stats['seconds'] - baseline, 0.0)
+        flag = ''
+        if args.check is not None and name.endswith('.py') and seconds > args.check:
+            over_budget.append(name)
+            flag = '  <-- acima do orçamento'
+        print(f"{name:40s} {seconds:10.3f}  {', '.join(stats['heavy']) or '-'}{flag}"
+              + (f"  [erro: {stats['error'][:60]}]" if stats['error'] else ''))
+        for module, us in stats['slowest'][:args.top]:
+            print(f"    {module:36s} {us / 1e6:10.3f}")
+
+    if over_budget:
+        print(f"\n{len(over_budget)} CLI(s) acima de {args.check}s: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
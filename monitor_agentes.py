@@ -3,12 +3,13 @@ Monitor de Agentes - Visualiza atividade e resultados dos agentes de trading.
 """
 
 import requests
-import json
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
 import sys
 
+from src.decision_log import get_decision_log
+
 BASE_URL = "http://localhost:5000"
 
 def print_header(text):
@@ -47,43 +48,39 @@ def get_backtest_results():
     except:
         return None
 
-def get_logs():
-    """Lê logs dos agentes."""
+def get_logs(event_type=None, limit=5):
+    """Lê os logs mais recentes dos agentes (índice do log de decisões)."""
     log_dir = Path("logs")
     if not log_dir.exists():
         return []
     
-    logs = []
-    for log_file in log_dir.glob("*.jsonl"):
-        try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        logs.append(json.loads(line))
-        except:
-            continue
-    
-    return sorted(logs, key=lambda x: x.get('timestamp', ''), reverse=True)
+    return get_decision_log(str(log_dir)).query(event_type=event_type, limit=limit)
 
 def show_agent_activity():
     """Mostra atividade dos agentes."""
     print_header("ATIVIDADE DOS AGENTES")
     
-    logs = get_logs()
+    if not Path("logs").exists():
+        print("Nenhum log encontrado. Execute um backtest primeiro.")
+        return
+    
+    counts = {}
+    for (event_type, _), n in get_decision_log("logs").counts().items():
+        counts[event_type] = counts.get(event_type, 0) + n
     
-    if not logs:
+    if not counts:
         print("Nenhum log encontrado. Execute um backtest primeiro.")
         return
     
-    # Filtrar por tipo de evento
-    trader_proposals = [l for l in logs if l.get('event_type') == 'trader_proposal']
-    risk_evaluations = [l for l in logs if l.get('event_type') == 'risk_evaluation']
-    executions = [l for l in logs if l.get('event_type') == 'execution']
+    # Só as últimas entradas de cada tipo são lidas dos arquivos
+    trader_proposals = get_logs('trader_proposal')
+    risk_evaluations = get_logs('risk_evaluation')
+    executions = get_logs('execution')
     
     print(f"\n📊 Estatísticas:")
-    print(f"   Propostas do TraderAgent: {len(trader_proposals)}")
-    print(f"   Avaliações do RiskAgent: {len(risk_evaluations)}")
-    print(f"   Execuções: {len(executions)}")
+    print(f"   Propostas do TraderAgent: {counts.get('trader_proposal', 0)}")
+    print(f"   Avaliações do RiskAgent: {counts.get('risk_evaluation', 0)}")
+    print(f"   Execuções: {counts.get('execution', 0)}")
     
     # Mostrar últimas propostas
     if trader_proposals:
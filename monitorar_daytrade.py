@@ -60,29 +60,26 @@ def monitor_daytrade_activity():
         print("⚠️  Nenhuma proposta DayTrade encontrada ainda.")
         print()
     
-    # Verificar últimas avaliações de risco para daytrade
-    evaluations_df = orders_repo.get_risk_evaluations()
-    if not evaluations_df.empty:
-        # Filtrar avaliações de propostas daytrade
-        daytrade_evaluations = []
-        for idx, row in evaluations_df.iterrows():
-            proposal_id = row.get('proposal_id', '')
-            if 'DAYTRADE' in proposal_id.upper() or 'DAYTRADE' in str(row.get('details', '')):
-                daytrade_evaluations.append(row)
+    # Decisões do RiskAgent sobre propostas daytrade (ciclo de vida agregado no banco)
+    summary = orders_repo.get_lifecycle_summary(strategy='daytrade_options')
+    decisions = summary['by_decision']
+    evaluated = sum(decisions.values())
+    if evaluated:
+        print(f"✅ Total de avaliações DayTrade: {evaluated}")
+        print()
         
-        if daytrade_evaluations:
-            print(f"✅ Total de avaliações DayTrade: {len(daytrade_evaluations)}")
-            print()
-            
-            # Contar aprovações vs rejeições
-            approved = sum(1 for e in daytrade_evaluations if e.get('decision') == 'APPROVE')
-            rejected = sum(1 for e in daytrade_evaluations if e.get('decision') == 'REJECT')
-            
-            print(f"📊 Estatísticas de Avaliação:")
-            print(f"  • Aprovadas: {approved}")
-            print(f"  • Rejeitadas: {rejected}")
-            print(f"  • Taxa de Aprovação: {(approved / len(daytrade_evaluations) * 100):.1f}%")
-            print()
+        # Contar aprovações vs rejeições
+        approved = decisions.get('APPROVE', 0)
+        rejected = decisions.get('REJECT', 0)
+        
+        print(f"📊 Estatísticas de Avaliação:")
+        print(f"  • Aprovadas: {approved}")
+        print(f"  • Rejeitadas: {rejected}")
+        print(f"  • Taxa de Aprovação: {(approved / evaluated * 100):.1f}%")
+        if summary['by_status']:
+            status_counts = ', '.join(f"{k}: {v}" for k, v in sorted(summary['by_status'].items()))
+            print(f"  • Status: {status_counts}")
+        print()
     
     # Verificar capturas de dados de mercado recentes
     captures_df = orders_repo.get_market_data_captures()
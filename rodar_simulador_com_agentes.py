@@ -175,7 +175,7 @@ def main():
     
     # Criar DataHealthMonitor
     try:
-        health_monitor = DataHealthMonitor(config)
+        health_monitor = DataHealthMonitor(config, services=monitoring_service.services)
         logger.info("✅ DataHealthMonitor criado")
     except Exception as e:
         logger.error(f"❌ Erro ao criar DataHealthMonitor: {e}")
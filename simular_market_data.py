@@ -349,7 +349,8 @@ def executar_simulacao_completa():
                                 from src.execution import ExecutionSimulator
                             except ImportError:
                                 from execution import ExecutionSimulator
-                            execution_simulator = ExecutionSimulator(config, monitoring.logger, orders_repo=monitoring.orders_repo)
+                            execution_simulator = ExecutionSimulator(config, monitoring.logger, orders_repo=monitoring.orders_repo,
+                                                                      mtm_engine=monitoring.mtm_engine)
                             
                             underlying = proposal.metadata.get('underlying', '') if proposal.metadata else ''
                             market_price = market_data['spot'].get(underlying, {}).get('last', proposal.price) if underlying else proposal.price
@@ -361,10 +362,16 @@ def executar_simulacao_completa():
                                 'quantity': proposal_to_execute.quantity,
                                 'price': proposal_to_execute.price,
                                 'order_type': 'MARKET',  # MARKET para garantir execução na simulação
-                                'strategy': proposal.strategy
+                                'strategy': proposal.strategy,
+                                'underlying': underlying or None,
+                                # Gregas da posição (por contrato x quantidade x multiplicador)
+                                'delta': proposal.metadata.get('delta', 0) * proposal_to_execute.quantity * 100 if proposal.metadata else 0,
+                                'gamma': proposal.metadata.get('gamma', 0) * proposal_to_execute.quantity * 100 if proposal.metadata else 0,
+                                'vega': proposal.metadata.get('vega', 0) * proposal_to_execute.quantity * 100 if proposal.metadata else 0
                             }
                             
-                            execution_result = execution_simulator.execute_order(order_dict, market_price)
+                            # Abre a posição no banco e no livro do MTM (on_fill)
+                            execution_result = execution_simulator.execute_order(order_dict, market_price, open_position=True)
                             
                             logger.info(f"      [EXEC] Resultado: {execution_result}")
                             
@@ -372,21 +379,6 @@ def executar_simulacao_completa():
                             if execution_result and (execution_result.get('fill_id') or execution_result.get('order_id')):
                                 logger.info(f"      [EXEC] Executada: {execution_result.get('quantity', 0)} @ R$ {execution_result.get('price', 0):.2f}")
                                 
-                                # Criar posição
-                                delta_val = proposal.metadata.get('delta', 0) * execution_result.get('quantity', proposal.quantity) * 100 if proposal.metadata else 0
-                                gamma_val = proposal.metadata.get('gamma', 0) * execution_result.get('quantity', proposal.quantity) * 100 if proposal.metadata else 0
-                                vega_val = proposal.metadata.get('vega', 0) * execution_result.get('quantity', proposal.quantity) * 100 if proposal.metadata else 0
-                                
-                                monitoring.orders_repo.save_open_position(
-                                    symbol=proposal.symbol,
-                                    side=proposal.side,
-                                    quantity=execution_result.get('quantity', proposal.quantity),
-                                    avg_price=execution_result.get('price', proposal.price),
-                                    current_price=market_price,
-                                    delta=delta_val,
-                                    gamma=gamma_val,
-                                    vega=vega_val
-                                )
                                 logger.info(f"      [POS] Posicao criada no banco")
                                 
                                 # Calcular snapshot de performance
@@ -423,7 +415,8 @@ def executar_simulacao_completa():
                         # Processar proposta modificada também
                         try:
                             from execution import ExecutionSimulator
-                            execution_simulator = ExecutionSimulator(config, monitoring.logger, orders_repo=monitoring.orders_repo)
+                            execution_simulator = ExecutionSimulator(config, monitoring.logger, orders_repo=monitoring.orders_repo,
+                                                                      mtm_engine=monitoring.mtm_engine)
                             
                             underlying = proposal.metadata.get('underlying', '') if proposal.metadata else ''
                             market_price = market_data['spot'].get(underlying, {}).get('last', proposal.price) if underlying else proposal.price
@@ -435,30 +428,22 @@ def executar_simulacao_completa():
                                 'quantity': proposal_to_execute.quantity,
                                 'price': proposal_to_execute.price,
                                 'order_type': 'MARKET',  # Mudar para MARKET para garantir execução
-                                'strategy': proposal.strategy
+                                'strategy': proposal.strategy,
+                                'underlying': underlying or None,
+                                # Gregas da posição (por contrato x quantidade x multiplicador)
+                                'delta': proposal.metadata.get('delta', 0) * proposal_to_execute.quantity * 100 if proposal.metadata else 0,
+                                'gamma': proposal.metadata.get('gamma', 0) * proposal_to_execute.quantity * 100 if proposal.metadata else 0,
+                                'vega': proposal.metadata.get('vega', 0) * proposal_to_execute.quantity * 100 if proposal.metadata else 0
                             }
                             
-                            execution_result = execution_simulator.execute_order(order_dict, market_price)
+                            # Abre a posição no banco e no livro do MTM (on_fill)
+                            execution_result = execution_simulator.execute_order(order_dict, market_price, open_position=True)
                             
                             logger.info(f"      [EXEC] Resultado: {execution_result}")
                             
                             if execution_result and (execution_result.get('fill_id') or execution_result.get('order_id')):
                                 logger.info(f"      [EXEC] Executada: {execution_result.get('quantity', 0)} @ R$ {execution_result.get('price', 0):.2f}")
                                 
-                                delta_val = proposal.metadata.get('delta', 0) * execution_result.get('quantity', proposal.quantity) * 100 if proposal.metadata else 0
-                                gamma_val = proposal.metadata.get('gamma', 0) * execution_result.get('quantity', proposal.quantity) * 100 if proposal.metadata else 0
-                                vega_val = proposal.metadata.get('vega', 0) * execution_result.get('quantity', proposal.quantity) * 100 if proposal.metadata else 0
-                                
-                                monitoring.orders_repo.save_open_position(
-                                    symbol=proposal.symbol,
-                                    side=proposal.side,
-                                    quantity=execution_result.get('quantity', proposal.quantity),
-                                    avg_price=execution_result.get('price', proposal.price),
-                                    current_price=market_price,
-                                    delta=delta_val,
-                                    gamma=gamma_val,
-                                    vega=vega_val
-                                )
                         except Exception as exec_err:
                             logger.warning(f"      Erro ao executar modificada: {exec_err}")
                     else:
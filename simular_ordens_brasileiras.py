@@ -539,29 +539,23 @@ def simular_ordens_completas():
                 else:
                     market_price = proposal.price
                 
-                # Executar ordem
-                execution_result = execution_simulator.execute_order(order_dict, market_price)
+                # Posição aberta pelo fill (gregas por contrato x quantidade x multiplicador)
+                order_dict.update({
+                    'underlying': underlying or None,
+                    'delta': proposal.metadata.get('delta', 0) * proposal.quantity * 100,
+                    'gamma': proposal.metadata.get('gamma', 0) * proposal.quantity * 100,
+                    'vega': proposal.metadata.get('vega', 0) * proposal.quantity * 100
+                })
+                
+                # Executar ordem (grava a posição aberta e registra no MTM ativo)
+                execution_result = execution_simulator.execute_order(order_dict, market_price, open_position=True)
                 
                 if execution_result and execution_result.get('status') == 'FILLED':
                     executed_count += 1
                     logger.info(f"      ✅ Executada: {execution_result.get('quantity', 0)} @ R$ {execution_result.get('price', 0):.2f} ({time.time() - exec_order_start:.2f}s)")
                     
-                    # Criar posição aberta
-                    try:
-                        orders_repo.save_open_position(
-                            symbol=proposal.symbol,
-                            side=proposal.side,
-                            quantity=execution_result.get('quantity', proposal.quantity),
-                            avg_price=execution_result.get('price', proposal.price),
-                            current_price=market_price,
-                            delta=proposal.metadata.get('delta', 0) * execution_result.get('quantity', proposal.quantity) * 100,
-                            gamma=proposal.metadata.get('gamma', 0) * execution_result.get('quantity', proposal.quantity) * 100,
-                            vega=proposal.metadata.get('vega', 0) * execution_result.get('quantity', proposal.quantity) * 100
-                        )
-                        positions_created += 1
-                        logger.info(f"      📊 Posição criada no banco")
-                    except Exception as pos_err:
-                        logger.warning(f"      ⚠️  Erro ao criar posição: {pos_err}")
+                    positions_created += 1
+                    logger.info(f"      📊 Posição criada no banco")
                 else:
                     logger.warning(f"      ⚠️  Execução não completada: {execution_result}")
                     
@@ -1,5 +1,52 @@
 """
 Pacote src - Módulos principais do sistema de trading.
+
+Submódulos e classes principais são carregados sob demanda (PEP 562): `import src` não
+importa pandas, scipy ou yfinance; `src.OrdersRepository` ou `src.pricing` importam só o
+módulo necessário na primeira vez e ficam em cache no pacote.
 """
 
+import importlib
+
 __version__ = "1.0.0"
+
+# Nome público -> submódulo que o define
+_LAZY_ATTRS = {
+    'OrdersRepository': 'orders_repository',
+    'MonitoringService': 'monitoring_service',
+    'TradingSchedule': 'trading_schedule',
+    'B3Calendar': 'trading_schedule',
+    'OrderProposal': 'records',
+    'RiskEvaluation': 'records',
+    'BlackScholes': 'pricing',
+    'UnifiedNotifier': 'notifications',
+    'StructuredLogger': 'utils',
+    'DataRetentionManager': 'data_retention',
+    'OptionChainStore': 'option_snapshots',
+    'DecisionLog': 'decision_log',
+    'ServiceContainer': 'services',
+    'get_services': 'services',
+    'HttpClient': 'http_client',
+}
+
+__all__ = sorted(_LAZY_ATTRS)
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(f"{__name__}.{_LAZY_ATTRS[name]}"), name)
+    elif not name.startswith('_'):
+        try:
+            value = importlib.import_module(f"{__name__}.{name}")
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value  # Próximos acessos não passam por __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
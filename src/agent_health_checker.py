@@ -3,10 +3,8 @@ Sistema de Verificação de Saúde dos Agentes
 Verifica se todos os agentes estão operantes e funcionando corretamente.
 """
 
-import json
 import time
-from datetime import datetime, timedelta
-from pathlib import Path
+from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import pandas as pd
 
@@ -238,16 +236,7 @@ class AgentHealthChecker:
             }
     
     def check_recent_activity(self, hours: int = 24) -> Dict:
-        """Verifica atividade recente dos agentes."""
-        log_dir = Path('logs')
-        if not log_dir.exists():
-            return {
-                'status': 'no_logs',
-                'message': 'Diretório de logs não encontrado',
-                'activities': {}
-            }
-        
-        cutoff_time = datetime.now() - timedelta(hours=hours)
+        """Verifica atividade recente dos agentes (contagens do índice do log de decisões)."""
         activities = {
             'trader_proposals': 0,
             'risk_evaluations': 0,
@@ -259,47 +248,31 @@ class AgentHealthChecker:
         }
         
         try:
-            logs = []
-            for log_file in sorted(log_dir.glob("*.jsonl"), reverse=True):
-                try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        for line in f:
-                            if line.strip():
-                                log_entry = json.loads(line)
-                                log_time = datetime.fromisoformat(log_entry.get('timestamp', '').replace('Z', '+00:00'))
-                                if log_time.replace(tzinfo=None) >= cutoff_time:
-                                    logs.append(log_entry)
-                except:
-                    continue
+            decision_log = self.logger.decision_log
+            counts = decision_log.counts(hours=hours)
             
-            # Contar atividades
-            for log in logs:
-                event_type = log.get('event_type', '')
-                strategy = log.get('strategy', '')
-                
+            for (event_type, strategy), count in counts.items():
                 if event_type == 'trader_proposal':
-                    activities['trader_proposals'] += 1
+                    activities['trader_proposals'] += count
                     if strategy == 'daytrade_options':
-                        activities['daytrade_proposals'] += 1
+                        activities['daytrade_proposals'] += count
                     elif strategy == 'vol_arb':
-                        activities['vol_arb_proposals'] += 1
+                        activities['vol_arb_proposals'] += count
                     elif strategy == 'pairs':
-                        activities['pairs_proposals'] += 1
+                        activities['pairs_proposals'] += count
                 elif event_type == 'risk_evaluation':
-                    activities['risk_evaluations'] += 1
+                    activities['risk_evaluations'] += count
                 elif event_type == 'execution':
-                    activities['executions'] += 1
-                
-                # Última atividade
-                log_time = log.get('timestamp', '')
-                if log_time and (not activities['last_activity'] or log_time > activities['last_activity']):
-                    activities['last_activity'] = log_time
+                    activities['executions'] += count
+            
+            if counts:
+                activities['last_activity'] = decision_log.last_timestamp()
             
             return {
                 'status': 'ok',
                 'hours_checked': hours,
                 'activities': activities,
-                'total_logs': len(logs)
+                'total_logs': sum(counts.values())
             }
         except Exception as e:
             return {
@@ -2,49 +2,105 @@
 Módulos dos agentes: TraderAgent e RiskAgent.
 """
 
+import logging
+import threading
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Tuple, Optional, Any
-from dataclasses import dataclass
-from statsmodels.tsa.stattools import coint, adfuller
+from typing import List, Dict, Tuple, Optional
 
 try:
     from .pricing import BlackScholes
     from .utils import StructuredLogger
     from .comparison_engine import ComparisonEngine, InvestmentOpportunity
+    from .records import OrderProposal, RiskEvaluation, PROPOSAL_ID_PATTERN
+    from .trading_schedule import get_b3_calendar
+    from .orders_repository import get_b3_timestamp, get_max_proposal_seq
 except ImportError:
     from pricing import BlackScholes
     from utils import StructuredLogger
     from comparison_engine import ComparisonEngine, InvestmentOpportunity
+    from records import OrderProposal, RiskEvaluation, PROPOSAL_ID_PATTERN
+    from trading_schedule import get_b3_calendar
+    from orders_repository import get_b3_timestamp, get_max_proposal_seq
 
 
-@dataclass
-class OrderProposal:
-    """Proposta de ordem do TraderAgent."""
-    proposal_id: str
-    strategy: str
-    instrument_type: str  # 'spot', 'futures', 'options'
-    symbol: str
-    side: str  # 'BUY', 'SELL'
-    quantity: float
-    price: Optional[float] = None
-    order_type: str = 'LIMIT'
-    metadata: Dict[str, Any] = None
+_proposal_id_lock = threading.Lock()
+_proposal_seq_day: Optional[str] = None
+_last_proposal_seq = 0
+
+
+def next_proposal_id() -> str:
+    """
+    ID único de proposta: data do pregão + sequência do dia (AAAAMMDD-NNNN).
     
-    def __post_init__(self):
-        if self.metadata is None:
-            self.metadata = {}
+    Na primeira chamada do dia a sequência parte da maior já gravada no banco, de modo
+    que reinícios do processo não reutilizam IDs. Os 4 dígitos finais são o apelido
+    exibido nos comandos do Telegram (proposal_alias).
+    """
+    global _proposal_seq_day, _last_proposal_seq
+    with _proposal_id_lock:
+        day = get_b3_timestamp()[:10].replace('-', '')
+        if day != _proposal_seq_day:
+            _proposal_seq_day = day
+            _last_proposal_seq = get_max_proposal_seq(day)
+        _last_proposal_seq += 1
+        return f"{day}-{_last_proposal_seq:04d}"
+
+
+def reseed_proposal_seq():
+    """Avança a sequência do dia até a maior gravada no banco (outro processo usou os IDs seguintes)."""
+    global _proposal_seq_day, _last_proposal_seq
+    with _proposal_id_lock:
+        day = get_b3_timestamp()[:10].replace('-', '')
+        current = _last_proposal_seq if day == _proposal_seq_day else 0
+        _proposal_seq_day = day
+        _last_proposal_seq = max(current, get_max_proposal_seq(day))
 
 
 class PortfolioManager:
-    """Gerencia portfólio e posições."""
+    """
+    Gerencia portfólio e posições.
+    
+    Greeks e notional de cada posição ficam em arrays numpy (um slot por símbolo).
+    Os agregados são mantidos incrementalmente: cada fill (update_position) ou tick
+    de preço/IV (on_tick) remove a contribuição antiga do slot e soma a nova, de modo
+    que get_aggregate_greeks e get_exposure são O(1) independente do tamanho do livro.
+    """
     
-    def __init__(self, initial_nav: float = 1000000.0):
+    GREEK_FIELDS = ('delta', 'gamma', 'vega', 'theta')
+    OPTION_MULTIPLIER = 100
+    
+    def __init__(self, initial_nav: float = 1000000.0, capacity: int = 64, risk_free_rate: float = 0.05):
         self.initial_nav = initial_nav
         self.nav = initial_nav
         self.positions = {}  # {symbol: quantity}
         self.cash = initial_nav
         self.snapshots = []
+        self.risk_free_rate = risk_free_rate
+        
+        # Estado por posição (array-backed)
+        self._slots: Dict[str, int] = {}
+        self._qty = np.zeros(capacity)
+        self._price = np.zeros(capacity)
+        self._multiplier = np.ones(capacity)
+        self._is_option = np.zeros(capacity, dtype=bool)
+        self._unit_greeks = np.zeros((capacity, len(self.GREEK_FIELDS)))
+        # Contribuição atual de cada slot para os agregados
+        self._greek_exposure = np.zeros((capacity, len(self.GREEK_FIELDS)))
+        self._net_value = np.zeros(capacity)
+        # Contrato da opção (para recalcular greeks em ticks de preço/IV)
+        self._strike = np.zeros(capacity)
+        self._expiry = np.full(capacity, np.nan)  # epoch em segundos
+        self._is_call = np.ones(capacity, dtype=bool)
+        self._iv = np.full(capacity, 0.25)
+        self._underlying: List[Optional[str]] = [None] * capacity
+        self._free_slots = list(range(capacity - 1, -1, -1))
+        
+        # Agregados mantidos incrementalmente
+        self._total_greeks = np.zeros(len(self.GREEK_FIELDS))
+        self._gross_notional = 0.0
+        self._net_notional = 0.0
+        self._options_notional = 0.0
     
     def get_nav(self) -> float:
         """Retorna NAV atual."""
@@ -54,14 +110,199 @@ class PortfolioManager:
         """Retorna posições atuais."""
         return self.positions.copy()
     
-    def update_position(self, symbol: str, quantity: float, price: float):
-        """Atualiza posição."""
+    @staticmethod
+    def _parse_option_symbol(symbol: str) -> Optional[Dict]:
+        """
+        Extrai o contrato de símbolos de opção gerados pelas estratégias.
+        Formatos: ATIVO_STRIKE_C_YYYYMMDD (daytrade) e ATIVO_STRIKE_C (vol_arb).
+        """
+        parts = str(symbol).split('_')
+        try:
+            if len(parts) >= 4 and parts[-2] in ('C', 'P'):
+                return {
+                    'underlying': '_'.join(parts[:-3]),
+                    'strike': float(parts[-3]),
+                    'option_type': parts[-2],
+                    'expiry': pd.to_datetime(parts[-1], format='%Y%m%d')
+                }
+            if len(parts) >= 3 and parts[-1] in ('C', 'P'):
+                return {
+                    'underlying': '_'.join(parts[:-2]),
+                    'strike': float(parts[-2]),
+                    'option_type': parts[-1],
+                    'expiry': None
+                }
+        except (ValueError, TypeError):
+            return None
+        return None
+    
+    def _grow(self):
+        """Dobra a capacidade dos arrays."""
+        old = len(self._qty)
+        new = old * 2
+        
+        def _extend(arr, fill):
+            extra_shape = (old,) + arr.shape[1:]
+            return np.concatenate([arr, np.full(extra_shape, fill, dtype=arr.dtype)])
+        
+        self._qty = _extend(self._qty, 0.0)
+        self._price = _extend(self._price, 0.0)
+        self._multiplier = _extend(self._multiplier, 1.0)
+        self._is_option = _extend(self._is_option, False)
+        self._unit_greeks = _extend(self._unit_greeks, 0.0)
+        self._greek_exposure = _extend(self._greek_exposure, 0.0)
+        self._net_value = _extend(self._net_value, 0.0)
+        self._strike = _extend(self._strike, 0.0)
+        self._expiry = _extend(self._expiry, np.nan)
+        self._is_call = _extend(self._is_call, True)
+        self._iv = _extend(self._iv, 0.25)
+        self._underlying.extend([None] * old)
+        self._free_slots.extend(range(new - 1, old - 1, -1))
+    
+    def _allocate_slot(self, symbol: str, instrument_type: Optional[str] = None) -> int:
+        """Reserva um slot para um novo símbolo."""
+        if not self._free_slots:
+            self._grow()
+        slot = self._free_slots.pop()
+        self._slots[symbol] = slot
+        
+        contract = self._parse_option_symbol(symbol)
+        is_option = instrument_type == 'options' or (instrument_type is None and contract is not None)
+        self._is_option[slot] = is_option
+        self._multiplier[slot] = self.OPTION_MULTIPLIER if is_option else 1.0
+        self._unit_greeks[slot] = 0.0
+        if not is_option:
+            self._unit_greeks[slot, 0] = 1.0  # Ação/futuro: delta unitário
+        if contract:
+            self._strike[slot] = contract['strike']
+            self._is_call[slot] = contract['option_type'] == 'C'
+            self._expiry[slot] = contract['expiry'].timestamp() if contract['expiry'] is not None else np.nan
+            self._underlying[slot] = contract['underlying']
+        else:
+            self._strike[slot] = 0.0
+            self._is_call[slot] = True
+            self._expiry[slot] = np.nan
+            self._underlying[slot] = symbol
+        self._iv[slot] = 0.25
+        return slot
+    
+    def _release_slot(self, symbol: str):
+        """Libera o slot de um símbolo zerado."""
+        slot = self._slots.pop(symbol)
+        self._qty[slot] = 0.0
+        self._price[slot] = 0.0
+        self._greek_exposure[slot] = 0.0
+        self._net_value[slot] = 0.0
+        self._underlying[slot] = None
+        self._free_slots.append(slot)
+        if not self._slots:
+            # Livro vazio: zerar agregados elimina deriva de ponto flutuante
+            self._total_greeks[:] = 0.0
+            self._gross_notional = 0.0
+            self._net_notional = 0.0
+            self._options_notional = 0.0
+    
+    def _refresh_slot(self, slot: int):
+        """Recalcula a contribuição de um slot e aplica a diferença nos agregados."""
+        scale = self._qty[slot] * self._multiplier[slot]
+        new_exposure = scale * self._unit_greeks[slot]
+        new_net = scale * self._price[slot]
+        old_net = self._net_value[slot]
+        
+        self._total_greeks += new_exposure - self._greek_exposure[slot]
+        self._gross_notional += abs(new_net) - abs(old_net)
+        self._net_notional += new_net - old_net
+        if self._is_option[slot]:
+            self._options_notional += abs(new_net) - abs(old_net)
+        
+        self._greek_exposure[slot] = new_exposure
+        self._net_value[slot] = new_net
+    
+    def _reprice_greeks(self, slot: int, underlying_price: float, timestamp: Optional[pd.Timestamp] = None):
+        """Recalcula greeks unitários de uma opção via Black-Scholes."""
+        if np.isnan(self._expiry[slot]) or underlying_price <= 0 or self._strike[slot] <= 0:
+            return
+        now = (timestamp or pd.Timestamp.now()).timestamp()
+        T = max((self._expiry[slot] - now) / (365.0 * 86400), 0.0)
+        option_type = 'C' if self._is_call[slot] else 'P'
+        greeks = BlackScholes.all_greeks(
+            underlying_price, self._strike[slot], T, self.risk_free_rate, self._iv[slot], option_type
+        )
+        self._unit_greeks[slot] = [greeks[g] for g in self.GREEK_FIELDS]
+    
+    def update_position(self, symbol: str, quantity: float, price: float,
+                        greeks: Optional[Dict[str, float]] = None,
+                        instrument_type: Optional[str] = None):
+        """
+        Atualiza posição a partir de um fill.
+        
+        Args:
+            symbol: Símbolo do instrumento
+            quantity: Quantidade com sinal (positiva para compra, negativa para venda)
+            price: Preço do fill
+            greeks: Greeks unitários do instrumento (ex: metadata da proposta), opcional
+            instrument_type: 'spot', 'futures' ou 'options' (inferido do símbolo se None)
+        """
         if symbol not in self.positions:
             self.positions[symbol] = 0.0
         self.positions[symbol] += quantity
         self.cash -= quantity * price
+        
+        slot = self._slots.get(symbol)
+        if slot is None:
+            slot = self._allocate_slot(symbol, instrument_type)
+        self._qty[slot] = self.positions[symbol]
+        self._price[slot] = price
+        if greeks:
+            for i, field in enumerate(self.GREEK_FIELDS):
+                if field in greeks and greeks[field] is not None:
+                    self._unit_greeks[slot, i] = float(greeks[field])
+            iv = greeks.get('iv', greeks.get('implied_vol'))
+            if iv:
+                self._iv[slot] = float(iv)
+        self._refresh_slot(slot)
+        
         if self.positions[symbol] == 0:
             del self.positions[symbol]
+            self._release_slot(symbol)
+    
+    def on_tick(self, symbol: str, price: Optional[float] = None, iv: Optional[float] = None,
+                underlying_price: Optional[float] = None, timestamp: Optional[pd.Timestamp] = None,
+                greeks: Optional[Dict[str, float]] = None):
+        """
+        Atualiza marcação de uma posição a partir de um tick de preço/IV.
+        
+        Para opções, se underlying_price for informado e greeks não, os greeks são
+        recalculados por Black-Scholes apenas para este slot.
+        """
+        slot = self._slots.get(symbol)
+        if slot is None:
+            return
+        if price is not None and price > 0:
+            self._price[slot] = price
+        if iv is not None and iv > 0:
+            self._iv[slot] = iv
+        if greeks:
+            for i, field in enumerate(self.GREEK_FIELDS):
+                if field in greeks and greeks[field] is not None:
+                    self._unit_greeks[slot, i] = float(greeks[field])
+        elif self._is_option[slot] and underlying_price:
+            self._reprice_greeks(slot, underlying_price, timestamp)
+        self._refresh_slot(slot)
+    
+    def apply_market_data(self, market_data: Dict, timestamp: Optional[pd.Timestamp] = None):
+        """Propaga preços do payload de scan apenas para os símbolos em carteira."""
+        spot_data = market_data.get('spot', {}) or {}
+        for symbol, slot in list(self._slots.items()):
+            underlying = self._underlying[slot] or symbol
+            spot_info = spot_data.get(underlying)
+            if not spot_info:
+                continue
+            spot_price = spot_info.get('last', spot_info.get('close'))
+            if self._is_option[slot]:
+                self.on_tick(symbol, underlying_price=spot_price, timestamp=timestamp)
+            else:
+                self.on_tick(symbol, price=spot_price)
     
     def snapshot(self, date: pd.Timestamp, market_prices: Dict[str, float]):
         """Cria snapshot do portfólio."""
@@ -75,27 +316,27 @@ class PortfolioManager:
             'positions': self.positions.copy()
         })
     
-    def get_aggregate_greeks(self, market_data: Dict) -> Dict[str, float]:
-        """Calcula greeks agregados do portfólio."""
-        total_delta = 0.0
-        total_gamma = 0.0
-        total_vega = 0.0
-        total_theta = 0.0
-        
-        for symbol, quantity in self.positions.items():
-            if symbol in market_data:
-                greeks = market_data[symbol].get('greeks', {})
-                total_delta += quantity * greeks.get('delta', 0)
-                total_gamma += quantity * greeks.get('gamma', 0)
-                total_vega += quantity * greeks.get('vega', 0)
-                total_theta += quantity * greeks.get('theta', 0)
+    def get_aggregate_greeks(self, market_data: Optional[Dict] = None) -> Dict[str, float]:
+        """
+        Retorna greeks agregados do portfólio (O(1)).
         
+        market_data é aceito por compatibilidade; os agregados já refletem os
+        últimos fills e ticks recebidos.
+        """
+        return {field: float(self._total_greeks[i]) for i, field in enumerate(self.GREEK_FIELDS)}
+    
+    def get_exposure(self) -> Dict[str, float]:
+        """Retorna exposição agregada (notional bruto, líquido e em opções) em O(1)."""
         return {
-            'delta': total_delta,
-            'gamma': total_gamma,
-            'vega': total_vega,
-            'theta': total_theta
+            'gross_notional': float(self._gross_notional),
+            'net_notional': float(self._net_notional),
+            'options_notional': float(self._options_notional)
         }
+    
+    def get_symbol_notional(self, symbol: str) -> float:
+        """Retorna notional absoluto de um símbolo em carteira."""
+        slot = self._slots.get(symbol)
+        return float(abs(self._net_value[slot])) if slot is not None else 0.0
 
 
 class DayTradeOptionsStrategy:
@@ -107,8 +348,156 @@ class DayTradeOptionsStrategy:
         self.logger = logger
         self.bs = BlackScholes()
         self.comparison_engine = ComparisonEngine(
-            risk_free_rate=config.get('risk_free_rate', 0.05)
+            risk_free_rate=config.get('risk_free_rate', 0.05),
+            score_weights=self.config.get('score_weights')
+        )
+    
+    def _spot_frame(self, spot_data: Dict[str, Dict]) -> pd.DataFrame:
+        """
+        Momentum e volume intraday de todo o universo spot (um ativo por linha),
+        com a mesma precedência de campos usada historicamente em generate().
+        """
+        frame = pd.DataFrame.from_dict(spot_data, orient='index')
+        
+        def column(*names):
+            # Primeira coluna presente vence (mesma precedência dos .get() encadeados)
+            values = pd.Series(np.nan, index=frame.index)
+            for name in reversed(names):
+                if name in frame:
+                    values = pd.to_numeric(frame[name], errors='coerce').fillna(values)
+            return values.fillna(0.0)
+        
+        open_price = column('open')
+        last_price = column('close', 'last')
+        volume = column('volume')
+        adv = column('adv', 'avg_volume', 'average_volume')
+        adv = adv.where(adv > 0, volume.clip(lower=1))
+        volatility = column('volatility', 'iv')
+        
+        valid = (open_price > 0) & (last_price > 0)
+        intraday_return = (last_price / open_price.where(valid, 1.0)) - 1
+        volume_ratio = volume / adv
+        
+        passes = (
+            valid
+            & (intraday_return >= self.config.get('min_intraday_return', 0.005))
+            & (volume_ratio >= self.config.get('min_volume_ratio', 0.25))
+        )
+        return pd.DataFrame({
+            'last_price': last_price,
+            'intraday_return': intraday_return,
+            'volume_ratio': volume_ratio,
+            'volatility': volatility.where(volatility != 0, 0.25),
+            'passes': passes
+        }, index=frame.index)
+    
+    def prescreen(self, spot_data: Dict[str, Dict]) -> List[str]:
+        """
+        Filtro barato (vetorizado) do universo spot antes de buscar cadeias de opções.
+        Aplica os mesmos cortes de momentum e volume de generate().
+        """
+        if not spot_data or not self.config.get('enabled', True):
+            return []
+        
+        frame = self._spot_frame(spot_data)
+        return frame.index[frame['passes']].tolist()
+    
+    def _viable_calls(self, movers: pd.DataFrame, options_data, timestamp: pd.Timestamp,
+                      cfg: Dict) -> Tuple[pd.DataFrame, set]:
+        """
+        Cadeia colunar com as calls viáveis de todos os ativos (DTE, spread, volume e delta).
+        
+        Returns:
+            (cadeia filtrada com greeks e colunas do ComparisonEngine, ativos com cadeia)
+        """
+        # Os dados podem vir como lista ou dict organizado por ativo
+        if isinstance(options_data, list):
+            chain = pd.DataFrame([opt for opt in options_data if isinstance(opt, dict)])
+            if not chain.empty and 'underlying' in chain:
+                chain = chain[chain['underlying'].isin(movers.index)]
+            else:
+                chain = pd.DataFrame()
+        elif isinstance(options_data, dict):
+            frames = [
+                pd.DataFrame(options_data[asset]).assign(underlying=asset)
+                for asset in movers.index if options_data.get(asset)
+            ]
+            chain = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        else:
+            chain = pd.DataFrame()
+        
+        if chain.empty:
+            return chain, set()
+        chain = chain.reset_index(drop=True)
+        assets_with_chain = set(chain['underlying'])
+        
+        def column(name, default=0.0, fallback=None):
+            values = chain[name] if name in chain else pd.Series(np.nan, index=chain.index)
+            if fallback is not None and fallback in chain:
+                values = values.fillna(chain[fallback])
+            return pd.to_numeric(values, errors='coerce').fillna(default)
+        
+        now = pd.Timestamp(timestamp)
+        if now.tzinfo is not None:
+            now = now.tz_localize(None)
+        expiry = pd.to_datetime(chain['expiry'], errors='coerce') if 'expiry' in chain else pd.Series(pd.NaT, index=chain.index)
+        if getattr(expiry.dt, 'tz', None) is not None:
+            expiry = expiry.dt.tz_localize(None)
+        expiry = expiry.fillna(now)
+        days_to_expiry = (expiry - now).dt.days.to_numpy()
+        # Prazo para precificação em dias de pregão (base 252), não em dias corridos
+        business_days = np.maximum(get_b3_calendar(self.full_config.get('trading_calendar')).business_days(
+            now.normalize().to_datetime64(), expiry.dt.normalize().to_numpy()), 1)
+        
+        option_type = chain['option_type'].fillna('C') if 'option_type' in chain else pd.Series('C', index=chain.index)
+        strike = column('strike').to_numpy(dtype=float)
+        bid = column('bid').to_numpy(dtype=float)
+        ask = column('ask').to_numpy(dtype=float)
+        mid_default = np.where((bid > 0) & (ask > 0), (bid + ask) / 2, 0.0)
+        mid = column('mid', default=np.nan).to_numpy(dtype=float)
+        mid = np.where(np.isnan(mid), mid_default, mid)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spread_pct = np.where(mid > 0, (ask - bid) / np.where(mid > 0, mid, 1.0), 1.0)
+        volume = column('volume', fallback='open_interest').to_numpy(dtype=float)
+        iv = column('implied_vol', default=0.25, fallback='implied_volatility').to_numpy(dtype=float)
+        
+        spot = chain['underlying'].map(movers['last_price']).to_numpy(dtype=float)
+        greeks = self.bs.vectorized(spot, strike, business_days / 252.0,
+                                    self.full_config.get('risk_free_rate', 0.05), iv, True)
+        
+        mask = (
+            (option_type.to_numpy() == 'C')
+            & (days_to_expiry > 0) & (days_to_expiry <= cfg.get('max_dte', 7))
+            & (strike != 0)
+            & (mid != 0)
+            & (spread_pct <= cfg.get('max_spread_pct', 0.05))
+            & (volume >= cfg.get('min_option_volume', 200))
+            & (greeks['delta'] >= cfg.get('delta_min', 0.20))
+            & (greeks['delta'] <= cfg.get('delta_max', 0.60))
         )
+        
+        viable = pd.DataFrame({
+            'underlying': chain['underlying'].to_numpy(),
+            'strike': chain['strike'].to_numpy(),  # valor original (compõe o símbolo da proposta)
+            'expiry': expiry.to_numpy(),
+            'days_to_expiry': days_to_expiry,
+            'business_days_to_expiry': business_days,
+            'bid': bid,
+            'ask': ask,
+            'mid': mid,
+            'spread_pct': spread_pct,
+            'volume': volume,
+            'delta': greeks['delta'],
+            'gamma': greeks['gamma'],
+            'vega': greeks['vega'],
+            'iv': iv,
+            # Colunas esperadas por ComparisonEngine.score_options
+            'spot_price': spot,
+            'premium': mid,
+            'implied_vol': iv,
+            'expected_price_change_pct': chain['underlying'].map(movers['intraday_return']).to_numpy(dtype=float) * 100
+        })[mask].reset_index(drop=True)
+        return viable, assets_with_chain
     
     def generate(self, nav: float, timestamp: pd.Timestamp, market_data: Dict) -> List[OrderProposal]:
         """Gera propostas de daytrade de opções."""
@@ -137,192 +526,58 @@ class DayTradeOptionsStrategy:
             # Continuar para gerar propostas baseadas em momentum spot
             # A estratégia pode gerar propostas spot quando enable_spot=True
         
-        # Iterar sobre ativos disponíveis
-        for asset, spot_info in spot_data.items():
+        # 1. Momentum e volume intraday de todo o universo de uma vez
+        spot_frame = self._spot_frame(spot_data)
+        movers = spot_frame[spot_frame['passes']]
+        
+        # 2. Calls viáveis de todos os ativos em uma única cadeia colunar
+        try:
+            viable_calls, assets_with_chain = self._viable_calls(movers, options_data, timestamp, cfg)
+        except Exception as e:
+            import logging
+            logging.error(f"Erro ao montar cadeia de opções em DayTradeOptionsStrategy: {e}")
+            viable_calls, assets_with_chain = pd.DataFrame(), set()
+        
+        # 3. COMPARAÇÃO MATEMÁTICA em lote: todas as calls vs ação de cada ativo
+        STANDARD_TICKET_VALUE = 1000.0
+        risk_per_trade = cfg.get('risk_per_trade', 0.002)
+        enable_spot = cfg.get('enable_spot_trading', True)
+        movers = movers[movers.index.isin(assets_with_chain)]
+        spots = pd.DataFrame({
+            'current_price': movers['last_price'],
+            'expected_price_change_pct': movers['intraday_return'] * 100,  # Converter para %
+            'volatility': movers['volatility']
+        }, index=movers.index)
+        spot_scores = self.comparison_engine.score_spots(spots, nav, risk_per_trade)['score'] if enable_spot else pd.Series(dtype=float)
+        best_options = pd.DataFrame()
+        if not viable_calls.empty:
+            best_options = self.comparison_engine.rank_options_vs_spot(
+                viable_calls, spots, nav, risk_per_trade, k=1
+            ).set_index('underlying', drop=False)
+        
+        for asset, last_price, intraday_return, volume_ratio in zip(
+            movers.index, movers['last_price'], movers['intraday_return'], movers['volume_ratio']
+        ):
             try:
-                # 1. Verificar momentum e volume intraday
-                open_price = spot_info.get('open', 0)
-                last_price = spot_info.get('close', spot_info.get('last', 0))
-                
-                if open_price == 0 or last_price == 0:
-                    continue
-                
-                intraday_return = (last_price / open_price) - 1
-                min_intraday_return = cfg.get('min_intraday_return', 0.005)
-                
-                if intraday_return < min_intraday_return:
-                    continue
-                
-                # Calcular volume ratio
-                volume_day = spot_info.get('volume', 0)
-                # Tentar obter ADV (Average Daily Volume) ou usar volume médio
-                adv = spot_info.get('adv', spot_info.get('avg_volume', spot_info.get('average_volume', volume_day)))
-                if adv == 0:
-                    # Se não tiver ADV, usar volume do dia atual como fallback
-                    adv = max(volume_day, 1)
-                
-                volume_ratio = volume_day / adv
-                min_volume_ratio = cfg.get('min_volume_ratio', 0.25)
-                
-                if volume_ratio < min_volume_ratio:
-                    continue
-                
-                # 2. Buscar chain de opções para o ativo
-                # Os dados podem vir como lista ou dict organizado por ativo
-                if isinstance(options_data, list):
-                    # Se for lista, filtrar por underlying
-                    options_chain = [
-                        opt for opt in options_data 
-                        if isinstance(opt, dict) and opt.get('underlying') == asset
-                    ]
-                elif isinstance(options_data, dict):
-                    # Se for dict, buscar diretamente
-                    options_chain = options_data.get(asset, [])
-                else:
-                    # Caso não seja lista nem dict, retornar lista vazia
-                    options_chain = []
-                
-                if not options_chain:
-                    continue
-                
-                # Filtrar calls viáveis
-                viable_calls = []
-                max_dte = cfg.get('max_dte', 7)
-                delta_min = cfg.get('delta_min', 0.20)
-                delta_max = cfg.get('delta_max', 0.60)
-                max_spread_pct = cfg.get('max_spread_pct', 0.05)
-                min_option_volume = cfg.get('min_option_volume', 200)
-                
-                for opt in options_chain:
-                    # Verificar se é CALL
-                    option_type = opt.get('option_type', 'C')
-                    if option_type != 'C':
-                        continue
-                    
-                    # Verificar dias até expiração
-                    expiry = pd.to_datetime(opt.get('expiry', timestamp))
-                    days_to_expiry = (expiry - timestamp).days
-                    if days_to_expiry <= 0 or days_to_expiry > max_dte:
-                        continue
-                    
-                    # Calcular greeks se não estiverem disponíveis
-                    strike = opt.get('strike', 0)
-                    if strike == 0:
-                        continue
-                    
-                    bid = opt.get('bid', 0)
-                    ask = opt.get('ask', 0)
-                    mid = opt.get('mid', (bid + ask) / 2 if bid > 0 and ask > 0 else 0)
-                    
-                    if mid == 0:
-                        continue
-                    
-                    # Calcular spread percentual
-                    spread_pct = (ask - bid) / mid if mid > 0 else 1.0
-                    if spread_pct > max_spread_pct:
-                        continue
-                    
-                    # Verificar volume
-                    volume = opt.get('volume', opt.get('open_interest', 0))
-                    if volume < min_option_volume:
-                        continue
-                    
-                    # Calcular greeks usando Black-Scholes
-                    time_to_expiry = days_to_expiry / 365.0
-                    iv = opt.get('implied_vol', opt.get('implied_volatility', 0.25))
-                    r = self.full_config.get('risk_free_rate', 0.05)
-                    
-                    delta = self.bs.delta(last_price, strike, time_to_expiry, r, iv, 'C')
-                    gamma = self.bs.gamma(last_price, strike, time_to_expiry, r, iv)
-                    vega = self.bs.vega(last_price, strike, time_to_expiry, r, iv)
-                    
-                    # Verificar delta
-                    if not (delta_min <= delta <= delta_max):
-                        continue
-                    
-                    viable_calls.append({
-                        'option': opt,
-                        'strike': strike,
-                        'expiry': expiry,
-                        'days_to_expiry': days_to_expiry,
-                        'bid': bid,
-                        'ask': ask,
-                        'mid': mid,
-                        'spread_pct': spread_pct,
-                        'volume': volume,
-                        'delta': delta,
-                        'gamma': gamma,
-                        'vega': vega,
-                        'iv': iv
-                    })
-                
-                # 3. COMPARAÇÃO MATEMÁTICA: Opções vs Ações
-                # Primeiro, avaliar oportunidade em ações (spot)
-                STANDARD_TICKET_VALUE = 1000.0
-                take_profit_pct = cfg.get('take_profit_pct', 0.10)
-                stop_loss_pct = cfg.get('stop_loss_pct', 0.40)
+                best_call = best_options.loc[asset].to_dict() if asset in best_options.index else None
+                spot_score = spot_scores.get(asset) if enable_spot else None
                 
-                # Calcular volatilidade histórica (simplificado - usar IV como proxy se disponível)
-                historical_volatility = spot_info.get('volatility', spot_info.get('iv', 0.25))
-                if historical_volatility == 0:
-                    historical_volatility = 0.25  # Fallback
-                
-                # Calcular oportunidade em ações
-                spot_opportunity = None
-                enable_spot = cfg.get('enable_spot_trading', True)
-                if enable_spot:
-                    try:
-                        spot_opportunity = self.comparison_engine.calculate_spot_opportunity(
-                            asset=asset,
-                            current_price=last_price,
-                            expected_price_change_pct=intraday_return * 100,  # Converter para %
-                            volatility=historical_volatility,
-                            capital_available=nav,
-                            risk_per_trade=cfg.get('risk_per_trade', 0.002)
-                        )
-                    except Exception as e:
-                        if self.logger:
-                            import logging
-                            logging.warning(f"Erro ao calcular oportunidade spot para {asset}: {e}")
-                
-                # Avaliar melhor opção disponível
-                best_option_opportunity = None
-                best_option_call = None
-                
-                if viable_calls:
-                    # Selecionar melhor call (maior gamma, menor spread, maior liquidez)
-                    best_call = max(
-                        viable_calls,
-                        key=lambda o: (o['gamma'], -o['spread_pct'], o['volume'])
+                if best_call is not None and spot_score is not None:
+                    option_opp = InvestmentOpportunity(
+                        instrument_type='options', symbol=f"{asset}_{best_call['strike']}_C",
+                        expected_return=best_call['expected_return'],
+                        risk_adjusted_return=best_call['risk_adjusted_return'],
+                        leverage_effect=best_call['leverage_effect'],
+                        capital_required=best_call['capital_required'],
+                        max_loss=best_call['max_loss'], max_gain=best_call['max_gain'],
+                        score=best_call['score']
                     )
-                    
-                    # Calcular oportunidade em opções
-                    try:
-                        best_option_opportunity = self.comparison_engine.calculate_option_opportunity(
-                            asset=asset,
-                            strike=best_call['strike'],
-                            current_price=last_price,
-                            option_premium=best_call['mid'],
-                            delta=best_call['delta'],
-                            gamma=best_call['gamma'],
-                            vega=best_call['vega'],
-                            days_to_expiry=best_call['days_to_expiry'],
-                            implied_vol=best_call['iv'],
-                            expected_price_change_pct=intraday_return * 100,
-                            capital_available=nav,
-                            risk_per_trade=cfg.get('risk_per_trade', 0.002)
-                        )
-                        best_option_call = best_call
-                    except Exception as e:
-                        if self.logger:
-                            import logging
-                            logging.warning(f"Erro ao calcular oportunidade opção para {asset}: {e}")
-                
-                # Comparar e escolher a melhor oportunidade
-                if spot_opportunity and best_option_opportunity:
-                    best_opp, comparison_reason = self.comparison_engine.compare_opportunities(
-                        spot_opportunity, best_option_opportunity
+                    spot_row = spots.loc[asset]
+                    spot_opp = self.comparison_engine.calculate_spot_opportunity(
+                        asset, spot_row['current_price'], spot_row['expected_price_change_pct'],
+                        spot_row['volatility'], nav, risk_per_trade
                     )
+                    best_opp, comparison_reason = self.comparison_engine.compare_opportunities(spot_opp, option_opp)
                     
                     if self.logger:
                         import logging
@@ -331,46 +586,33 @@ class DayTradeOptionsStrategy:
                     # Gerar proposta baseada na melhor oportunidade
                     if best_opp.instrument_type == 'options':
                         proposal = self._create_option_proposal(
-                            asset, best_option_call, last_price, intraday_return, volume_ratio,
+                            asset, best_call, last_price, intraday_return, volume_ratio,
                             timestamp, cfg, STANDARD_TICKET_VALUE, best_opp.score
                         )
-                        if proposal:
-                            proposals.append(proposal)
                     else:
                         proposal = self._create_spot_proposal(
                             asset, last_price, intraday_return, volume_ratio,
                             timestamp, cfg, STANDARD_TICKET_VALUE, best_opp.score
                         )
-                        if proposal:
-                            proposals.append(proposal)
                 
-                elif best_option_opportunity:
+                elif best_call is not None:
                     # Só tem opção disponível
                     proposal = self._create_option_proposal(
-                        asset, best_option_call, last_price, intraday_return, volume_ratio,
-                        timestamp, cfg, STANDARD_TICKET_VALUE, best_option_opportunity.score
+                        asset, best_call, last_price, intraday_return, volume_ratio,
+                        timestamp, cfg, STANDARD_TICKET_VALUE, best_call['score']
                     )
-                    if proposal:
-                        proposals.append(proposal)
                 
-                elif spot_opportunity and enable_spot:
+                elif spot_score is not None:
                     # Só tem ação disponível
                     proposal = self._create_spot_proposal(
                         asset, last_price, intraday_return, volume_ratio,
-                        timestamp, cfg, STANDARD_TICKET_VALUE, spot_opportunity.score
+                        timestamp, cfg, STANDARD_TICKET_VALUE, spot_score
                     )
-                    if proposal:
-                        proposals.append(proposal)
+                else:
+                    proposal = None
                 
-                # Se não houver opções mas estratégia permite trading spot, continuar
-                elif enable_spot and not viable_calls:
-                    # Gerar proposta de ação mesmo sem opções
-                    proposal = self._create_spot_proposal(
-                        asset, last_price, intraday_return, volume_ratio,
-                        timestamp, cfg, STANDARD_TICKET_VALUE, 0.5  # Score padrão
-                    )
-                    if proposal:
-                        proposals.append(proposal)
+                if proposal:
+                    proposals.append(proposal)
             
             except Exception as e:
                 if self.logger:
@@ -441,10 +683,8 @@ class DayTradeOptionsStrategy:
                 qty = int(STANDARD_TICKET_VALUE / premium_per_contract) + 1
                 actual_value = qty * premium_per_contract
             
-            # ID simplificado: apenas últimos 4 dígitos do timestamp
-            # Exemplo: 3456 (últimos 4 dígitos do timestamp Unix)
-            timestamp_short = str(int(timestamp.timestamp()))[-4:]
-            proposal_id = timestamp_short
+            # ID simplificado de 4 dígitos (único no processo)
+            proposal_id = next_proposal_id()
             
             entry_price_unit = best_call['ask']
             entry_price_total = entry_price_unit * qty * 100
@@ -523,9 +763,8 @@ class DayTradeOptionsStrategy:
             
             actual_value = qty * last_price
             
-            # ID simplificado: apenas últimos 4 dígitos do timestamp
-            timestamp_short = str(int(timestamp.timestamp()))[-4:]
-            proposal_id = timestamp_short
+            # ID simplificado de 4 dígitos (único no processo)
+            proposal_id = next_proposal_id()
             
             entry_price = last_price
             entry_price_total = actual_value
@@ -584,7 +823,6 @@ class TraderAgent:
         self.config = config
         self.logger = logger
         self.orders_repo = orders_repo  # Repositório para salvar propostas
-        self.proposal_counter = 0
         
         # Inicializar estratégias modulares
         self.strategies = []
@@ -593,10 +831,24 @@ class TraderAgent:
         if config.get('daytrade_options', {}).get('enabled', True):
             self.strategies.append(DayTradeOptionsStrategy(config, logger))
     
-    def generate_proposals(self, date: pd.Timestamp, market_data: Dict) -> List[OrderProposal]:
+    def prescreen_options_universe(self, spot_data: Dict[str, Dict]) -> List[str]:
+        """Ativos que passam nos filtros spot de alguma estratégia de opções (estágio 1 do scan)."""
+        survivors = set()
+        for strategy in self.strategies:
+            if hasattr(strategy, 'prescreen'):
+                survivors.update(strategy.prescreen(spot_data))
+        return sorted(survivors)
+    
+    def generate_proposals(self, date: pd.Timestamp, market_data: Dict, cross_sectional: bool = True,
+                           save: bool = True) -> List[OrderProposal]:
         """
         Gera propostas de daytrade focadas exclusivamente em ativos brasileiros (B3).
         Filtra automaticamente apenas tickers com sufixo .SA
+        
+        Args:
+            cross_sectional: False para lotes parciais do universo (pipeline em streaming);
+                as estratégias que comparam ativos rodam em generate_universe_proposals
+            save: False deixa a gravação para o chamador (save_proposals)
         """
         proposals = []
         
@@ -641,35 +893,68 @@ class TraderAgent:
             proposals.extend(vol_arb_proposals)
         
         # Estratégia 2: Pairs/Statistical Arbitrage
-        if self.config.get('enable_pairs', True):
-            pairs_proposals = self._pairs_strategy(date, market_data)
-            proposals.extend(pairs_proposals)
+        if cross_sectional:
+            proposals.extend(self.generate_universe_proposals(date, market_data, save=False))
         
-        # Salvar propostas no banco de dados
-        if self.orders_repo:
-            for proposal in proposals:
-                try:
-                    proposal_dict = {
-                        'proposal_id': proposal.proposal_id,
-                        'timestamp': date.isoformat(),
-                        'strategy': proposal.strategy,
-                        'instrument_type': proposal.instrument_type,
-                        'symbol': proposal.symbol,
-                        'side': proposal.side,
-                        'quantity': proposal.quantity,
-                        'price': proposal.price,
-                        'order_type': proposal.order_type,
-                        'metadata': proposal.metadata,
-                        'status': 'gerada'  # Status inicial: proposta gerada mas não aprovada pelo RiskAgent
-                    }
-                    self.orders_repo.save_proposal(proposal_dict)
-                except Exception as e:
-                    if self.logger:
-                        import logging
-                        logging.error(f"Erro ao salvar proposta {proposal.proposal_id}: {e}")
+        if save:
+            proposals = self.save_proposals(date, proposals)
         
         return proposals
     
+    def generate_universe_proposals(self, date: pd.Timestamp, market_data: Dict,
+                                    save: bool = True) -> List[OrderProposal]:
+        """Estratégias que precisam do universo completo do scan (pairs)."""
+        proposals = []
+        if self.config.get('enable_pairs', True):
+            proposals.extend(self._pairs_strategy(date, market_data))
+        if save:
+            proposals = self.save_proposals(date, proposals)
+        return proposals
+    
+    def save_proposals(self, date: pd.Timestamp, proposals: List[OrderProposal]) -> List[OrderProposal]:
+        """
+        Salva propostas no banco de dados (status inicial 'gerada').
+        
+        Sequência do dia já usada por outro processo (backtest, simulador no mesmo banco): a
+        sequência local é ressincronizada com o banco e a proposta recebe um número novo (as
+        pernas de um par mantêm o mesmo). Retorna só as propostas gravadas; as demais não devem
+        seguir para o RiskAgent/Telegram, pois o ID (e o apelido) pertenceria a outra proposta.
+        """
+        if not self.orders_repo:
+            return proposals
+        saved = []
+        renamed: Dict[str, str] = {}  # Sequência em conflito -> sequência nova
+        checked = set()  # Sequências livres nesta chamada (a segunda perna do par reusa a da primeira)
+        for proposal in proposals:
+            try:
+                for _ in range(5):
+                    match = PROPOSAL_ID_PATTERN.search(proposal.proposal_id)
+                    key = match.group(0) if match else None
+                    if key in renamed:
+                        proposal.proposal_id = proposal.proposal_id.replace(key, renamed[key], 1)
+                        continue
+                    if key and key not in checked:
+                        if self.orders_repo.proposal_seq_exists(key):
+                            reseed_proposal_seq()
+                            renamed[key] = next_proposal_id()
+                            continue
+                        checked.add(key)
+                    proposal_dict = proposal.to_dict()
+                    proposal_dict['timestamp'] = date.isoformat()
+                    proposal_dict['status'] = 'gerada'  # Status inicial: proposta gerada mas não aprovada pelo RiskAgent
+                    if self.orders_repo.save_proposal(proposal_dict):
+                        saved.append(proposal)
+                        break
+                    if not key or self.orders_repo.resolve_proposal_id(proposal.proposal_id) != proposal.proposal_id:
+                        break  # Erro que não é colisão de ID
+                    checked.discard(key)  # Gravado por outro processo entre a consulta e o INSERT
+                else:
+                    logging.error(f"Proposta {proposal.proposal_id} descartada: ID em conflito no banco")
+            except Exception as e:
+                if self.logger:
+                    logging.error(f"Erro ao salvar proposta {proposal.proposal_id}: {e}")
+        return saved
+    
     def _vol_arb_strategy(self, date: pd.Timestamp, market_data: Dict) -> List[OrderProposal]:
         """Delta-hedged Volatility Arbitrage."""
         proposals = []
@@ -702,14 +987,15 @@ class TraderAgent:
         if not options_chain:
             return proposals
         
+        calendar = get_b3_calendar(self.config.get('trading_calendar'))
         for opt in options_chain[:10]:
             strike = opt.get('strike', 0)
             expiry = opt.get('expiry', date)
             days_to_expiry = (pd.to_datetime(expiry) - date).days
-            if days_to_expiry <= 0:
+            if not days_to_expiry > 0:  # Vencida ou sem vencimento (NaT)
                 continue
             
-            time_to_expiry = days_to_expiry / 365.0
+            time_to_expiry = max(calendar.business_days(pd.Timestamp(date).date(), pd.to_datetime(expiry).date()), 1) / 252.0
             iv = opt.get('implied_vol', 0.25)
             mid_price = opt.get('mid', 0)
             
@@ -725,8 +1011,7 @@ class TraderAgent:
             mispricing = (mid_price - theoretical_price) / theoretical_price
             
             if abs(mispricing) > threshold:
-                self.proposal_counter += 1
-                proposal_id = f"VOL_ARB_{self.proposal_counter}"
+                proposal_id = f"VOL_ARB_{next_proposal_id()}"
                 
                 if mispricing > 0:
                     side = 'SELL'
@@ -808,8 +1093,7 @@ class TraderAgent:
         zscore = (ratio - mean_ratio) / std_ratio
         
         if abs(zscore) > zscore_threshold:
-            self.proposal_counter += 1
-            proposal_id = f"PAIRS_{self.proposal_counter}"
+            proposal_id = f"PAIRS_{next_proposal_id()}"
             
             if zscore > zscore_threshold:
                 side1 = 'SELL'
@@ -885,16 +1169,17 @@ class RiskAgent:
                 b3_tz = pytz.timezone('America/Sao_Paulo')
                 timestamp = datetime.now(b3_tz).isoformat()
                 
-                evaluation_dict = {
-                    'proposal_id': proposal.proposal_id,
-                    'timestamp': timestamp,
-                    'decision': decision,
-                    'reason': reason,
-                    'details': {},
-                    'modified_quantity': modified_proposal.quantity if modified_proposal else None,
-                    'modified_price': modified_proposal.price if modified_proposal else None
-                }
-                success = self.orders_repo.save_risk_evaluation(evaluation_dict)
+                evaluation = RiskEvaluation(
+                    proposal_id=proposal.proposal_id,
+                    decision=decision,
+                    reason=reason,
+                    timestamp=timestamp,
+                    strategy=proposal.strategy,
+                    symbol=proposal.symbol,
+                    modified_quantity=modified_proposal.quantity if modified_proposal else None,
+                    modified_price=modified_proposal.price if modified_proposal else None
+                )
+                success = self.orders_repo.save_risk_evaluation(evaluation)
                 if not success:
                     import logging
                     logging.warning(f"Falha ao salvar avaliação {proposal.proposal_id}")
@@ -931,7 +1216,7 @@ class RiskAgent:
             # Verificar limite por ativo
             underlying = proposal.metadata.get('underlying', '')
             max_per_asset = self.config.get('max_per_asset_exposure', 0.05)
-            current_asset_exposure = abs(self.portfolio.positions.get(proposal.symbol, 0) * proposal.price)
+            current_asset_exposure = self.portfolio.get_symbol_notional(proposal.symbol)
             if current_asset_exposure > self.portfolio.nav * max_per_asset:
                 reason = f'Exposição máxima por ativo excedida para {underlying}'
                 self._save_evaluation(proposal, 'REJECT', reason)
@@ -946,16 +1231,11 @@ class RiskAgent:
                 return ('REJECT', None, reason)
             
             # Verificar exposição agregada em opções curtas
-            # Nota: Para calcular exposição precisa, precisaríamos dos preços de mercado
-            # Por enquanto, usamos uma estimativa baseada na quantidade
-            total_options_exposure = sum(
-                abs(qty * proposal.price * 100) if proposal.price else abs(qty * 1000)
-                for symbol, qty in self.portfolio.positions.items()
-                if 'options' in symbol.lower() or '_C_' in symbol or '_P_' in symbol
-            )
-            # Se não houver posições, usar o risco da proposta atual
-            if total_options_exposure == 0:
-                total_options_exposure = abs(proposal.quantity * proposal.price * 100) if proposal.price else 0
+            # Notional em opções já em carteira (O(1)) + notional da proposta atual
+            proposal_options_notional = 0.0
+            if proposal.instrument_type == 'options' and proposal.price:
+                proposal_options_notional = abs(proposal.quantity * proposal.price * PortfolioManager.OPTION_MULTIPLIER)
+            total_options_exposure = self.portfolio.get_exposure()['options_notional'] + proposal_options_notional
             max_options_exposure = daytrade_cfg.get('max_options_exposure_pct', 0.15)
             if total_options_exposure > self.portfolio.nav * max_options_exposure:
                 reason = f'Exposição agregada em opções excedida: {total_options_exposure:.2f}'
@@ -964,14 +1244,14 @@ class RiskAgent:
         
         # Verificar limites de exposição
         max_exposure = self.config.get('max_exposure', 0.5)
-        current_exposure = abs(sum(self.portfolio.positions.values()))
+        current_exposure = self.portfolio.get_exposure()['gross_notional']
         if current_exposure > self.portfolio.nav * max_exposure:
             reason = f'Exposição máxima excedida: {current_exposure:.2f}'
             self._save_evaluation(proposal, 'REJECT', reason)
             return ('REJECT', None, reason)
         
         # Verificar limites de greeks
-        greeks = self.portfolio.get_aggregate_greeks(market_data)
+        greeks = self.portfolio.get_aggregate_greeks()
         max_delta = self.config.get('max_delta', 1000)
         max_gamma = self.config.get('max_gamma', 500)
         max_vega = self.config.get('max_vega', 1000)
@@ -1033,12 +1313,13 @@ class RiskAgent:
         
         return ('APPROVE', proposal, 'Proposta aprovada')
     
-    def kill_switch(self):
-        """Ativa kill switch."""
+    def kill_switch(self, nav_loss: Optional[float] = None):
+        """Ativa kill switch (nav_loss: perda do dia já medida, ex.: pelo MTM; padrão: NAV do portfólio)."""
         self.kill_switch_active = True
         
         # Calcular perda de NAV
-        nav_loss = (self.portfolio.initial_nav - self.portfolio.nav) / self.portfolio.initial_nav if self.portfolio.initial_nav > 0 else 0
+        if nav_loss is None:
+            nav_loss = (self.portfolio.initial_nav - self.portfolio.nav) / self.portfolio.initial_nav if self.portfolio.initial_nav > 0 else 0
         
         if self.logger:
             # Verificar se logger tem método log_decision (StructuredLogger) ou usar logging padrão
@@ -4,9 +4,14 @@
 Módulo de Cálculo de Custos Operacionais B3
 Baseado em tarifas oficiais da B3 e práticas de mercado
 """
-from typing import Dict, Optional
+from typing import Dict, Optional, Sequence, Union
 from dataclasses import dataclass
 
+import numpy as np
+import pandas as pd
+
+ArrayLike = Union[float, Sequence[float], np.ndarray, pd.Series]
+
 @dataclass
 class TradeCosts:
     """Custos de uma operação na B3."""
@@ -52,6 +57,10 @@ class B3CostCalculator:
     IR_RETIDO_PCT = 0.01  # 1% retido na fonte
     IR_A_PAGAR_PCT = 0.19  # 19% a pagar
     
+    # Imposto de Renda operações comuns (swing trade)
+    IR_SWING_ALIQUOTA = 0.15  # 15%
+    IR_SWING_RETIDO_PCT = 0.00005  # 0.005% sobre valor de venda (retido na fonte)
+    
     def __init__(
         self,
         corretagem_pct: float = 0.0,
@@ -155,13 +164,17 @@ class B3CostCalculator:
     
     def calculate_tax_costs(
         self,
-        profit: float
+        profit: float,
+        is_daytrade: bool = True,
+        sale_value: float = 0.0
     ) -> TradeCosts:
         """
         Calcula custos de impostos sobre lucro.
         
         Args:
             profit: Lucro da operação (valor positivo)
+            is_daytrade: Se True, alíquota day trade (20%); senão operação comum (15%)
+            sale_value: Valor de venda (base do IR retido em operações comuns)
         
         Returns:
             TradeCosts com custos de impostos
@@ -171,11 +184,17 @@ class B3CostCalculator:
         
         costs = TradeCosts()
         
-        # IR retido na fonte (1%)
-        costs.ir_retido = profit * self.IR_RETIDO_PCT
-        
-        # IR a pagar (19%)
-        costs.ir_a_pagar = profit * self.IR_A_PAGAR_PCT
+        if is_daytrade:
+            # IR retido na fonte (1%)
+            costs.ir_retido = profit * self.IR_RETIDO_PCT
+            
+            # IR a pagar (19%)
+            costs.ir_a_pagar = profit * self.IR_A_PAGAR_PCT
+        else:
+            # 15% sobre o lucro, com 0.005% do valor de venda retido na fonte
+            ir_total = profit * self.IR_SWING_ALIQUOTA
+            costs.ir_retido = min(sale_value * self.IR_SWING_RETIDO_PCT, ir_total)
+            costs.ir_a_pagar = ir_total - costs.ir_retido
         
         # Total impostos
         costs.total_impostos = costs.ir_retido + costs.ir_a_pagar
@@ -187,7 +206,8 @@ class B3CostCalculator:
         entry_value: float,
         exit_value: float,
         instrument_type: str = 'options',
-        levar_vencimento: bool = False
+        levar_vencimento: bool = False,
+        is_daytrade: bool = True
     ) -> Dict:
         """
         Calcula custos totais de uma operação completa (entrada + saída + impostos).
@@ -197,6 +217,7 @@ class B3CostCalculator:
             exit_value: Valor financeiro da saída
             instrument_type: Tipo de instrumento
             levar_vencimento: Se True, aplica taxa de liquidação
+            is_daytrade: Se True, IR de day trade (20%); senão operação comum (15%)
         
         Returns:
             Dict com todos os custos detalhados
@@ -211,7 +232,7 @@ class B3CostCalculator:
         profit_bruto = exit_value - entry_value
         
         # Custos de impostos (sobre lucro)
-        tax_costs = self.calculate_tax_costs(profit_bruto)
+        tax_costs = self.calculate_tax_costs(profit_bruto, is_daytrade=is_daytrade, sale_value=exit_value)
         
         # Total de custos operacionais
         total_custos_operacionais = entry_costs.total_custos + exit_costs.total_custos
@@ -283,6 +304,177 @@ class B3CostCalculator:
         min_profit = self.calculate_minimum_profit(entry_value, instrument_type)
         return (min_profit / entry_value) if entry_value > 0 else 0
 
+    # ------------------------------------------------------------------
+    # Cálculo vetorizado (análises em lote)
+    # ------------------------------------------------------------------
+    
+    def calculate_costs_batch(
+        self,
+        entry_values: ArrayLike,
+        exit_values: ArrayLike,
+        instrument_types: Optional[Union[str, Sequence[str]]] = 'options',
+        is_daytrade: Union[bool, Sequence[bool]] = True,
+        levar_vencimento: Union[bool, Sequence[bool]] = False
+    ) -> pd.DataFrame:
+        """
+        Calcula custos e impostos de N operações de uma vez.
+        
+        Mesmas regras de calculate_total_costs (IR por operação, sem compensação),
+        com escalares sendo propagados para todas as operações.
+        
+        Args:
+            entry_values: Valores financeiros de entrada
+            exit_values: Valores financeiros de saída
+            instrument_types: Tipo de instrumento (escalar ou por operação)
+            is_daytrade: Flag de day trade (escalar ou por operação)
+            levar_vencimento: Aplica taxa de liquidação (escalar ou por operação)
+        
+        Returns:
+            DataFrame com uma linha por operação e colunas emolumentos, taxa_registro,
+            taxa_liquidacao, corretagem, total_operational_costs, profit_bruto,
+            ir_retido, ir_a_pagar, total_taxes, total_costs, profit_liquido,
+            profit_pct_bruto e profit_pct_liquido
+        """
+        entry = np.atleast_1d(np.asarray(entry_values, dtype=float))
+        exit_ = np.atleast_1d(np.asarray(exit_values, dtype=float))
+        entry, exit_ = np.broadcast_arrays(entry, exit_)
+        n = entry.shape[0]
+        daytrade = np.broadcast_to(np.asarray(is_daytrade, dtype=bool), (n,))
+        vencimento = np.broadcast_to(np.asarray(levar_vencimento, dtype=bool), (n,))
+        instruments = np.broadcast_to(np.asarray(instrument_types, dtype=object), (n,))
+        
+        traded = entry + exit_
+        emolumentos = traded * self.EMOLUMENTOS_PCT
+        taxa_registro = traded * self.TAXA_REGISTRO_PCT
+        taxa_liquidacao = np.where(vencimento, exit_ * self.TAXA_LIQUIDACAO_PCT, 0.0)
+        if self.corretagem_pct > 0:
+            corretagem = traded * self.corretagem_pct
+        else:
+            corretagem = np.full(n, 2 * self.corretagem_fixa)
+        operational = emolumentos + taxa_registro + taxa_liquidacao + corretagem
+        
+        profit_bruto = exit_ - entry
+        profit_pos = np.maximum(profit_bruto, 0.0)
+        ir_total = profit_pos * np.where(daytrade, self.IR_ALIQUOTA_TOTAL, self.IR_SWING_ALIQUOTA)
+        ir_retido = np.where(
+            daytrade,
+            profit_pos * self.IR_RETIDO_PCT,
+            np.minimum(exit_ * self.IR_SWING_RETIDO_PCT, ir_total)
+        )
+        ir_a_pagar = ir_total - ir_retido
+        profit_liquido = profit_bruto - operational - ir_total
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            valid_entry = entry > 0
+            profit_pct_bruto = np.where(valid_entry, profit_bruto / entry * 100, 0.0)
+            profit_pct_liquido = np.where(valid_entry, profit_liquido / entry * 100, 0.0)
+        
+        return pd.DataFrame({
+            'entry_value': entry,
+            'exit_value': exit_,
+            'instrument_type': instruments,
+            'is_daytrade': daytrade,
+            'emolumentos': emolumentos,
+            'taxa_registro': taxa_registro,
+            'taxa_liquidacao': taxa_liquidacao,
+            'corretagem': corretagem,
+            'total_operational_costs': operational,
+            'profit_bruto': profit_bruto,
+            'ir_retido': ir_retido,
+            'ir_a_pagar': ir_a_pagar,
+            'total_taxes': ir_total,
+            'total_costs': operational + ir_total,
+            'profit_liquido': profit_liquido,
+            'profit_pct_bruto': profit_pct_bruto,
+            'profit_pct_liquido': profit_pct_liquido
+        })
+    
+    @staticmethod
+    def _carry_forward(values: np.ndarray, opening_balance: float = 0.0):
+        """
+        Compensação sequencial de saldos negativos.
+        
+        Com S = saldo_inicial + cumsum(values), o saldo negativo a compensar após o
+        mês t é S_t - max(0, max(S_0..S_t)) e a parcela tributável do mês é o
+        incremento do máximo corrente - sem laço sobre os meses.
+        
+        Returns:
+            (parcela positiva por mês, saldo negativo acumulado por mês)
+        """
+        cumulative = opening_balance + np.cumsum(values)
+        running_max = np.maximum.accumulate(np.maximum(cumulative, 0.0))
+        taxable = np.diff(running_max, prepend=0.0)
+        return taxable, cumulative - running_max
+    
+    def calculate_monthly_ir(
+        self,
+        dates: Sequence,
+        results: ArrayLike,
+        is_daytrade: Union[bool, Sequence[bool]] = True,
+        ir_retido: Optional[ArrayLike] = None,
+        prejuizo_anterior_daytrade: float = 0.0,
+        prejuizo_anterior_swing: float = 0.0
+    ) -> pd.DataFrame:
+        """
+        Apura o IR mensal de um histórico de operações.
+        
+        Os resultados (líquidos de custos operacionais) são somados por mês e
+        modalidade; o prejuízo de um mês compensa lucros dos meses seguintes da
+        mesma modalidade (day trade só com day trade) e o IR retido na fonte não
+        aproveitado também é abatido nos meses seguintes.
+        
+        Args:
+            dates: Data de cada operação
+            results: Resultado de cada operação já descontados os custos operacionais
+            is_daytrade: Flag de day trade (escalar ou por operação)
+            ir_retido: IR retido na fonte por operação (padrão: zero)
+            prejuizo_anterior_daytrade: Prejuízo a compensar de day trade (valor positivo)
+            prejuizo_anterior_swing: Prejuízo a compensar de operações comuns (valor positivo)
+        
+        Returns:
+            DataFrame por (mês, modalidade) com resultado, prejuizo_compensado,
+            base_calculo, aliquota, ir_devido, ir_retido, darf e prejuizo_acumulado
+        """
+        results = np.atleast_1d(np.asarray(results, dtype=float))
+        n = results.shape[0]
+        columns = ['month', 'modalidade', 'resultado', 'prejuizo_compensado', 'base_calculo',
+                   'aliquota', 'ir_devido', 'ir_retido', 'darf', 'prejuizo_acumulado']
+        if n == 0:
+            return pd.DataFrame(columns=columns)
+        
+        timestamps = pd.DatetimeIndex(pd.to_datetime(dates, format='ISO8601'))
+        if timestamps.tz is not None:
+            timestamps = timestamps.tz_localize(None)
+        trades = pd.DataFrame({
+            'month': timestamps.to_numpy().astype('datetime64[M]'),
+            'modalidade': np.where(np.broadcast_to(np.asarray(is_daytrade, dtype=bool), (n,)), 'daytrade', 'swing'),
+            'resultado': results,
+            'ir_retido': np.zeros(n) if ir_retido is None else np.broadcast_to(np.asarray(ir_retido, dtype=float), (n,))
+        })
+        monthly = trades.groupby(['modalidade', 'month'], sort=True)[['resultado', 'ir_retido']].sum().reset_index()
+        
+        frames = []
+        for modalidade, group in monthly.groupby('modalidade', sort=False):
+            group = group.copy()
+            is_dt = modalidade == 'daytrade'
+            prejuizo_anterior = prejuizo_anterior_daytrade if is_dt else prejuizo_anterior_swing
+            aliquota = self.IR_ALIQUOTA_TOTAL if is_dt else self.IR_SWING_ALIQUOTA
+            
+            resultado = group['resultado'].to_numpy()
+            base, saldo = self._carry_forward(resultado, -abs(prejuizo_anterior))
+            group['base_calculo'] = base
+            group['prejuizo_compensado'] = np.where(resultado > 0, np.maximum(resultado - base, 0.0), 0.0)
+            group['prejuizo_acumulado'] = 0.0 - saldo
+            group['aliquota'] = aliquota
+            group['ir_devido'] = base * aliquota
+            darf, _ = self._carry_forward(group['ir_devido'].to_numpy() - group['ir_retido'].to_numpy())
+            group['darf'] = darf
+            frames.append(group)
+        
+        report = pd.concat(frames, ignore_index=True).sort_values(['month', 'modalidade']).reset_index(drop=True)
+        report['month'] = np.datetime_as_string(report['month'].to_numpy().astype('datetime64[M]'), unit='M')
+        return report[columns]
+
 # Instância padrão (RLP ativo = corretagem zerada)
 default_calculator = B3CostCalculator(rlp_ativo=True)
 
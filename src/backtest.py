@@ -55,28 +55,48 @@ class BacktestEngine:
             market_data = self._prepare_market_data(date)
             proposals = self.trader_agent.generate_proposals(pd.to_datetime(date), market_data)
             
+            # Ordens aprovadas do dia são executadas em lote; cada aprovação entra como posição
+            # provisória para que os limites do RiskAgent enxerguem as anteriores do mesmo candle
+            approved = []
+            orders = []
             for proposal in proposals:
                 decision, modified_proposal, reason = self.risk_agent.evaluate_proposal(proposal, market_data)
                 
                 if decision == 'APPROVE':
-                    order = {
+                    spot_info = market_data['spot'].get(proposal.symbol, {})
+                    market_price = self._get_market_price(proposal.symbol, date)
+                    approved.append((proposal, proposal.price or market_price))
+                    self._apply_provisional(*approved[-1], 1)
+                    orders.append({
                         'order_id': proposal.proposal_id,
                         'symbol': proposal.symbol,
                         'side': proposal.side,
                         'quantity': proposal.quantity,
                         'price': proposal.price,
-                        'order_type': proposal.order_type
-                    }
-                    
-                    market_price = self._get_market_price(proposal.symbol, date)
-                    fill = self.execution_simulator.execute_order(order, market_price)
-                    
-                    if fill:
-                        self.portfolio_manager.update_position(
-                            proposal.symbol,
-                            fill['quantity'] if proposal.side == 'BUY' else -fill['quantity'],
-                            fill['price']
-                        )
+                        'order_type': proposal.order_type,
+                        'market_price': market_price,
+                        'adv': spot_info.get('volume', np.nan),
+                        'volatility': proposal.metadata.get('iv', np.nan)
+                    })
+            
+            # Desfazer as provisórias: a carteira recebe apenas os fills efetivos
+            for proposal, price in reversed(approved):
+                self._apply_provisional(proposal, price, -1)
+            
+            if orders:
+                fills = self.execution_simulator.execute_batch(orders, timestamp=pd.to_datetime(date))
+                for row, fill in zip(fills.index, fills.to_dict('records')):
+                    proposal = approved[row][0]
+                    self.portfolio_manager.update_position(
+                        proposal.symbol,
+                        fill['quantity'] if proposal.side == 'BUY' else -fill['quantity'],
+                        fill['price'],
+                        greeks=proposal.metadata,
+                        instrument_type=proposal.instrument_type
+                    )
+            
+            # Propagar preços do dia para greeks/exposição das posições
+            self.portfolio_manager.apply_market_data(market_data, pd.to_datetime(date))
             
             # Snapshot do portfólio
             market_prices = self._get_all_market_prices(date)
@@ -94,6 +114,17 @@ class BacktestEngine:
             'orders': []
         }
     
+    def _apply_provisional(self, proposal, price: float, direction: int):
+        """Aplica (direction=1) ou desfaz (direction=-1) a posição provisória de uma proposta aprovada."""
+        quantity = proposal.quantity if proposal.side == 'BUY' else -proposal.quantity
+        self.portfolio_manager.update_position(
+            proposal.symbol,
+            direction * quantity,
+            price,
+            greeks=proposal.metadata if direction > 0 else None,
+            instrument_type=proposal.instrument_type
+        )
+    
     def _prepare_market_data(self, date: pd.Timestamp) -> Dict:
         """Prepara dados de mercado para uma data."""
         market_data = {'spot': {}, 'futures': {}, 'options': {}}
@@ -4,10 +4,21 @@ Compara matematicamente qual é a melhor oportunidade de investimento.
 """
 
 import numpy as np
-from typing import Dict, Optional, Tuple
+import pandas as pd
+from typing import Dict, Optional, Sequence, Tuple
 from dataclasses import dataclass
 
 
+# Pesos padrão do score combinado (sobrescrevíveis via config)
+DEFAULT_SCORE_WEIGHTS = {
+    'expected_return': 0.3,  # Retorno esperado (30%)
+    'risk_adjusted_return': 0.3,  # Risk-adjusted return (30%)
+    'leverage': 0.2,  # Leverage effect (20%)
+    'capital_efficiency': 0.1,  # Capital efficiency (10%)
+    'risk_reward': 0.1  # Risk/reward ratio (10%)
+}
+
+
 @dataclass
 class InvestmentOpportunity:
     """Representa uma oportunidade de investimento."""
@@ -34,8 +45,9 @@ class ComparisonEngine:
     5. Risk/Reward Ratio
     """
     
-    def __init__(self, risk_free_rate: float = 0.05):
+    def __init__(self, risk_free_rate: float = 0.05, score_weights: Optional[Dict[str, float]] = None):
         self.risk_free_rate = risk_free_rate
+        self.score_weights = {**DEFAULT_SCORE_WEIGHTS, **(score_weights or {})}
     
     def calculate_spot_opportunity(
         self,
@@ -256,13 +268,179 @@ class ComparisonEngine:
         risk_reward_ratio = max_gain / max_loss if max_loss > 0 else 0
         
         # Score combinado (pesos ajustáveis)
+        w = self.score_weights
         score = (
-            return_normalized * 0.3 +  # Retorno esperado (30%)
-            risk_adj_normalized * 0.3 +  # Risk-adjusted return (30%)
-            leverage_normalized * 0.2 +  # Leverage effect (20%)
-            capital_efficiency * 0.1 +  # Capital efficiency (10%)
-            risk_reward_ratio * 0.1  # Risk/reward ratio (10%)
+            return_normalized * w['expected_return'] +
+            risk_adj_normalized * w['risk_adjusted_return'] +
+            leverage_normalized * w['leverage'] +
+            capital_efficiency * w['capital_efficiency'] +
+            risk_reward_ratio * w['risk_reward']
         )
         
         return score
+    
+    # ------------------------------------------------------------------
+    # API vetorizada (cadeias inteiras de uma vez)
+    # ------------------------------------------------------------------
+    
+    def score_array(
+        self,
+        expected_return_value: np.ndarray,
+        risk_adjusted_return: np.ndarray,
+        leverage_effect: np.ndarray,
+        capital_required: np.ndarray,
+        max_loss: np.ndarray,
+        max_gain: np.ndarray
+    ) -> np.ndarray:
+        """Mesma fórmula de _calculate_score aplicada a arrays."""
+        w = self.score_weights
+        valid = (capital_required != 0) & (max_loss != 0)
+        capital_safe = np.where(valid, capital_required, 1.0)
+        loss_safe = np.where(valid, max_loss, 1.0)
+        score = (
+            expected_return_value / 1000.0 * w['expected_return'] +
+            np.maximum(risk_adjusted_return, 0) * w['risk_adjusted_return'] +
+            np.minimum(leverage_effect, 10.0) * w['leverage'] +
+            expected_return_value / capital_safe * w['capital_efficiency'] +
+            max_gain / loss_safe * w['risk_reward']
+        )
+        return np.where(valid, score, 0.0)
+    
+    def score_spots(
+        self,
+        spots: pd.DataFrame,
+        capital_available: float,
+        risk_per_trade: float = 0.02
+    ) -> pd.DataFrame:
+        """
+        Versão vetorizada de calculate_spot_opportunity.
+        
+        Args:
+            spots: Colunas current_price, expected_price_change_pct (%) e volatility
+        
+        Returns:
+            Cópia de spots com expected_return, risk_adjusted_return, leverage_effect,
+            capital_required, max_loss, max_gain e score
+        """
+        stop_loss_pct = 0.02  # 2% stop loss padrão para ações
+        pct = spots['expected_price_change_pct'].to_numpy(dtype=float) / 100
+        vol = spots['volatility'].to_numpy(dtype=float)
+        capital_required = np.full(len(spots), min(capital_available * risk_per_trade / stop_loss_pct, capital_available))
+        
+        expected_return = capital_required * pct
+        with np.errstate(divide='ignore', invalid='ignore'):
+            risk_adjusted = np.where(vol > 0, (pct - self.risk_free_rate) / vol, 0.0)
+        leverage = np.ones(len(spots))
+        max_loss = capital_required * stop_loss_pct
+        
+        result = spots.copy()
+        result['expected_return'] = expected_return
+        result['risk_adjusted_return'] = risk_adjusted
+        result['leverage_effect'] = leverage
+        result['capital_required'] = capital_required
+        result['max_loss'] = max_loss
+        result['max_gain'] = expected_return
+        result['score'] = self.score_array(expected_return, risk_adjusted, leverage,
+                                           capital_required, max_loss, expected_return)
+        return result
+    
+    def score_options(
+        self,
+        chain: pd.DataFrame,
+        capital_available: float,
+        risk_per_trade: float = 0.02
+    ) -> pd.DataFrame:
+        """
+        Versão vetorizada de calculate_option_opportunity para uma cadeia colunar
+        (qualquer número de ativos subjacentes).
+        
+        Args:
+            chain: Colunas spot_price, premium, delta, days_to_expiry, implied_vol e
+                   expected_price_change_pct (%) do ativo subjacente
+        
+        Returns:
+            Cópia de chain com as métricas da oportunidade e score
+        """
+        premium = chain['premium'].to_numpy(dtype=float)
+        spot = chain['spot_price'].to_numpy(dtype=float)
+        delta = chain['delta'].to_numpy(dtype=float)
+        iv = chain['implied_vol'].to_numpy(dtype=float)
+        time_factor = chain['days_to_expiry'].to_numpy(dtype=float) / 365.0
+        pct = chain['expected_price_change_pct'].to_numpy(dtype=float) / 100
+        
+        # Para opções, o risco máximo é o prêmio pago (contrato = 100 ações)
+        valid = premium > 0
+        premium_per_contract = np.where(valid, premium * 100, 1.0)
+        contracts = np.maximum(np.floor(capital_available * risk_per_trade / premium_per_contract), 1)
+        capital_required = np.where(valid, contracts * premium_per_contract, 0.0)
+        
+        # Valor da opção após o movimento esperado (aproximação por delta)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected_return_frac = np.where(valid, delta * spot * pct / np.where(valid, premium, 1.0), 0.0)
+            expected_return = capital_required * expected_return_frac
+            risk_adjusted = np.where(iv > 0, (expected_return_frac - self.risk_free_rate * time_factor) / iv, 0.0)
+            leverage = np.where(capital_required > 0, contracts * 100 * spot / np.where(valid, capital_required, 1.0), 1.0)
+        
+        result = chain.copy()
+        result['expected_return'] = expected_return
+        result['risk_adjusted_return'] = risk_adjusted
+        result['leverage_effect'] = leverage
+        result['capital_required'] = capital_required
+        result['max_loss'] = capital_required
+        result['max_gain'] = expected_return
+        result['score'] = self.score_array(expected_return, risk_adjusted, leverage,
+                                           capital_required, capital_required, expected_return)
+        return result
+    
+    @staticmethod
+    def top_k_per_group(groups: Sequence, scores: np.ndarray, k: int = 1) -> np.ndarray:
+        """
+        Índices dos k maiores scores de cada grupo (argpartition por grupo, O(n)).
+        Resultado ordenado por grupo (ordem de primeira aparição) e score decrescente.
+        """
+        scores = np.nan_to_num(np.asarray(scores, dtype=float), nan=-np.inf)
+        if scores.size == 0 or k <= 0:
+            return np.array([], dtype=int)
+        
+        codes, _ = pd.factorize(np.asarray(groups, dtype=object))
+        order = np.argsort(codes, kind='stable')
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        
+        selected = []
+        for segment in np.split(order, bounds):
+            if segment.size > k:
+                segment = segment[np.argpartition(-scores[segment], k - 1)[:k]]
+            selected.append(segment[np.argsort(-scores[segment], kind='stable')])
+        return np.concatenate(selected)
+    
+    def rank_options_vs_spot(
+        self,
+        chain: pd.DataFrame,
+        spots: pd.DataFrame,
+        capital_available: float,
+        risk_per_trade: float = 0.02,
+        k: int = 1
+    ) -> pd.DataFrame:
+        """
+        Pontua todas as opções de todos os ativos contra a alternativa spot em uma
+        passada e devolve as k melhores por ativo.
+        
+        Args:
+            chain: Cadeia colunar (ver score_options) com coluna underlying
+            spots: Indexado pelo ativo (ver score_spots)
+        
+        Returns:
+            Top-k opções por underlying com score, spot_score e beats_spot
+        """
+        if chain.empty:
+            return chain.assign(score=pd.Series(dtype=float), spot_score=pd.Series(dtype=float),
+                                beats_spot=pd.Series(dtype=bool))
+        
+        scored = self.score_options(chain, capital_available, risk_per_trade)
+        top = scored.iloc[self.top_k_per_group(scored['underlying'].to_numpy(), scored['score'].to_numpy(), k)]
+        
+        spot_scores = self.score_spots(spots, capital_available, risk_per_trade)['score']
+        top = top.assign(spot_score=top['underlying'].map(spot_scores).to_numpy())
+        top['beats_spot'] = top['spot_score'].isna() | (top['score'] > top['spot_score'])
+        return top
 
@@ -9,6 +9,11 @@ from datetime import datetime, timedelta
 import time
 import logging
 
+try:
+    from .http_client import get_http_client
+except ImportError:
+    from http_client import get_http_client
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -39,6 +44,7 @@ class BinanceAPI:
             'secret': api_secret or '',
             'sandbox': sandbox,
             'enableRateLimit': True,
+            'session': get_http_client('binance').session,  # Pool keep-alive compartilhado (ccxt limita a taxa)
             'options': {
                 'defaultType': 'spot'  # 'spot', 'future', 'delivery', 'option'
             }
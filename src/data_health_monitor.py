@@ -9,7 +9,7 @@ corrige problemas automaticamente e envia relatórios periódicos.
 import json
 import logging
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import sys
@@ -18,13 +18,9 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 try:
-    from src.notifications import UnifiedNotifier
-    from src.market_data_api import create_market_data_api
-    from src.trading_schedule import TradingSchedule
+    from src.services import get_services
 except ImportError:
-    from notifications import UnifiedNotifier
-    from market_data_api import create_market_data_api
-    from trading_schedule import TradingSchedule
+    from services import get_services
 
 logger = logging.getLogger(__name__)
 
@@ -32,26 +28,17 @@ logger = logging.getLogger(__name__)
 class DataHealthMonitor:
     """Monitor de saúde da captura de dados."""
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, services=None):
         self.config = config
         self.db_path = Path('agents_orders.db')
-        # Tentar obter orders_repo se disponível
-        orders_repo = None
-        try:
-            from .orders_repository import OrdersRepository
-            orders_repo = OrdersRepository()
-        except:
-            try:
-                from orders_repository import OrdersRepository
-                orders_repo = OrdersRepository()
-            except:
-                pass
-        self.notifier = UnifiedNotifier(config, orders_repo=orders_repo)
-        self.trading_schedule = TradingSchedule()
+        self.services = services or get_services(config)  # Clientes compartilhados do processo
+        self.orders_repo = self.services.orders_repo  # Estatísticas de captura vêm dos rollups do repositório
+        self.notifier = self.services.notifier
+        self.trading_schedule = self.services.trading_schedule
         
         # Configurar API de mercado
         api_type = config.get('market_data_api', 'yfinance')
-        self.market_api = create_market_data_api(api_type)
+        self.market_api = self.services.market_data_api(api_type)
         
         # Tickers monitorados
         self.monitored_tickers = config.get('monitored_tickers', [])
@@ -86,34 +73,14 @@ class DataHealthMonitor:
                     'can_fix': True
                 }
             
-            # Verificar última captura
-            cursor.execute("""
-                SELECT MAX(timestamp) FROM market_data_captures
-                WHERE source = 'real'
-            """)
-            result = cursor.fetchone()
-            last_capture = result[0] if result[0] else None
-            
-            # Verificar capturas nas últimas 2 horas
-            two_hours_ago = (datetime.now() - timedelta(hours=2)).isoformat()
-            cursor.execute("""
-                SELECT COUNT(*) FROM market_data_captures
-                WHERE source = 'real' AND timestamp >= ?
-            """, (two_hours_ago,))
-            recent_captures = cursor.fetchone()[0]
-            
-            # Verificar capturas por ticker nas últimas 2 horas
-            cursor.execute("""
-                SELECT ticker, COUNT(*) as count
-                FROM market_data_captures
-                WHERE source = 'real' AND timestamp >= ?
-                GROUP BY ticker
-                ORDER BY count DESC
-            """, (two_hours_ago,))
-            ticker_stats = {row[0]: row[1] for row in cursor.fetchall()}
-            
             conn.close()
             
+            # Última captura e capturas das últimas 2 horas (rollups, sem varrer a tabela)
+            last_capture = self.orders_repo.get_last_capture_time() if self.orders_repo else None
+            recent = self.orders_repo.get_capture_stats(hours=2) if self.orders_repo else {}
+            recent_captures = recent.get('total_captures', 0)
+            ticker_stats = recent.get('ticker_captures', {})
+            
             return {
                 'status': 'OK' if recent_captures > 0 else 'WARNING',
                 'last_capture': last_capture,
@@ -184,10 +151,12 @@ class DataHealthMonitor:
     def fix_database_issues(self) -> bool:
         """Tenta corrigir problemas no banco de dados."""
         try:
-            from src.orders_repository import OrdersRepository
+            try:
+                from src.orders_repository import init_db
+            except ImportError:
+                from orders_repository import init_db
             
-            repo = OrdersRepository()
-            repo.init_db()  # Isso cria as tabelas se não existirem
+            init_db(force=True)  # Isso cria as tabelas se não existirem
             
             logger.info("Banco de dados verificado/corrigido")
             return True
@@ -201,7 +170,8 @@ class DataHealthMonitor:
         try:
             # Tentar recriar conexão com API
             api_type = self.config.get('market_data_api', 'yfinance')
-            self.market_api = create_market_data_api(api_type)
+            self.services.reset(f"market_data_api:{api_type.lower()}")
+            self.market_api = self.services.market_data_api(api_type)
             
             # Testar novamente
             test_result = self.check_api_health()
@@ -218,72 +188,15 @@ class DataHealthMonitor:
             return False
     
     def get_capture_statistics(self, hours: int = 24) -> Dict:
-        """Obtém estatísticas de captura."""
-        try:
-            conn = sqlite3.connect(str(self.db_path))
-            cursor = conn.cursor()
-            
-            # Período
-            since_time = (datetime.now() - timedelta(hours=hours)).isoformat()
-            
-            # Total de capturas
-            cursor.execute("""
-                SELECT COUNT(*) FROM market_data_captures
-                WHERE source = 'real' AND timestamp >= ?
-            """, (since_time,))
-            total_captures = cursor.fetchone()[0]
-            
-            # Capturas por ticker
-            cursor.execute("""
-                SELECT ticker, COUNT(*) as count
-                FROM market_data_captures
-                WHERE source = 'real' AND timestamp >= ?
-                GROUP BY ticker
-                ORDER BY count DESC
-            """, (since_time,))
-            ticker_captures = {row[0]: row[1] for row in cursor.fetchall()}
-            
-            # Capturas com opções
-            cursor.execute("""
-                SELECT COUNT(*) FROM market_data_captures
-                WHERE source = 'real' AND timestamp >= ?
-                AND options_data IS NOT NULL AND options_data != 'null' AND options_data != ''
-            """, (since_time,))
-            captures_with_options = cursor.fetchone()[0]
-            
-            # Última captura
-            cursor.execute("""
-                SELECT MAX(timestamp) FROM market_data_captures
-                WHERE source = 'real'
-            """)
-            last_capture = cursor.fetchone()[0]
-            
-            # Primeira captura do período
-            cursor.execute("""
-                SELECT MIN(timestamp) FROM market_data_captures
-                WHERE source = 'real' AND timestamp >= ?
-            """, (since_time,))
-            first_capture = cursor.fetchone()[0]
-            
-            conn.close()
-            
-            return {
-                'total_captures': total_captures,
-                'ticker_captures': ticker_captures,
-                'captures_with_options': captures_with_options,
-                'last_capture': last_capture,
-                'first_capture': first_capture,
-                'hours': hours
-            }
-            
-        except Exception as e:
-            logger.error(f"Erro ao obter estatísticas: {e}")
+        """Obtém estatísticas de captura (rollups por minuto/hora de capture_stats)."""
+        if self.orders_repo is None:
             return {
                 'total_captures': 0,
                 'ticker_captures': {},
                 'captures_with_options': 0,
-                'error': str(e)
+                'error': 'OrdersRepository indisponível'
             }
+        return self.orders_repo.get_capture_stats(hours=hours)
     
     def generate_report_message(self, stats: Dict, health: Dict) -> str:
         """Gera mensagem de relatório para Telegram."""
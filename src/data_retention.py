@@ -0,0 +1,291 @@
+"""
+Retenção e arquivamento do agents_orders.db.
+
+Cada tabela tem uma política (dias mantidos no banco "quente"). Linhas mais antigas são
+movidas, por mês, para bancos de arquivo anexados (archive_dir/agents_orders_YYYY-MM.db);
+os blobs JSON das capturas de mercado vão comprimidos com zlib. Antes de sair do banco
+quente, as capturas alimentam o agregado diário market_data_daily (contagem, preços e
+volume por ticker/dia), que continua disponível para dashboards.
+
+O job roda fora do pregão (MonitoringService, schedule 'retention.run_at') e termina com
+PRAGMA incremental_vacuum para devolver as páginas liberadas ao sistema de arquivos.
+"""
+
+import logging
+import os
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+try:
+    from . import orders_repository
+    from .trading_schedule import B3_TIMEZONE
+except ImportError:
+    import orders_repository
+    from trading_schedule import B3_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# Dias mantidos no banco quente por tabela (None = nunca arquivar)
+DEFAULT_RETENTION_DAYS: Dict[str, Optional[int]] = {
+    'market_data_captures': 7,
+    'option_chain_snapshots': 7,
+    'option_contracts': 7,
+    'telegram_messages_sent': 30,
+    'performance_snapshots': 30,
+    'risk_evaluations': 90,
+    'proposals': 180,
+    'executions': None,  # Histórico contábil: mantido no banco quente
+}
+
+# Dias mantidos dos rollups de capture_stats por resolução (não são arquivados)
+DEFAULT_CAPTURE_STATS_DAYS: Dict[str, int] = {'minute': 3, 'hour': 400}
+
+# Colunas JSON comprimidas no arquivo
+COMPRESSED_COLUMNS: Dict[str, tuple] = {
+    'market_data_captures': ('options_data', 'raw_data'),
+}
+
+MARKET_DATA_DAILY_SQL = """
+CREATE TABLE IF NOT EXISTS market_data_daily (
+    date TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    data_type TEXT NOT NULL,
+    captures INTEGER NOT NULL,
+    first_price REAL,
+    last_price REAL,
+    high_price REAL,
+    low_price REAL,
+    max_volume INTEGER,
+    first_capture TEXT,
+    last_capture TEXT,
+    PRIMARY KEY (date, ticker, data_type)
+);
+"""
+
+# Agregado diário das capturas que vão sair do banco quente
+MARKET_DATA_DAILY_ROLLUP_SQL = """
+INSERT OR REPLACE INTO market_data_daily
+    (date, ticker, data_type, captures, first_price, last_price, high_price, low_price,
+     max_volume, first_capture, last_capture)
+SELECT day, ticker, data_type, COUNT(*), MAX(first_price), MAX(last_price), MAX(high), MIN(low),
+       MAX(volume), MIN(timestamp), MAX(timestamp)
+FROM (
+    SELECT substr(timestamp, 1, 10) AS day, ticker, data_type, timestamp, volume,
+           COALESCE(high_price, last_price, close_price) AS high,
+           COALESCE(low_price, last_price, close_price) AS low,
+           FIRST_VALUE(COALESCE(last_price, close_price)) OVER w AS first_price,
+           LAST_VALUE(COALESCE(last_price, close_price)) OVER (
+               w ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+           ) AS last_price
+    FROM market_data_captures
+    WHERE timestamp >= ? AND timestamp < ?
+    WINDOW w AS (PARTITION BY substr(timestamp, 1, 10), ticker, data_type ORDER BY timestamp)
+)
+GROUP BY day, ticker, data_type
+"""
+
+
+def _zcompress(value):
+    if value is None:
+        return None
+    return zlib.compress(value.encode('utf-8') if isinstance(value, str) else value, 6)
+
+
+class DataRetentionManager:
+    """Aplica as políticas de retenção ao banco de ordens."""
+
+    def __init__(self, config: Dict, db_path: Optional[str] = None):
+        retention_config = config.get('retention', {})
+        self.db_path = db_path
+        self.enabled = retention_config.get('enabled', True)
+        self.archive_dir = retention_config.get(
+            'archive_dir',
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'archive')
+        )
+        self.retention_days = {**DEFAULT_RETENTION_DAYS, **retention_config.get('days', {})}
+        self.capture_stats_days = {**DEFAULT_CAPTURE_STATS_DAYS, **retention_config.get('capture_stats_days', {})}
+        self.vacuum_pages = retention_config.get('vacuum_pages', 5000)  # Páginas liberadas por execução
+        self.last_result: Optional[Dict] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path or orders_repository.DB_PATH, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.create_function('zcompress', 1, _zcompress, deterministic=True)
+        return conn
+
+    def archive_path(self, month: str) -> str:
+        """Caminho do banco de arquivo do mês ('YYYY-MM')."""
+        return os.path.join(self.archive_dir, f"agents_orders_{month}.db")
+
+    def run(self, now: Optional[datetime] = None) -> Dict:
+        """
+        Executa retenção de todas as tabelas, agregados e vacuum incremental.
+
+        Returns:
+            {'archived': {tabela: linhas}, 'capture_stats_pruned': n, 'vacuum_pages': n,
+             'db_size_mb': tamanho}
+        """
+        if not self.enabled:
+            return {'archived': {}, 'vacuum_pages': 0}
+
+        now = now or datetime.now(B3_TIMEZONE)
+        archived: Dict[str, int] = {}
+        conn = self._connect()
+        try:
+            conn.execute(MARKET_DATA_DAILY_SQL)
+            for table, days in self.retention_days.items():
+                if days is None:
+                    continue
+                cutoff = (now - timedelta(days=int(days))).strftime('%Y-%m-%d')
+                try:
+                    archived[table] = self._archive_table(conn, table, cutoff)
+                except Exception as e:
+                    logger.error(f"Erro ao arquivar {table}: {e}")
+            pruned = 0
+            try:
+                pruned = self._prune_capture_stats(conn, now)
+            except Exception as e:
+                logger.error(f"Erro ao podar capture_stats: {e}")
+            vacuum_pages = self._vacuum(conn)
+            conn.execute("PRAGMA optimize")
+        finally:
+            conn.close()
+
+        db_file = self.db_path or orders_repository.DB_PATH
+        result = {
+            'archived': archived,
+            'capture_stats_pruned': pruned,
+            'vacuum_pages': vacuum_pages,
+            'db_size_mb': round(os.path.getsize(db_file) / 1e6, 2) if os.path.exists(db_file) else 0.0
+        }
+        self.last_result = result
+        total = sum(archived.values())
+        logger.info(f"Retenção concluída: {total} linha(s) arquivada(s) {archived}, "
+                    f"{vacuum_pages} página(s) liberada(s), banco com {result['db_size_mb']} MB")
+        return result
+
+    def _archive_table(self, conn: sqlite3.Connection, table: str, cutoff: str) -> int:
+        """Move linhas com timestamp anterior a cutoff ('YYYY-MM-DD') para os arquivos mensais."""
+        months = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT substr(timestamp, 1, 7) FROM {table} WHERE timestamp < ?", (cutoff,)
+        )]
+        if not months:
+            return 0
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        compressed = COMPRESSED_COLUMNS.get(table, ())
+        select_list = ', '.join(f"zcompress({c})" if c in compressed else c for c in columns)
+        total = 0
+
+        for month in months:
+            start = f"{month}-01"
+            end = min(cutoff, _next_month(month))
+            conn.execute("ATTACH DATABASE ? AS arch", (self.archive_path(month),))
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f"CREATE TABLE IF NOT EXISTS arch.{table} AS SELECT * FROM main.{table} WHERE 0")
+                conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS arch.ux_{table}_id ON {table} (id)")
+                archived_columns = {row[1] for row in conn.execute(f"PRAGMA arch.table_info({table})")}
+                for column in columns:
+                    if column not in archived_columns:  # Coluna criada por migração após o arquivo
+                        conn.execute(f"ALTER TABLE arch.{table} ADD COLUMN {column}")
+                if table == 'market_data_captures':
+                    conn.execute(MARKET_DATA_DAILY_ROLLUP_SQL, (start, end))
+                conn.execute(
+                    f"INSERT OR IGNORE INTO arch.{table} ({', '.join(columns)}) "
+                    f"SELECT {select_list} FROM main.{table} WHERE timestamp >= ? AND timestamp < ?",
+                    (start, end)
+                )
+                deleted = conn.execute(
+                    f"DELETE FROM main.{table} WHERE timestamp >= ? AND timestamp < ?", (start, end)
+                ).rowcount
+                conn.execute("COMMIT")
+                total += deleted
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.execute("DETACH DATABASE arch")
+
+        return total
+
+    def _prune_capture_stats(self, conn: sqlite3.Connection, now: datetime) -> int:
+        """Remove buckets antigos dos rollups de captura (minuto: dias, hora/ticker: meses)."""
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'capture_stats'").fetchone():
+            return 0
+        minute_cutoff = (now - timedelta(days=int(self.capture_stats_days['minute']))).strftime('%Y-%m-%d')
+        hour_cutoff = (now - timedelta(days=int(self.capture_stats_days['hour']))).strftime('%Y-%m-%d')
+        deleted = conn.execute(
+            "DELETE FROM capture_stats WHERE (resolution = 'minute' AND bucket < ?) OR (resolution = 'hour' AND bucket < ?)",
+            (minute_cutoff, hour_cutoff)
+        ).rowcount
+        deleted += conn.execute("DELETE FROM capture_stats_ticker WHERE bucket < ?", (hour_cutoff,)).rowcount
+        return deleted
+
+    def _vacuum(self, conn: sqlite3.Connection) -> int:
+        """
+        Vacuum incremental. Na primeira execução converte o banco para auto_vacuum=INCREMENTAL
+        (exige um VACUUM completo, feito aqui por rodar fora do pregão).
+        """
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            logger.info("Banco convertido para auto_vacuum=INCREMENTAL")
+            return 0
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})")
+        free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return free_before - free_after
+
+    def list_archives(self) -> List[str]:
+        """Meses ('YYYY-MM') com banco de arquivo."""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        return sorted(
+            name[len('agents_orders_'):-len('.db')]
+            for name in os.listdir(self.archive_dir)
+            if name.startswith('agents_orders_') and name.endswith('.db')
+        )
+
+    def read_archive(self, table: str, month: str, columns: Optional[List[str]] = None,
+                     ticker: Optional[str] = None, decompress: bool = True) -> pd.DataFrame:
+        """Lê linhas arquivadas de um mês (descomprime as colunas JSON por padrão)."""
+        path = self.archive_path(month)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        try:
+            conn = sqlite3.connect(path)
+            try:
+                available = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+                if not available:
+                    return pd.DataFrame()
+                selected = [c for c in (columns or available) if c in available]
+                query = f"SELECT {', '.join(selected)} FROM {table}"
+                params = []
+                if ticker and 'ticker' in available:
+                    query += " WHERE ticker = ?"
+                    params.append(ticker)
+                df = pd.read_sql_query(query + " ORDER BY timestamp", conn, params=params)
+            finally:
+                conn.close()
+            if decompress:
+                for column in COMPRESSED_COLUMNS.get(table, ()):
+                    if column in df.columns:
+                        df[column] = [zlib.decompress(v).decode('utf-8') if v is not None else None
+                                      for v in df[column]]
+            return df
+        except Exception as e:
+            logger.error(f"Erro ao ler arquivo {table} de {month}: {e}")
+            return pd.DataFrame()
+
+
+def _next_month(month: str) -> str:
+    """'YYYY-MM' -> primeiro dia do mês seguinte ('YYYY-MM-DD')."""
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}-01"
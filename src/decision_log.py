@@ -0,0 +1,439 @@
+"""
+Log de decisões dos agentes: JSONL diário + índice SQLite.
+
+As entradas do StructuredLogger vão para logs/decisions-YYYYMMDD.jsonl (arquivo escolhido
+pelo timestamp da entrada, então a rotação diária é automática). Quem registra só coloca o
+dict em uma fila limitada; uma thread de escrita serializa e grava em lotes (batch_size
+entradas ou flush_interval segundos). Com a fila cheia (max_pending), a política
+overflow='drop' descarta a entrada e registra um evento 'log_dropped' com a contagem, e
+'block' espera até block_timeout segundos por espaço; execuções e kill switch sempre
+esperam. No encerramento do processo a fila é drenada (atexit).
+Na mesma transação cada lote alimenta o índice logs/decisions_index.db:
+
+- decision_events: (timestamp, event_type, strategy, proposal_id) -> (arquivo, offset,
+  tamanho), para ler só as linhas pedidas com seek;
+- decision_counts: contagens por minuto e por hora de (event_type, strategy), para
+  contagens por janela de tempo em O(buckets), independente do tamanho do histórico.
+
+Arquivos JSONL anteriores ao índice são indexados uma vez, na criação do índice.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, offsets valem para um único processo escritor
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_SQL = """
+CREATE TABLE IF NOT EXISTS decision_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    strategy TEXT NOT NULL DEFAULT '',
+    proposal_id TEXT,
+    day TEXT NOT NULL,  -- YYYYMMDD do arquivo decisions-YYYYMMDD.jsonl
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_decision_events_timestamp ON decision_events (timestamp);
+CREATE INDEX IF NOT EXISTS idx_decision_events_type ON decision_events (event_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_decision_events_strategy ON decision_events (strategy, timestamp);
+CREATE INDEX IF NOT EXISTS idx_decision_events_proposal ON decision_events (proposal_id);
+
+CREATE TABLE IF NOT EXISTS decision_counts (
+    resolution TEXT NOT NULL CHECK (resolution IN ('minute', 'hour')),
+    bucket TEXT NOT NULL,  -- YYYY-MM-DDTHH:MM (minute) ou YYYY-MM-DDTHH (hour)
+    event_type TEXT NOT NULL,
+    strategy TEXT NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 0,
+    last_timestamp TEXT,
+    PRIMARY KEY (resolution, bucket, event_type, strategy)
+);
+"""
+
+COUNT_UPSERT_SQL = """
+INSERT INTO decision_counts (resolution, bucket, event_type, strategy, count, last_timestamp)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (resolution, bucket, event_type, strategy) DO UPDATE SET
+    count = count + excluded.count,
+    last_timestamp = MAX(COALESCE(last_timestamp, excluded.last_timestamp), excluded.last_timestamp)
+"""
+
+# Eventos que nunca são descartados com a fila cheia (quem registra espera por espaço)
+CRITICAL_EVENTS = ('execution', 'kill_switch')
+
+_STOP = object()  # Sentinela de encerramento da thread de escrita
+
+# Uma instância por diretório de log no processo (vários StructuredLogger no mesmo arquivo)
+_DECISION_LOGS: Dict[str, 'DecisionLog'] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_decision_log(log_dir: str = 'logs', config: Optional[Dict] = None) -> 'DecisionLog':
+    """DecisionLog compartilhado do diretório (criado na primeira chamada, com o config dela)."""
+    key = str(Path(log_dir).resolve())
+    with _REGISTRY_LOCK:
+        if key not in _DECISION_LOGS:
+            _DECISION_LOGS[key] = DecisionLog(log_dir, config)
+        return _DECISION_LOGS[key]
+
+
+def _bucket_keys(timestamp: str) -> Tuple[str, str]:
+    """Buckets (minuto, hora) de um timestamp ISO; aceita separador ' ' ou 'T'."""
+    normalized = timestamp[:10] + 'T' + timestamp[11:16] if len(timestamp) >= 16 else timestamp
+    return normalized[:16], normalized[:13]
+
+
+class DecisionLog:
+    """JSONL diário com escrita em lote e índice de consulta."""
+
+    INDEX_FILE = 'decisions_index.db'
+
+    def __init__(self, log_dir: str = 'logs', config: Optional[Dict] = None):
+        config = config or {}
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.log_dir / self.INDEX_FILE
+        self.batch_size = config.get('batch_size', 64)
+        self.flush_interval = config.get('flush_interval', 1.0)
+        self.max_pending = config.get('max_pending', 10000)  # ~1 KB por entrada
+        self.overflow = config.get('overflow', 'drop')  # 'drop' ou 'block'
+        self.block_timeout = config.get('block_timeout', 2.0)
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=self.max_pending)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0
+        self._dropped_unreported = 0
+        self._init_index()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.index_path), timeout=10)
+        conn.execute("PRAGMA synchronous=NORMAL")  # Em WAL: sem fsync por commit, só no checkpoint
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_index(self):
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")  # Leitores (API/dashboard) não bloqueiam o escritor
+                is_new = not conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'decision_events'"
+                ).fetchone()
+                conn.executescript(INDEX_SQL)
+                if is_new:
+                    indexed = self._index_existing_files(conn)
+                    if indexed:
+                        logger.info(f"Índice de decisões criado a partir de {indexed} entrada(s) existentes")
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Erro ao inicializar índice de decisões: {e}")
+
+    def _index_existing_files(self, conn: sqlite3.Connection) -> int:
+        """Indexa os decisions-*.jsonl gravados antes do índice existir."""
+        total = 0
+        for path in sorted(self.log_dir.glob('decisions-*.jsonl')):
+            day = path.stem[len('decisions-'):]
+            rows, offset = [], 0
+            with open(path, 'rb') as f:
+                for raw in f:
+                    length = len(raw)
+                    try:
+                        entry = json.loads(raw)
+                        rows.append(self._index_row(entry, day, offset, length))
+                    except (ValueError, TypeError):
+                        pass  # Linha corrompida: fica fora do índice
+                    offset += length
+            self._write_index(conn, rows)
+            total += len(rows)
+        return total
+
+    @staticmethod
+    def _index_row(entry: Dict[str, Any], day: str, offset: int, length: int) -> Tuple:
+        return (str(entry.get('timestamp', '')), str(entry.get('event_type', '')),
+                str(entry.get('strategy') or ''), entry.get('proposal_id'), day, offset, length)
+
+    @staticmethod
+    def _write_index(conn: sqlite3.Connection, rows: List[Tuple]):
+        if not rows:
+            return
+        conn.executemany(
+            "INSERT INTO decision_events (timestamp, event_type, strategy, proposal_id, day, offset, length) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        counts: Dict[Tuple[str, str, str, str], List] = {}
+        for timestamp, event_type, strategy, *_ in rows:
+            for resolution, bucket in zip(('minute', 'hour'), _bucket_keys(timestamp)):
+                key = (resolution, bucket, event_type, strategy)
+                current = counts.setdefault(key, [0, timestamp])
+                current[0] += 1
+                current[1] = max(current[1], timestamp)
+        conn.executemany(COUNT_UPSERT_SQL, [(*key, n, last) for key, (n, last) in counts.items()])
+
+    # ------------------------------------------------------------------ escrita
+
+    def _ensure_writer(self):
+        """Inicia a thread de escrita (de novo após fork: threads e fila não são herdadas)."""
+        if self._writer_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._writer_pid == os.getpid():
+                return
+            if self._writer_pid is not None:
+                self._queue = queue.Queue(maxsize=self.max_pending)
+            self._writer = threading.Thread(target=self._run, name='decision-log-writer', daemon=True)
+            self._writer.start()
+            self._writer_pid = os.getpid()
+
+    def append(self, entry: Dict[str, Any]):
+        """Enfileira uma entrada; serialização e escrita ficam com a thread de escrita."""
+        self._ensure_writer()
+        try:
+            if self.overflow == 'block' or entry.get('event_type') in CRITICAL_EVENTS:
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._stats_lock:
+                self._dropped += 1
+                self._dropped_unreported += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera a thread de escrita gravar tudo o que foi enfileirado até agora."""
+        if self._writer_pid != os.getpid() or not self._writer.is_alive():
+            return True  # Nada enfileirado neste processo
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Drena a fila e encerra a thread de escrita (chamado também no atexit)."""
+        with self._start_lock:
+            if self._writer_pid != os.getpid():
+                return
+            writer, self._writer_pid = self._writer, None
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+            writer.join(timeout)
+        except queue.Full:
+            logger.warning("Fila do log de decisões cheia no encerramento; gravando o restante direto")
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, dict):
+                remaining.append(item)
+        self._write_entries(remaining)
+
+    def stats(self) -> Dict[str, Any]:
+        """Entradas pendentes, gravadas e descartadas desde o início do processo."""
+        return {
+            'pending': self._queue.qsize(),
+            'written': self._written,
+            'dropped': self._dropped,
+            'max_pending': self.max_pending,
+            'overflow': self.overflow
+        }
+
+    def _run(self):
+        """Laço da thread de escrita: acumula até batch_size entradas ou flush_interval segundos."""
+        batch: List[Dict[str, Any]] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, dict):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size and time.monotonic() < deadline:
+                    continue
+                # Com fila acumulada, leva tudo o que já chegou no mesmo lote (uma transação)
+                while isinstance(item, dict) and len(batch) < self.max_pending:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        item = None
+                        break
+                    if isinstance(item, dict):
+                        batch.append(item)
+            self._write_entries(batch)
+            batch, deadline = [], None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
+
+    def _write_entries(self, entries: List[Dict[str, Any]]):
+        """Grava as entradas nos JSONL do dia e atualiza o índice em uma transação."""
+        with self._stats_lock:
+            dropped, self._dropped_unreported = self._dropped_unreported, 0
+        if dropped:
+            logger.warning(f"Log de decisões: {dropped} entrada(s) descartada(s) com a fila cheia")
+            entries = entries + [{'timestamp': datetime.now().isoformat(), 'event_type': 'log_dropped',
+                                  'count': dropped}]
+        if not entries:
+            return
+        with self._write_lock:
+            try:
+                by_day: Dict[str, List[Tuple[Dict[str, Any], bytes]]] = {}
+                for entry in entries:
+                    line = (json.dumps(entry, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+                    day = str(entry.get('timestamp', ''))[:10].replace('-', '') or datetime.now().strftime('%Y%m%d')
+                    by_day.setdefault(day, []).append((entry, line))
+
+                rows = []
+                for day, lines in by_day.items():
+                    with open(self.log_dir / f"decisions-{day}.jsonl", 'ab') as f:
+                        # Lock entre processos: o offset lido precisa ser o do início da nossa escrita
+                        if fcntl is not None:
+                            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                        try:
+                            f.seek(0, 2)
+                            offset = f.tell()
+                            f.write(b''.join(line for _, line in lines))
+                            f.flush()
+                        finally:
+                            if fcntl is not None:
+                                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    for entry, line in lines:
+                        rows.append(self._index_row(entry, day, offset, len(line)))
+                        offset += len(line)
+
+                conn = self._connect()
+                try:
+                    self._write_index(conn, rows)
+                    conn.commit()
+                finally:
+                    conn.close()
+                self._written += len(entries)
+            except Exception as e:
+                logger.error(f"Erro ao gravar {len(entries)} entrada(s) do log de decisões: {e}")
+
+    # ------------------------------------------------------------------ consulta
+
+    @staticmethod
+    def _since(hours: Optional[float], since: Optional[str]) -> Optional[str]:
+        if since is not None:
+            return since.isoformat() if hasattr(since, 'isoformat') else str(since)
+        if hours is not None:
+            return (datetime.now() - timedelta(hours=hours)).isoformat()
+        return None
+
+    def counts(self, hours: Optional[float] = None, since=None, event_type: Optional[str] = None,
+               strategy: Optional[str] = None) -> Dict[Tuple[str, str], int]:
+        """
+        Contagens por (event_type, strategy) na janela, a partir dos buckets.
+        Janelas de até 6h usam buckets por minuto; maiores, por hora (começando na hora cheia).
+        """
+        self.flush()
+        since = self._since(hours, since)
+        resolution = 'minute' if hours is not None and hours <= 6 else 'hour'
+        query = "SELECT event_type, strategy, SUM(count) AS n FROM decision_counts WHERE resolution = ?"
+        params: List[Any] = [resolution]
+        if since:
+            query += " AND bucket >= ?"
+            params.append(_bucket_keys(since)[0 if resolution == 'minute' else 1])
+        if event_type:
+            query += " AND event_type = ?"
+            params.append(event_type)
+        if strategy is not None:
+            query += " AND strategy = ?"
+            params.append(strategy)
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(query + " GROUP BY event_type, strategy", params).fetchall()
+            finally:
+                conn.close()
+            return {(row['event_type'], row['strategy']): row['n'] for row in rows}
+        except Exception as e:
+            logger.error(f"Erro ao contar decisões: {e}")
+            return {}
+
+    def last_timestamp(self, event_type: Optional[str] = None) -> Optional[str]:
+        """Timestamp da entrada mais recente (opcionalmente de um tipo)."""
+        self.flush()
+        query = "SELECT MAX(timestamp) FROM decision_events"
+        params: List[Any] = []
+        if event_type:
+            query += " WHERE event_type = ?"
+            params.append(event_type)
+        try:
+            conn = self._connect()
+            try:
+                return conn.execute(query, params).fetchone()[0]
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Erro ao buscar última decisão: {e}")
+            return None
+
+    def query(self, hours: Optional[float] = None, since=None, until=None, event_type: Optional[str] = None,
+              strategy: Optional[str] = None, proposal_id: Optional[str] = None,
+              limit: Optional[int] = 1000, descending: bool = True) -> List[Dict[str, Any]]:
+        """Entradas filtradas pelo índice; só as linhas selecionadas são lidas dos JSONL."""
+        self.flush()
+        query = "SELECT day, offset, length FROM decision_events WHERE 1=1"
+        params: List[Any] = []
+        since = self._since(hours, since)
+        for clause, value in (("timestamp >= ?", since), ("timestamp <= ?", until), ("event_type = ?", event_type),
+                              ("strategy = ?", strategy), ("proposal_id = ?", proposal_id)):
+            if value is not None:
+                query += f" AND {clause}"
+                params.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        query += f" ORDER BY timestamp {'DESC' if descending else 'ASC'}, id {'DESC' if descending else 'ASC'}"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        try:
+            conn = self._connect()
+            try:
+                locations = conn.execute(query, params).fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Erro ao consultar log de decisões: {e}")
+            return []
+
+        entries: List[Optional[Dict[str, Any]]] = [None] * len(locations)
+        by_day: Dict[str, List[Tuple[int, int, int]]] = {}
+        for position, row in enumerate(locations):
+            by_day.setdefault(row['day'], []).append((row['offset'], row['length'], position))
+        for day, spans in by_day.items():
+            try:
+                with open(self.log_dir / f"decisions-{day}.jsonl", 'rb') as f:
+                    for offset, length, position in sorted(spans):
+                        f.seek(offset)
+                        entries[position] = json.loads(f.read(length))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Erro ao ler decisions-{day}.jsonl: {e}")
+        return [entry for entry in entries if entry is not None]
@@ -2,15 +2,12 @@
 Análise Automática Pós-EOD
 Executa backtest, análises de rentabilidade, parâmetros e melhorias após fechamento do mercado.
 """
-import json
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import logging
-import yfinance as yf
-from .orders_repository import OrdersRepository
-from .trading_schedule import TradingSchedule
+from .services import get_services
 from .b3_costs import B3CostCalculator
 
 logger = logging.getLogger(__name__)
@@ -19,10 +16,11 @@ logger = logging.getLogger(__name__)
 class EODAnalyzer:
     """Analisador pós-EOD que executa backtest e análises completas."""
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, services=None):
         self.config = config
-        self.orders_repo = OrdersRepository()
-        self.schedule = TradingSchedule()
+        services = services or get_services(config)
+        self.orders_repo = services.orders_repo
+        self.schedule = services.trading_schedule
         self.cost_calculator = B3CostCalculator()
     
     def analyze_daily_proposals(self, date: Optional[str] = None) -> Dict:
@@ -75,102 +73,55 @@ class EODAnalyzer:
         start_time = f"{date} 00:00:00"
         end_time = f"{date} 23:59:59"
         
-        proposals = self.orders_repo.get_proposals(start_date=start_time, end_date=end_time)
-        
-        # Filtrar apenas daytrade
-        if not proposals.empty and 'strategy' in proposals.columns:
-            proposals = proposals[proposals['strategy'] == 'daytrade_options']
-        
-        return proposals
+        # Apenas daytrade; métricas já vêm como colunas (sem parse do JSON de metadata)
+        return self.orders_repo.get_proposals(
+            strategy='daytrade_options', start_date=start_time, end_date=end_time, parse_metadata=False
+        )
     
     def _backtest_proposals(self, proposals: pd.DataFrame, date: str) -> List[Dict]:
-        """Executa backtest de todas as propostas."""
-        results = []
+        """Executa backtest de todas as propostas (custos B3 calculados em lote)."""
+        trades = []
+        close_prices: Dict[str, Optional[float]] = {}
         
-        for idx, row in proposals.iterrows():
+        for row in proposals.to_dict('records'):
             try:
-                proposal_id = row['proposal_id']
                 symbol = row['symbol']
                 side = row['side']
                 quantity = row['quantity']
                 entry_price = row['price']
-                metadata_str = row.get('metadata', '{}')
-                
-                # Parse metadata
-                if isinstance(metadata_str, str):
-                    try:
-                        metadata = json.loads(metadata_str.replace("'", '"'))
-                    except:
-                        metadata = {}
-                else:
-                    metadata = metadata_str if isinstance(metadata_str, dict) else {}
+                # Colunas de métricas da proposta (NULL -> padrão)
+                metadata = {k: v for k, v in row.items() if v is not None and not pd.isna(v)}
                 
-                # Buscar preço de fechamento do dia
-                close_price = self._get_close_price(symbol, date)
+                # Buscar preço de fechamento do dia (uma vez por símbolo)
+                if symbol not in close_prices:
+                    close_prices[symbol] = self._get_close_price(symbol, date)
+                close_price = close_prices[symbol]
                 if close_price is None:
                     continue
                 
-                # Calcular resultado teórico
-                if side == 'BUY':
-                    price_change = close_price - entry_price
-                    pct_change = (close_price / entry_price) - 1
-                else:
-                    price_change = entry_price - close_price
-                    pct_change = (entry_price / close_price) - 1
-                
-                # Calcular valores
-                entry_value = entry_price * quantity * (100 if metadata.get('comparison_type') == 'options' else 1)
-                exit_value = close_price * quantity * (100 if metadata.get('comparison_type') == 'options' else 1)
-                
-                # Calcular custos B3
-                costs = self.cost_calculator.calculate_total_costs(
-                    entry_value, exit_value,
-                    instrument_type=metadata.get('comparison_type', 'spot'),
-                    is_daytrade=True
-                )
-                
-                # Resultado líquido
-                net_result = costs['profit_liquido']
-                
-                # Verificar se atingiu TP ou SL
+                instrument_type = metadata.get('comparison_type', 'spot')
+                multiplier = 100 if instrument_type == 'options' else 1
                 take_profit_pct = metadata.get('take_profit_pct', 0.012)
                 stop_loss_pct = metadata.get('stop_loss_pct', 0.15)
-                exit_price_tp = metadata.get('exit_price_tp', entry_price * (1 + take_profit_pct))
-                exit_price_sl = metadata.get('exit_price_sl', entry_price * (1 - stop_loss_pct))
                 
-                hit_tp = False
-                hit_sl = False
-                if side == 'BUY':
-                    hit_tp = close_price >= exit_price_tp
-                    hit_sl = close_price <= exit_price_sl
-                else:
-                    hit_tp = close_price <= exit_price_tp
-                    hit_sl = close_price >= exit_price_sl
-                
-                results.append({
-                    'proposal_id': proposal_id,
+                trades.append({
+                    'proposal_id': row['proposal_id'],
                     'symbol': symbol,
                     'underlying': metadata.get('underlying', symbol),
                     'side': side,
                     'entry_price': entry_price,
                     'close_price': close_price,
                     'quantity': quantity,
-                    'price_change': price_change,
-                    'pct_change': pct_change,
-                    'entry_value': entry_value,
-                    'exit_value': exit_value,
-                    'gross_profit': costs['profit_bruto'],
-                    'operational_costs': costs['operational_costs'],
-                    'ir_amount': costs['ir_amount'],
-                    'net_profit': net_result,
-                    'hit_tp': hit_tp,
-                    'hit_sl': hit_sl,
+                    'entry_value': entry_price * quantity * multiplier,
+                    'exit_value': close_price * quantity * multiplier,
+                    'exit_price_tp': metadata.get('exit_price_tp', entry_price * (1 + take_profit_pct)),
+                    'exit_price_sl': metadata.get('exit_price_sl', entry_price * (1 - stop_loss_pct)),
                     'take_profit_pct': take_profit_pct,
                     'stop_loss_pct': stop_loss_pct,
                     'comparison_score': metadata.get('comparison_score', 0),
                     'intraday_return': metadata.get('intraday_return', 0),
                     'volume_ratio': metadata.get('volume_ratio', 0),
-                    'instrument_type': metadata.get('comparison_type', 'spot'),
+                    'instrument_type': instrument_type,
                     'delta': metadata.get('delta', 0),
                     'status': row.get('status', 'gerada')
                 })
@@ -178,7 +129,41 @@ class EODAnalyzer:
                 logger.error(f"Erro ao fazer backtest da proposta {row.get('proposal_id', 'N/A')}: {e}")
                 continue
         
-        return results
+        if not trades:
+            return []
+        
+        df = pd.DataFrame(trades)
+        is_buy = (df['side'] == 'BUY').to_numpy()
+        entry = df['entry_price'].to_numpy(dtype=float)
+        close = df['close_price'].to_numpy(dtype=float)
+        
+        # Resultado teórico
+        df['price_change'] = np.where(is_buy, close - entry, entry - close)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df['pct_change'] = np.where(is_buy, close / entry - 1, entry / close - 1)
+        
+        # Custos B3 de todas as operações de uma vez (day trade);
+        # em vendas a descoberto a compra é a saída
+        entry_value = df['entry_value'].to_numpy(dtype=float)
+        exit_value = df['exit_value'].to_numpy(dtype=float)
+        costs = self.cost_calculator.calculate_costs_batch(
+            np.where(is_buy, entry_value, exit_value),
+            np.where(is_buy, exit_value, entry_value),
+            instrument_types=df['instrument_type'].to_numpy(),
+            is_daytrade=True
+        )
+        df['gross_profit'] = costs['profit_bruto'].to_numpy()
+        df['operational_costs'] = costs['total_operational_costs'].to_numpy()
+        df['ir_amount'] = costs['total_taxes'].to_numpy()
+        df['net_profit'] = costs['profit_liquido'].to_numpy()
+        
+        # Verificar se atingiu TP ou SL
+        tp = df['exit_price_tp'].to_numpy(dtype=float)
+        sl = df['exit_price_sl'].to_numpy(dtype=float)
+        df['hit_tp'] = np.where(is_buy, close >= tp, close <= tp)
+        df['hit_sl'] = np.where(is_buy, close <= sl, close >= sl)
+        
+        return df.drop(columns=['exit_price_tp', 'exit_price_sl']).to_dict('records')
     
     def _get_close_price(self, symbol: str, date: str) -> Optional[float]:
         """Busca preço de fechamento do dia."""
@@ -186,6 +171,8 @@ class EODAnalyzer:
             # Limpar símbolo para yfinance
             ticker_yf = symbol.split('_')[0] if '_' in symbol else symbol
             
+            import yfinance as yf  # Import tardio: só a análise EOD usa
+            
             ticker = yf.Ticker(ticker_yf)
             hist = ticker.history(start=date, end=(datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
             
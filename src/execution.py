@@ -1,10 +1,24 @@
 """
 Módulo de execução: simula fills com slippage e comissões.
+
+Slippage por modelo de impacto (fração do preço):
+    base_slippage + slippage_k * (volatilidade / impact_reference_vol) * sqrt(quantidade / ADV)
+Sem ADV/volatilidade informados, resta apenas o componente base.
+
+Fills ficam em um buffer colunar pré-alocado (FillBuffer) e o lote inteiro é
+persistido em uma única transação (execute_batch), para backtests e replays com
+dezenas de milhares de fills.
+
+Ordens de abertura (open_positions=True) também gravam a posição em open_positions e
+registram o fill no MarkToMarketEngine (on_fill), para que o P&L em tempo real e o kill
+switch vejam a posição sem esperar o próximo load_from_repository.
 """
 
+import logging
+import uuid
 import pandas as pd
 import numpy as np
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 
 try:
@@ -12,122 +26,260 @@ try:
 except ImportError:
     from utils import StructuredLogger
 
+logger = logging.getLogger(__name__)
+
+
+class FillBuffer:
+    """Armazena fills em arrays numpy pré-alocados (cresce dobrando a capacidade)."""
+
+    FIELDS = ('fill_id', 'order_id', 'proposal_id', 'symbol', 'side', 'quantity', 'price',
+              'market_price', 'slippage', 'commission', 'notional', 'total_cost', 'timestamp')
+    NUMERIC_FIELDS = ('quantity', 'price', 'market_price', 'slippage', 'commission', 'notional', 'total_cost')
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self._capacity = max(int(capacity), 1)
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.empty(self._capacity, dtype=float if name in self.NUMERIC_FIELDS else object)
+            for name in self.FIELDS
+        }
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self._columns[name] = grown
+        self._capacity = capacity
+
+    def append(self, columns: Dict[str, Union[np.ndarray, List]]):
+        """Acrescenta um lote de fills (mesmo comprimento em todas as colunas)."""
+        n = len(columns['price'])
+        if n == 0:
+            return
+        self._reserve(n)
+        for name, column in self._columns.items():
+            column[self.size:self.size + n] = columns[name]
+        self.size += n
+
+    def to_frame(self) -> pd.DataFrame:
+        if self.size == 0:
+            return pd.DataFrame()
+        return pd.DataFrame({name: self._columns[name][:self.size] for name in self.FIELDS})
+
 
 class ExecutionSimulator:
     """Simula execução de ordens com slippage e comissões."""
-    
-    def __init__(self, config: Dict, logger: Optional[StructuredLogger] = None, orders_repo=None):
+
+    def __init__(self, config: Dict, logger: Optional[StructuredLogger] = None, orders_repo=None,
+                 mtm_engine=None):
         self.config = config
         self.logger = logger
         self.orders_repo = orders_repo  # Repositório para salvar execuções
+        self.mtm_engine = mtm_engine  # Livro do MTM (padrão: engine ativo do processo)
         self.commission_rate = config.get('commission_rate', 0.001)  # 0.1%
-        self.slippage_bps = config.get('slippage_bps', 5)  # 5 bps
+        self.slippage_bps = config.get('slippage_bps', 5)  # 5 bps (usado se base_slippage ausente)
+        self.base_slippage = config.get('base_slippage', self.slippage_bps / 10000)
+        self.slippage_k = config.get('slippage_k', 0.0)  # Coeficiente do impacto sqrt(participação)
+        self.impact_reference_vol = config.get('impact_reference_vol', 0.25)  # Vol anualizada de referência
         self.fill_rate = config.get('fill_rate', 1.0)  # 100% fill rate para simulação
         self.orders = []
-        self.fills = []
-    
-    def execute_order(self, order: Dict, market_price: float) -> Optional[Dict]:
+        self.fill_buffer = FillBuffer(config.get('fill_buffer_capacity', 1024))
+        self._run_id = uuid.uuid4().hex[:12]  # Prefixo dos fill_ids desta instância
+        self._fill_seq = 0
+
+    @property
+    def fills(self) -> List[Dict]:
+        """Fills executados como lista de dicts (compatibilidade)."""
+        return self.fill_buffer.to_frame().to_dict('records')
+
+    def _next_fill_ids(self, n: int) -> np.ndarray:
+        start = self._fill_seq
+        self._fill_seq += n
+        return np.array([f"{self._run_id}-{seq}" for seq in range(start, start + n)], dtype=object)
+
+    def impact_slippage(self, market_price, quantity, volatility=None, adv=None) -> np.ndarray:
+        """
+        Slippage em preço pelo modelo de impacto (vetorizado).
+        Volatilidade ou ADV ausentes (NaN/<=0) anulam o componente de impacto.
+        """
+        market_price = np.asarray(market_price, dtype=float)
+        quantity = np.abs(np.asarray(quantity, dtype=float))
+        volatility = np.asarray(np.nan if volatility is None else volatility, dtype=float)
+        adv = np.asarray(np.nan if adv is None else adv, dtype=float)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            participation = np.where(adv > 0, quantity / np.where(adv > 0, adv, 1.0), 0.0)
+            vol_ratio = np.where(volatility > 0, volatility / self.impact_reference_vol, 1.0)
+        impact = self.slippage_k * vol_ratio * np.sqrt(participation)
+        return market_price * (self.base_slippage + impact)
+
+    def execute_order(self, order: Dict, market_price: float, open_position: bool = False) -> Optional[Dict]:
         """
         Executa uma ordem.
-        
+
         Args:
-            order: Dicionário com detalhes da ordem
+            order: Dicionário com detalhes da ordem (volatility/adv opcionais para o impacto)
             market_price: Preço de mercado atual
-        
+            open_position: Ordem de abertura (grava a posição e registra no MTM)
+
         Returns:
             Fill ou None se não executado
         """
-        import uuid
-        
-        order_id = order.get('order_id', str(uuid.uuid4()))
-        side = order.get('side', 'BUY')
-        quantity = order.get('quantity', 0)
-        limit_price = order.get('price', market_price)
-        
-        # Verificar se ordem será executada (fill rate)
-        # Para simulação, sempre executar (fill_rate = 1.0)
-        if np.random.random() > self.fill_rate:
+        fills = self.execute_batch(
+            pd.DataFrame([{**order, 'market_price': market_price}]),
+            log_fills=True,
+            open_positions=open_position
+        )
+        if fills.empty:
             return None
-        
-        # Calcular slippage (mínimo para simulação)
-        slippage = market_price * (self.slippage_bps / 10000)
-        if side == 'BUY':
-            execution_price = market_price + slippage
-        else:
-            execution_price = market_price - slippage
-        
-        # Aplicar limite se for ordem limitada
-        # Para simulação, sempre executar se for MARKET ou se o preço estiver dentro do limite
-        if order.get('order_type') == 'LIMIT':
-            if side == 'BUY':
-                # Para compra LIMIT, executar se o preço de mercado está abaixo ou igual ao limite
-                if execution_price > limit_price * 1.01:  # Permitir 1% de tolerância
-                    return None
-                # Usar o menor preço entre mercado e limite
-                execution_price = min(execution_price, limit_price)
-            else:  # SELL
-                # Para venda LIMIT, executar se o preço de mercado está acima ou igual ao limite
-                if execution_price < limit_price * 0.99:  # Permitir 1% de tolerância
-                    return None
-                # Usar o maior preço entre mercado e limite
-                execution_price = max(execution_price, limit_price)
-        # Se for MARKET, usar o preço calculado com slippage
-        
-        # Calcular comissão
-        notional = quantity * execution_price
+        return fills.iloc[0].to_dict()
+
+    def execute_batch(self, orders: Union[pd.DataFrame, Dict[str, List]], persist: bool = True,
+                      log_fills: bool = False, timestamp: Optional[datetime] = None,
+                      open_positions: bool = False) -> pd.DataFrame:
+        """
+        Executa várias ordens de uma vez (ex.: todas as ordens de um candle).
+
+        Args:
+            orders: Colunas symbol, side, quantity, market_price e opcionais price (limite),
+                    order_type, order_id, proposal_id, volatility, adv, timestamp
+            persist: Se True e houver repositório, grava os fills em uma única transação
+            log_fills: Registra cada fill no StructuredLogger (desligado em lote)
+            timestamp: Horário dos fills sem coluna timestamp (padrão: agora)
+            open_positions: Cada fill abre (ou aumenta) posição: grava em open_positions
+                    (colunas opcionais strategy, underlying, delta, gamma, vega) e chama on_fill do MTM
+
+        Returns:
+            DataFrame com os fills executados, indexado pela linha da ordem em orders
+        """
+        orders = pd.DataFrame(orders)
+        n = len(orders)
+        if n == 0:
+            return pd.DataFrame()
+
+        def column(name, default):
+            return orders[name] if name in orders else pd.Series(default, index=orders.index)
+
+        side = column('side', 'BUY').to_numpy(dtype=object)
+        is_buy = side == 'BUY'
+        quantity = column('quantity', 0).fillna(0).to_numpy(dtype=float)
+        market_price = orders['market_price'].to_numpy(dtype=float)
+        limit_price = column('price', np.nan).fillna(orders['market_price']).to_numpy(dtype=float)
+        is_limit = (column('order_type', None) == 'LIMIT').to_numpy()
+
+        # Verificar se ordem será executada (fill rate)
+        executed = np.random.random(n) <= self.fill_rate
+
+        slippage = self.impact_slippage(
+            market_price, quantity,
+            column('volatility', np.nan).to_numpy(dtype=float),
+            column('adv', np.nan).to_numpy(dtype=float)
+        )
+        execution_price = np.where(is_buy, market_price + slippage, market_price - slippage)
+
+        # Ordens limitadas: 1% de tolerância e melhor preço entre mercado e limite
+        limit_blocked = np.where(is_buy, execution_price > limit_price * 1.01, execution_price < limit_price * 0.99)
+        executed &= ~(is_limit & limit_blocked)
+        execution_price = np.where(
+            is_limit,
+            np.where(is_buy, np.minimum(execution_price, limit_price), np.maximum(execution_price, limit_price)),
+            execution_price
+        )
+
+        idx = np.flatnonzero(executed)
+        if idx.size == 0:
+            return pd.DataFrame()
+
+        price = execution_price[idx]
+        qty = quantity[idx]
+        notional = qty * price
         commission = notional * self.commission_rate
-        
-        fill_timestamp = datetime.now()
-        fill = {
-            'fill_id': str(uuid.uuid4()),
-            'order_id': order_id,
-            'timestamp': fill_timestamp.isoformat(),  # Converter para string ISO
-            'symbol': order.get('symbol', ''),
-            'side': side,
-            'quantity': quantity,
-            'price': execution_price,
-            'market_price': market_price,
-            'slippage': slippage,
+        fill_ids = self._next_fill_ids(idx.size)
+
+        if 'timestamp' in orders:
+            timestamps = orders['timestamp'].iloc[idx].map(
+                lambda t: t.isoformat() if hasattr(t, 'isoformat') else str(t)
+            ).to_numpy(dtype=object)
+        else:
+            timestamps = np.full(idx.size, (timestamp or datetime.now()).isoformat(), dtype=object)
+
+        order_ids = column('order_id', None).to_numpy(dtype=object)[idx]
+        order_ids = np.where(pd.isna(order_ids), fill_ids, order_ids)
+
+        batch = {
+            'fill_id': fill_ids,
+            'order_id': order_ids,
+            'proposal_id': column('proposal_id', '').fillna('').to_numpy(dtype=object)[idx],
+            'symbol': column('symbol', '').to_numpy(dtype=object)[idx],
+            'side': side[idx],
+            'quantity': qty,
+            'price': price,
+            'market_price': market_price[idx],
+            'slippage': slippage[idx],
             'commission': commission,
             'notional': notional,
-            'total_cost': notional + commission if side == 'BUY' else notional - commission
+            'total_cost': np.where(is_buy[idx], notional + commission, notional - commission),
+            'timestamp': timestamps
         }
-        
-        self.fills.append(fill)
-        
-        if self.logger:
-            # Criar dict para log sem datetime object
-            log_fill = fill.copy()
-            self.logger.log_execution(order_id, 'FILLED', log_fill)
-        
-        # Salvar execução no banco de dados
-        if self.orders_repo:
+        self.fill_buffer.append(batch)
+        fills = pd.DataFrame(batch, index=orders.index[idx])  # índice = linha da ordem de origem
+
+        if self.logger and log_fills:
+            for fill in fills.to_dict('records'):
+                self.logger.log_execution(fill['order_id'], 'FILLED', fill)
+
+        # Salvar execuções no banco de dados (uma transação para o lote)
+        if persist and self.orders_repo:
             try:
-                execution_dict = {
-                    'order_id': fill['fill_id'],
-                    'proposal_id': order.get('proposal_id', ''),
-                    'timestamp': fill['timestamp'].isoformat() if hasattr(fill['timestamp'], 'isoformat') else str(fill['timestamp']),
-                    'symbol': fill['symbol'],
-                    'side': fill['side'],
-                    'quantity': fill['quantity'],
-                    'price': fill['price'],
-                    'market_price': fill['market_price'],
-                    'slippage': fill['slippage'],
-                    'commission': fill['commission'],
-                    'notional': fill['notional'],
-                    'total_cost': fill['total_cost'],
-                    'status': 'FILLED'
-                }
-                self.orders_repo.save_execution(execution_dict)
+                self.orders_repo.save_executions(
+                    fills.drop(columns=['order_id']).rename(columns={'fill_id': 'order_id'}).assign(status='FILLED')
+                )
             except Exception as e:
-                if self.logger:
-                    self.logger.log_error(f"Erro ao salvar execução {order_id}: {e}")
-        
-        return fill
-    
+                logger.error(f"Erro ao salvar {len(fills)} execução(ões): {e}")
+
+        if open_positions:
+            self._open_positions(fills, orders.loc[fills.index])
+
+        return fills
+
+    def _open_positions(self, fills: pd.DataFrame, orders: pd.DataFrame):
+        """Grava as posições abertas pelos fills e as registra no livro do MTM."""
+        engine = self.mtm_engine
+        if engine is None:
+            try:
+                from .mark_to_market import get_active_engine
+            except ImportError:
+                from mark_to_market import get_active_engine
+            engine = get_active_engine()
+
+        def extra(order: Dict, name: str):
+            value = order.get(name)
+            return None if value is None or (isinstance(value, float) and np.isnan(value)) else value
+
+        for fill, order in zip(fills.to_dict('records'), orders.to_dict('records')):
+            proposal_id = fill['proposal_id'] or None
+            position_id = None
+            if self.orders_repo:
+                position_id = self.orders_repo.save_open_position(
+                    symbol=fill['symbol'], side=fill['side'], quantity=fill['quantity'],
+                    avg_price=fill['price'], current_price=fill['market_price'],
+                    delta=extra(order, 'delta') or 0, gamma=extra(order, 'gamma') or 0, vega=extra(order, 'vega') or 0,
+                    strategy=extra(order, 'strategy'), underlying=extra(order, 'underlying'), proposal_id=proposal_id
+                )
+            if engine is not None:
+                engine.on_fill(fill['symbol'], fill['side'], fill['quantity'], fill['price'],
+                               strategy=extra(order, 'strategy'), underlying=extra(order, 'underlying'),
+                               position_id=position_id, proposal_id=proposal_id)
+
     def get_fills(self) -> pd.DataFrame:
         """Retorna todos os fills como DataFrame."""
-        if not self.fills:
-            return pd.DataFrame()
-        return pd.DataFrame(self.fills)
-
+        return self.fill_buffer.to_frame()
@@ -0,0 +1,269 @@
+"""
+Monitor de saídas (take profit / stop loss / time stop) entre scans.
+
+Consulta em alta frequência apenas os símbolos com posição aberta (uma única
+chamada de cotações em lote), remarca as posições no MarkToMarketEngine e avalia
+as regras de saída de todas as posições de forma vetorizada. Saídas passam pelo
+ExecutionSimulator (execução + persistência) e pelo OrdersRepository
+(fechamento da posição).
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .execution import ExecutionSimulator
+    from .futures_data_api import FUTURES_SYMBOLS
+    from .trading_schedule import TradingSchedule
+except ImportError:
+    from execution import ExecutionSimulator
+    from futures_data_api import FUTURES_SYMBOLS
+    from trading_schedule import TradingSchedule
+
+logger = logging.getLogger(__name__)
+
+# Códigos de saída (ordem = prioridade quando mais de uma regra dispara)
+EXIT_NONE = 0
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_TIME_STOP = 3
+EXIT_REASONS = {EXIT_STOP_LOSS: 'stop_loss', EXIT_TAKE_PROFIT: 'take_profit', EXIT_TIME_STOP: 'time_stop'}
+
+
+def evaluate_exit_rules(price: np.ndarray, sign: np.ndarray, tp_price: np.ndarray,
+                        sl_price: np.ndarray, held_minutes: np.ndarray,
+                        max_holding_minutes: np.ndarray) -> np.ndarray:
+    """
+    Avalia TP/SL/time stop para todas as posições de uma vez.
+
+    sign = +1 para compradas e -1 para vendidas; níveis NaN (ou prazo <= 0)
+    desativam a regra correspondente. Retorna um código EXIT_* por posição.
+    """
+    with np.errstate(invalid='ignore'):
+        hit_tp = (sign * (price - tp_price)) >= 0
+        hit_sl = (sign * (price - sl_price)) <= 0
+    hit_tp &= ~np.isnan(tp_price) & (price > 0)
+    hit_sl &= ~np.isnan(sl_price) & (price > 0)
+    hit_time = (max_holding_minutes > 0) & (held_minutes >= max_holding_minutes)
+
+    return np.select(
+        [hit_sl, hit_tp, hit_time],
+        [EXIT_STOP_LOSS, EXIT_TAKE_PROFIT, EXIT_TIME_STOP],
+        default=EXIT_NONE
+    )
+
+
+class ExitMonitor:
+    """Acompanha posições abertas e executa saídas por TP/SL/tempo."""
+
+    def __init__(self, config: Dict, mtm_engine, stock_api, orders_repo=None,
+                 execution_simulator: Optional[ExecutionSimulator] = None, notifier=None):
+        self.config = config
+        self.exit_config = config.get('exit_monitor', {})
+        self.interval_seconds = self.exit_config.get('interval_seconds', 10)
+        self.reload_seconds = self.exit_config.get('reload_seconds', 60)
+        self.max_holding_minutes = self.exit_config.get('max_holding_minutes', 0)  # 0 = sem time stop
+        self.mtm_engine = mtm_engine
+        self.stock_api = stock_api
+        self.orders_repo = orders_repo
+        self.execution_simulator = execution_simulator or ExecutionSimulator(config, orders_repo=orders_repo)
+        self.notifier = notifier
+        self.trading_schedule = TradingSchedule()
+        self.is_running = False
+        self.thread = None
+        self.last_check_time = None
+        self.last_reload_time = 0.0
+        self.exits_executed: List[Dict] = []
+        self._rules_cache: Dict[int, Dict] = {}  # position_id -> níveis de saída
+
+    # ------------------------------------------------------------------
+    # Regras
+    # ------------------------------------------------------------------
+
+    def _default_pcts(self, strategy: str) -> Dict:
+        """Percentuais padrão da estratégia (config) para posições sem proposta."""
+        cfg = self.config.get(strategy, {}) if strategy in ('daytrade_options', 'futures_daytrade') else {}
+        return {
+            'take_profit_pct': cfg.get('take_profit_pct', self.exit_config.get('take_profit_pct')),
+            'stop_loss_pct': cfg.get('stop_loss_pct', self.exit_config.get('stop_loss_pct'))
+        }
+
+    def _build_rules(self, positions: List[Dict]) -> None:
+        """Resolve níveis de saída das posições novas (metadata da proposta ou config)."""
+        missing = [p for p in positions if p['id'] not in self._rules_cache]
+        if not missing:
+            return
+
+        metadata_by_proposal = {}
+        if self.orders_repo:
+            metadata_by_proposal = self.orders_repo.get_proposals_metadata(
+                [p['proposal_id'] for p in missing if p.get('proposal_id')]
+            )
+
+        for pos in missing:
+            metadata = metadata_by_proposal.get(pos.get('proposal_id'), {})
+            sign = 1.0 if pos['side'] == 'BUY' else -1.0
+            avg_price = pos['avg_price']
+
+            # Níveis absolutos da proposta (opções: exit_price_*, futuros: *_price)
+            tp_price = metadata.get('exit_price_tp', metadata.get('take_profit_price'))
+            sl_price = metadata.get('exit_price_sl', metadata.get('stop_loss_price'))
+
+            pcts = self._default_pcts(pos['strategy'])
+            tp_pct = metadata.get('take_profit_pct', pcts['take_profit_pct'])
+            sl_pct = metadata.get('stop_loss_pct', pcts['stop_loss_pct'])
+            if tp_price is None and tp_pct is not None:
+                tp_price = avg_price * (1 + sign * tp_pct)
+            if sl_price is None and sl_pct is not None:
+                sl_price = avg_price * (1 - sign * sl_pct)
+
+            self._rules_cache[pos['id']] = {
+                'tp_price': float(tp_price) if tp_price is not None else np.nan,
+                'sl_price': float(sl_price) if sl_price is not None else np.nan,
+                'max_holding_minutes': float(metadata.get('max_holding_minutes', self.max_holding_minutes) or 0)
+            }
+
+    # ------------------------------------------------------------------
+    # Ciclo
+    # ------------------------------------------------------------------
+
+    def _fetch_marks(self, positions: List[Dict]) -> Dict:
+        """Busca em lote as cotações necessárias para marcar as posições."""
+        spot_tickers = set()
+        futures_map = {}  # símbolo yfinance -> símbolo da posição
+        for pos in positions:
+            if pos['instrument'] == 'futures':
+                futures_map[FUTURES_SYMBOLS.get(pos['symbol'][:3], f"{pos['symbol']}=F")] = pos['symbol']
+            else:
+                spot_tickers.add(pos['underlying'] if pos['instrument'] == 'option' else pos['symbol'])
+
+        quotes = self.stock_api.fetch_quotes(sorted(spot_tickers) + sorted(futures_map))
+        market_data = {'spot': {}, 'futures': {}}
+        for ticker, price in quotes.items():
+            if ticker in futures_map:
+                market_data['futures'][futures_map[ticker]] = {'last': price}
+            else:
+                market_data['spot'][ticker] = {'last': price}
+        return market_data
+
+    def check_exits(self) -> List[Dict]:
+        """Executa um ciclo: remarca posições abertas e fecha as que atingiram alguma regra."""
+        now = time.time()
+        if self.orders_repo and now - self.last_reload_time >= self.reload_seconds:
+            self.mtm_engine.load_from_repository()
+            self.last_reload_time = now
+
+        positions = self.mtm_engine.get_state()['positions']
+        if not positions:
+            return []
+
+        market_data = self._fetch_marks(positions)
+        if not market_data['spot'] and not market_data['futures']:
+            logger.debug("ExitMonitor: nenhuma cotação retornada")
+            return []
+
+        b3_time = self.trading_schedule.get_current_b3_time()
+        self.mtm_engine.on_market_data(market_data, b3_time)
+        positions = self.mtm_engine.get_state()['positions']
+        self._build_rules(positions)
+
+        rules = [self._rules_cache[p['id']] for p in positions]
+        now_ts = pd.Timestamp(b3_time)
+        opened = pd.to_datetime([p['opened_at'] for p in positions], utc=True, errors='coerce')
+        held_minutes = ((now_ts.tz_convert('UTC') - opened).total_seconds() / 60.0).to_numpy()
+
+        codes = evaluate_exit_rules(
+            price=np.array([p['current_price'] for p in positions], dtype=float),
+            sign=np.array([1.0 if p['side'] == 'BUY' else -1.0 for p in positions]),
+            tp_price=np.array([r['tp_price'] for r in rules], dtype=float),
+            sl_price=np.array([r['sl_price'] for r in rules], dtype=float),
+            held_minutes=np.nan_to_num(held_minutes, nan=0.0),
+            max_holding_minutes=np.array([r['max_holding_minutes'] for r in rules], dtype=float)
+        )
+        self.last_check_time = b3_time
+
+        exits = []
+        for idx in np.flatnonzero(codes):
+            exit_info = self._execute_exit(positions[idx], EXIT_REASONS[int(codes[idx])])
+            if exit_info:
+                exits.append(exit_info)
+        return exits
+
+    def _execute_exit(self, position: Dict, reason: str) -> Optional[Dict]:
+        """Envia ordem de saída a mercado e fecha a posição."""
+        try:
+            exit_side = 'SELL' if position['side'] == 'BUY' else 'BUY'
+            fill = self.execution_simulator.execute_order({
+                'proposal_id': position.get('proposal_id') or '',
+                'symbol': position['symbol'],
+                'side': exit_side,
+                'quantity': position['quantity'],
+                'price': position['current_price'],
+                'order_type': 'MARKET'
+            }, position['current_price'])
+            if not fill:
+                logger.warning(f"ExitMonitor: saída {reason} de {position['symbol']} não executada")
+                return None
+
+            realized_pnl = self.mtm_engine.on_close(position['id'], fill['price'])
+            if self.orders_repo and position['id'] > 0:
+                self.orders_repo.close_position(position['id'], fill['price'], realized_pnl)
+            self._rules_cache.pop(position['id'], None)
+
+            exit_info = {
+                'position_id': position['id'],
+                'symbol': position['symbol'],
+                'reason': reason,
+                'price': fill['price'],
+                'realized_pnl': realized_pnl,
+                'timestamp': fill['timestamp']
+            }
+            self.exits_executed.append(exit_info)
+            logger.info(f"ExitMonitor: {reason} em {position['symbol']} @ {fill['price']:.2f} (P&L R$ {realized_pnl:,.2f})")
+
+            if self.notifier:
+                self.notifier.send(
+                    f"{position['symbol']}: {reason} @ R$ {fill['price']:.2f}\nP&L: R$ {realized_pnl:,.2f}",
+                    title="🚪 Saída de posição",
+                    priority='high'
+                )
+            return exit_info
+        except Exception as e:
+            logger.error(f"ExitMonitor: erro ao executar saída de {position.get('symbol')}: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Thread
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Inicia o loop de verificação em thread própria (apenas no pregão)."""
+        if self.is_running:
+            return
+        self.is_running = True
+
+        def loop():
+            while self.is_running:
+                started = time.time()
+                try:
+                    if self.trading_schedule.is_trading_hours():
+                        self.check_exits()
+                except Exception as e:
+                    logger.error(f"Erro no loop do ExitMonitor: {e}")
+                time.sleep(max(self.interval_seconds - (time.time() - started), 0.5))
+
+        self.thread = threading.Thread(target=loop, daemon=True)
+        self.thread.start()
+        logger.info(f"ExitMonitor iniciado (intervalo: {self.interval_seconds}s)")
+
+    def stop(self):
+        """Para o loop de verificação."""
+        self.is_running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+        logger.info("ExitMonitor parado")
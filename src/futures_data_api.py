@@ -4,9 +4,10 @@
 API para coletar dados de contratos futuros da B3
 WIN (Mini Índice), WDO (Mini Dólar), IND (Índice), DOL (Dólar)
 """
+import threading
+import time
 import pandas as pd
-import yfinance as yf
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 import logging
 
@@ -22,11 +23,24 @@ FUTURES_SYMBOLS = {
     'DOLF': 'DOLF=F'  # Dólar Fracionário
 }
 
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
 class FuturesDataAPI:
-    """API para coletar dados de futuros da B3."""
+    """
+    API para coletar dados de futuros da B3.
+    
+    Mantém um buffer de candles de 1 minuto por contrato (apenas o pregão corrente)
+    e, a cada atualização, busca somente os candles a partir do último já visto,
+    em uma única chamada para todos os contratos.
+    """
     
-    def __init__(self):
+    def __init__(self, refresh_seconds: float = 20.0):
         self.symbols_map = FUTURES_SYMBOLS
+        self.refresh_seconds = refresh_seconds  # Não rebuscar antes disso
+        self._bars: Dict[str, pd.DataFrame] = {}
+        self._last_fetch: Dict[str, float] = {}
+        self._lock = threading.Lock()
     
     def get_futures_data(self, symbol: str, period: str = '1d', interval: str = '1m') -> Optional[pd.DataFrame]:
         """
@@ -41,6 +55,8 @@ class FuturesDataAPI:
             DataFrame com dados do futuro ou None se não disponível
         """
         try:
+            import yfinance as yf
+            
             yf_symbol = self.symbols_map.get(symbol, f"{symbol}=F")
             
             ticker = yf.Ticker(yf_symbol)
@@ -55,6 +71,113 @@ class FuturesDataAPI:
             logger.error(f"Erro ao buscar dados de {symbol}: {e}")
             return None
     
+    # ------------------------------------------------------------------
+    # Buffer incremental de candles de 1 minuto
+    # ------------------------------------------------------------------
+    
+    def _download_bars(self, symbols: List[str], start: Optional[datetime] = None) -> Dict[str, pd.DataFrame]:
+        """Baixa candles de 1m de vários contratos em uma chamada (desde start ou do dia)."""
+        import yfinance as yf
+        
+        yf_symbols = {self.symbols_map.get(s, f"{s}=F"): s for s in symbols}
+        kwargs = {'start': start} if start is not None else {'period': '1d'}
+        data = yf.download(
+            list(yf_symbols), interval='1m', progress=False,
+            threads=True, auto_adjust=False, **kwargs
+        )
+        if data is None or data.empty:
+            return {}
+        
+        bars = {}
+        for yf_symbol, symbol in yf_symbols.items():
+            if isinstance(data.columns, pd.MultiIndex):
+                if yf_symbol not in data.columns.get_level_values(-1):
+                    continue
+                frame = data.xs(yf_symbol, axis=1, level=-1)
+            else:
+                frame = data
+            frame = frame.reindex(columns=BAR_COLUMNS).dropna(subset=['Close'])
+            if not frame.empty:
+                bars[symbol] = frame
+        return bars
+    
+    def update_bars(self, symbols: List[str], force: bool = False) -> Dict[str, pd.DataFrame]:
+        """
+        Atualiza os buffers de candles dos contratos.
+        
+        Contratos sem buffer (ou de pregão anterior) recebem o dia inteiro; os demais,
+        apenas os candles a partir do último visto (o último candle é substituído,
+        pois pode ter sido capturado ainda em formação).
+        
+        Returns:
+            Dict {símbolo: candles novos/atualizados}
+        """
+        now = time.time()
+        fresh, incremental = [], []
+        with self._lock:
+            for symbol in symbols:
+                if not force and now - self._last_fetch.get(symbol, 0) < self.refresh_seconds:
+                    continue
+                buffer = self._bars.get(symbol)
+                if buffer is None or buffer.empty or \
+                        buffer.index[-1].date() != pd.Timestamp.now(tz=buffer.index.tz).date():
+                    fresh.append(symbol)
+                else:
+                    incremental.append(symbol)
+        
+        updates: Dict[str, pd.DataFrame] = {}
+        try:
+            if fresh:
+                updates.update(self._download_bars(fresh))
+            if incremental:
+                with self._lock:
+                    start = min(self._bars[s].index[-1] for s in incremental)
+                updates.update(self._download_bars(incremental, start=start))
+        except Exception as e:
+            logger.error(f"Erro ao atualizar candles de futuros: {e}")
+            return {}
+        
+        with self._lock:
+            for symbol in fresh + incremental:
+                self._last_fetch[symbol] = now
+            for symbol, new_bars in updates.items():
+                buffer = self._bars.get(symbol)
+                if buffer is not None and not buffer.empty and symbol in incremental:
+                    buffer = buffer[buffer.index < new_bars.index[0]]
+                    new_bars = pd.concat([buffer, new_bars])
+                # Manter apenas o pregão corrente
+                last_date = new_bars.index[-1].date()
+                self._bars[symbol] = new_bars[new_bars.index.date == last_date]
+        
+        if fresh or incremental:
+            logger.debug(f"Futuros: {len(fresh)} carga(s) completa(s), {len(incremental)} incremental(is)")
+        return updates
+    
+    def get_bars(self, symbol: str) -> Optional[pd.DataFrame]:
+        """Candles de 1m do pregão corrente já em buffer (sem acessar a rede)."""
+        with self._lock:
+            buffer = self._bars.get(symbol)
+            return buffer.copy() if buffer is not None else None
+    
+    def _snapshot(self, symbol: str) -> Optional[Dict]:
+        """Resumo do pregão a partir do buffer (abertura do dia, máxima, mínima, último)."""
+        with self._lock:
+            bars = self._bars.get(symbol)
+            if bars is None or bars.empty:
+                return None
+            last_close = float(bars['Close'].iloc[-1])
+            return {
+                'symbol': symbol,
+                'timestamp': bars.index[-1].isoformat(),
+                'open': float(bars['Open'].iloc[0]),
+                'high': float(bars['High'].max()),
+                'low': float(bars['Low'].min()),
+                'close': last_close,
+                'last': last_close,
+                'volume': int(bars['Volume'].fillna(0).sum()),
+                'bars': len(bars)
+            }
+    
     def get_current_futures_price(self, symbol: str) -> Optional[Dict]:
         """
         Busca preço atual de um futuro.
@@ -66,23 +189,8 @@ class FuturesDataAPI:
             Dict com dados atuais ou None
         """
         try:
-            data = self.get_futures_data(symbol, period='1d', interval='1m')
-            
-            if data is None or data.empty:
-                return None
-            
-            last_row = data.iloc[-1]
-            
-            return {
-                'symbol': symbol,
-                'timestamp': datetime.now().isoformat(),
-                'open': float(last_row.get('Open', 0)),
-                'high': float(last_row.get('High', 0)),
-                'low': float(last_row.get('Low', 0)),
-                'close': float(last_row.get('Close', 0)),
-                'last': float(last_row.get('Close', 0)),
-                'volume': int(last_row.get('Volume', 0))
-            }
+            self.update_bars([symbol])
+            return self._snapshot(symbol)
         except Exception as e:
             logger.error(f"Erro ao buscar preço atual de {symbol}: {e}")
             return None
@@ -97,10 +205,11 @@ class FuturesDataAPI:
         Returns:
             Dict com dados de cada futuro
         """
-        results = {}
+        self.update_bars(list(symbols))
         
+        results = {}
         for symbol in symbols:
-            data = self.get_current_futures_price(symbol)
+            data = self._snapshot(symbol)
             if data:
                 results[symbol] = data
         
@@ -10,9 +10,9 @@ from typing import List, Dict, Optional
 from dataclasses import dataclass
 
 try:
-    from .agents import OrderProposal
+    from .agents import OrderProposal, next_proposal_id
 except ImportError:
-    from agents import OrderProposal
+    from agents import OrderProposal, next_proposal_id
 
 @dataclass
 class FuturesProposal:
@@ -27,10 +27,18 @@ class FuturesProposal:
     metadata: Dict
 
 class FuturesDayTradeStrategy:
-    """Estratégia de daytrade para futuros B3."""
+    """
+    Estratégia de daytrade para futuros B3.
     
-    def __init__(self, config: Dict):
+    Instância de vida longa (uma por MonitoringService): quando recebe o feed de
+    futuros, mantém por contrato a abertura do pregão e o VWAP acumulado,
+    incorporando a cada scan apenas os candles de 1 minuto ainda não vistos.
+    """
+    
+    def __init__(self, config: Dict, futures_api=None):
         self.config = config
+        self.futures_api = futures_api
+        self._state: Dict[str, Dict] = {}  # símbolo -> estado incremental do pregão
         self.futures_config = config.get('futures_daytrade', {
             'enabled': True,
             'min_intraday_move': 0.003,  # 0.3% mínimo de movimento
@@ -40,6 +48,42 @@ class FuturesDayTradeStrategy:
             'max_contracts': 10  # Máximo de contratos por operação
         })
     
+    def _update_state(self, symbol: str) -> Dict:
+        """Incorpora ao estado do contrato apenas os candles novos do buffer do feed."""
+        state = self._state.get(symbol, {})
+        bars = self.futures_api.get_bars(symbol) if self.futures_api else None
+        if bars is None or bars.empty:
+            return state
+        
+        session = bars.index[-1].date()
+        if state.get('session') != session:
+            state = {
+                'session': session,
+                'open': float(bars['Open'].iloc[0]),
+                'last_bar': None,
+                'pv': 0.0,
+                'volume': 0.0
+            }
+        
+        if state['last_bar'] is not None:
+            # Último candle visto pode ter sido revisado: remove a contribuição e reprocessa
+            bars = bars[bars.index >= state['last_bar']]
+            state['pv'] -= state['last_pv']
+            state['volume'] -= state['last_volume']
+        
+        volume = bars['Volume'].fillna(0).to_numpy(dtype=float)
+        typical = ((bars['High'] + bars['Low'] + bars['Close']) / 3).to_numpy(dtype=float)
+        pv = typical * volume
+        state['pv'] += float(pv.sum())
+        state['volume'] += float(volume.sum())
+        state['last_bar'] = bars.index[-1]
+        state['last_pv'] = float(pv[-1])
+        state['last_volume'] = float(volume[-1])
+        state['vwap'] = state['pv'] / state['volume'] if state['volume'] > 0 else None
+        
+        self._state[symbol] = state
+        return state
+    
     def generate_proposals(self, timestamp: pd.Timestamp, futures_data: Dict) -> List[OrderProposal]:
         """
         Gera propostas de daytrade para futuros.
@@ -60,8 +104,9 @@ class FuturesDayTradeStrategy:
         
         for symbol, data in futures_data.items():
             try:
-                # Calcular movimento intraday
-                open_price = data.get('open', 0)
+                # Calcular movimento intraday (abertura do pregão pelo estado incremental)
+                state = self._update_state(symbol)
+                open_price = state.get('open', data.get('open', 0))
                 current_price = data.get('last', data.get('close', 0))
                 volume = data.get('volume', 0)
                 
@@ -103,13 +148,9 @@ class FuturesDayTradeStrategy:
                 if quantity <= 0:
                     continue
                 
-                # Criar proposta
-                # ID simplificado: apenas últimos 4 dígitos do timestamp
-                timestamp_short = str(int(timestamp.timestamp()))[-4:]
-                proposal_id = timestamp_short
-                
+                # Criar proposta (ID de 4 dígitos único no processo)
                 proposal = OrderProposal(
-                    proposal_id=proposal_id,
+                    proposal_id=next_proposal_id(),
                     strategy='futures_daytrade',
                     instrument_type='futures',
                     symbol=symbol,
@@ -126,6 +167,7 @@ class FuturesDayTradeStrategy:
                         'take_profit_pct': take_profit_pct,
                         'stop_loss_pct': stop_loss_pct,
                         'point_value': self._get_point_value(symbol),
+                        'vwap': state.get('vwap'),
                         'eod_close': True
                     }
                 )
@@ -0,0 +1,296 @@
+"""
+Camada HTTP compartilhada dos clientes externos (Telegram, Discord, Brapi, Binance).
+
+Cada provedor tem um HttpClient com:
+- requests.Session com pool de conexões keep-alive (sem handshake TCP/TLS por chamada);
+- TokenBucket thread-safe (limite de taxa por provedor, compartilhado pelas threads);
+- retry com backoff exponencial e jitter (GET: erro de conexão, timeout, 429 e 5xx;
+  POST: só erro de conexão e 429, para não duplicar mensagens);
+- circuit breaker: após N falhas seguidas, recusa chamadas por reset_timeout segundos
+  (CircuitOpenError) e depois deixa uma chamada de teste passar;
+- métricas de latência e erros (stats()).
+
+Limites e pools valem por processo. Padrões por provedor em PROVIDER_DEFAULTS, sobrescritos
+por config['http_clients'][provedor] na criação (registrado pelo ServiceContainer).
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    'rate_per_second': 5.0,
+    'burst': 5,
+    'max_retries': 2,
+    'backoff_base': 0.5,
+    'backoff_max': 8.0,
+    'failure_threshold': 5,
+    'reset_timeout': 30.0,
+    'pool_maxsize': 10,
+}
+
+PROVIDER_DEFAULTS = {
+    'telegram': {'rate_per_second': 25.0, 'burst': 30},  # Limite da Bot API: ~30 msg/s
+    'discord': {'rate_per_second': 5.0, 'burst': 5},
+    'brapi': {'rate_per_second': 1.0, 'burst': 1},
+    'yfinance': {'rate_per_second': 2.0, 'burst': 1},
+    'binance': {'rate_per_second': 10.0, 'burst': 20},
+}
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada: circuito do provedor aberto após falhas seguidas."""
+
+
+class TokenBucket:
+    """Limitador de taxa thread-safe (rate tokens/s, até capacity acumulados)."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = float(rate)
+        self.capacity = max(float(capacity), 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """Consome um token, esperando se preciso. Retorna o tempo de espera (s)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise TimeoutError("Limite de taxa: token não disponível no prazo")
+            time.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker:
+    """Circuito fechado -> aberto após failure_threshold falhas -> meio aberto após reset_timeout."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'half_open':
+                self.opened_at = time.monotonic()  # Uma chamada de teste por janela
+            return state != 'open'
+
+    def record(self, success: bool):
+        with self._lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    if self.opened_at is None:
+                        logger.warning(f"Circuito aberto após {self.failures} falhas seguidas")
+                    self.opened_at = time.monotonic()
+
+
+class HttpClient:
+    """Cliente HTTP de um provedor: sessão com pool, limite de taxa, retry e circuit breaker."""
+
+    def __init__(self, provider: str, config: Optional[Dict] = None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        options = {**DEFAULT_OPTIONS, **PROVIDER_DEFAULTS.get(provider, {}), **(config or {})}
+        self.provider = provider
+        self.max_retries = options['max_retries']
+        self.backoff_base = options['backoff_base']
+        self.backoff_max = options['backoff_max']
+        self.limiter = TokenBucket(options['rate_per_second'], options['burst'])
+        self.breaker = CircuitBreaker(options['failure_threshold'], options['reset_timeout'])
+        self._requests = requests
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=options['pool_maxsize'])
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=512)  # ms das últimas chamadas
+        self._counters = {'requests': 0, 'errors': 0, 'retries': 0, 'rejected': 0, 'throttle_wait_s': 0.0}
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs):
+        """
+        Faz a requisição com limite de taxa e retry. Devolve a Response (inclusive 4xx/5xx
+        finais, como requests); levanta a última exceção de rede ou CircuitOpenError.
+        """
+        kwargs.setdefault('timeout', 10)
+        retries = self.max_retries if retries is None else retries
+        idempotent = method.upper() in ('GET', 'HEAD', 'OPTIONS')
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count('rejected')
+                raise CircuitOpenError(f"Circuito aberto para {self.provider}")
+            waited = self.limiter.acquire()
+            if waited:
+                self._count('throttle_wait_s', waited)
+
+            started = time.perf_counter()
+            response, error = None, None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except self._requests.RequestException as e:
+                error = e
+            self._record(time.perf_counter() - started, response, error)
+
+            retryable = self._is_retryable(response, error, idempotent)
+            if not retryable or attempt >= retries:
+                if error is not None:
+                    raise error
+                return response
+
+            if self.breaker.state != 'closed':  # Circuito abriu nesta sequência: devolve a última resposta
+                if error is not None:
+                    raise error
+                return response
+
+            attempt += 1
+            self._count('retries')
+            delay = self._retry_after(response)
+            if delay is None:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))  # Full jitter
+            logger.debug(f"{self.provider}: tentativa {attempt}/{retries} em {delay:.2f}s "
+                         f"({type(error).__name__ if error else response.status_code})")
+            time.sleep(delay)
+
+    def _is_retryable(self, response, error, idempotent: bool) -> bool:
+        if error is not None:
+            # Falha de conexão: em geral a requisição não chegou a sair, então POST também repete
+            return idempotent or isinstance(error, self._requests.ConnectionError)
+        if response.status_code == 429:
+            return True
+        return idempotent and response.status_code in RETRY_STATUS
+
+    def _retry_after(self, response) -> Optional[float]:
+        if response is None or response.status_code != 429:
+            return None
+        try:
+            return min(float(response.headers.get('Retry-After', '')), self.backoff_max)
+        except ValueError:
+            return None
+
+    def _record(self, elapsed: float, response, error):
+        failed = error is not None or response.status_code >= 500 or response.status_code == 429
+        if response is None or response.status_code != 429:  # 429 é limite de taxa, não indisponibilidade
+            self.breaker.record(not failed)
+        with self._stats_lock:
+            self._counters['requests'] += 1
+            if failed:
+                self._counters['errors'] += 1
+            self._latencies.append(elapsed * 1000)
+
+    def _count(self, name: str, value: float = 1):
+        with self._stats_lock:
+            self._counters[name] += value
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores, taxa de erro, latência (média/p50/p95/máx, ms) e estado do circuito."""
+        with self._stats_lock:
+            counters = dict(self._counters)
+            latencies = sorted(self._latencies)
+        result = {
+            **counters,
+            'error_rate': counters['errors'] / counters['requests'] if counters['requests'] else 0.0,
+            'circuit': self.breaker.state,
+        }
+        if latencies:
+            result.update({
+                'latency_avg_ms': sum(latencies) / len(latencies),
+                'latency_p50_ms': latencies[len(latencies) // 2],
+                'latency_p95_ms': latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+                'latency_max_ms': latencies[-1],
+            })
+        return result
+
+    def close(self):
+        self.session.close()
+
+
+# Sobrescritas por provedor (config['http_clients']), aplicadas na criação dos clientes
+_PROVIDER_CONFIG: Dict[str, Dict] = {}
+
+# Clientes e limitadores por provedor neste processo (recriados após fork)
+_CLIENTS: Dict[str, HttpClient] = {}
+_LIMITERS: Dict[str, TokenBucket] = {}
+_REGISTRY_PID: Optional[int] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _check_pid():
+    global _REGISTRY_PID
+    if _REGISTRY_PID != os.getpid():
+        _CLIENTS.clear()
+        _LIMITERS.clear()
+        _REGISTRY_PID = os.getpid()
+
+
+def configure_http_clients(config: Optional[Dict]):
+    """Registra config['http_clients'] ({provedor: opções}) para os clientes ainda não criados."""
+    with _REGISTRY_LOCK:
+        _PROVIDER_CONFIG.update(config or {})
+
+
+def get_http_client(provider: str, config: Optional[Dict] = None) -> HttpClient:
+    """HttpClient compartilhado do provedor (config só vale na primeira chamada)."""
+    with _REGISTRY_LOCK:
+        _check_pid()
+        if provider not in _CLIENTS:
+            _CLIENTS[provider] = HttpClient(provider, config or _PROVIDER_CONFIG.get(provider))
+            _LIMITERS[provider] = _CLIENTS[provider].limiter
+        return _CLIENTS[provider]
+
+
+def get_rate_limiter(provider: str, rate_per_second: Optional[float] = None, burst: Optional[float] = None) -> TokenBucket:
+    """Limitador do provedor (o mesmo do HttpClient, se existir) para clientes sem requests (yfinance)."""
+    with _REGISTRY_LOCK:
+        _check_pid()
+        if provider not in _LIMITERS:
+            options = {**DEFAULT_OPTIONS, **PROVIDER_DEFAULTS.get(provider, {}), **_PROVIDER_CONFIG.get(provider, {})}
+            _LIMITERS[provider] = TokenBucket(rate_per_second or options['rate_per_second'],
+                                              burst or options['burst'])
+        return _LIMITERS[provider]
+
+
+def http_client_stats() -> Dict[str, Dict[str, Any]]:
+    """Métricas de todos os clientes criados neste processo."""
+    with _REGISTRY_LOCK:
+        clients = dict(_CLIENTS) if _REGISTRY_PID == os.getpid() else {}
+    return {provider: client.stats() for provider, client in clients.items()}
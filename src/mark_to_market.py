@@ -0,0 +1,495 @@
+"""
+Mark-to-market intradiário das posições abertas.
+
+Recebe os preços de cada scan (spot das capturas, opções pelo mid da cadeia ou
+Black-Scholes vetorizado) e mantém em memória o P&L não realizado e realizado
+por posição, por estratégia e por ativo-objeto. Periodicamente grava um
+snapshot em performance_snapshots e a marcação em open_positions, para que API,
+dashboards e kill switch leiam o estado sem varrer tabelas.
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .pricing import BlackScholes
+    from .agents import PortfolioManager
+    from .orders_repository import get_b3_timestamp, B3_TIMEZONE
+except ImportError:
+    from pricing import BlackScholes
+    from agents import PortfolioManager
+    from orders_repository import get_b3_timestamp, B3_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+
+def _clean(value):
+    """Converte NaN/None vindos do pandas em None."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value
+
+# Engine ativo no processo (registrado pelo MonitoringService)
+_active_engine = None
+
+
+def set_active_engine(engine: Optional['MarkToMarketEngine']):
+    """Registra o engine ativo do processo (usado pela API)."""
+    global _active_engine
+    _active_engine = engine
+
+
+def get_active_engine() -> Optional['MarkToMarketEngine']:
+    """Retorna o engine ativo do processo, se houver."""
+    return _active_engine
+
+
+class MarkToMarketEngine:
+    """Marcação a mercado e P&L intradiário das posições abertas."""
+
+    DEFAULT_IV = 0.25
+
+    def __init__(self, config: Dict, orders_repo=None):
+        self.config = config
+        self.orders_repo = orders_repo
+        self.initial_nav = config.get('nav', 1000000)
+        self.risk_free_rate = config.get('risk_free_rate', 0.05)
+        self.snapshot_interval_seconds = config.get('mtm_snapshot_interval_seconds', 60)
+        self.positions: Dict[int, Dict] = {}  # position_id -> estado da posição
+        self.realized_pnl = 0.0
+        self.realized_by_strategy: Dict[str, float] = {}
+        self.realized_by_underlying: Dict[str, float] = {}
+        self.closed_trades = 0
+        self.winning_trades = 0
+        self.losing_trades = 0
+        self.last_mark_time = None
+        self.last_snapshot_time = None
+        self._next_local_id = -1  # IDs para posições que ainda não estão no banco
+        self._futures_strategy = None
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Posições
+    # ------------------------------------------------------------------
+
+    def load_from_repository(self) -> int:
+        """Carrega posições abertas e P&L realizado do dia a partir do banco."""
+        if not self.orders_repo:
+            return 0
+        try:
+            today = datetime.now(B3_TIMEZONE).strftime('%Y-%m-%d')
+            with self._lock:
+                self.positions.clear()
+                open_df = self.orders_repo.get_open_positions()
+                for row in open_df.to_dict('records'):
+                    self._add_position(
+                        position_id=int(row['id']),
+                        symbol=row['symbol'],
+                        side=row['side'],
+                        quantity=float(row['quantity']),
+                        avg_price=float(row['avg_price']),
+                        strategy=_clean(row.get('strategy')),
+                        underlying=_clean(row.get('underlying')),
+                        current_price=_clean(row.get('current_price')),
+                        proposal_id=_clean(row.get('proposal_id')),
+                        opened_at=_clean(row.get('opened_at'))
+                    )
+
+                closed_df = self.orders_repo.get_closed_positions(start_date=today)
+                self.realized_pnl = 0.0
+                self.realized_by_strategy = {}
+                self.realized_by_underlying = {}
+                self.closed_trades = self.winning_trades = self.losing_trades = 0
+                for row in closed_df.to_dict('records'):
+                    pnl = _clean(row.get('realized_pnl'))
+                    if pnl is None:
+                        continue
+                    contract = PortfolioManager._parse_option_symbol(row['symbol'])
+                    underlying = _clean(row.get('underlying')) or (contract['underlying'] if contract else row['symbol'])
+                    self._book_realized(_clean(row.get('strategy')) or 'unknown', underlying, float(pnl))
+
+            logger.info(f"MTM: {len(self.positions)} posições abertas carregadas, realizado do dia R$ {self.realized_pnl:,.2f}")
+            return len(self.positions)
+        except Exception as e:
+            logger.error(f"Erro ao carregar posições para MTM: {e}")
+            return 0
+
+    def _futures_point_value(self, symbol: str) -> float:
+        """Valor do ponto do futuro (mesma tabela da estratégia de futuros)."""
+        if self._futures_strategy is None:
+            try:
+                from .futures_strategy import FuturesDayTradeStrategy
+            except ImportError:
+                from futures_strategy import FuturesDayTradeStrategy
+            self._futures_strategy = FuturesDayTradeStrategy(self.config)
+        return self._futures_strategy._get_point_value(symbol[:3])
+
+    def _classify(self, symbol: str, underlying: Optional[str]) -> Dict:
+        """Identifica tipo de instrumento, multiplicador e contrato."""
+        contract = PortfolioManager._parse_option_symbol(symbol)
+        if contract:
+            expiry = contract['expiry']
+            if expiry is not None and expiry == expiry.normalize():
+                expiry = expiry + pd.Timedelta(hours=17)  # Vencimento no fechamento do pregão
+            return {
+                'instrument': 'option',
+                'underlying': underlying or contract['underlying'],
+                'multiplier': PortfolioManager.OPTION_MULTIPLIER,
+                'strike': contract['strike'],
+                'option_type': contract['option_type'],
+                'expiry': expiry
+            }
+
+        monitored_futures = self.config.get('monitored_futures', [])
+        if symbol in monitored_futures or symbol[:3] in monitored_futures:
+            return {'instrument': 'futures', 'underlying': underlying or symbol,
+                    'multiplier': self._futures_point_value(symbol)}
+
+        return {'instrument': 'spot', 'underlying': underlying or symbol, 'multiplier': 1.0}
+
+    def _add_position(self, position_id: int, symbol: str, side: str, quantity: float,
+                      avg_price: float, strategy: Optional[str] = None,
+                      underlying: Optional[str] = None, current_price: Optional[float] = None,
+                      proposal_id: Optional[str] = None, opened_at: Optional[str] = None):
+        """Inclui posição no livro em memória."""
+        info = self._classify(symbol, underlying)
+        last_price = current_price if current_price else avg_price
+        position = {
+            'id': position_id,
+            'symbol': symbol,
+            'side': side,
+            'sign': 1.0 if side == 'BUY' else -1.0,
+            'quantity': quantity,
+            'avg_price': avg_price,
+            'strategy': strategy or 'unknown',
+            'proposal_id': proposal_id,
+            'opened_at': opened_at or get_b3_timestamp(),
+            'last_price': float(last_price),
+            'iv': self.DEFAULT_IV,
+            'iv_calibrated': False,
+            'price_source': 'entry',
+            'unrealized_pnl': 0.0,
+            'delta': 0.0,
+            'gamma': 0.0,
+            'vega': 0.0,
+            'theta': 0.0
+        }
+        position.update(info)
+        self._mark_linear(position)
+        self.positions[position_id] = position
+
+    def on_fill(self, symbol: str, side: str, quantity: float, price: float,
+                strategy: Optional[str] = None, underlying: Optional[str] = None,
+                position_id: Optional[int] = None, proposal_id: Optional[str] = None) -> int:
+        """
+        Registra fill de abertura (ou aumento) de posição.
+        Retorna o ID usado no livro (ID do banco se informado).
+        """
+        with self._lock:
+            for pos in self.positions.values():
+                if pos['symbol'] == symbol and pos['side'] == side:
+                    new_qty = pos['quantity'] + quantity
+                    if new_qty > 0:
+                        pos['avg_price'] = (pos['quantity'] * pos['avg_price'] + quantity * price) / new_qty
+                    pos['quantity'] = new_qty
+                    self._mark_linear(pos)
+                    return pos['id']
+
+            if position_id is None:
+                position_id = self._next_local_id
+                self._next_local_id -= 1
+            self._add_position(position_id, symbol, side, quantity, price, strategy, underlying, price,
+                               proposal_id=proposal_id)
+            return position_id
+
+    def on_close(self, position_id: int, close_price: float) -> Optional[float]:
+        """Fecha posição no livro, move o P&L para realizado e retorna o P&L."""
+        with self._lock:
+            pos = self.positions.pop(position_id, None)
+            if pos is None:
+                return None
+            pnl = pos['sign'] * (close_price - pos['avg_price']) * pos['quantity'] * pos['multiplier']
+            self._book_realized(pos['strategy'], pos['underlying'], pnl)
+            return pnl
+
+    def _book_realized(self, strategy: str, underlying: str, pnl: float):
+        """Acumula P&L realizado nas agregações."""
+        self.realized_pnl += pnl
+        self.realized_by_strategy[strategy] = self.realized_by_strategy.get(strategy, 0.0) + pnl
+        self.realized_by_underlying[underlying] = self.realized_by_underlying.get(underlying, 0.0) + pnl
+        self.closed_trades += 1
+        if pnl > 0:
+            self.winning_trades += 1
+        elif pnl < 0:
+            self.losing_trades += 1
+
+    # ------------------------------------------------------------------
+    # Marcação
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _mark_linear(pos: Dict):
+        """P&L e delta de spot/futuros (e P&L de opções já precificadas)."""
+        exposure = pos['sign'] * pos['quantity'] * pos['multiplier']
+        pos['unrealized_pnl'] = exposure * (pos['last_price'] - pos['avg_price'])
+        if pos['instrument'] != 'option':
+            pos['delta'] = exposure
+
+    def on_market_data(self, market_data: Dict, timestamp: Optional[datetime] = None) -> Dict:
+        """
+        Marca todas as posições com os preços do scan.
+
+        Spot e futuros usam o último preço. Opções usam o mid da cadeia quando
+        houver cotação; caso contrário são reprecificadas por Black-Scholes
+        vetorizado com a última vol conhecida do contrato.
+        """
+        timestamp = timestamp or datetime.now(B3_TIMEZONE)
+        spot_data = market_data.get('spot', {}) or {}
+        futures_data = market_data.get('futures', {}) or {}
+        options_data = market_data.get('options', {}) or {}
+
+        with self._lock:
+            option_positions = []
+            for pos in self.positions.values():
+                if pos['instrument'] == 'option':
+                    option_positions.append(pos)
+                    continue
+                source = futures_data if pos['instrument'] == 'futures' else spot_data
+                quote = source.get(pos['symbol'])
+                if quote:
+                    price = quote.get('last', quote.get('close'))
+                    if price:
+                        pos['last_price'] = float(price)
+                        pos['price_source'] = 'last'
+                self._mark_linear(pos)
+
+            if option_positions:
+                self._mark_options(option_positions, spot_data, options_data, timestamp)
+
+            self.last_mark_time = timestamp
+            summary = self._totals()
+
+        self.maybe_snapshot(timestamp)
+        return summary
+
+    def _mark_options(self, option_positions: List[Dict], spot_data: Dict, options_data: Dict,
+                      timestamp: datetime):
+        """Marca opções: mid da cadeia quando disponível, Black-Scholes vetorizado caso contrário."""
+        # Índice da cadeia apenas para os ativos-objeto em carteira
+        chain_index = {}
+        for underlying in {p['underlying'] for p in option_positions}:
+            for opt in options_data.get(underlying, []) or []:
+                expiry = pd.to_datetime(opt.get('expiry')).strftime('%Y%m%d') if opt.get('expiry') is not None else None
+                key = (underlying, float(opt.get('strike', 0)), opt.get('option_type'), expiry)
+                chain_index[key] = opt
+                chain_index.setdefault((underlying, float(opt.get('strike', 0)), opt.get('option_type'), None), opt)
+
+        now = pd.Timestamp(timestamp).tz_localize(None) if pd.Timestamp(timestamp).tzinfo else pd.Timestamp(timestamp)
+        n = len(option_positions)
+        S = np.zeros(n)
+        K = np.zeros(n)
+        T = np.zeros(n)
+        sigma = np.zeros(n)
+        is_call = np.zeros(n, dtype=bool)
+
+        for i, pos in enumerate(option_positions):
+            expiry = pos['expiry'].strftime('%Y%m%d') if pos['expiry'] is not None else None
+            quote = chain_index.get((pos['underlying'], pos['strike'], pos['option_type'], expiry))
+            if quote:
+                if quote.get('implied_vol'):
+                    pos['iv'] = float(quote['implied_vol'])
+                if pos['expiry'] is None and quote.get('expiry') is not None:
+                    pos['expiry'] = pd.to_datetime(quote['expiry']) + pd.Timedelta(hours=17)
+            spot = spot_data.get(pos['underlying'], {})
+            S[i] = spot.get('last', spot.get('close', 0)) or 0
+            K[i] = pos['strike']
+            T[i] = max((pos['expiry'] - now).total_seconds(), 0) / (365.0 * 86400) if pos['expiry'] is not None else 0.0
+            if quote and quote.get('implied_vol'):
+                pos['iv_calibrated'] = True
+            elif not pos['iv_calibrated'] and S[i] > 0 and T[i] > 0:
+                # Sem cadeia: calibrar a vol a partir do último prêmio conhecido (entrada ou mid)
+                iv = BlackScholes.implied_volatility(pos['last_price'], S[i], K[i], T[i],
+                                                     self.risk_free_rate, pos['option_type'])
+                if iv > 0:
+                    pos['iv'] = iv
+                pos['iv_calibrated'] = True
+            sigma[i] = pos['iv']
+            is_call[i] = pos['option_type'] == 'C'
+            pos['_quote'] = quote
+
+        model = BlackScholes.vectorized(S, K, T, self.risk_free_rate, sigma, is_call)
+
+        for i, pos in enumerate(option_positions):
+            quote = pos.pop('_quote')
+            mid = float(quote.get('mid', 0) or 0) if quote else 0.0
+            if mid > 0:
+                pos['last_price'] = mid
+                pos['price_source'] = 'mid'
+            elif S[i] > 0:
+                pos['last_price'] = float(model['price'][i])
+                pos['price_source'] = 'model'
+
+            exposure = pos['sign'] * pos['quantity'] * pos['multiplier']
+            if S[i] > 0:
+                pos['delta'] = exposure * float(model['delta'][i])
+                pos['gamma'] = exposure * float(model['gamma'][i])
+                pos['vega'] = exposure * float(model['vega'][i])
+                pos['theta'] = exposure * float(model['theta'][i])
+            self._mark_linear(pos)
+
+    # ------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------
+
+    def _totals(self) -> Dict:
+        """Totais do livro (chamar com lock)."""
+        unrealized = sum(p['unrealized_pnl'] for p in self.positions.values())
+        total_pnl = unrealized + self.realized_pnl
+        return {
+            'unrealized_pnl': unrealized,
+            'realized_pnl': self.realized_pnl,
+            'total_pnl': total_pnl,
+            'nav': self.initial_nav + total_pnl,
+            'open_positions': len(self.positions),
+            'total_delta': sum(p['delta'] for p in self.positions.values()),
+            'total_gamma': sum(p['gamma'] for p in self.positions.values()),
+            'total_vega': sum(p['vega'] for p in self.positions.values()),
+            'total_theta': sum(p['theta'] for p in self.positions.values())
+        }
+
+    def reset_day(self):
+        """Novo pregão: zera o realizado do dia (com banco, recarrega posições e realizado de hoje)."""
+        if self.orders_repo:
+            self.load_from_repository()
+            return
+        with self._lock:
+            self.realized_pnl = 0.0
+            self.realized_by_strategy = {}
+            self.realized_by_underlying = {}
+            self.closed_trades = self.winning_trades = self.losing_trades = 0
+
+    def get_pnl_loss_fraction(self) -> float:
+        """Perda do dia como fração do NAV inicial (0 se lucro)."""
+        with self._lock:
+            total = self._totals()['total_pnl']
+        return max(-total, 0.0) / self.initial_nav if self.initial_nav > 0 else 0.0
+
+    def get_state(self, include_positions: bool = True) -> Dict:
+        """Estado completo em memória (totais, por estratégia, por ativo-objeto e por posição)."""
+        with self._lock:
+            state = self._totals()
+            by_strategy: Dict[str, Dict] = {}
+            by_underlying: Dict[str, Dict] = {}
+
+            for key, realized in self.realized_by_strategy.items():
+                by_strategy.setdefault(key, {'unrealized_pnl': 0.0, 'realized_pnl': 0.0, 'positions': 0})['realized_pnl'] = realized
+            for key, realized in self.realized_by_underlying.items():
+                by_underlying.setdefault(key, {'unrealized_pnl': 0.0, 'realized_pnl': 0.0, 'positions': 0})['realized_pnl'] = realized
+
+            for pos in self.positions.values():
+                for bucket, key in ((by_strategy, pos['strategy']), (by_underlying, pos['underlying'])):
+                    entry = bucket.setdefault(key, {'unrealized_pnl': 0.0, 'realized_pnl': 0.0, 'positions': 0})
+                    entry['unrealized_pnl'] += pos['unrealized_pnl']
+                    entry['positions'] += 1
+
+            for bucket in (by_strategy, by_underlying):
+                for entry in bucket.values():
+                    entry['total_pnl'] = entry['unrealized_pnl'] + entry['realized_pnl']
+
+            state.update({
+                'timestamp': self.last_mark_time.isoformat() if self.last_mark_time else None,
+                'closed_trades': self.closed_trades,
+                'winning_trades': self.winning_trades,
+                'losing_trades': self.losing_trades,
+                'by_strategy': by_strategy,
+                'by_underlying': by_underlying
+            })
+            if include_positions:
+                state['positions'] = [
+                    {
+                        'id': p['id'],
+                        'symbol': p['symbol'],
+                        'side': p['side'],
+                        'quantity': p['quantity'],
+                        'avg_price': p['avg_price'],
+                        'current_price': p['last_price'],
+                        'price_source': p['price_source'],
+                        'strategy': p['strategy'],
+                        'underlying': p['underlying'],
+                        'instrument': p['instrument'],
+                        'proposal_id': p['proposal_id'],
+                        'opened_at': p['opened_at'],
+                        'unrealized_pnl': p['unrealized_pnl'],
+                        'delta': p['delta'],
+                        'gamma': p['gamma'],
+                        'vega': p['vega']
+                    }
+                    for p in self.positions.values()
+                ]
+            return state
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+
+    def maybe_snapshot(self, timestamp: Optional[datetime] = None) -> bool:
+        """Grava snapshot se o intervalo configurado já passou."""
+        timestamp = timestamp or datetime.now(B3_TIMEZONE)
+        if self.last_snapshot_time is not None:
+            elapsed = (pd.Timestamp(timestamp) - pd.Timestamp(self.last_snapshot_time)).total_seconds()
+            if elapsed < self.snapshot_interval_seconds:
+                return False
+        return self.snapshot(timestamp)
+
+    def snapshot(self, timestamp: Optional[datetime] = None) -> bool:
+        """Grava estado em performance_snapshots e a marcação em open_positions."""
+        if not self.orders_repo:
+            return False
+        timestamp = timestamp or datetime.now(B3_TIMEZONE)
+        state = self.get_state()
+
+        marks = [
+            {
+                'id': p['id'],
+                'current_price': p['current_price'],
+                'unrealized_pnl': p['unrealized_pnl'],
+                'delta': p['delta'],
+                'gamma': p['gamma'],
+                'vega': p['vega']
+            }
+            for p in state['positions'] if p['id'] > 0
+        ]
+        self.orders_repo.update_position_marks(marks)
+
+        saved = self.orders_repo.save_performance_snapshot({
+            'timestamp': pd.Timestamp(timestamp).isoformat() if timestamp else get_b3_timestamp(),
+            'nav': state['nav'],
+            'total_pnl': state['total_pnl'],
+            'daily_pnl': state['total_pnl'],
+            'total_trades': state['closed_trades'],
+            'winning_trades': state['winning_trades'],
+            'losing_trades': state['losing_trades'],
+            'open_positions': state['open_positions'],
+            'total_delta': state['total_delta'],
+            'total_gamma': state['total_gamma'],
+            'total_vega': state['total_vega'],
+            'portfolio_value': state['nav'],
+            'cash': self.initial_nav + state['realized_pnl'],
+            'details': {
+                'source': 'mtm',
+                'unrealized_pnl': state['unrealized_pnl'],
+                'realized_pnl': state['realized_pnl'],
+                'total_theta': state['total_theta'],
+                'by_strategy': state['by_strategy'],
+                'by_underlying': state['by_underlying'],
+                'positions': state['positions']
+            }
+        })
+        if saved:
+            self.last_snapshot_time = timestamp
+        return saved
@@ -7,23 +7,21 @@ import pandas as pd
 import numpy as np
 from typing import Optional, Dict, List
 from datetime import datetime, timedelta
-import time
 import os
 import logging
 
+try:
+    from .http_client import get_http_client, get_rate_limiter
+except ImportError:
+    from http_client import get_http_client, get_rate_limiter
+
 logger = logging.getLogger(__name__)
 
 BRAPI_TOKEN = os.getenv("BRAPI_API_KEY", os.getenv("BRAPI_TOKEN", ""))
-_last_request_time = {}
 
 def _throttle(api_name: str = 'default', min_seconds: float = 1.0):
-    """Throttle entre requisições."""
-    global _last_request_time
-    if api_name in _last_request_time:
-        elapsed = time.time() - _last_request_time[api_name]
-        if elapsed < min_seconds:
-            time.sleep(min_seconds - elapsed)
-    _last_request_time[api_name] = time.time()
+    """Throttle entre requisições (token bucket thread-safe compartilhado por provedor)."""
+    get_rate_limiter(api_name, rate_per_second=1.0 / min_seconds, burst=1).acquire()
 
 class MarketDataAPI:
     """Classe base para APIs de dados de mercado."""
@@ -31,7 +29,13 @@ class MarketDataAPI:
         raise NotImplementedError
     def fetch_futures_data(self, contracts: List[str], start_date: str, end_date: str) -> pd.DataFrame:
         raise NotImplementedError
-    def fetch_options_chain(self, underlying: str, start_date: str, end_date: str) -> pd.DataFrame:
+    def fetch_options_chain(self, underlying: str, start_date: str, end_date: str, max_dte: Optional[int] = None) -> pd.DataFrame:
+        raise NotImplementedError
+    def fetch_quotes(self, tickers: List[str]) -> Dict[str, float]:
+        """Último preço de vários tickers em uma única chamada."""
+        raise NotImplementedError
+    def fetch_intraday_snapshot(self, ticker: str, market_open: bool = True) -> Optional[Dict]:
+        """Resumo do dia {'open', 'high', 'low', 'last', 'volume', 'source'} ou None."""
         raise NotImplementedError
 
 class YahooFinanceAPI(MarketDataAPI):
@@ -81,70 +85,172 @@ class YahooFinanceAPI(MarketDataAPI):
     def fetch_futures_data(self, contracts: List[str], start_date: str, end_date: str) -> pd.DataFrame:
         return pd.DataFrame(columns=['date', 'contract', 'expiry', 'open', 'high', 'low', 'close', 'volume'])
     
-    def fetch_options_chain(self, underlying: str, start_date: str, end_date: str) -> pd.DataFrame:
+    OPTIONS_COLUMNS = ['date', 'underlying', 'expiry', 'strike', 'option_type', 'bid', 'ask', 'mid', 'implied_vol', 'open_interest']
+    
+    def _chain_side_frame(self, side: pd.DataFrame, underlying: str, expiry_str: str, option_type: str) -> pd.DataFrame:
+        """Converte calls/puts de uma expiração para o formato padrão (vetorizado)."""
+        bid = pd.to_numeric(side['bid'], errors='coerce')
+        ask = pd.to_numeric(side['ask'], errors='coerce')
+        iv = pd.to_numeric(side['impliedVolatility'], errors='coerce') if 'impliedVolatility' in side else pd.Series(np.nan, index=side.index)
+        oi = pd.to_numeric(side['openInterest'], errors='coerce') if 'openInterest' in side else pd.Series(np.nan, index=side.index)
+        return pd.DataFrame({
+            'date': pd.Timestamp(datetime.now().date()),
+            'underlying': underlying,
+            'expiry': pd.to_datetime(expiry_str),
+            'strike': pd.to_numeric(side['strike'], errors='coerce').astype(float),
+            'option_type': option_type,
+            'bid': bid.fillna(0.0),
+            'ask': ask.fillna(0.0),
+            'mid': ((bid + ask) / 2).fillna(0.0),
+            'implied_vol': iv.fillna(0.25),
+            'open_interest': oi.fillna(0).astype(int)
+        })
+    
+    def fetch_options_chain(self, underlying: str, start_date: str, end_date: str, max_dte: Optional[int] = None) -> pd.DataFrame:
+        """
+        Busca cadeia de opções (até 5 vencimentos).
+        
+        Args:
+            max_dte: Se informado, busca apenas vencimentos com 0 < DTE <= max_dte
+        """
         _throttle('yfinance', 0.5)
         try:
             ticker_yf = self._normalize_ticker(underlying)
             stock = self.yf.Ticker(ticker_yf)
             expirations = stock.options
+            if max_dte is not None and expirations:
+                today = pd.Timestamp(datetime.now().date())
+                expirations = [
+                    e for e in expirations
+                    if 0 < (pd.to_datetime(e) - today).days <= max_dte
+                ]
             if not expirations:
-                return pd.DataFrame(columns=['date', 'underlying', 'expiry', 'strike', 'option_type', 'bid', 'ask', 'mid', 'implied_vol', 'open_interest'])
-            all_data = []
+                return pd.DataFrame(columns=self.OPTIONS_COLUMNS)
+            frames = []
             for expiry_str in expirations[:5]:
                 try:
                     opt_chain = stock.option_chain(expiry_str)
                     if not opt_chain.calls.empty:
-                        for _, row in opt_chain.calls.iterrows():
-                            all_data.append({
-                                'date': datetime.now().date(),
-                                'underlying': underlying,
-                                'expiry': pd.to_datetime(expiry_str),
-                                'strike': float(row['strike']),
-                                'option_type': 'C',
-                                'bid': float(row['bid']) if not pd.isna(row['bid']) else 0.0,
-                                'ask': float(row['ask']) if not pd.isna(row['ask']) else 0.0,
-                                'mid': (float(row['bid']) + float(row['ask'])) / 2 if not pd.isna(row['bid']) and not pd.isna(row['ask']) else 0.0,
-                                'implied_vol': float(row['impliedVolatility']) if 'impliedVolatility' in row and not pd.isna(row['impliedVolatility']) else 0.25,
-                                'open_interest': int(row['openInterest']) if 'openInterest' in row and not pd.isna(row['openInterest']) else 0
-                            })
+                        frames.append(self._chain_side_frame(opt_chain.calls, underlying, expiry_str, 'C'))
                     if not opt_chain.puts.empty:
-                        for _, row in opt_chain.puts.iterrows():
-                            all_data.append({
-                                'date': datetime.now().date(),
-                                'underlying': underlying,
-                                'expiry': pd.to_datetime(expiry_str),
-                                'strike': float(row['strike']),
-                                'option_type': 'P',
-                                'bid': float(row['bid']) if not pd.isna(row['bid']) else 0.0,
-                                'ask': float(row['ask']) if not pd.isna(row['ask']) else 0.0,
-                                'mid': (float(row['bid']) + float(row['ask'])) / 2 if not pd.isna(row['bid']) and not pd.isna(row['ask']) else 0.0,
-                                'implied_vol': float(row['impliedVolatility']) if 'impliedVolatility' in row and not pd.isna(row['impliedVolatility']) else 0.25,
-                                'open_interest': int(row['openInterest']) if 'openInterest' in row and not pd.isna(row['openInterest']) else 0
-                            })
+                        frames.append(self._chain_side_frame(opt_chain.puts, underlying, expiry_str, 'P'))
                 except:
                     continue
-            if not all_data:
-                return pd.DataFrame(columns=['date', 'underlying', 'expiry', 'strike', 'option_type', 'bid', 'ask', 'mid', 'implied_vol', 'open_interest'])
-            df = pd.DataFrame(all_data)
-            df['date'] = pd.to_datetime(df['date'])
+            if not frames:
+                return pd.DataFrame(columns=self.OPTIONS_COLUMNS)
+            df = pd.concat(frames, ignore_index=True)
             return df.sort_values(['date', 'expiry', 'strike', 'option_type'])
         except Exception as e:
             logger.error(f"Erro ao buscar opções: {e}")
-            return pd.DataFrame(columns=['date', 'underlying', 'expiry', 'strike', 'option_type', 'bid', 'ask', 'mid', 'implied_vol', 'open_interest'])
+            return pd.DataFrame(columns=self.OPTIONS_COLUMNS)
+    
+    def fetch_quotes(self, tickers: List[str]) -> Dict[str, float]:
+        """Último preço (candle de 1m do dia) de vários tickers em um único download."""
+        if not tickers:
+            return {}
+        _throttle('yfinance', 0.5)
+        try:
+            data = self.yf.download(
+                list(tickers), period='1d', interval='1m',
+                progress=False, threads=True, auto_adjust=False
+            )
+            if data is None or data.empty or 'Close' not in data:
+                return {}
+            closes = data['Close']
+            if isinstance(closes, pd.Series):
+                closes = closes.to_frame(name=tickers[0])
+            last = closes.ffill().iloc[-1]
+            return {str(ticker): float(price) for ticker, price in last.items() if not pd.isna(price)}
+        except Exception as e:
+            logger.error(f"Erro ao buscar cotações em lote: {e}")
+            return {}
+
+    def _summarize_bars(self, bars: pd.DataFrame) -> Dict:
+        return {
+            'open': float(bars.iloc[0]['Open']),
+            'high': float(bars['High'].max()),
+            'low': float(bars['Low'].min()),
+            'last': float(bars.iloc[-1]['Close']),
+            'volume': int(bars['Volume'].sum()) if 'Volume' in bars.columns else 0,
+        }
+    
+    def fetch_intraday_snapshot(self, ticker: str, market_open: bool = True) -> Optional[Dict]:
+        """
+        Resumo do dia: candles intraday de HOJE (5m, 15m, 1h); com mercado aberto e sem
+        candle de hoje (delay da API), o último candle disponível; depois info() (ações
+        .SA) e, com mercado fechado, o último fechamento diário.
+        """
+        stock = self.yf.Ticker(self._normalize_ticker(ticker))
+        today = datetime.now().date()
+        for interval in ['5m', '15m', '1h']:
+            try:
+                hist = stock.history(period='1d', interval=interval, timeout=10)
+                if hist is None or hist.empty:
+                    continue
+                hist.index = pd.to_datetime(hist.index)
+                hist_today = hist[hist.index.date == today]
+                if not hist_today.empty:
+                    snapshot = self._summarize_bars(hist_today)
+                    logger.info(f"{ticker}: ✅ Dados intraday de HOJE capturados ({interval}, {len(hist_today)} candles) - Preço: {snapshot['last']:.2f}")
+                    return {**snapshot, 'source': f'intraday_{interval}'}
+                if market_open:
+                    # Mercado aberto sem candle de hoje: pode ser delay da API
+                    snapshot = self._summarize_bars(hist)
+                    logger.warning(f"{ticker}: ⚠️ Mercado aberto mas último candle é de {hist.index[-1].date()} (pode ser delay da API) - Preço: {snapshot['last']:.2f}")
+                    return {**snapshot, 'source': f'intraday_{interval}_stale'}
+            except Exception as e:
+                logger.debug(f"Erro ao buscar intraday {interval} para {ticker}: {e}")
+        
+        if '.SA' in ticker:
+            try:
+                info = stock.info
+                price = info.get('regularMarketPrice') or info.get('currentPrice')
+                if price:
+                    logger.info(f"{ticker}: ✅ Dados obtidos via info() - Preço atual: {price:.2f}")
+                    return {
+                        'open': info.get('open') or info.get('regularMarketOpen') or price,
+                        'high': info.get('dayHigh') or info.get('regularMarketDayHigh') or price,
+                        'low': info.get('dayLow') or info.get('regularMarketDayLow') or price,
+                        'last': price,
+                        'volume': info.get('volume') or info.get('regularMarketVolume') or 0,
+                        'source': 'info'
+                    }
+            except Exception as e:
+                logger.debug(f"Erro ao buscar info para {ticker}: {e}")
+        
+        if market_open:
+            logger.warning(f"{ticker}: ⚠️ Mercado aberto mas não foi possível obter dados atualizados")
+            return None
+        try:
+            hist_daily = stock.history(period='2d', interval='1d', timeout=10)
+            if hist_daily is not None and not hist_daily.empty:
+                latest = hist_daily.iloc[-1]
+                snapshot = {
+                    'open': float(hist_daily.iloc[0]['Open']) if len(hist_daily) > 1 else float(latest['Open']),
+                    'high': float(latest['High']),
+                    'low': float(latest['Low']),
+                    'last': float(latest['Close']),
+                    'volume': int(hist_daily['Volume'].sum()) if 'Volume' in hist_daily.columns else 0,
+                    'source': 'daily'
+                }
+                logger.info(f"{ticker}: ℹ️ Mercado fechado - usando último preço de fechamento: {snapshot['last']:.2f}")
+                return snapshot
+        except Exception as e:
+            logger.debug(f"Erro ao buscar dados diários para {ticker}: {e}")
+        return None
 
 class BrapiAPI(MarketDataAPI):
     """API usando Brapi.dev."""
-    def __init__(self, api_key: Optional[str] = None):
-        import requests
-        self.requests = requests
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        self.http = get_http_client('brapi')  # Limite de taxa próprio; sem _throttle
         self.api_key = api_key or BRAPI_TOKEN
-        self.base_url = "https://brapi.dev/api"
+        # BRAPI_BASE_URL: aponta para o servidor simulado (market_data_simulator) em testes de carga
+        self.base_url = (base_url or os.getenv('BRAPI_BASE_URL') or "https://brapi.dev/api").rstrip('/')
     
     def _normalize_ticker(self, ticker: str) -> str:
         return ticker.replace('.SA', '').upper()
     
     def fetch_spot_data(self, tickers: List[str], start_date: str, end_date: str) -> pd.DataFrame:
-        _throttle('brapi', 1.0)
         all_data = []
         for ticker in tickers:
             try:
@@ -153,7 +259,7 @@ class BrapiAPI(MarketDataAPI):
                 params = {'range': '1y', 'interval': '1d'}
                 if self.api_key:
                     params['token'] = self.api_key
-                response = self.requests.get(url, params=params, timeout=10)
+                response = self.http.get(url, params=params, timeout=10)
                 if response.status_code == 200:
                     data = response.json()
                     if 'results' in data and len(data['results']) > 0:
@@ -183,8 +289,55 @@ class BrapiAPI(MarketDataAPI):
     def fetch_futures_data(self, contracts: List[str], start_date: str, end_date: str) -> pd.DataFrame:
         return pd.DataFrame(columns=['date', 'contract', 'expiry', 'open', 'high', 'low', 'close', 'volume'])
     
-    def fetch_options_chain(self, underlying: str, start_date: str, end_date: str) -> pd.DataFrame:
+    def fetch_options_chain(self, underlying: str, start_date: str, end_date: str, max_dte: Optional[int] = None) -> pd.DataFrame:
         return pd.DataFrame(columns=['date', 'underlying', 'expiry', 'strike', 'option_type', 'bid', 'ask', 'mid', 'implied_vol', 'open_interest'])
+    
+    def fetch_quotes(self, tickers: List[str]) -> Dict[str, float]:
+        """Último preço de vários tickers (endpoint /quote aceita lista separada por vírgula)."""
+        if not tickers:
+            return {}
+        try:
+            normalized = {self._normalize_ticker(t): t for t in tickers}
+            url = f"{self.base_url}/quote/{','.join(normalized)}"
+            params = {'token': self.api_key} if self.api_key else {}
+            response = self.http.get(url, params=params, timeout=10)
+            if response.status_code != 200:
+                return {}
+            quotes = {}
+            for result in response.json().get('results', []):
+                ticker = normalized.get(result.get('symbol', ''))
+                price = result.get('regularMarketPrice')
+                if ticker and price:
+                    quotes[ticker] = float(price)
+            return quotes
+        except Exception as e:
+            logger.error(f"Erro ao buscar cotações em lote (brapi): {e}")
+            return {}
+
+    def fetch_intraday_snapshot(self, ticker: str, market_open: bool = True) -> Optional[Dict]:
+        """Resumo do dia pelo /quote (preço, abertura, máxima, mínima e volume do pregão)."""
+        try:
+            url = f"{self.base_url}/quote/{self._normalize_ticker(ticker)}"
+            params = {'token': self.api_key} if self.api_key else {}
+            response = self.http.get(url, params=params, timeout=10)
+            if response.status_code != 200:
+                return None
+            results = response.json().get('results') or []
+            if not results or not results[0].get('regularMarketPrice'):
+                return None
+            result = results[0]
+            price = float(result['regularMarketPrice'])
+            return {
+                'open': float(result.get('regularMarketOpen') or price),
+                'high': float(result.get('regularMarketDayHigh') or price),
+                'low': float(result.get('regularMarketDayLow') or price),
+                'last': price,
+                'volume': int(result.get('regularMarketVolume') or 0),
+                'source': 'quote'
+            }
+        except Exception as e:
+            logger.debug(f"Erro ao buscar resumo do dia (brapi) para {ticker}: {e}")
+            return None
 
 def create_market_data_api(api_type: str = 'yfinance', **kwargs) -> MarketDataAPI:
     """Factory function para criar API."""
@@ -192,7 +345,13 @@ def create_market_data_api(api_type: str = 'yfinance', **kwargs) -> MarketDataAP
     if api_type == 'yfinance':
         return YahooFinanceAPI()
     elif api_type == 'brapi':
-        return BrapiAPI(api_key=kwargs.get('api_key'))
+        return BrapiAPI(api_key=kwargs.get('api_key'), base_url=kwargs.get('base_url'))
+    elif api_type == 'simulated':
+        try:
+            from .market_data_simulator import SimulatedMarketDataAPI
+        except ImportError:
+            from market_data_simulator import SimulatedMarketDataAPI
+        return SimulatedMarketDataAPI(config=kwargs.get('config'))
     else:
         raise ValueError(f"Tipo de API desconhecido: {api_type}")
 
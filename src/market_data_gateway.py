@@ -0,0 +1,334 @@
+"""
+Gateway de dados de mercado: um ponto de entrada para resumo intraday, histórico diário,
+cadeias de opções, cotações em lote e futuros, sobre vários provedores.
+
+- Ranking por provedor e operação: taxa de sucesso (janela recente), taxa de respostas com
+  dados e latência mediana. Falhas seguidas colocam o par (provedor, operação) em cooldown
+  (usado só como último recurso); as demais operações do provedor não são afetadas.
+- Hedged requests: se o primeiro provedor passar do percentil hedge_percentile da própria
+  latência, a mesma chamada vai para o segundo e vale a primeira resposta válida. O número
+  de hedges simultâneos é limitado (max_inflight_hedges) para não estourar limites de taxa.
+- Failover: resposta sem dados ou erro passa para o próximo provedor; em cotações e histórico
+  os tickers que faltaram são completados pelos demais (merge). Resposta válida sem dados não
+  conta como falha, e provedores que não implementam a operação não são chamados.
+- Normalização: DataFrames nas colunas padrão de MarketDataAPI; resumos com floats e o
+  provedor de origem.
+
+O gateway implementa a interface de MarketDataAPI, então substitui o cliente único onde ele
+era usado (MonitoringService, ExitMonitor).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    from .market_data_api import MarketDataAPI, YahooFinanceAPI
+except ImportError:
+    from market_data_api import MarketDataAPI, YahooFinanceAPI
+
+logger = logging.getLogger(__name__)
+
+SPOT_COLUMNS = ['date', 'ticker', 'open', 'high', 'low', 'close', 'volume']
+FUTURES_COLUMNS = ['date', 'contract', 'expiry', 'open', 'high', 'low', 'close', 'volume']
+OPTIONS_COLUMNS = YahooFinanceAPI.OPTIONS_COLUMNS
+SNAPSHOT_FIELDS = ('open', 'high', 'low', 'last')
+
+
+class ProviderHealth:
+    """Latência, sucesso e cooldown recentes de um provedor, por operação."""
+
+    MIN_SAMPLES = 5
+
+    def __init__(self, window: int = 200, failure_threshold: int = 3, cooldown_seconds: float = 60.0):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.latencies: Dict[str, deque] = {}
+        self.outcomes: Dict[str, deque] = {}  # True = respondeu (com ou sem dados), False = erro
+        self.data: Dict[str, deque] = {}  # Entre as respostas: True = com dados, False = sem dados
+        self.consecutive_failures: Dict[str, int] = {}
+        self.cooldown_until: Dict[str, float] = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, latency: float, success: bool, has_data: bool = True):
+        """Registra uma chamada. Resposta válida sem dados (has_data=False) não conta como falha."""
+        with self._lock:
+            self.calls += 1
+            self.outcomes.setdefault(operation, deque(maxlen=self.window)).append(success)
+            if success:
+                self.latencies.setdefault(operation, deque(maxlen=self.window)).append(latency)
+                self.data.setdefault(operation, deque(maxlen=self.window)).append(has_data)
+                self.consecutive_failures[operation] = 0
+            else:
+                failures = self.consecutive_failures.get(operation, 0) + 1
+                self.consecutive_failures[operation] = failures
+                if failures >= self.failure_threshold:
+                    self.cooldown_until[operation] = time.monotonic() + self.cooldown_seconds
+
+    def available(self, operation: str) -> bool:
+        return time.monotonic() >= self.cooldown_until.get(operation, 0.0)
+
+    def success_rate(self, operation: str) -> float:
+        outcomes = self.outcomes.get(operation)
+        return sum(outcomes) / len(outcomes) if outcomes else 1.0  # Sem histórico: otimista
+
+    def data_rate(self, operation: str) -> float:
+        data = self.data.get(operation)
+        return sum(data) / len(data) if data else 1.0
+
+    def latency_percentile(self, operation: str, percentile: float) -> Optional[float]:
+        latencies = sorted(self.latencies.get(operation, ()))
+        if len(latencies) < self.MIN_SAMPLES:
+            return None
+        return latencies[min(int(len(latencies) * percentile / 100), len(latencies) - 1)]
+
+    def stats(self) -> Dict[str, Any]:
+        operations = {}
+        for operation in self.outcomes:
+            p50 = self.latency_percentile(operation, 50)
+            p90 = self.latency_percentile(operation, 90)
+            operations[operation] = {
+                'calls': len(self.outcomes[operation]),
+                'available': self.available(operation),
+                'success_rate': round(self.success_rate(operation), 3),
+                'data_rate': round(self.data_rate(operation), 3),
+                'latency_p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                'latency_p90_ms': round(p90 * 1000, 1) if p90 is not None else None,
+            }
+        return {'calls': self.calls, 'operations': operations}
+
+
+class MarketDataGateway(MarketDataAPI):
+    """Roteia as chamadas de dados de mercado entre provedores, com hedge e failover."""
+
+    def __init__(self, providers: Dict[str, MarketDataAPI], futures_providers: Optional[Dict[str, Any]] = None,
+                 config: Optional[Dict] = None):
+        config = config or {}
+        if not providers:
+            raise ValueError("MarketDataGateway precisa de pelo menos um provedor")
+        self.providers = providers
+        self.futures_providers = futures_providers or {}
+        self.hedge_percentile = config.get('hedge_percentile', 90)
+        self.hedge_min_seconds = config.get('hedge_min_ms', 300) / 1000
+        self.hedge_default_seconds = config.get('hedge_default_ms', 2000) / 1000
+        self.max_inflight_hedges = config.get('max_inflight_hedges', 2)
+        self.timeout_seconds = config.get('timeout_seconds', 30.0)
+        self.health = {
+            name: ProviderHealth(failure_threshold=config.get('failure_threshold', 3),
+                                 cooldown_seconds=config.get('cooldown_seconds', 60.0))
+            for name in list(providers) + list(self.futures_providers)
+        }
+        self._executor = ThreadPoolExecutor(max_workers=config.get('max_workers', 8),
+                                            thread_name_prefix='market-data')
+        self._lock = threading.Lock()
+        self._inflight_hedges = 0
+        self._counters = {'calls': 0, 'hedges': 0, 'hedge_wins': 0, 'failovers': 0, 'no_data': 0, 'failures': 0}
+
+    # ------------------------------------------------------------------ roteamento
+
+    def rank(self, operation: str, candidates: Optional[List[str]] = None) -> List[str]:
+        """Provedores em ordem de preferência para a operação (em cooldown nela vão para o fim)."""
+        names = list(candidates if candidates is not None else self.providers)
+
+        def key(name):
+            health = self.health[name]
+            p50 = health.latency_percentile(operation, 50)
+            return (not health.available(operation), -round(health.success_rate(operation), 1),
+                    -round(health.data_rate(operation), 1), p50 if p50 is not None else 0.0)
+        return sorted(names, key=key)
+
+    @staticmethod
+    def supports(provider: Any, method: str) -> bool:
+        """Provedor implementa o método (não herdado do stub de MarketDataAPI)."""
+        implementation = getattr(type(provider), method, None)
+        return implementation is not None and implementation is not getattr(MarketDataAPI, method, None)
+
+    def _hedge_delay(self, name: str, operation: str) -> float:
+        latency = self.health[name].latency_percentile(operation, self.hedge_percentile)
+        if latency is None:
+            return self.hedge_default_seconds
+        return max(latency, self.hedge_min_seconds)
+
+    def _run(self, name: str, provider: Any, operation: str, call: Callable[[Any], Any],
+             has_data: Callable[[Any], bool]) -> Tuple[Optional[bool], Any]:
+        """Retorna (True, resultado) com dados, (False, resultado) sem dados ou (None, None) em erro."""
+        started = time.perf_counter()
+        try:
+            result = call(provider)
+        except Exception as e:
+            logger.debug(f"{name}.{operation} falhou: {e}")
+            self.health[name].record(operation, time.perf_counter() - started, False)
+            return None, None
+        found = has_data(result)
+        self.health[name].record(operation, time.perf_counter() - started, True, has_data=found)
+        return found, result
+
+    def _release_hedge(self, _future):
+        with self._lock:
+            self._inflight_hedges -= 1
+
+    def _call(self, operation: str, method: str, call: Callable[[Any], Any], has_data: Callable[[Any], bool],
+              pool: Optional[Dict[str, Any]] = None, exclude: Tuple[str, ...] = ()) -> Tuple[Any, Optional[str]]:
+        """
+        Executa a chamada no melhor provedor que implementa method, com hedge no segundo se o
+        primeiro demorar e failover nos seguintes. Retorna (resultado, provedor) ou (None, None).
+        """
+        pool = self.providers if pool is None else pool
+        order = [name for name in self.rank(operation, list(pool))
+                 if name not in exclude and self.supports(pool[name], method)]
+        if not order:
+            return None, None
+        with self._lock:
+            self._counters['calls'] += 1
+
+        pending: Dict[Any, str] = {}
+        hedged = set()
+        answered = False  # Algum provedor respondeu sem erro (ainda que sem dados)
+
+        def launch(name: str, hedge: bool = False):
+            future = self._executor.submit(self._run, name, pool[name], operation, call, has_data)
+            pending[future] = name
+            if hedge:
+                hedged.add(name)
+                future.add_done_callback(self._release_hedge)
+
+        launch(order[0])
+        next_index = 1
+        deadline = time.monotonic() + self.timeout_seconds
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = remaining
+            can_hedge = next_index < len(order) and not hedged and len(pending) == 1
+            if can_hedge:
+                timeout = min(timeout, self._hedge_delay(pending[next(iter(pending))], operation))
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if can_hedge:
+                    with self._lock:
+                        budget = self._inflight_hedges < self.max_inflight_hedges
+                        if budget:
+                            self._inflight_hedges += 1
+                            self._counters['hedges'] += 1
+                    if budget:
+                        launch(order[next_index], hedge=True)
+                        next_index += 1
+                    else:
+                        hedged.add(None)  # Sem orçamento: espera o primário
+                continue
+            for future in done:
+                name = pending.pop(future)
+                found, result = future.result()
+                answered = answered or found is not None
+                if found:
+                    with self._lock:
+                        if name in hedged:
+                            self._counters['hedge_wins'] += 1
+                        if name != order[0] and name not in hedged:
+                            self._counters['failovers'] += 1
+                    return result, name
+            if not pending and next_index < len(order):
+                launch(order[next_index])  # Failover: sem dados ou erro
+                next_index += 1
+
+        with self._lock:
+            self._counters['no_data' if answered else 'failures'] += 1
+        return None, None
+
+    # ------------------------------------------------------------------ interface MarketDataAPI
+
+    def fetch_intraday_snapshot(self, ticker: str, market_open: bool = True) -> Optional[Dict]:
+        snapshot, provider = self._call(
+            'snapshot', 'fetch_intraday_snapshot', lambda api: api.fetch_intraday_snapshot(ticker, market_open),
+            lambda result: bool(result) and bool(result.get('last'))
+        )
+        if snapshot is None:
+            return None
+        normalized = {field: float(snapshot.get(field) or snapshot['last']) for field in SNAPSHOT_FIELDS}
+        normalized['volume'] = int(snapshot.get('volume') or 0)
+        normalized['source'] = snapshot.get('source')
+        normalized['provider'] = provider
+        return normalized
+
+    def fetch_quotes(self, tickers: List[str]) -> Dict[str, float]:
+        quotes: Dict[str, float] = {}
+        tried: Tuple[str, ...] = ()
+        remaining = list(tickers)
+        while remaining:
+            result, provider = self._call(
+                'quotes', 'fetch_quotes', lambda api, subset=tuple(remaining): api.fetch_quotes(list(subset)), bool, exclude=tried
+            )
+            if provider is None:
+                break
+            quotes.update({ticker: float(price) for ticker, price in result.items() if ticker in remaining})
+            tried += (provider,)
+            remaining = [ticker for ticker in remaining if ticker not in quotes]
+        return quotes
+
+    def fetch_spot_data(self, tickers: List[str], start_date: str, end_date: str) -> pd.DataFrame:
+        frames = []
+        tried: Tuple[str, ...] = ()
+        remaining = list(tickers)
+        while remaining:
+            result, provider = self._call(
+                'spot', 'fetch_spot_data', lambda api, subset=tuple(remaining): api.fetch_spot_data(list(subset), start_date, end_date),
+                lambda df: df is not None and not df.empty, exclude=tried
+            )
+            if provider is None:
+                break
+            frames.append(_normalize_frame(result, SPOT_COLUMNS))
+            tried += (provider,)
+            remaining = [ticker for ticker in remaining if ticker not in set(result['ticker'])]
+        if not frames:
+            return pd.DataFrame(columns=SPOT_COLUMNS)
+        return pd.concat(frames, ignore_index=True).sort_values(['date', 'ticker'])
+
+    def fetch_options_chain(self, underlying: str, start_date: str, end_date: str,
+                            max_dte: Optional[int] = None) -> pd.DataFrame:
+        chain, _ = self._call(
+            'options', 'fetch_options_chain', lambda api: api.fetch_options_chain(underlying, start_date, end_date, max_dte=max_dte),
+            lambda df: df is not None and not df.empty
+        )
+        return _normalize_frame(chain, OPTIONS_COLUMNS)
+
+    def fetch_futures_data(self, contracts: List[str], start_date: str, end_date: str) -> pd.DataFrame:
+        data, _ = self._call(
+            'futures_daily', 'fetch_futures_data', lambda api: api.fetch_futures_data(contracts, start_date, end_date),
+            lambda df: df is not None and not df.empty
+        )
+        return _normalize_frame(data, FUTURES_COLUMNS)
+
+    def get_all_futures_data(self, symbols: List[str]) -> Dict[str, Dict]:
+        """Snapshot dos contratos futuros (provedores de futuros: buffers de candles de 1m)."""
+        if not self.futures_providers:
+            return {}
+        data, _ = self._call('futures', 'get_all_futures_data', lambda api: api.get_all_futures_data(symbols), bool,
+                             pool=self.futures_providers)
+        return data or {}
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            'ranking': {operation: self.rank(operation) for operation in ('snapshot', 'quotes', 'options')},
+            'providers': {name: health.stats() for name, health in self.health.items()},
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def _normalize_frame(df: Optional[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+    """Colunas padrão (faltantes como NaN, extras descartadas)."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=columns)
+    return df.reindex(columns=columns)
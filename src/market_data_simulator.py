@@ -0,0 +1,576 @@
+"""
+Mercado simulado para testes de carga e latência sem rede.
+
+- SyntheticMarket: OHLCV diário e intraday (1m, agregável), cadeias de opções
+  (Black-Scholes com smile) e candles de 1m de futuros, determinísticos por
+  (seed, ticker, dia), para centenas de tickers. Pode ancorar o último preço e as
+  cadeias em capturas gravadas no banco (load_recorded).
+- FaultProfile: latência, jitter, taxa de erro e limite de taxa configuráveis.
+- SimulatedMarketDataAPI / SimulatedFuturesAPI: substitutos em processo de
+  MarketDataAPI e FuturesDataAPI (create_market_data_api('simulated')).
+- MarketDataStandInServer: servidor HTTP local compatível com os endpoints usados pelo
+  BrapiAPI (/api/quote), pela Bot API do Telegram (/bot<token>/...) e por webhooks do
+  Discord (/discord/webhook), mais /api/options e /api/futures.
+
+Uso:
+    python -m src.market_data_simulator --port 8765 --tickers 300 --latency-ms 40 --error-rate 0.02
+
+    config['simulated_market'] = {'enabled': True, 'latency_ms': 40, 'error_rate': 0.02}
+    BrapiAPI(base_url='http://127.0.0.1:8765/api')
+    TELEGRAM_API_BASE=http://127.0.0.1:8765
+"""
+
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .futures_data_api import BAR_COLUMNS, FuturesDataAPI
+    from .http_client import TokenBucket
+    from .market_data_api import MarketDataAPI, YahooFinanceAPI
+    from .orders_repository import get_b3_timestamp
+    from .pricing import BlackScholes
+    from .trading_schedule import get_b3_calendar
+except ImportError:
+    from futures_data_api import BAR_COLUMNS, FuturesDataAPI
+    from http_client import TokenBucket
+    from market_data_api import MarketDataAPI, YahooFinanceAPI
+    from orders_repository import get_b3_timestamp
+    from pricing import BlackScholes
+    from trading_schedule import get_b3_calendar
+
+logger = logging.getLogger(__name__)
+
+SESSION_OPEN = (10, 0)
+SESSION_MINUTES = 420  # 10:00 - 17:00
+RISK_FREE_RATE = 0.1075
+FUTURES_BASE_PRICES = {'WIN': 130000.0, 'IND': 130000.0, 'WDO': 5500.0, 'DOL': 5500.0, 'WSP': 5800.0, 'DOLF': 5500.0}
+SPOT_COLUMNS = ['date', 'ticker', 'open', 'high', 'low', 'close', 'volume']
+OPTIONS_COLUMNS = YahooFinanceAPI.OPTIONS_COLUMNS
+
+
+def default_tickers(n: int) -> List[str]:
+    """n tickers sintéticos no formato B3 (SIM001.SA, ...)."""
+    return [f"SIM{i:03d}.SA" for i in range(1, n + 1)]
+
+
+class SimulatedProviderError(Exception):
+    """Falha injetada pelo FaultProfile (status 500 ou 429)."""
+
+    def __init__(self, status: int, message: str = ''):
+        super().__init__(message or f"Falha simulada ({status})")
+        self.status = status
+
+
+class FaultProfile:
+    """Latência (ms) + jitter uniforme, taxa de erro (0-1) e limite de taxa (req/s, 0 = sem)."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_per_second: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.limiter = TokenBucket(rate_limit_per_second, max(rate_limit_per_second, 1)) \
+            if rate_limit_per_second else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'errors': 0, 'rate_limited': 0}
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> 'FaultProfile':
+        config = config or {}
+        return cls(config.get('latency_ms', 0.0), config.get('jitter_ms', 0.0), config.get('error_rate', 0.0),
+                   config.get('rate_limit_per_second', 0.0), config.get('seed'))
+
+    def check(self):
+        """Aplica a latência e levanta SimulatedProviderError quando a chamada deve falhar."""
+        with self._lock:
+            self.counters['calls'] += 1
+            delay = max(self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms), 0.0) / 1000
+            fail = self._random.random() < self.error_rate
+        if self.limiter is not None:
+            try:
+                self.limiter.acquire(timeout=0)
+            except TimeoutError:
+                with self._lock:
+                    self.counters['rate_limited'] += 1
+                raise SimulatedProviderError(429, "Limite de taxa simulado")
+        if delay:
+            time.sleep(delay)
+        if fail:
+            with self._lock:
+                self.counters['errors'] += 1
+            raise SimulatedProviderError(500)
+
+
+class SyntheticMarket:
+    """Séries sintéticas determinísticas (GBM) por ticker e dia, com âncoras gravadas opcionais."""
+
+    def __init__(self, tickers: Optional[List[str]] = None, seed: int = 42, history_days: int = 400):
+        self.tickers = list(tickers) if tickers else default_tickers(300)
+        self.seed = seed
+        self.history_days = history_days
+        self._cache: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        self._recorded_spot: Dict[str, Dict] = {}
+        self._recorded_chains: Dict[str, pd.DataFrame] = {}
+
+    def _rng(self, *key) -> np.random.Generator:
+        digest = hashlib.sha1(repr((self.seed,) + key).encode()).digest()
+        return np.random.default_rng(int.from_bytes(digest[:8], 'little'))
+
+    def _cached(self, key: Tuple, builder):
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        value = builder()
+        with self._lock:
+            if len(self._cache) > 4096:
+                self._cache.clear()
+            self._cache[key] = value
+        return value
+
+    def _profile(self, ticker: str) -> Tuple[float, float]:
+        """(preço base, vol diária) do ticker."""
+        rng = self._rng('profile', ticker)
+        return float(rng.uniform(5, 120)), float(rng.uniform(0.012, 0.035))
+
+    # ------------------------------------------------------------------ diário
+
+    def daily_bars(self, ticker: str) -> pd.DataFrame:
+        """Histórico diário (dias úteis) até hoje."""
+        def build():
+            base, vol = self._profile(ticker)
+            days = pd.bdate_range(end=pd.Timestamp(date.today()), periods=self.history_days)
+            rng = self._rng('daily', ticker)
+            closes = base * np.exp(np.cumsum(rng.normal(0, vol, len(days))))
+            opens = np.concatenate([[base], closes[:-1]]) * np.exp(rng.normal(0, vol / 4, len(days)))
+            spread = np.abs(rng.normal(0, vol, len(days))) * closes
+            return pd.DataFrame({
+                'date': days,
+                'ticker': ticker,
+                'open': opens,
+                'high': np.maximum(opens, closes) + spread / 2,
+                'low': np.minimum(opens, closes) - spread / 2,
+                'close': closes,
+                'volume': rng.integers(1e5, 5e6, len(days)),
+            })
+        return self._cached(('daily', ticker), build)
+
+    def previous_close(self, ticker: str, day: date) -> float:
+        bars = self.daily_bars(ticker)
+        before = bars[bars['date'] < pd.Timestamp(day)]
+        return float(before['close'].iloc[-1]) if not before.empty else self._profile(ticker)[0]
+
+    # ------------------------------------------------------------------ intraday
+
+    def _session_minutes(self, day: date, now: Optional[datetime]) -> int:
+        """Minutos do pregão já decorridos (dia anterior ou sessão encerrada: completo)."""
+        now = now or datetime.now()
+        if day < now.date():
+            return SESSION_MINUTES
+        elapsed = (now.hour - SESSION_OPEN[0]) * 60 + now.minute - SESSION_OPEN[1] + 1
+        return int(min(max(elapsed, 0), SESSION_MINUTES))
+
+    def intraday_bars(self, ticker: str, day: Optional[date] = None, interval_minutes: int = 1,
+                      now: Optional[datetime] = None) -> pd.DataFrame:
+        """Candles do pregão (colunas Open/High/Low/Close/Volume, índice datetime)."""
+        day = day or (now or datetime.now()).date()
+
+        def build():
+            _, vol = self._profile(ticker)
+            rng = self._rng('intraday', ticker, day.isoformat())
+            minute_vol = vol / np.sqrt(SESSION_MINUTES)
+            start = self.previous_close(ticker, day) * float(np.exp(rng.normal(0, vol / 3)))
+            closes = start * np.exp(np.cumsum(rng.normal(0, minute_vol, SESSION_MINUTES)))
+            opens = np.concatenate([[start], closes[:-1]])
+            wick = np.abs(rng.normal(0, minute_vol, SESSION_MINUTES)) * closes
+            index = pd.date_range(datetime.combine(day, datetime.min.time()).replace(hour=SESSION_OPEN[0]),
+                                  periods=SESSION_MINUTES, freq='1min')
+            return pd.DataFrame({
+                'Open': opens, 'High': np.maximum(opens, closes) + wick, 'Low': np.minimum(opens, closes) - wick,
+                'Close': closes, 'Volume': rng.integers(100, 20000, SESSION_MINUTES)
+            }, index=index)
+
+        bars = self._cached(('intraday', ticker, day), build).iloc[:self._session_minutes(day, now)]
+        if interval_minutes > 1 and not bars.empty:
+            bars = bars.resample(f"{interval_minutes}min").agg(
+                {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+            ).dropna()
+        return bars
+
+    def snapshot(self, ticker: str, now: Optional[datetime] = None) -> Optional[Dict]:
+        """Resumo do pregão corrente (ou do último, antes da abertura)."""
+        if ticker in self._recorded_spot:
+            return dict(self._recorded_spot[ticker])
+        now = (now or datetime.now()).replace(second=0, microsecond=0)
+
+        def build():
+            bars = self.intraday_bars(ticker, now.date(), now=now)
+            if bars.empty:
+                bars = self.intraday_bars(ticker, (pd.Timestamp(now.date()) - pd.offsets.BDay(1)).date(), now=now)
+            if bars.empty:
+                return None
+            return {
+                'open': float(bars['Open'].iloc[0]), 'high': float(bars['High'].max()),
+                'low': float(bars['Low'].min()), 'last': float(bars['Close'].iloc[-1]),
+                'volume': int(bars['Volume'].sum()), 'source': 'simulated'
+            }
+
+        snapshot = self._cached(('snapshot', ticker, now), build)  # Muda a cada minuto, como os candles
+        return dict(snapshot) if snapshot else None
+
+    # ------------------------------------------------------------------ opções e futuros
+
+    def option_chain(self, underlying: str, max_dte: Optional[int] = None, now: Optional[datetime] = None) -> pd.DataFrame:
+        """Cadeia com vencimentos semanais do calendário B3 (até 5) e strikes a ±20% do spot."""
+        if underlying in self._recorded_chains:
+            return self._recorded_chains[underlying].copy()
+        now = now or datetime.now()
+        snapshot = self.snapshot(underlying, now)
+        if snapshot is None:
+            return pd.DataFrame(columns=OPTIONS_COLUMNS)
+        spot = snapshot['last']
+        today = pd.Timestamp(now.date())
+        horizon = today + timedelta(days=max_dte if max_dte is not None else 60)
+        expiries = [pd.Timestamp(e) for e in get_b3_calendar().option_expiries(
+            (today + timedelta(days=1)).date(), horizon.date(), weekly=True)][:5]
+        step = max(round(spot * 0.025, 2), 0.01)
+        strikes = np.round(spot + step * np.arange(-8, 9), 2)
+        rng = self._rng('oi', underlying, now.date().isoformat())
+        rows = []
+        for expiry in expiries:
+            T = (expiry - today).days / 365
+            for strike in strikes:
+                iv = 0.30 + 0.4 * (strike / spot - 1) ** 2
+                for option_type in ('C', 'P'):
+                    mid = BlackScholes.price(spot, strike, T, RISK_FREE_RATE, iv, option_type)
+                    half_spread = max(mid * 0.01, 0.01)
+                    rows.append({
+                        'date': today, 'underlying': underlying, 'expiry': expiry, 'strike': float(strike),
+                        'option_type': option_type, 'bid': max(mid - half_spread, 0.0), 'ask': mid + half_spread,
+                        'mid': mid, 'implied_vol': iv, 'open_interest': int(rng.integers(0, 5000))
+                    })
+        return pd.DataFrame(rows, columns=OPTIONS_COLUMNS)
+
+    def futures_bars(self, symbol: str, start: Optional[datetime] = None, now: Optional[datetime] = None) -> pd.DataFrame:
+        """Candles de 1m do pregão para o contrato (desde start, se informado)."""
+        now = now or datetime.now()
+        day = now.date()
+        key = f"FUT:{symbol}"
+        if key not in self._recorded_spot and key not in self._cache:
+            self._profile_override(key, FUTURES_BASE_PRICES.get(symbol, 1000.0))
+        bars = self.intraday_bars(key, day, now=now)
+        if bars.empty:
+            bars = self.intraday_bars(key, (pd.Timestamp(day) - pd.offsets.BDay(1)).date(), now=now)
+        if start is not None and not bars.empty:
+            bars = bars[bars.index >= pd.Timestamp(start).tz_localize(None)]
+        return bars[BAR_COLUMNS]
+
+    def _profile_override(self, key: str, base: float):
+        """Histórico diário de um contrato de futuro em torno do preço base."""
+        def build():
+            days = pd.bdate_range(end=pd.Timestamp(date.today()), periods=30)
+            closes = base * np.exp(np.cumsum(self._rng('daily', key).normal(0, 0.01, len(days))))
+            return pd.DataFrame({'date': days, 'ticker': key, 'open': closes, 'high': closes,
+                                 'low': closes, 'close': closes, 'volume': 0})
+        self._cached(('daily', key), build)
+
+    # ------------------------------------------------------------------ dados gravados
+
+    def load_recorded(self, orders_repo, day: Optional[str] = None) -> int:
+        """
+        Ancora último preço e cadeias nas capturas gravadas (market_data_captures do dia).
+        Retorna quantos tickers foram carregados.
+        """
+        day = day or _b3_today()
+        captures = orders_repo.get_market_data_captures(start_date=day, end_date=f"{day}T23:59:59")
+        if captures is None or captures.empty:
+            return 0
+        for _, capture in captures.sort_values('created_at').iterrows():
+            price = capture.get('last_price')
+            if not price or pd.isna(price):
+                continue
+            ticker = capture['ticker']
+            self._recorded_spot[ticker] = {
+                'open': float(capture.get('open_price') or price), 'high': float(capture.get('high_price') or price),
+                'low': float(capture.get('low_price') or price), 'last': float(price),
+                'volume': int(capture.get('volume') or 0), 'source': 'recorded'
+            }
+            options = capture.get('options_data')
+            if isinstance(options, list) and options:
+                self._recorded_chains[ticker] = pd.DataFrame(options).reindex(columns=OPTIONS_COLUMNS)
+        for ticker in self._recorded_spot:
+            if ticker not in self.tickers:
+                self.tickers.append(ticker)
+        return len(self._recorded_spot)
+
+
+def _b3_today() -> str:
+    """Data corrente em B3 (as capturas gravam timestamp no fuso de São Paulo)."""
+    return get_b3_timestamp()[:10]
+
+
+_MARKETS: Dict[Tuple, SyntheticMarket] = {}
+_MARKETS_LOCK = threading.Lock()
+
+
+def get_simulated_market(config: Optional[Dict] = None) -> SyntheticMarket:
+    """SyntheticMarket compartilhado do processo por (seed, n_tickers)."""
+    config = config or {}
+    key = (config.get('seed', 42), tuple(config.get('tickers') or ()), config.get('n_tickers', 300))
+    with _MARKETS_LOCK:
+        if key not in _MARKETS:
+            _MARKETS[key] = SyntheticMarket(config.get('tickers') or default_tickers(key[2]), seed=key[0])
+        return _MARKETS[key]
+
+
+class SimulatedMarketDataAPI(MarketDataAPI):
+    """MarketDataAPI em processo sobre um SyntheticMarket, com falhas injetadas."""
+
+    def __init__(self, market: Optional[SyntheticMarket] = None, faults: Optional[FaultProfile] = None,
+                 config: Optional[Dict] = None):
+        self.market = market or get_simulated_market(config)
+        self.faults = faults or FaultProfile.from_config(config)
+
+    def fetch_spot_data(self, tickers: List[str], start_date: str, end_date: str) -> pd.DataFrame:
+        self.faults.check()
+        frames = [bars[(bars['date'] >= start_date) & (bars['date'] <= end_date)]
+                  for bars in (self.market.daily_bars(t) for t in tickers)]
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame(columns=SPOT_COLUMNS)
+        return pd.concat(frames, ignore_index=True).sort_values(['date', 'ticker'])
+
+    def fetch_futures_data(self, contracts: List[str], start_date: str, end_date: str) -> pd.DataFrame:
+        return pd.DataFrame(columns=['date', 'contract', 'expiry', 'open', 'high', 'low', 'close', 'volume'])
+
+    def fetch_options_chain(self, underlying: str, start_date: str, end_date: str,
+                            max_dte: Optional[int] = None) -> pd.DataFrame:
+        self.faults.check()
+        return self.market.option_chain(underlying, max_dte=max_dte)
+
+    def fetch_quotes(self, tickers: List[str]) -> Dict[str, float]:
+        self.faults.check()
+        quotes = {}
+        for ticker in tickers:
+            snapshot = self.market.snapshot(ticker)
+            if snapshot:
+                quotes[ticker] = snapshot['last']
+        return quotes
+
+    def fetch_intraday_snapshot(self, ticker: str, market_open: bool = True) -> Optional[Dict]:
+        self.faults.check()
+        return self.market.snapshot(ticker)
+
+
+class SimulatedFuturesAPI(FuturesDataAPI):
+    """FuturesDataAPI com candles do SyntheticMarket (mesmos buffers e atualização incremental)."""
+
+    def __init__(self, market: Optional[SyntheticMarket] = None, faults: Optional[FaultProfile] = None,
+                 config: Optional[Dict] = None, refresh_seconds: float = 20.0):
+        super().__init__(refresh_seconds=refresh_seconds)
+        self.market = market or get_simulated_market(config)
+        self.faults = faults or FaultProfile.from_config(config)
+
+    def get_futures_data(self, symbol: str, period: str = '1d', interval: str = '1m') -> Optional[pd.DataFrame]:
+        bars = self._download_bars([symbol]).get(symbol)
+        return bars if bars is not None and not bars.empty else None
+
+    def _download_bars(self, symbols: List[str], start: Optional[datetime] = None) -> Dict[str, pd.DataFrame]:
+        self.faults.check()
+        bars = {symbol: self.market.futures_bars(symbol, start=start) for symbol in symbols}
+        return {symbol: frame for symbol, frame in bars.items() if not frame.empty}
+
+
+# ---------------------------------------------------------------------- servidor HTTP
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive: exercita o pool de conexões dos clientes
+    server: 'ThreadingHTTPServer'
+
+    def log_message(self, format, *args):
+        logger.debug("stand-in: " + format % args)
+
+    def _send(self, status: int, payload: Any = None, headers: Optional[Dict[str, str]] = None):
+        body = b'' if payload is None else json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str):
+        stand_in: 'MarketDataStandInServer' = self.server.stand_in
+        parsed = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        body = {}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                body = {}
+        try:
+            stand_in.faults.check()
+            status, payload = stand_in.route(method, unquote(parsed.path), query, body)
+        except SimulatedProviderError as e:
+            headers = {'Retry-After': '1'} if e.status == 429 else None
+            self._send(e.status, {'error': str(e)}, headers)
+            return
+        except Exception as e:
+            logger.error(f"Erro no stand-in ({parsed.path}): {e}")
+            self._send(500, {'error': str(e)})
+            return
+        self._send(status, payload)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class MarketDataStandInServer:
+    """Servidor HTTP local com endpoints compatíveis com brapi, Telegram e Discord."""
+
+    def __init__(self, market: Optional[SyntheticMarket] = None, faults: Optional[FaultProfile] = None,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.market = market or get_simulated_market()
+        self.faults = faults or FaultProfile()
+        self.sent_messages: List[Dict] = []
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _StandInHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stand_in = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def brapi_url(self) -> str:
+        return f"{self.base_url}/api"
+
+    @property
+    def discord_webhook_url(self) -> str:
+        return f"{self.base_url}/discord/webhook"
+
+    def start(self) -> 'MarketDataStandInServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='market-data-stand-in', daemon=True)
+        self._thread.start()
+        logger.info(f"Servidor de mercado simulado em {self.base_url} ({len(self.market.tickers)} tickers)")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    # ------------------------------------------------------------------ rotas
+
+    def route(self, method: str, path: str, query: Dict[str, str], body: Dict) -> Tuple[int, Any]:
+        parts = [p for p in path.split('/') if p]
+        if len(parts) >= 3 and parts[0] == 'api' and parts[1] == 'quote':
+            return 200, {'results': [self._quote(t, query) for t in parts[2].split(',') if t]}
+        if len(parts) >= 3 and parts[0] == 'api' and parts[1] == 'options':
+            max_dte = int(query['max_dte']) if query.get('max_dte') else None
+            chain = self.market.option_chain(parts[2], max_dte=max_dte)
+            return 200, {'results': chain.to_dict('records')}
+        if len(parts) >= 3 and parts[0] == 'api' and parts[1] == 'futures':
+            results = {}
+            for symbol in parts[2].split(','):
+                bars = self.market.futures_bars(symbol)
+                results[symbol] = [{'timestamp': ts.isoformat(), **row} for ts, row in
+                                   zip(bars.index, bars.to_dict('records'))]
+            return 200, {'results': results}
+        if len(parts) == 2 and parts[0].startswith('bot'):
+            return self._telegram(parts[1], query, body)
+        if parts[:2] == ['discord', 'webhook'] and method == 'POST':
+            self._record_message('discord', body)
+            return 204, None
+        return 404, {'error': f"Rota desconhecida: {path}"}
+
+    def _quote(self, symbol: str, query: Dict[str, str]) -> Dict:
+        ticker = symbol if symbol.endswith('.SA') or symbol in self.market.tickers else f"{symbol}.SA"
+        snapshot = self.market.snapshot(ticker) or {}
+        result = {
+            'symbol': symbol,
+            'regularMarketPrice': snapshot.get('last'),
+            'regularMarketOpen': snapshot.get('open'),
+            'regularMarketDayHigh': snapshot.get('high'),
+            'regularMarketDayLow': snapshot.get('low'),
+            'regularMarketVolume': snapshot.get('volume'),
+        }
+        if query.get('range'):
+            bars = self.market.daily_bars(ticker)
+            result['historicalDataPrice'] = [
+                {'date': int(row['date'].timestamp() * 1000), 'open': row['open'], 'high': row['high'],
+                 'low': row['low'], 'close': row['close'], 'volume': int(row['volume'])}
+                for row in bars.to_dict('records')
+            ]
+        return result
+
+    def _record_message(self, channel: str, payload: Dict) -> int:
+        with self._lock:
+            self._message_id += 1
+            self.sent_messages.append({'channel': channel, 'message_id': self._message_id, **payload})
+            return self._message_id
+
+    def _telegram(self, method_name: str, query: Dict[str, str], body: Dict) -> Tuple[int, Any]:
+        if method_name == 'getUpdates':
+            return 200, {'ok': True, 'result': []}
+        if method_name in ('sendMessage', 'editMessageText'):
+            message_id = self._record_message('telegram', {'method': method_name, **body})
+            return 200, {'ok': True, 'result': {'message_id': message_id, 'text': body.get('text')}}
+        if method_name == 'answerCallbackQuery':
+            return 200, {'ok': True, 'result': True}
+        return 404, {'ok': False, 'description': f"Método desconhecido: {method_name}"}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor local de dados de mercado simulados")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tickers', type=int, default=300, help='Quantidade de tickers sintéticos')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Requisições/s (0 = sem limite)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    market = SyntheticMarket(default_tickers(args.tickers), seed=args.seed)
+    faults = FaultProfile(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit, seed=args.seed)
+    server = MarketDataStandInServer(market, faults, args.host, args.port)
+    print(f"Brapi:    {server.brapi_url}")
+    print(f"Telegram: TELEGRAM_API_BASE={server.base_url}")
+    print(f"Discord:  {server.discord_webhook_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,33 +3,39 @@ Serviço de Monitoramento Contínuo - Escaneia mercado em tempo real.
 """
 
 import time
-import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import logging
 import pandas as pd
-import yfinance as yf
 
 try:
     from .market_monitor import MarketMonitor
     from .data_loader import DataLoader
-    from .market_data_api import create_market_data_api
     from .crypto_api import create_crypto_api
     from .agents import TraderAgent, RiskAgent, PortfolioManager
     from .utils import StructuredLogger
-    from .notifications import UnifiedNotifier
-    from .orders_repository import OrdersRepository
-    from .trading_schedule import TradingSchedule
+    from .mark_to_market import MarkToMarketEngine, set_active_engine
+    from .exit_monitor import ExitMonitor
+    from .scan_scheduler import JobScheduler, TickerPrioritizer
+    from .data_retention import DataRetentionManager
+    from .services import get_services
+    from .http_client import http_client_stats
+    from .scan_pipeline import ScanPipeline
+    from .strategy_workers import StrategyWorkerPool
 except ImportError:
     from market_monitor import MarketMonitor
     from data_loader import DataLoader
-    from market_data_api import create_market_data_api
     from crypto_api import create_crypto_api
     from agents import TraderAgent, RiskAgent, PortfolioManager
     from utils import StructuredLogger
-    from notifications import UnifiedNotifier
-    from orders_repository import OrdersRepository
-    from trading_schedule import TradingSchedule
+    from mark_to_market import MarkToMarketEngine, set_active_engine
+    from exit_monitor import ExitMonitor
+    from scan_scheduler import JobScheduler, TickerPrioritizer
+    from data_retention import DataRetentionManager
+    from services import get_services
+    from http_client import http_client_stats
+    from scan_pipeline import ScanPipeline
+    from strategy_workers import StrategyWorkerPool
 
 logger = logging.getLogger(__name__)
 
@@ -37,19 +43,28 @@ logger = logging.getLogger(__name__)
 class MonitoringService:
     """Serviço que monitora mercado continuamente."""
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, services=None):
         self.config = config
-        self.logger = StructuredLogger(log_dir='logs')
-        self.orders_repo = OrdersRepository()  # Repositório para salvar ordens
+        self.services = services or get_services(config)  # Repositório, notificador e APIs do processo
+        self.logger = StructuredLogger(log_dir='logs', config=config)
+        self.orders_repo = self.services.orders_repo  # Repositório para salvar ordens
         self.market_monitor = MarketMonitor(config)
         self.portfolio_manager = PortfolioManager(config.get('nav', 1000000))
         self.trader_agent = TraderAgent(config, self.logger, orders_repo=self.orders_repo)
         self.risk_agent = RiskAgent(self.portfolio_manager, config, self.logger, orders_repo=self.orders_repo)
         self.data_loader = DataLoader()
-        self.notifier = UnifiedNotifier(config, orders_repo=self.orders_repo)  # Sistema unificado de notificações
-        self.trading_schedule = TradingSchedule()  # Horário de funcionamento B3
+        self.notifier = self.services.notifier  # Sistema unificado de notificações
+        self.trading_schedule = self.services.trading_schedule  # Horário de funcionamento B3
+        self.mtm_engine = MarkToMarketEngine(config, orders_repo=self.orders_repo)  # P&L intradiário em memória
+        self.mtm_engine.load_from_repository()
+        set_active_engine(self.mtm_engine)
         self.is_running = False
         self.thread = None
+        self.schedule_config = config.get('schedule', {})
+        self.scheduler = JobScheduler()  # Jobs de scan, status, EOD e reset diário
+        self.ticker_prioritizer = TickerPrioritizer(config)  # Ativos quentes com refresh mais frequente
+        self.retention = DataRetentionManager(config)  # Arquivamento/vacuum do banco fora do pregão
+        self.interval_seconds = 300
         self.last_scan_time = None
         self.opportunities_found = []
         self.proposals_generated = []
@@ -60,15 +75,17 @@ class MonitoringService:
         self.last_eod_check = None  # Última verificação de EOD
         
         # APIs
-        self.stock_api = create_market_data_api('yfinance')
+        # Spot, cotações, opções e futuros passam pelo gateway (ranking, hedge e failover entre provedores)
+        self.market_data_gateway = self.services.market_data_gateway
+        self.stock_api = self.market_data_gateway  # Interface MarketDataAPI (ExitMonitor, cadeias de opções)
         
-        # API de Futuros
+        # API de Futuros (buffers de candles de 1m) e estratégia persistente entre scans
         try:
-            from .futures_data_api import create_futures_api
-            self.futures_api = create_futures_api()
+            from .futures_strategy import FuturesDayTradeStrategy
         except ImportError:
-            from futures_data_api import create_futures_api
-            self.futures_api = create_futures_api()
+            from futures_strategy import FuturesDayTradeStrategy
+        self.futures_api = self.services.futures_api
+        self.futures_strategy = FuturesDayTradeStrategy(config, futures_api=self.futures_api)
         
         if config.get('enable_crypto', False):
             try:
@@ -83,6 +100,24 @@ class MonitoringService:
                 logger.warning("Crypto API não disponível")
         else:
             self.crypto_api = None
+        
+        # Monitor de TP/SL/time stop entre scans (só símbolos com posição aberta)
+        if config.get('exit_monitor', {}).get('enabled', True):
+            self.exit_monitor = ExitMonitor(
+                config, self.mtm_engine, self.stock_api,
+                orders_repo=self.orders_repo, notifier=self.notifier
+            )
+        else:
+            self.exit_monitor = None
+        
+        # Estratégias por ativo em processos separados, um shard por ativo-objeto (padrão: no processo do scan)
+        workers_config = config.get('strategy_workers', {})
+        self.strategy_pool = (StrategyWorkerPool(config, self.trader_agent, workers_config)
+                              if workers_config.get('enabled', False) else None)
+        
+        # Scan em estágios com filas limitadas (scan_pipeline.enabled=false: etapas sequenciais)
+        pipeline_config = config.get('scan_pipeline', {})
+        self.scan_pipeline = ScanPipeline(self, pipeline_config) if pipeline_config.get('enabled', True) else None
     
     def _send_start_notification(self):
         """Envia notificação de início das atividades."""
@@ -160,7 +195,9 @@ O agente está agora monitorando o mercado e gerando propostas de daytrade.
         
         if self.orders_repo:
             try:
-                captures_df = self.orders_repo.get_market_data_captures(limit=1000)
+                captures_df = self.orders_repo.get_market_data_captures(
+                    limit=1000, columns=['created_at'], decode_json=False
+                )
                 if not captures_df.empty:
                     today = b3_time.strftime('%Y-%m-%d')
                     captures_today = captures_df[captures_df['created_at'].str.startswith(today)]
@@ -237,7 +274,7 @@ O agente está agora monitorando o mercado e gerando propostas de daytrade.
             logger.info("🔍 Iniciando análise automática pós-EOD...")
             from .eod_analysis import EODAnalyzer
             
-            analyzer = EODAnalyzer(self.config)
+            analyzer = EODAnalyzer(self.config, services=self.services)
             analysis = analyzer.analyze_daily_proposals(date_str)
             
             # Formatar e enviar relatório por Telegram
@@ -309,7 +346,9 @@ O agente está agora monitorando o mercado e gerando propostas de daytrade.
                 # Buscar estatísticas de captura de dados do dia
                 captures_today = self.orders_repo.get_market_data_captures(
                     start_date=f"{b3_time.strftime('%Y-%m-%d')} 00:00:00",
-                    end_date=b3_time.isoformat()
+                    end_date=b3_time.isoformat(),
+                    columns=['ticker', 'data_type'],
+                    decode_json=False
                 )
                 
                 if not captures_today.empty:
@@ -354,8 +393,23 @@ O agente está agora monitorando o mercado e gerando propostas de daytrade.
         self.notifier.send(message, title="📊 Status do Agente", priority='normal', message_type='status')
         self.last_status_notification = b3_time
     
-    def scan_market(self) -> Dict:
-        """Escaneia mercado uma vez."""
+    def _check_kill_switch(self):
+        """Ativa kill switch se a perda do dia (MTM) ultrapassar o limite configurado."""
+        threshold = self.config.get('kill_switch_threshold', 0.15)
+        if self.risk_agent.kill_switch_active or threshold <= 0:
+            return
+        loss = self.mtm_engine.get_pnl_loss_fraction()
+        if loss >= threshold:
+            logger.critical(f"🛑 Perda intradiária {loss:.2%} atingiu limite {threshold:.2%} - ativando kill switch")
+            self.risk_agent.kill_switch(nav_loss=loss)
+    
+    def scan_market(self, tickers: Optional[List[str]] = None) -> Dict:
+        """
+        Escaneia mercado uma vez.
+        
+        Args:
+            tickers: Subconjunto de tickers a escanear (padrão: todos os monitorados)
+        """
         opportunities = []
         proposals = []
         
@@ -377,14 +431,14 @@ O agente está agora monitorando o mercado e gerando propostas de daytrade.
                 'proposals': 0
             }
         
-        # Validação: não permitir propostas após 15:00 (para garantir fechamento EOD)
-        current_hour = b3_time.hour
-        if current_hour >= 15:
-            logger.info(f"Horário limite atingido ({b3_time.strftime('%H:%M')}) - Não gerando novas propostas (fechamento EOD às 17:00)")
+        # Validação: não permitir propostas após o horário limite (para garantir fechamento EOD)
+        cutoff = self.schedule_config.get('new_proposals_cutoff', '15:00')
+        if b3_time.strftime('%H:%M') >= cutoff:
+            logger.info(f"Horário limite atingido ({b3_time.strftime('%H:%M')}) - Não gerando novas propostas (fechamento EOD às {self.schedule_config.get('eod_close_time', '17:00')})")
             return {
                 'timestamp': b3_time.isoformat(),
                 'status': 'LIMIT_HOUR',
-                'message': 'Horário limite para novas propostas (15:00)',
+                'message': f'Horário limite para novas propostas ({cutoff})',
                 'data_captured': 0,
                 'proposals': 0,
                 'opportunities': 0
@@ -404,15 +458,11 @@ O agente está agora monitorando o mercado e gerando propostas de daytrade.
         # Só gerar propostas durante horário de trading
         should_generate_proposals = trading_status in ['PRE_MARKET', 'TRADING', 'POST_MARKET']
         
-        # Enviar notificação de status a cada 2 horas (apenas durante trading)
-        if trading_status == 'TRADING' and (self.last_status_notification is None or \
-           (b3_time - self.last_status_notification).total_seconds() >= 7200):  # 2 horas
-            self._send_status_notification()
-        
+        successful_tickers = 0
         try:
             # Buscar dados de ações (INTRADAY do dia atual)
             # Filtrar apenas tickers brasileiros (.SA)
-            all_tickers = self.config.get('monitored_tickers', [])
+            all_tickers = tickers if tickers is not None else self.config.get('monitored_tickers', [])
             tickers = [t for t in all_tickers if '.SA' in str(t)]
             
             # Coleta de futuros será feita dentro do loop de dados
@@ -425,478 +475,15 @@ O agente está agora monitorando o mercado e gerando propostas de daytrade.
                     'proposals': 0
                 }
             
-            # Buscar dados INTRADAY do dia atual (não histórico!)
-            today = datetime.now().strftime('%Y-%m-%d')
-            market_data = {'spot': {}, 'options': {}, 'futures': {}}
-            
-            # 1. COLETAR DADOS DE FUTUROS PRIMEIRO
-            futures = self.config.get('monitored_futures', [])
-            if futures and hasattr(self, 'futures_api'):
-                logger.info(f"Coletando dados de {len(futures)} contratos futuros...")
-                try:
-                    futures_data = self.futures_api.get_all_futures_data(futures)
-                    if futures_data:
-                        market_data['futures'] = futures_data
-                        logger.info(f"Dados coletados para {len(futures_data)} futuros: {list(futures_data.keys())}")
-                except Exception as e:
-                    logger.warning(f"Erro ao coletar dados de futuros: {e}")
-            
-            # 1. COLETAR DADOS DE FUTUROS
-            futures = self.config.get('monitored_futures', [])
-            if futures and hasattr(self, 'futures_api'):
-                logger.info(f"Coletando dados de {len(futures)} contratos futuros...")
-                try:
-                    futures_data = self.futures_api.get_all_futures_data(futures)
-                    if futures_data:
-                        market_data['futures'] = futures_data
-                        logger.info(f"Dados coletados para {len(futures_data)} futuros: {list(futures_data.keys())}")
-                except Exception as e:
-                    logger.warning(f"Erro ao coletar dados de futuros: {e}")
-            
-            logger.info(f"Buscando dados intraday para {len(tickers)} tickers...")
-            
-            # Importar yfinance uma vez
-            try:
-                import yfinance as yf
-            except ImportError:
-                logger.error("yfinance não instalado! Execute: pip install yfinance")
-                raise
-            
-            # Buscar dados spot INTRADAY para cada ticker
-            # Processar todos os tickers configurados (agora 62 ativos)
-            tickers_to_process = tickers  # Processar todos os tickers brasileiros
-            successful_tickers = 0
-            failed_tickers = []
-            
-            logger.info(f"Processando {len(tickers_to_process)} tickers...")
-            
-            for ticker in tickers_to_process:
-                try:
-                    ticker_yf = ticker
-                    
-                    # Para ações brasileiras (.SA), usar info() para dados em tempo real
-                    # Para outras ações, tentar intraday primeiro
-                    is_brazilian = '.SA' in ticker
-                    
-                    current_price = None
-                    open_price = None
-                    high_price = None
-                    low_price = None
-                    volume_today = 0
-                    
-                    if is_brazilian:
-                        # Para ações brasileiras, buscar dados INTRADAY do dia atual
-                        stock = yf.Ticker(ticker_yf)
-                        hist_intraday = None
-                        today = datetime.now().date()
-                        is_market_open = trading_status in ['PRE_MARKET', 'TRADING', 'POST_MARKET']
-                        
-                        # Tentar buscar dados intraday do dia atual (5m, 15m, 1h)
-                        for interval in ['5m', '15m', '1h']:
-                            try:
-                                hist_intraday = stock.history(period='1d', interval=interval, timeout=10)
-                                if hist_intraday is not None and not hist_intraday.empty:
-                                    # Converter índice para datetime se necessário
-                                    hist_intraday.index = pd.to_datetime(hist_intraday.index)
-                                    
-                                    # Filtrar apenas dados de HOJE
-                                    hist_today = hist_intraday[hist_intraday.index.date == today]
-                                    
-                                    if not hist_today.empty:
-                                        # Usar último candle disponível de HOJE (mais recente)
-                                        latest = hist_today.iloc[-1]
-                                        current_price = float(latest['Close'])
-                                        open_price = float(hist_today.iloc[0]['Open'])
-                                        high_price = float(hist_today['High'].max())
-                                        low_price = float(hist_today['Low'].min())
-                                        volume_today = int(hist_today['Volume'].sum())
-                                        logger.info(f"{ticker}: ✅ Dados intraday de HOJE capturados ({interval}, {len(hist_today)} candles) - Preço: {current_price:.2f}")
-                                        break
-                                    elif is_market_open:
-                                        # Se mercado está aberto mas não há dados de hoje, pode ser delay da API
-                                        # Usar último candle disponível (pode ser do início do pregão)
-                                        latest = hist_intraday.iloc[-1]
-                                        candle_date = hist_intraday.index[-1].date()
-                                        current_price = float(latest['Close'])
-                                        open_price = float(hist_intraday.iloc[0]['Open'])
-                                        high_price = float(hist_intraday['High'].max())
-                                        low_price = float(hist_intraday['Low'].min())
-                                        volume_today = int(hist_intraday['Volume'].sum())
-                                        logger.warning(f"{ticker}: ⚠️ Mercado aberto mas último candle é de {candle_date} (pode ser delay da API) - Preço: {current_price:.2f}")
-                                        break
-                            except Exception as e:
-                                logger.debug(f"Erro ao buscar intraday {interval} para {ticker}: {e}")
-                                continue
-                        
-                        # Se não conseguiu intraday, tentar info() para dados em tempo real
-                        if current_price is None:
-                            try:
-                                info = stock.info
-                                # Pegar preço atual do info (mais atualizado)
-                                current_price = info.get('regularMarketPrice') or info.get('currentPrice')
-                                if current_price:
-                                    open_price = info.get('open') or info.get('regularMarketOpen') or current_price
-                                    high_price = info.get('dayHigh') or info.get('regularMarketDayHigh') or current_price
-                                    low_price = info.get('dayLow') or info.get('regularMarketDayLow') or current_price
-                                    volume_today = info.get('volume') or info.get('regularMarketVolume') or 0
-                                    logger.info(f"{ticker}: ✅ Dados obtidos via info() - Preço atual: {current_price:.2f}")
-                            except Exception as e:
-                                logger.debug(f"Erro ao buscar info para {ticker}: {e}")
-                                # Último fallback: dados diários (apenas se mercado fechado)
-                                if not is_market_open:
-                                    try:
-                                        hist_daily = stock.history(period='2d', interval='1d', timeout=10)
-                                        if hist_daily is not None and not hist_daily.empty:
-                                            latest = hist_daily.iloc[-1]
-                                            current_price = float(latest['Close'])
-                                            open_price = float(hist_daily.iloc[0]['Open']) if len(hist_daily) > 1 else float(latest['Open'])
-                                            high_price = float(latest['High'])
-                                            low_price = float(latest['Low'])
-                                            volume_today = int(hist_daily['Volume'].sum()) if 'Volume' in hist_daily.columns else 0
-                                            logger.info(f"{ticker}: ℹ️ Mercado fechado - usando último preço de fechamento: {current_price:.2f}")
-                                    except:
-                                        pass
-                                else:
-                                    logger.warning(f"{ticker}: ⚠️ Mercado aberto mas não foi possível obter dados atualizados")
-                    else:
-                        # Para ações não-brasileiras, buscar dados INTRADAY do dia atual
-                        stock = yf.Ticker(ticker_yf)
-                        hist_intraday = None
-                        today = datetime.now().date()
-                        is_market_open = trading_status in ['PRE_MARKET', 'TRADING', 'POST_MARKET']
-                        
-                        # Tentar buscar dados intraday do dia atual (5m, 15m, 1h)
-                        for interval in ['5m', '15m', '1h']:
-                            try:
-                                hist_intraday = stock.history(period='1d', interval=interval, timeout=10)
-                                if hist_intraday is not None and not hist_intraday.empty:
-                                    # Converter índice para datetime se necessário
-                                    hist_intraday.index = pd.to_datetime(hist_intraday.index)
-                                    
-                                    # Filtrar apenas dados de HOJE
-                                    hist_today = hist_intraday[hist_intraday.index.date == today]
-                                    
-                                    if not hist_today.empty:
-                                        # Usar último candle disponível de HOJE (mais recente)
-                                        latest = hist_today.iloc[-1]
-                                        current_price = float(latest['Close'])
-                                        open_price = float(hist_today.iloc[0]['Open'])
-                                        high_price = float(hist_today['High'].max())
-                                        low_price = float(hist_today['Low'].min())
-                                        volume_today = int(hist_today['Volume'].sum())
-                                        logger.info(f"{ticker}: ✅ Dados intraday de HOJE capturados ({interval}, {len(hist_today)} candles) - Preço: {current_price:.2f}")
-                                        break
-                                    elif is_market_open:
-                                        # Se mercado está aberto mas não há dados de hoje, pode ser delay da API
-                                        latest = hist_intraday.iloc[-1]
-                                        candle_date = hist_intraday.index[-1].date()
-                                        current_price = float(latest['Close'])
-                                        open_price = float(hist_intraday.iloc[0]['Open'])
-                                        high_price = float(hist_intraday['High'].max())
-                                        low_price = float(hist_intraday['Low'].min())
-                                        volume_today = int(hist_intraday['Volume'].sum())
-                                        logger.warning(f"{ticker}: ⚠️ Mercado aberto mas último candle é de {candle_date} (pode ser delay da API) - Preço: {current_price:.2f}")
-                                        break
-                            except Exception as e:
-                                logger.debug(f"Erro ao buscar intraday {interval} para {ticker}: {e}")
-                                continue
-                        
-                        # Se não conseguiu intraday de hoje, tentar dados diários como fallback
-                        if current_price is None:
-                            if not is_market_open:
-                                # Se mercado fechado, usar dados diários é aceitável
-                                try:
-                                    hist_daily = stock.history(period='2d', interval='1d', timeout=10)
-                                    if hist_daily is not None and not hist_daily.empty:
-                                        latest = hist_daily.iloc[-1]
-                                        current_price = float(latest['Close'])
-                                        open_price = float(hist_daily.iloc[0]['Open']) if len(hist_daily) > 1 else float(latest['Open'])
-                                        high_price = float(latest['High'])
-                                        low_price = float(latest['Low'])
-                                        volume_today = int(hist_daily['Volume'].sum()) if 'Volume' in hist_daily.columns else 0
-                                        logger.info(f"{ticker}: ℹ️ Mercado fechado - usando último preço de fechamento: {current_price:.2f}")
-                                except Exception as e:
-                                    logger.debug(f"Erro ao buscar dados diários para {ticker}: {e}")
-                            else:
-                                logger.warning(f"{ticker}: ⚠️ Mercado aberto mas não foi possível obter dados atualizados")
-                        
-                        if current_price is None:
-                            logger.warning(f"Nenhum dado encontrado para {ticker}")
-                            failed_tickers.append(ticker)
-                            continue
-                    
-                    if current_price is None:
-                        logger.warning(f"Não foi possível obter preço atual para {ticker}")
-                        failed_tickers.append(ticker)
-                        continue
-                    
-                    market_data['spot'][ticker] = {
-                        'open': open_price,
-                        'close': current_price,
-                        'last': current_price,  # Preço atual
-                        'high': high_price,
-                        'low': low_price,
-                        'volume': volume_today,
-                        'adv': 0  # Será calculado depois se necessário
-                    }
-                    
-                    logger.debug(f"{ticker}: Preço atual={current_price:.2f}, Abertura={open_price:.2f}, Volume={volume_today:,}")
-                    
-                    successful_tickers += 1
-                    
-                    # Buscar opções para este ticker (coletar para TODOS os 62 ativos)
-                    # Throttle para não sobrecarregar API (0.1s entre requisições)
-                    try:
-                        import time
-                        time.sleep(0.1)  # Pequeno delay para não sobrecarregar API
-                        
-                        options_df = self.stock_api.fetch_options_chain(ticker, today, today)
-                        if not options_df.empty:
-                            if ticker not in market_data['options']:
-                                market_data['options'][ticker] = []
-                            # Converter DataFrame para lista de dicts
-                            options_list = options_df.to_dict('records')
-                            market_data['options'][ticker].extend(options_list)
-                            logger.debug(f"Opções encontradas para {ticker}: {len(options_list)} contratos")
-                        else:
-                            logger.debug(f"Nenhuma opção disponível para {ticker} (pode ser normal)")
-                    except Exception as opt_err:
-                        logger.debug(f"Erro ao buscar opções para {ticker}: {opt_err}")
-                        # Continuar mesmo sem opções - pode ter propostas baseadas apenas em momentum
-                    
-                except Exception as e:
-                    logger.warning(f"Erro ao buscar dados para {ticker}: {e}")
-                    failed_tickers.append(ticker)
-                    import traceback
-                    logger.debug(traceback.format_exc())
-                    continue
-            
-            # Log resumo
-            if failed_tickers:
-                logger.warning(f"Tickers com falha ({len(failed_tickers)}): {failed_tickers[:5]}")
-            
-            logger.info(f"Dados coletados: {successful_tickers}/{len(tickers_to_process)} tickers com dados spot")
-            logger.info(f"Opções disponíveis para: {len(market_data.get('options', {}))} tickers")
-            if market_data.get('futures'):
-                logger.info(f"Futuros coletados: {len(market_data.get('futures', {}))} contratos")
-            
-            # CRÍTICO: Salvar dados capturados SEMPRE, mesmo quando mercado fechado
-            # Isso garante rastreabilidade e análise posterior
-            if self.orders_repo and market_data.get('spot'):
-                saved_count = 0
-                for ticker, spot_info in market_data['spot'].items():
-                    try:
-                        options_list = market_data.get('options', {}).get(ticker, [])
-                        self.orders_repo.save_market_data_capture(
-                            ticker=ticker,
-                            data_type='spot',
-                            spot_data=spot_info,
-                            options_data=options_list if options_list else None,
-                            raw_data={'timestamp': b3_time.isoformat(), 'trading_status': trading_status},
-                            source='real'
-                        )
-                        saved_count += 1
-                    except Exception as save_err:
-                        logger.error(f"Erro ao salvar dados de mercado para {ticker}: {save_err}")
-                        import traceback
-                        logger.debug(traceback.format_exc())
-                
-                # Salvar dados de futuros
-                if market_data.get('futures'):
-                    for future_symbol, future_data in market_data['futures'].items():
-                        try:
-                            self.orders_repo.save_market_data_capture(
-                                ticker=future_symbol,
-                                data_type='futures',
-                                spot_data=future_data,
-                                options_data=None,
-                                raw_data={'timestamp': b3_time.isoformat(), 'trading_status': trading_status},
-                                source='real'
-                            )
-                            saved_count += 1
-                        except Exception as save_err:
-                            logger.error(f"Erro ao salvar dados de futuro {future_symbol}: {save_err}")
-                
-                if saved_count > 0:
-                    logger.info(f"Dados salvos no banco: {saved_count} instrumentos (spot + futuros)")
-            
-            # CRÍTICO: Gerar propostas APENAS durante horário de trading
-            # Mas sempre capturamos dados para rastreabilidade
-            proposals = []
-            if should_generate_proposals:
-                # Gerar propostas do TraderAgent (inclui DayTradeOptionsStrategy)
-                if market_data.get('spot'):
-                    proposals = self.trader_agent.generate_proposals(
-                        pd.to_datetime(datetime.now()),
-                        market_data
-                    )
-                
-                # Gerar propostas de futuros se disponível
-                if market_data.get('futures'):
-                    try:
-                        from .futures_strategy import FuturesDayTradeStrategy
-                        futures_strategy = FuturesDayTradeStrategy(self.config)
-                        futures_proposals = futures_strategy.generate_proposals(
-                            pd.to_datetime(datetime.now()),
-                            market_data['futures']
-                        )
-                        proposals.extend(futures_proposals)
-                        if futures_proposals:
-                            logger.info(f"Propostas de futuros geradas: {len(futures_proposals)}")
-                    except ImportError:
-                        try:
-                            from futures_strategy import FuturesDayTradeStrategy
-                            futures_strategy = FuturesDayTradeStrategy(self.config)
-                            futures_proposals = futures_strategy.generate_proposals(
-                                pd.to_datetime(datetime.now()),
-                                market_data['futures']
-                            )
-                            proposals.extend(futures_proposals)
-                            if futures_proposals:
-                                logger.info(f"Propostas de futuros geradas: {len(futures_proposals)}")
-                        except Exception as e:
-                            logger.warning(f"Erro ao gerar propostas de futuros: {e}")
-                    except Exception as e:
-                        logger.warning(f"Erro ao gerar propostas de futuros: {e}")
-                
-                logger.info(f"Total de propostas geradas: {len(proposals)}")
-                
-                # Escanear oportunidades do MarketMonitor (para outras estratégias)
-                # FILTRO: Apenas oportunidades de ativos brasileiros
-                opportunities = self.market_monitor.scan_all_opportunities(market_data)
-                
-                # Filtrar oportunidades apenas de ativos brasileiros
-                brazilian_opportunities = [
-                    opp for opp in opportunities 
-                    if '.SA' in str(opp.get('symbol', '')) or 
-                       '.SA' in str(opp.get('ticker', '')) or
-                       str(opp.get('symbol', '')).endswith('.SA') or
-                       str(opp.get('ticker', '')).endswith('.SA')
-                ]
-                
-                # Enviar notificações se encontrar oportunidades brasileiras
-                if brazilian_opportunities:
-                    for opp in brazilian_opportunities[:5]:
-                        self.notifier.notify_opportunity(opp)
-                
-                # FILTRO CRÍTICO: Filtrar propostas apenas de ativos brasileiros
-                brazilian_proposals = []
-                for prop in proposals:
-                    symbol = prop.symbol if hasattr(prop, 'symbol') else str(prop.get('symbol', ''))
-                    underlying = prop.metadata.get('underlying', '') if hasattr(prop, 'metadata') and prop.metadata else ''
-                    
-                    # Verificar se é brasileiro
-                    is_brazilian = (
-                        '.SA' in str(symbol) or 
-                        str(symbol).endswith('.SA') or
-                        '.SA' in str(underlying) or
-                        str(underlying).endswith('.SA')
-                    )
-                    
-                    # Apenas estratégias de daytrade e futuros (que já são brasileiros)
-                    if prop.strategy in ['daytrade_options', 'futures_daytrade']:
-                        is_brazilian = True  # Essas estratégias já são apenas brasileiras
-                    
-                    if is_brazilian:
-                        brazilian_proposals.append(prop)
-                    else:
-                        logger.warning(f"Proposta filtrada (não brasileira): {symbol} - {prop.strategy}")
-                
-                proposals = brazilian_proposals
-                
-                # Avaliar propostas com RiskAgent antes de enviar
-                if proposals:
-                    # Notificar sobre propostas de daytrade (alta prioridade)
-                    daytrade_proposals = [p for p in proposals if p.strategy == 'daytrade_options']
-                    if daytrade_proposals:
-                        logger.info(f"Propostas de daytrade encontradas: {len(daytrade_proposals)}")
-                        
-                        # Filtrar propostas com razão ganho/perda aceitável (> 0.25)
-                        propostas_filtradas = []
-                        for proposal in daytrade_proposals:
-                            metadata = proposal.metadata or {}
-                            gain_value = metadata.get('gain_value', 0)
-                            loss_value = abs(metadata.get('loss_value', 1))
-                            
-                            if loss_value > 0:
-                                gain_loss_ratio = gain_value / loss_value
-                                # Apenas propostas com razão ganho/perda > 0.25
-                                if gain_loss_ratio > 0.25:
-                                    propostas_filtradas.append(proposal)
-                        
-                        logger.info(f"Propostas após filtro de razão ganho/perda: {len(propostas_filtradas)}")
-                        
-                        # Avaliar TODAS as propostas com RiskAgent (não apenas as aprovadas)
-                        # IMPORTANTE: Avaliar todas para salvar avaliações no banco
-                        approved_count = 0
-                        rejected_count = 0
-                        modified_count = 0
-                        
-                        # Limitar a 50 propostas por scan para não sobrecarregar
-                        propostas_para_avaliar = propostas_filtradas[:50]
-                        
-                        logger.info(f"Avaliando {len(propostas_para_avaliar)} propostas com RiskAgent...")
-                        
-                        for proposal in propostas_para_avaliar:
-                            try:
-                                # Avaliar proposta com RiskAgent (sempre salva avaliação)
-                                decision, modified_proposal, reason = self.risk_agent.evaluate_proposal(
-                                    proposal, market_data
-                                )
-                                
-                                # Contar decisões
-                                if decision == 'APPROVE':
-                                    approved_count += 1
-                                    
-                                    # Atualizar status para 'enviada' (aprovada pelo RiskAgent e enviada ao Telegram)
-                                    try:
-                                        self.orders_repo.update_proposal_status(proposal.proposal_id, 'enviada')
-                                    except Exception as e:
-                                        logger.error(f"Erro ao atualizar status da proposta {proposal.proposal_id}: {e}")
-                                    
-                                    # Preparar dados da proposta para Telegram
-                                    proposal_data = {
-                                        'proposal_id': proposal.proposal_id,
-                                        'symbol': proposal.symbol,
-                                        'side': proposal.side,
-                                        'quantity': proposal.quantity,
-                                        'price': proposal.price,
-                                        'metadata': proposal.metadata
-                                    }
-                                    
-                                    # Enviar via Telegram com botões de aprovação
-                                    telegram_channel = None
-                                    for channel_name, channel in self.notifier.channels:
-                                        if channel_name == 'telegram' and hasattr(channel, 'send_proposal_with_approval'):
-                                            telegram_channel = channel
-                                            break
-                                    
-                                    if telegram_channel:
-                                        telegram_channel.send_proposal_with_approval(proposal_data)
-                                    else:
-                                        logger.warning("Canal Telegram não disponível")
-                                elif decision == 'REJECT':
-                                    rejected_count += 1
-                                    logger.debug(f"Proposta {proposal.proposal_id} rejeitada: {reason}")
-                                elif decision == 'MODIFY':
-                                    modified_count += 1
-                                    logger.info(f"Proposta {proposal.proposal_id} modificada: {reason}")
-                                    
-                            except Exception as e:
-                                logger.error(f"Erro ao avaliar proposta {proposal.proposal_id}: {e}")
-                                import traceback
-                                logger.error(traceback.format_exc())
-                        
-                        logger.info(f"Resultado da avaliação: {approved_count} aprovadas, {rejected_count} rejeitadas, {modified_count} modificadas")
-                        
-                        logger.info(f"Propostas aprovadas e enviadas: {approved_count}")
+            if self.scan_pipeline is not None:
+                # Pipeline em estágios: cada ticker segue para estratégia/risco assim que chega
+                successful_tickers, opportunities, proposals = self.scan_pipeline.run(
+                    tickers, b3_time, trading_status, should_generate_proposals
+                )
             else:
-                opportunities = []
-                if successful_tickers == 0:
-                    logger.warning(f"Nenhum dado spot coletado após processar {len(tickers_to_process)} tickers")
-                    logger.warning("Possíveis causas: mercado fechado, problemas com API, ou tickers inválidos")
-                else:
-                    logger.info(f"Dados coletados ({successful_tickers} tickers) mas sem propostas geradas (mercado fechado ou sem oportunidades)")
+                successful_tickers, opportunities, proposals = self._scan_sequential(
+                    tickers, b3_time, trading_status, should_generate_proposals
+                )
             
             # Buscar dados de cripto (se habilitado)
             if self.crypto_api:
@@ -915,152 +502,531 @@ O agente está agora monitorando o mercado e gerando propostas de daytrade.
             )
         
         self.last_scan_time = self.trading_schedule.get_current_b3_time()
-        self.opportunities_found = opportunities[:10] if 'opportunities' in locals() else []
+        self.opportunities_found = opportunities[:10]
         self.proposals_generated = proposals
         
         # Log detalhado para debug
-        logger.info(f"Scan completo - Propostas: {len(proposals)}, Oportunidades: {len(opportunities) if 'opportunities' in locals() else 0}")
+        logger.info(f"Scan completo - Propostas: {len(proposals)}, Oportunidades: {len(opportunities)}")
         if proposals:
             for p in proposals[:3]:
                 logger.info(f"  Proposta: {p.strategy} - {p.symbol} - Qty: {p.quantity}")
         
         # Incluir informações sobre captura de dados no retorno
-        data_captured = successful_tickers if 'successful_tickers' in locals() else 0
         return {
             'timestamp': self.last_scan_time.isoformat(),
             'status': trading_status,
-            'opportunities': len(opportunities) if 'opportunities' in locals() else 0,
+            'opportunities': len(opportunities),
             'proposals': len(proposals),
-            'opportunities_list': opportunities[:5] if 'opportunities' in locals() else [],
+            'opportunities_list': opportunities[:5],
             'proposals_list': [{'id': p.proposal_id, 'strategy': p.strategy, 'symbol': p.symbol} for p in proposals[:5]],
-            'data_captured': data_captured,
-            'should_generate_proposals': should_generate_proposals if 'should_generate_proposals' in locals() else False
+            'data_captured': successful_tickers,
+            'should_generate_proposals': should_generate_proposals
         }
     
-    def start_monitoring(self, interval_seconds: int = 300):
-        """Inicia monitoramento contínuo respeitando horário B3."""
-        if self.is_running:
-            logger.warning("Monitoramento já está rodando")
-            return
+    def _scan_sequential(self, tickers: List[str], b3_time: datetime, trading_status: str,
+                         should_generate_proposals: bool):
+        """
+        Scan em etapas sequenciais para todo o universo: captura, persistência, propostas,
+        avaliação e notificação (scan_pipeline.enabled=false).
         
-        self.is_running = True
+        Returns:
+            (tickers com dados spot, oportunidades, propostas)
+        """
+        # Buscar dados INTRADAY do dia atual (não histórico!)
+        today = datetime.now().strftime('%Y-%m-%d')
+        market_data = {'spot': {}, 'options': {}, 'futures': {}}
         
-        def monitor_loop():
-            while self.is_running:
-                try:
-                    b3_time = self.trading_schedule.get_current_b3_time()
-                    status = self.trading_schedule.get_trading_status()
+        # 1. COLETAR DADOS DE FUTUROS PRIMEIRO
+        futures = self.config.get('monitored_futures', [])
+        if futures and hasattr(self, 'futures_api'):
+            logger.info(f"Coletando dados de {len(futures)} contratos futuros...")
+            try:
+                futures_data = self.market_data_gateway.get_all_futures_data(futures)
+                if futures_data:
+                    market_data['futures'] = futures_data
+                    logger.info(f"Dados coletados para {len(futures_data)} futuros: {list(futures_data.keys())}")
+            except Exception as e:
+                logger.warning(f"Erro ao coletar dados de futuros: {e}")
+        
+        logger.info(f"Buscando dados intraday para {len(tickers)} tickers...")
+        
+        # Buscar dados spot INTRADAY para cada ticker (via gateway de dados de mercado)
+        tickers_to_process = tickers  # Processar todos os tickers brasileiros
+        successful_tickers = 0
+        failed_tickers = []
+        collection_started = time.perf_counter()
+        is_market_open = trading_status in ['PRE_MARKET', 'TRADING', 'POST_MARKET']
+        
+        logger.info(f"Processando {len(tickers_to_process)} tickers...")
+        
+        for ticker in tickers_to_process:
+            try:
+                snapshot = self.market_data_gateway.fetch_intraday_snapshot(ticker, market_open=is_market_open)
+                if snapshot is None:
+                    logger.warning(f"Não foi possível obter preço atual para {ticker}")
+                    failed_tickers.append(ticker)
+                    continue
+                
+                market_data['spot'][ticker] = self._spot_from_snapshot(snapshot)
+                
+                logger.debug(f"{ticker}: Preço atual={snapshot['last']:.2f}, Abertura={snapshot['open']:.2f}, "
+                             f"Volume={snapshot['volume']:,} ({snapshot['provider']}/{snapshot['source']})")
+                
+                successful_tickers += 1
+                
+            except Exception as e:
+                logger.warning(f"Erro ao buscar dados para {ticker}: {e}")
+                failed_tickers.append(ticker)
+                import traceback
+                logger.debug(traceback.format_exc())
+                continue
+        
+        # Estágio 2: cadeias de opções apenas para sobreviventes do pré-filtro spot
+        # (mais ativos com posição aberta), limitadas aos vencimentos até max_dte
+        self._fetch_option_chains(market_data, today)
+        
+        collection_ms = (time.perf_counter() - collection_started) * 1000
+        
+        # Log resumo
+        if failed_tickers:
+            logger.warning(f"Tickers com falha ({len(failed_tickers)}): {failed_tickers[:5]}")
+        
+        logger.info(f"Dados coletados: {successful_tickers}/{len(tickers_to_process)} tickers com dados spot")
+        logger.info(f"Opções disponíveis para: {len(market_data.get('options', {}))} tickers")
+        if market_data.get('futures'):
+            logger.info(f"Futuros coletados: {len(market_data.get('futures', {}))} contratos")
+        
+        self._after_capture(market_data, b3_time)
+        
+        # CRÍTICO: Salvar dados capturados SEMPRE, mesmo quando mercado fechado
+        # Isso garante rastreabilidade e análise posterior
+        if self.orders_repo and market_data.get('spot'):
+            saved_count = 0
+            for ticker, spot_info in market_data['spot'].items():
+                options_list = market_data.get('options', {}).get(ticker, [])
+                saved_count += self._save_capture(ticker, 'spot', spot_info, options_list, b3_time, trading_status)
+            
+            # Salvar dados de futuros
+            for future_symbol, future_data in (market_data.get('futures') or {}).items():
+                saved_count += self._save_capture(future_symbol, 'futures', future_data, None, b3_time, trading_status)
+            
+            if saved_count > 0:
+                logger.info(f"Dados salvos no banco: {saved_count} instrumentos (spot + futuros)")
+        
+        # Estatísticas do scan (falhas, latência) para os relatórios de saúde
+        if self.orders_repo:
+            self.orders_repo.record_scan_stats(len(tickers_to_process), len(failed_tickers), collection_ms)
+        
+        # CRÍTICO: Gerar propostas APENAS durante horário de trading
+        # Mas sempre capturamos dados para rastreabilidade
+        proposals = []
+        opportunities = []
+        if should_generate_proposals:
+            # Gerar propostas do TraderAgent (inclui DayTradeOptionsStrategy)
+            if market_data.get('spot'):
+                proposals = self._ticker_proposals(pd.to_datetime(datetime.now()), market_data)
+            
+            # Gerar propostas de futuros se disponível
+            if market_data.get('futures'):
+                proposals.extend(self._futures_proposals(market_data['futures']))
+            
+            logger.info(f"Total de propostas geradas: {len(proposals)}")
+            
+            # Escanear oportunidades do MarketMonitor (para outras estratégias)
+            opportunities = self._scan_opportunities(market_data)
+            
+            # FILTRO CRÍTICO: Filtrar propostas apenas de ativos brasileiros
+            proposals = self._filter_brazilian(proposals)
+            
+            # Avaliar propostas com RiskAgent antes de enviar
+            if proposals:
+                # Notificar sobre propostas de daytrade (alta prioridade)
+                daytrade_proposals = [p for p in proposals if p.strategy == 'daytrade_options']
+                if daytrade_proposals:
+                    logger.info(f"Propostas de daytrade encontradas: {len(daytrade_proposals)}")
                     
-                    # CRÍTICO: Sempre executar scan, mesmo quando mercado fechado
-                    # Isso garante captura de dados históricos e rastreabilidade
-                    # Apenas não geramos propostas quando fechado
+                    # Filtrar propostas com razão ganho/perda aceitável (> 0.25)
+                    propostas_filtradas = [p for p in daytrade_proposals if self._passes_gain_loss(p)]
                     
-                    logger.info(f"[{b3_time.strftime('%H:%M:%S')}] Status: {status} - Executando scan...")
+                    logger.info(f"Propostas após filtro de razão ganho/perda: {len(propostas_filtradas)}")
                     
-                    # CRÍTICO: Fechamento EOD às 17:00
-                    current_hour = b3_time.hour
-                    current_minute = b3_time.minute
-                    current_date = b3_time.date()
+                    # Avaliar TODAS as propostas com RiskAgent (não apenas as aprovadas)
+                    # IMPORTANTE: Avaliar todas para salvar avaliações no banco
+                    decisions = {'APPROVE': 0, 'REJECT': 0, 'MODIFY': 0}
                     
-                    # Verificar se já passou das 17:00 e ainda não fechamos as posições hoje
-                    # Usar uma janela de tempo (17:00 até 18:00) para garantir execução
-                    if current_hour >= 17 and current_hour < 18:
-                        # Verificar se já fechamos hoje (comparar data)
-                        last_eod_date = self.last_eod_check.date() if self.last_eod_check else None
-                        
-                        if last_eod_date != current_date:
-                            logger.info(f"🔄 Executando fechamento EOD automático às {b3_time.strftime('%H:%M')}...")
-                            try:
-                                closed_count = self.orders_repo.close_all_daytrade_positions()
-                                if closed_count > 0:
-                                    logger.info(f"✅ Fechamento EOD: {closed_count} posições fechadas")
-                                    self._send_eod_notification(closed_count)
-                                else:
-                                    logger.info("ℹ️  Nenhuma posição aberta para fechar")
-                                    # Mesmo sem posições, executar análise se houver propostas
-                                    if self.orders_repo:
-                                        from datetime import datetime
-                                        date_str = b3_time.strftime('%Y-%m-%d')
-                                        proposals = self.orders_repo.get_proposals(
-                                            start_date=f'{date_str} 00:00:00',
-                                            end_date=f'{date_str} 23:59:59'
-                                        )
-                                        if not proposals.empty:
-                                            logger.info("🔄 Executando análise EOD mesmo sem posições abertas...")
-                                            try:
-                                                from .eod_analysis import EODAnalyzer
-                                                analyzer = EODAnalyzer(self.config)
-                                                analysis = analyzer.analyze_daily_proposals(date_str)
-                                                report = analyzer.format_telegram_report(analysis)
-                                                self.notifier.send(report, title="📊 Análise EOD Completa", priority='normal')
-                                            except Exception as e:
-                                                logger.error(f"Erro na análise EOD: {e}")
-                                
-                                self.eod_close_executed = True
-                                self.last_eod_check = b3_time
-                            except Exception as eod_err:
-                                logger.error(f"❌ ERRO ao fechar posições EOD: {eod_err}")
-                                import traceback
-                                logger.error(traceback.format_exc())
+                    # Limitar a 50 propostas por scan para não sobrecarregar
+                    propostas_para_avaliar = propostas_filtradas[:50]
                     
-                    # Resetar flag EOD após meia-noite (novo dia)
-                    if current_hour == 0 and current_minute < 5:
-                        if self.last_eod_check and (current_date > self.last_eod_check.date()):
-                            self.eod_close_executed = False
-                            logger.info("🔄 Flag EOD resetada para novo dia")
+                    logger.info(f"Avaliando {len(propostas_para_avaliar)} propostas com RiskAgent...")
                     
-                    # Escanear mercado (SEMPRE, mesmo fechado)
-                    try:
-                        result = self.scan_market()
-                        status_msg = result.get('status', 'UNKNOWN')
-                        data_captured = result.get('data_captured', 0)
-                        proposals = result.get('proposals', 0)
-                        opportunities = result.get('opportunities', 0)
-                        
-                        logger.info(f"Scan completo ({status_msg}): {data_captured} dados capturados, {opportunities} oportunidades, {proposals} propostas")
-                        
-                        # Log detalhado se houver dados capturados
-                        if data_captured > 0:
-                            logger.info(f"✅ Dados salvos no banco: {data_captured} tickers")
-                        else:
-                            logger.warning(f"⚠️  Nenhum dado capturado neste scan")
-                            
-                    except Exception as scan_err:
-                        logger.error(f"❌ ERRO ao executar scan: {scan_err}")
-                        import traceback
-                        logger.error(traceback.format_exc())
+                    for proposal in propostas_para_avaliar:
+                        decision = self._evaluate_and_notify(proposal, market_data)
+                        if decision in decisions:
+                            decisions[decision] += 1
                     
-                    # Se mercado fechado, aguardar antes do próximo scan
-                    if status == 'CLOSED':
-                        # Aguardar até próximo dia útil (máximo 1 hora para verificar novamente)
-                        next_open = self.trading_schedule.get_next_trading_open()
-                        if next_open:
-                            wait_seconds = (next_open - b3_time).total_seconds()
-                            wait_minutes = int(wait_seconds / 60)
-                            logger.info(f"Mercado fechado. Próxima abertura: {next_open.strftime('%d/%m/%Y %H:%M')} (aguardando {wait_minutes} minutos)")
-                            time.sleep(min(wait_seconds, 3600))
-                        else:
-                            logger.info("Mercado fechado. Aguardando 1 hora...")
-                            time.sleep(3600)
-                    else:
-                        # Durante trading, aguardar intervalo normal
-                        logger.debug(f"Aguardando {interval_seconds}s até próximo scan...")
-                        time.sleep(interval_seconds)
+                    logger.info(f"Resultado da avaliação: {decisions['APPROVE']} aprovadas, {decisions['REJECT']} rejeitadas, {decisions['MODIFY']} modificadas")
                     
-                    # Log detalhado se houver propostas (já movido para cima)
+                    logger.info(f"Propostas aprovadas e enviadas: {decisions['APPROVE']}")
+        else:
+            if successful_tickers == 0:
+                logger.warning(f"Nenhum dado spot coletado após processar {len(tickers_to_process)} tickers")
+                logger.warning("Possíveis causas: mercado fechado, problemas com API, ou tickers inválidos")
+            else:
+                logger.info(f"Dados coletados ({successful_tickers} tickers) mas sem propostas geradas (mercado fechado ou sem oportunidades)")
+        
+        return successful_tickers, opportunities, proposals
+    
+    @staticmethod
+    def _spot_from_snapshot(snapshot: Dict) -> Dict:
+        """Registro spot do scan a partir do resumo intradiário do gateway."""
+        return {
+            'open': snapshot['open'],
+            'close': snapshot['last'],
+            'last': snapshot['last'],  # Preço atual
+            'high': snapshot['high'],
+            'low': snapshot['low'],
+            'volume': snapshot['volume'],
+            'adv': 0  # Será calculado depois se necessário
+        }
+    
+    def _after_capture(self, market_data: Dict, b3_time: datetime):
+        """Atualizações que dependem do universo capturado (prioridade, carteira, MTM, kill switch)."""
+        # Atividade por ticker (pico de volume / movimento) para priorizar próximos scans
+        self.ticker_prioritizer.update(market_data['spot'])
+        
+        # Atualizar marcação/greeks das posições em carteira (incremental, só símbolos detidos)
+        self.portfolio_manager.apply_market_data(market_data, pd.Timestamp.now())
+        
+        # Mark-to-market das posições abertas e kill switch por perda intradiária
+        self.mtm_engine.on_market_data(market_data, b3_time)
+        self._check_kill_switch()
+    
+    def _save_capture(self, ticker: str, data_type: str, data: Dict, options_list: Optional[List[Dict]],
+                      b3_time: datetime, trading_status: str) -> int:
+        """Salva uma captura de mercado (retorna 1 se salvou, 0 em erro)."""
+        try:
+            self.orders_repo.save_market_data_capture(
+                ticker=ticker,
+                data_type=data_type,
+                spot_data=data,
+                options_data=options_list if options_list else None,
+                raw_data={'timestamp': b3_time.isoformat(), 'trading_status': trading_status},
+                source='real'
+            )
+            return 1
+        except Exception as save_err:
+            logger.error(f"Erro ao salvar dados de mercado para {ticker}: {save_err}")
+            import traceback
+            logger.debug(traceback.format_exc())
+            return 0
+    
+    def _ticker_proposals(self, date: pd.Timestamp, market_data: Dict, cross_sectional: bool = True,
+                          save: bool = True) -> List:
+        """Propostas do TraderAgent; com strategy_workers, as estratégias por ativo rodam nos processos."""
+        if self.strategy_pool is None:
+            return self.trader_agent.generate_proposals(date, market_data, cross_sectional=cross_sectional, save=save)
+        proposals = self.strategy_pool.generate_proposals(date, market_data)
+        if cross_sectional:
+            proposals.extend(self.trader_agent.generate_universe_proposals(date, market_data, save=False))
+        if save:
+            proposals = self.trader_agent.save_proposals(date, proposals)
+        return proposals
+    
+    def _futures_proposals(self, futures_data: Dict) -> List:
+        """Propostas da estratégia de futuros (buffers de candles de 1m)."""
+        try:
+            futures_proposals = self.futures_strategy.generate_proposals(
+                pd.to_datetime(datetime.now()),
+                futures_data
+            )
+            if futures_proposals:
+                logger.info(f"Propostas de futuros geradas: {len(futures_proposals)}")
+            return futures_proposals
+        except Exception as e:
+            logger.warning(f"Erro ao gerar propostas de futuros: {e}")
+            return []
+    
+    def _scan_opportunities(self, market_data: Dict) -> List[Dict]:
+        """Oportunidades do MarketMonitor (apenas ativos brasileiros); notifica as 5 primeiras."""
+        opportunities = self.market_monitor.scan_all_opportunities(market_data)
+        
+        # Filtrar oportunidades apenas de ativos brasileiros
+        brazilian_opportunities = [
+            opp for opp in opportunities 
+            if '.SA' in str(opp.get('symbol', '')) or 
+               '.SA' in str(opp.get('ticker', '')) or
+               str(opp.get('symbol', '')).endswith('.SA') or
+               str(opp.get('ticker', '')).endswith('.SA')
+        ]
+        
+        # Enviar notificações se encontrar oportunidades brasileiras
+        if brazilian_opportunities:
+            for opp in brazilian_opportunities[:5]:
+                self.notifier.notify_opportunity(opp)
+        return opportunities
+    
+    @staticmethod
+    def _filter_brazilian(proposals: List) -> List:
+        """Mantém apenas propostas de ativos brasileiros."""
+        brazilian_proposals = []
+        for prop in proposals:
+            symbol = prop.symbol if hasattr(prop, 'symbol') else str(prop.get('symbol', ''))
+            underlying = prop.metadata.get('underlying', '') if hasattr(prop, 'metadata') and prop.metadata else ''
+            
+            # Verificar se é brasileiro
+            is_brazilian = (
+                '.SA' in str(symbol) or 
+                str(symbol).endswith('.SA') or
+                '.SA' in str(underlying) or
+                str(underlying).endswith('.SA')
+            )
+            
+            # Apenas estratégias de daytrade e futuros (que já são brasileiros)
+            if prop.strategy in ['daytrade_options', 'futures_daytrade']:
+                is_brazilian = True  # Essas estratégias já são apenas brasileiras
+            
+            if is_brazilian:
+                brazilian_proposals.append(prop)
+            else:
+                logger.warning(f"Proposta filtrada (não brasileira): {symbol} - {prop.strategy}")
+        return brazilian_proposals
+    
+    @staticmethod
+    def _passes_gain_loss(proposal) -> bool:
+        """Razão ganho/perda acima de 0.25."""
+        metadata = proposal.metadata or {}
+        gain_value = metadata.get('gain_value', 0)
+        loss_value = abs(metadata.get('loss_value', 1))
+        return loss_value > 0 and gain_value / loss_value > 0.25
+    
+    def _evaluate_and_notify(self, proposal, market_data: Dict) -> Optional[str]:
+        """
+        Avalia a proposta com o RiskAgent (sempre salva a avaliação) e, se aprovada,
+        marca como 'enviada' e envia ao Telegram com botões de aprovação.
+        Retorna a decisão (None em erro).
+        """
+        try:
+            decision, modified_proposal, reason = self.risk_agent.evaluate_proposal(
+                proposal, market_data
+            )
+            
+            if decision == 'APPROVE':
+                # Atualizar status para 'enviada' (aprovada pelo RiskAgent e enviada ao Telegram)
+                try:
+                    self.orders_repo.update_proposal_status(proposal.proposal_id, 'enviada')
                 except Exception as e:
-                    logger.error(f"Erro no loop de monitoramento: {e}")
-                    time.sleep(60)  # Esperar 1 minuto antes de tentar novamente
+                    logger.error(f"Erro ao atualizar status da proposta {proposal.proposal_id}: {e}")
+                
+                # Preparar dados da proposta para Telegram
+                proposal_data = {
+                    'proposal_id': proposal.proposal_id,
+                    'symbol': proposal.symbol,
+                    'side': proposal.side,
+                    'quantity': proposal.quantity,
+                    'price': proposal.price,
+                    'metadata': proposal.metadata
+                }
+                
+                # Enviar via Telegram com botões de aprovação
+                telegram_channel = None
+                for channel_name, channel in self.notifier.channels:
+                    if channel_name == 'telegram' and hasattr(channel, 'send_proposal_with_approval'):
+                        telegram_channel = channel
+                        break
+                
+                if telegram_channel:
+                    telegram_channel.send_proposal_with_approval(proposal_data)
+                else:
+                    logger.warning("Canal Telegram não disponível")
+            elif decision == 'REJECT':
+                logger.debug(f"Proposta {proposal.proposal_id} rejeitada: {reason}")
+            elif decision == 'MODIFY':
+                logger.info(f"Proposta {proposal.proposal_id} modificada: {reason}")
+            return decision
+        
+        except Exception as e:
+            logger.error(f"Erro ao avaliar proposta {proposal.proposal_id}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return None
+    
+    def _fetch_option_chains(self, market_data: Dict, today) -> None:
+        """
+        Busca cadeias de opções apenas para os tickers que passaram no pré-filtro spot
+        das estratégias (retorno intradiário, volume) e para ativos com posição aberta.
+        Com options_prescreen=false volta a buscar para todo o universo coletado.
+        """
+        spot_tickers = list(market_data['spot'].keys())
+        if self.config.get('options_prescreen', True):
+            survivors = set(self.trader_agent.prescreen_options_universe(market_data['spot']))
+            held = {p.get('underlying') for p in self.mtm_engine.get_state()['positions']}
+            candidates = [t for t in spot_tickers if t in survivors or t in held]
+        else:
+            candidates = spot_tickers
+
+        max_dte = self.config.get('daytrade_options', {}).get('max_dte', 7)
+        for ticker in candidates:
+            try:
+                options_df = self.stock_api.fetch_options_chain(ticker, today, today, max_dte=max_dte)
+                if not options_df.empty:
+                    market_data['options'][ticker] = options_df.to_dict('records')
+                    logger.debug(f"Opções encontradas para {ticker}: {len(options_df)} contratos")
+            except Exception as opt_err:
+                logger.debug(f"Erro ao buscar opções para {ticker}: {opt_err}")
+
+        logger.info(f"Cadeias de opções buscadas: {len(candidates)}/{len(spot_tickers)} tickers "
+                    f"(pré-filtro spot, vencimentos até {max_dte} dias)")
+
+    def _scan_interval(self, now: datetime) -> Optional[float]:
+        """
+        Cadência do scan: intervalo configurado no pregão, 1h com mercado fechado em dia de
+        pregão. Fins de semana e feriados: pausado até o próximo pré-mercado
+        (schedule.scan_on_closed_days mantém a captura de 1h).
+        """
+        if self.trading_schedule.get_trading_status(now) == 'CLOSED':
+            if not self.trading_schedule.is_trading_day(now) and not self.schedule_config.get('scan_on_closed_days', False):
+                return None
+            return self.schedule_config.get('closed_interval_seconds', 3600)
+        return self.interval_seconds
+    
+    def _next_pre_market(self, now: datetime) -> Optional[datetime]:
+        """Início do próximo pré-mercado (para não esperar a cadência de mercado fechado)."""
+        return self.trading_schedule.get_next_pre_market(now)
+    
+    def _scheduled_scan(self):
+        """Job de scan: ativos quentes a cada tick, universo completo a cada N ticks."""
+        b3_time = self.trading_schedule.get_current_b3_time()
+        status = self.trading_schedule.get_trading_status()
+        
+        all_tickers = [t for t in self.config.get('monitored_tickers', []) if '.SA' in str(t)]
+        held = {p['underlying'] for p in self.mtm_engine.get_state()['positions']}
+        tickers = self.ticker_prioritizer.select(all_tickers, held=held)
+        if not tickers:
+            logger.debug("Nenhum ticker quente neste tick - scan parcial ignorado")
+            return
+        
+        logger.info(f"[{b3_time.strftime('%H:%M:%S')}] Status: {status} - Executando scan ({len(tickers)}/{len(all_tickers)} tickers)...")
+        result = self.scan_market(tickers=tickers)
+        data_captured = result.get('data_captured', 0)
+        logger.info(f"Scan completo ({result.get('status', 'UNKNOWN')}): {data_captured} dados capturados, "
+                    f"{result.get('opportunities', 0)} oportunidades, {result.get('proposals', 0)} propostas")
+        if data_captured > 0:
+            logger.info(f"✅ Dados salvos no banco: {data_captured} tickers")
+        else:
+            logger.warning(f"⚠️  Nenhum dado capturado neste scan")
+    
+    def _run_status_report(self):
+        """Job de status (a cada 2h, apenas durante o pregão)."""
+        if self.trading_schedule.get_trading_status() == 'TRADING':
+            self._send_status_notification()
+    
+    def _run_eod_close(self):
+        """Job diário de fechamento EOD: fecha posições de daytrade e dispara análise."""
+        b3_time = self.trading_schedule.get_current_b3_time()
+        logger.info(f"🔄 Executando fechamento EOD automático às {b3_time.strftime('%H:%M')}...")
+        try:
+            closed_count = self.orders_repo.close_all_daytrade_positions()
+            self.mtm_engine.load_from_repository()
+            self.mtm_engine.snapshot(b3_time)
+            if closed_count > 0:
+                logger.info(f"✅ Fechamento EOD: {closed_count} posições fechadas")
+                self._send_eod_notification(closed_count)
+            else:
+                logger.info("ℹ️  Nenhuma posição aberta para fechar")
+                # Mesmo sem posições, executar análise se houver propostas
+                if self.orders_repo:
+                    date_str = b3_time.strftime('%Y-%m-%d')
+                    proposals = self.orders_repo.get_proposals(
+                        start_date=f'{date_str} 00:00:00',
+                        end_date=f'{date_str} 23:59:59'
+                    )
+                    if not proposals.empty:
+                        logger.info("🔄 Executando análise EOD mesmo sem posições abertas...")
+                        try:
+                            try:
+                                from .eod_analysis import EODAnalyzer
+                            except ImportError:
+                                from eod_analysis import EODAnalyzer
+                            analyzer = EODAnalyzer(self.config, services=self.services)
+                            analysis = analyzer.analyze_daily_proposals(date_str)
+                            report = analyzer.format_telegram_report(analysis)
+                            self.notifier.send(report, title="📊 Análise EOD Completa", priority='normal')
+                        except Exception as e:
+                            logger.error(f"Erro na análise EOD: {e}")
+            
+            self.eod_close_executed = True
+            self.last_eod_check = b3_time
+        except Exception as eod_err:
+            logger.error(f"❌ ERRO ao fechar posições EOD: {eod_err}")
+            import traceback
+            logger.error(traceback.format_exc())
+    
+    def _run_retention(self):
+        """Job diário fora do pregão: arquiva dados antigos e faz vacuum incremental."""
+        try:
+            self.retention.run(self.trading_schedule.get_current_b3_time())
+        except Exception as e:
+            logger.error(f"Erro na retenção de dados: {e}")
+    
+    def _reset_daily_flags(self):
+        """Job diário (00:00): reseta flags do dia."""
+        self.eod_close_executed = False
+        self.trading_started = False
+        # Realizado de ontem não conta para o kill switch de hoje (independe do ExitMonitor)
+        self.mtm_engine.reset_day()
+        logger.info("🔄 Flags diárias resetadas para novo dia")
+    
+    def start_monitoring(self, interval_seconds: int = 300):
+        """
+        Inicia monitoramento contínuo respeitando horário B3.
+        
+        Scan, status, fechamento EOD e reset diário rodam como jobs do JobScheduler:
+        cadência alinhada ao relógio, sem sobreposição de execuções.
+        """
+        if self.is_running:
+            logger.warning("Monitoramento já está rodando")
+            return
+        
+        self.is_running = True
+        self.interval_seconds = interval_seconds
+        
+        # Scan sempre roda (mesmo com mercado fechado) para captura de dados
+        self.scheduler.add_interval_job(
+            'scan', self._scheduled_scan, self._scan_interval,
+            wake_at=self._next_pre_market, run_immediately=True
+        )
+        self.scheduler.add_interval_job(
+            'status_report', self._run_status_report,
+            self.schedule_config.get('status_interval_seconds', 7200)
+        )
+        self.scheduler.add_daily_job(
+            'eod_close', self._run_eod_close,
+            at=self.schedule_config.get('eod_close_time', '17:00'),
+            window_minutes=self.schedule_config.get('eod_window_minutes', 60),
+            day_filter=self.trading_schedule.is_trading_day
+        )
+        self.scheduler.add_daily_job('daily_reset', self._reset_daily_flags, at='00:00', window_minutes=5)
+        if self.retention.enabled:
+            self.scheduler.add_daily_job(
+                'retention', self._run_retention,
+                at=self.config.get('retention', {}).get('run_at', '20:00'), window_minutes=120
+            )
+        self.scheduler.start()
+        self.thread = self.scheduler.thread
         
-        self.thread = threading.Thread(target=monitor_loop, daemon=True)
-        self.thread.start()
-        logger.info(f"Monitoramento iniciado (intervalo: {interval_seconds}s, horário B3)")
+        if self.exit_monitor:
+            self.exit_monitor.start()
+        logger.info(f"Monitoramento iniciado (intervalo: {interval_seconds}s alinhado ao relógio, horário B3)")
     
     def stop_monitoring(self):
         """Para monitoramento."""
         self.is_running = False
-        if self.thread:
-            self.thread.join(timeout=5)
+        if self.exit_monitor:
+            self.exit_monitor.stop()
+        self.scheduler.stop()
+        if self.strategy_pool:
+            self.strategy_pool.stop()
+        self.logger.flush()
         logger.info("Monitoramento parado")
     
     def get_status(self) -> Dict:
@@ -1071,6 +1037,13 @@ O agente está agora monitorando o mercado e gerando propostas de daytrade.
             'opportunities_found': len(self.opportunities_found),
             'proposals_generated': len(self.proposals_generated),
             'recent_opportunities': self.opportunities_found[:5],
-            'recent_proposals': [{'id': p.proposal_id, 'strategy': p.strategy} for p in self.proposals_generated[:5]]
+            'recent_proposals': [{'id': p.proposal_id, 'strategy': p.strategy} for p in self.proposals_generated[:5]],
+            'jobs': self.scheduler.get_status(),
+            'ticker_priority': self.ticker_prioritizer.get_status(),
+            'decision_log': self.logger.decision_log.stats(),
+            'http': http_client_stats(),
+            'market_data': self.market_data_gateway.get_status(),
+            'scan_pipeline': self.scan_pipeline.get_status() if self.scan_pipeline else None,
+            'strategy_workers': self.strategy_pool.get_status() if self.strategy_pool else None
         }
 
@@ -5,11 +5,17 @@ Suporta múltiplos canais: Telegram, Discord, Email, SMS (via Twilio)
 
 import os
 import json
-import requests
 from typing import Dict, List, Optional
 from datetime import datetime
 import logging
 
+try:
+    from .http_client import get_http_client
+    from .records import proposal_alias
+except ImportError:
+    from http_client import get_http_client
+    from records import proposal_alias
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,11 +34,14 @@ class NotificationChannel:
 class TelegramNotifier(NotificationChannel):
     """Notificador via Telegram Bot."""
     
-    def __init__(self, bot_token: str = None, chat_id: str = None, orders_repo=None):
+    def __init__(self, bot_token: str = None, chat_id: str = None, orders_repo=None, api_base: str = None):
         self.bot_token = bot_token or os.getenv('TELEGRAM_BOT_TOKEN', '')
         self.chat_id = chat_id or os.getenv('TELEGRAM_CHAT_ID', '')
-        self.api_url = f"https://api.telegram.org/bot{self.bot_token}"
+        # api_base/TELEGRAM_API_BASE: servidor simulado (market_data_simulator) em testes de carga
+        api_base = (api_base or os.getenv('TELEGRAM_API_BASE') or "https://api.telegram.org").rstrip('/')
+        self.api_url = f"{api_base}/bot{self.bot_token}"
         self.orders_repo = orders_repo  # Para salvar mensagens quando usado diretamente
+        self.http = get_http_client('telegram')  # Sessão keep-alive e limite de taxa compartilhados
     
     def is_configured(self) -> bool:
         return bool(self.bot_token and self.chat_id)
@@ -68,7 +77,7 @@ class TelegramNotifier(NotificationChannel):
                 'disable_web_page_preview': True
             }
             
-            response = requests.post(url, json=payload, timeout=10)
+            response = self.http.post(url, json=payload, timeout=10)
             
             if response.status_code == 200:
                 logger.info("Notificacao Telegram enviada")
@@ -137,6 +146,7 @@ class TelegramNotifier(NotificationChannel):
         
         try:
             proposal_id = proposal.get('proposal_id', 'UNKNOWN')
+            alias = proposal_alias(proposal_id)  # Apelido curto para os comandos; botões usam o ID completo
             symbol = proposal.get('symbol', 'N/A')
             side = proposal.get('side', 'BUY')
             quantity = proposal.get('quantity', 0)
@@ -194,7 +204,7 @@ class TelegramNotifier(NotificationChannel):
             message = f"""
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 *📊 NOVA PROPOSTA - DAYTRADE*
-*ID: {proposal_id}*
+*ID: {alias}*
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
 *Tipo:* {instrument_label}
@@ -260,10 +270,10 @@ class TelegramNotifier(NotificationChannel):
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 *✅ APROVAÇÃO RÁPIDA:*
 
-`/aprovar {proposal_id}`  ← Copie e cole
-`/cancelar {proposal_id}`  ← Copie e cole
+`/aprovar {alias}`  ← Copie e cole
+`/cancelar {alias}`  ← Copie e cole
 
-*ID:* `{proposal_id}`
+*ID:* `{alias}`
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
             
@@ -289,7 +299,7 @@ class TelegramNotifier(NotificationChannel):
                 'disable_web_page_preview': True
             }
             
-            response = requests.post(url, json=payload, timeout=10)
+            response = self.http.post(url, json=payload, timeout=10)
             
             if response.status_code == 200:
                 logger.info(f"Proposta enviada com botões: {proposal_id}")
@@ -358,7 +368,7 @@ class TelegramNotifier(NotificationChannel):
                 'text': text,
                 'show_alert': show_alert
             }
-            response = requests.post(url, json=payload, timeout=10)
+            response = self.http.post(url, json=payload, timeout=10)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Erro ao responder callback: {e}")
@@ -377,7 +387,7 @@ class TelegramNotifier(NotificationChannel):
             if new_text:
                 payload['text'] = new_text
             
-            response = requests.post(url, json=payload, timeout=10)
+            response = self.http.post(url, json=payload, timeout=10)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Erro ao editar mensagem: {e}")
@@ -415,6 +425,7 @@ class DiscordNotifier(NotificationChannel):
     
     def __init__(self, webhook_url: str = None):
         self.webhook_url = webhook_url or os.getenv('DISCORD_WEBHOOK_URL', '')
+        self.http = get_http_client('discord')
     
     def is_configured(self) -> bool:
         return bool(self.webhook_url)
@@ -449,7 +460,7 @@ class DiscordNotifier(NotificationChannel):
                 'embeds': [embed]
             }
             
-            response = requests.post(self.webhook_url, json=payload, timeout=10)
+            response = self.http.post(self.webhook_url, json=payload, timeout=10)
             
             if response.status_code == 204:
                 logger.info("✅ Notificação Discord enviada")
@@ -487,7 +498,7 @@ class DiscordNotifier(NotificationChannel):
         }
         
         payload = {'embeds': [embed]}
-        response = requests.post(self.webhook_url, json=payload, timeout=10)
+        response = self.http.post(self.webhook_url, json=payload, timeout=10)
         return response.status_code == 204
 
 
@@ -506,7 +517,8 @@ class UnifiedNotifier:
             telegram = TelegramNotifier(
                 bot_token=telegram_config.get('bot_token') or os.getenv('TELEGRAM_BOT_TOKEN', ''),
                 chat_id=telegram_config.get('chat_id') or os.getenv('TELEGRAM_CHAT_ID', ''),
-                orders_repo=orders_repo  # Passar orders_repo para TelegramNotifier também
+                orders_repo=orders_repo,  # Passar orders_repo para TelegramNotifier também
+                api_base=telegram_config.get('api_base')
             )
             if telegram.is_configured():
                 self.channels.append(('telegram', telegram))
@@ -0,0 +1,332 @@
+"""
+Snapshots de cadeias de opções com metadados deduplicados e cotações em delta.
+
+Scans consecutivos (5 min) trazem praticamente a mesma cadeia: mesmos strikes e
+vencimentos, com bid/ask/IV levemente diferentes. Em vez de gravar a cadeia inteira em
+JSON a cada scan:
+
+- option_contracts guarda os metadados do contrato (vencimento, strike, tipo e demais
+  atributos não numéricos) uma vez por dia/ativo-objeto, com um índice estável;
+- option_chain_snapshots guarda, por scan, só os campos numéricos que mudaram, em forma
+  colunar: para cada campo, (índices dos contratos alterados, novos valores), em numpy
+  comprimido com zlib. A cada keyframe_every scans grava-se um keyframe com todos os
+  valores, o que limita a reconstrução a no máximo keyframe_every deltas.
+
+A presença do contrato no scan também é um campo ('_present'), então contratos que
+somem da cadeia são reconstruídos corretamente. Campos ausentes (NaN) não aparecem no
+dict reconstruído, como no JSON original.
+"""
+
+import json
+import logging
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OPTION_SNAPSHOTS_SQL = """
+CREATE TABLE IF NOT EXISTS option_contracts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,  -- Primeira vez em que o contrato apareceu no dia
+    trade_date TEXT NOT NULL,
+    underlying TEXT NOT NULL,
+    contract_idx INTEGER NOT NULL,
+    expiry TEXT,
+    strike REAL NOT NULL,
+    option_type TEXT,
+    attributes TEXT,  -- JSON com os demais atributos não numéricos
+    UNIQUE (trade_date, underlying, contract_idx)
+);
+CREATE TABLE IF NOT EXISTS option_chain_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    trade_date TEXT NOT NULL,
+    underlying TEXT NOT NULL,
+    keyframe INTEGER NOT NULL DEFAULT 0,
+    n_contracts INTEGER NOT NULL,
+    changed INTEGER NOT NULL,  -- Valores gravados neste snapshot
+    fields TEXT NOT NULL,  -- JSON {campo: 'i'|'f'} na ordem do payload
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_option_snapshots_underlying ON option_chain_snapshots (underlying, trade_date, id);
+CREATE INDEX IF NOT EXISTS idx_option_snapshots_timestamp ON option_chain_snapshots (timestamp);
+CREATE INDEX IF NOT EXISTS idx_option_contracts_timestamp ON option_contracts (timestamp);
+"""
+
+KEY_FIELDS = ('expiry', 'strike', 'option_type')
+PRESENT_FIELD = '_present'
+
+# Estado do último snapshot gravado por (banco, ativo-objeto), compartilhado entre instâncias
+_CHAIN_STATE: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+
+def _to_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+
+def _normalize_time(at) -> str:
+    """datetime/Timestamp/str -> ISO comparável com os timestamps gravados (separador 'T')."""
+    text = at.isoformat() if hasattr(at, 'isoformat') else str(at)
+    if len(text) > 10 and text[10] == ' ':
+        text = text[:10] + 'T' + text[11:]
+    return text
+
+
+class OptionChainStore:
+    """Grava e reconstrói cadeias de opções em snapshots delta (conexão fornecida pelo chamador)."""
+
+    def __init__(self, config: Optional[Dict] = None):
+        snapshot_config = (config or {}).get('option_snapshots', {})
+        self.enabled = snapshot_config.get('enabled', True)
+        self.keyframe_every = max(int(snapshot_config.get('keyframe_every', 12)), 1)  # 12 scans = 1h
+
+    # ------------------------------------------------------------------ escrita
+
+    def _split_chain(self, options: List[Dict]):
+        """Separa a cadeia em chaves de contrato, atributos e colunas numéricas."""
+        keys, attributes, numeric = [], [], {}
+        for position, option in enumerate(options):
+            strike = option.get('strike')
+            if not _is_number(strike):
+                return None
+            keys.append((_to_text(option.get('expiry')), float(strike), _to_text(option.get('option_type'))))
+            attrs = {}
+            for name, value in option.items():
+                if name in KEY_FIELDS:
+                    continue
+                if _is_number(value):
+                    numeric.setdefault(name, {})[position] = value
+                elif value is not None:
+                    attrs[name] = _to_text(value) if not isinstance(value, (str, bool)) else value
+            attributes.append(attrs)
+        if len(set(keys)) != len(keys):
+            return None  # Contratos repetidos: cadeia ambígua, fica no JSON
+        return keys, attributes, numeric
+
+    def _load_state(self, conn: sqlite3.Connection, db_key: Tuple[str, str], trade_date: str) -> Dict[str, Any]:
+        """Recarrega do banco o índice de contratos do dia (novo processo ou outro escritor)."""
+        underlying = db_key[1]
+        index = {
+            (row[0], row[1], row[2]): row[3]
+            for row in conn.execute(
+                "SELECT expiry, strike, option_type, contract_idx FROM option_contracts "
+                "WHERE trade_date = ? AND underlying = ?", (trade_date, underlying)
+            )
+        }
+        last_id = conn.execute(
+            "SELECT MAX(id) FROM option_chain_snapshots WHERE underlying = ? AND trade_date = ?",
+            (underlying, trade_date)
+        ).fetchone()[0]
+        state = {'trade_date': trade_date, 'index': index, 'values': {}, 'kinds': {},
+                 'since_keyframe': None, 'last_id': last_id}  # since_keyframe None força keyframe
+        _CHAIN_STATE[db_key] = state
+        return state
+
+    def write(self, conn: sqlite3.Connection, db_path: str, underlying: str, timestamp: str,
+              options: List[Dict]) -> Optional[int]:
+        """
+        Grava um scan da cadeia. Retorna o id do snapshot ou None se a cadeia não puder ser
+        codificada (o chamador mantém o JSON nesse caso).
+        """
+        if not self.enabled or not options:
+            return None
+        split = self._split_chain([o for o in options if isinstance(o, dict)])
+        if split is None:
+            return None
+        keys, attributes, numeric = split
+
+        db_key = (db_path, underlying)
+        try:
+            return self._write(conn, db_key, timestamp, keys, attributes, numeric)
+        except Exception:
+            _CHAIN_STATE.pop(db_key, None)  # Estado em memória pode ter divergido do banco
+            raise
+
+    def _write(self, conn: sqlite3.Connection, db_key: Tuple[str, str], timestamp: str, keys: List[Tuple],
+               attributes: List[Dict], numeric: Dict[str, Dict[int, Any]]) -> int:
+        underlying = db_key[1]
+        trade_date = timestamp[:10]
+        state = _CHAIN_STATE.get(db_key)
+        if state is None or state['trade_date'] != trade_date:
+            state = self._load_state(conn, db_key, trade_date)
+        else:
+            last_id = conn.execute(
+                "SELECT MAX(id) FROM option_chain_snapshots WHERE underlying = ? AND trade_date = ?",
+                (underlying, trade_date)
+            ).fetchone()[0]
+            if last_id != state['last_id']:
+                state = self._load_state(conn, db_key, trade_date)
+
+        # Contratos novos no dia recebem o próximo índice
+        index = state['index']
+        new_contracts = []
+        positions = np.empty(len(keys), dtype=np.int64)
+        for position, key in enumerate(keys):
+            idx = index.get(key)
+            if idx is None:
+                idx = len(index)
+                index[key] = idx
+                new_contracts.append((timestamp, trade_date, underlying, idx, key[0], key[1], key[2],
+                                      json.dumps(attributes[position]) if attributes[position] else None))
+            positions[position] = idx
+        if new_contracts:
+            conn.executemany(
+                "INSERT INTO option_contracts (timestamp, trade_date, underlying, contract_idx, expiry, "
+                "strike, option_type, attributes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", new_contracts
+            )
+
+        n = len(index)
+        current = {PRESENT_FIELD: np.full(n, np.nan)}
+        current[PRESENT_FIELD][positions] = 1.0
+        kinds = {PRESENT_FIELD: 'i'}
+        for name, values in numeric.items():
+            column = np.full(n, np.nan)
+            column[positions[list(values.keys())]] = np.fromiter(values.values(), dtype=float, count=len(values))
+            current[name] = column
+            kinds[name] = 'i' if all(isinstance(v, (int, np.integer)) for v in values.values()) else 'f'
+        for name in state['values']:
+            if name not in current:  # Campo que sumiu do scan
+                current[name] = np.full(n, np.nan)
+                kinds[name] = state['kinds'].get(name, 'f')
+
+        keyframe = state['since_keyframe'] is None or state['since_keyframe'] + 1 >= self.keyframe_every
+        parts, changed = [], 0
+        for name, column in current.items():
+            if keyframe:
+                parts.append(column.astype('<f8').tobytes())
+                changed += n
+                continue
+            previous = state['values'].get(name)
+            if previous is None:
+                previous = np.full(n, np.nan)
+            elif len(previous) < n:
+                previous = np.concatenate([previous, np.full(n - len(previous), np.nan)])
+            diff = np.flatnonzero(~((column == previous) | (np.isnan(column) & np.isnan(previous))))
+            parts.append(np.uint32(diff.size).tobytes())
+            parts.append(diff.astype('<u4').tobytes())
+            parts.append(column[diff].astype('<f8').tobytes())
+            changed += diff.size
+
+        cursor = conn.execute(
+            "INSERT INTO option_chain_snapshots (timestamp, trade_date, underlying, keyframe, n_contracts, "
+            "changed, fields, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (timestamp, trade_date, underlying, int(keyframe), n, changed, json.dumps(kinds),
+             zlib.compress(b''.join(parts), 6))
+        )
+        state['values'] = current
+        state['kinds'] = kinds
+        state['since_keyframe'] = 0 if keyframe else state['since_keyframe'] + 1
+        state['last_id'] = cursor.lastrowid
+        return cursor.lastrowid
+
+    # ------------------------------------------------------------------ leitura
+
+    @staticmethod
+    def _apply(values: Dict[str, np.ndarray], row) -> None:
+        """Aplica um snapshot (keyframe ou delta) sobre o estado colunar."""
+        n = row['n_contracts']
+        buffer = zlib.decompress(row['payload'])
+        offset = 0
+        for name in json.loads(row['fields']):
+            column = values.get(name)
+            if column is None or len(column) < n:
+                grown = np.full(n, np.nan)
+                if column is not None:
+                    grown[:len(column)] = column
+                values[name] = column = grown
+            if row['keyframe']:
+                column[:] = np.frombuffer(buffer, dtype='<f8', count=n, offset=offset)
+                offset += 8 * n
+                continue
+            count = int(np.frombuffer(buffer, dtype='<u4', count=1, offset=offset)[0])
+            offset += 4
+            idx = np.frombuffer(buffer, dtype='<u4', count=count, offset=offset)
+            offset += 4 * count
+            column[idx] = np.frombuffer(buffer, dtype='<f8', count=count, offset=offset)
+            offset += 8 * count
+
+    def replay(self, conn: sqlite3.Connection, snapshot_id: int) -> Optional[pd.DataFrame]:
+        """
+        Cadeia completa no snapshot informado: último keyframe + deltas até ele.
+
+        Returns:
+            DataFrame (uma linha por contrato presente, colunas de atributos/chaves/cotações)
+            ou None se o snapshot não existir
+        """
+        target = conn.execute(
+            "SELECT underlying, trade_date FROM option_chain_snapshots WHERE id = ?", (snapshot_id,)
+        ).fetchone()
+        if target is None:
+            return None
+        underlying, trade_date = target[0], target[1]
+        rows = conn.execute(
+            """
+            SELECT id, keyframe, n_contracts, fields, payload FROM option_chain_snapshots
+            WHERE underlying = ? AND trade_date = ? AND id <= ? AND id >= COALESCE((
+                SELECT MAX(id) FROM option_chain_snapshots
+                WHERE underlying = ? AND trade_date = ? AND id <= ? AND keyframe = 1
+            ), 0)
+            ORDER BY id
+            """, (underlying, trade_date, snapshot_id, underlying, trade_date, snapshot_id)
+        ).fetchall()
+        values: Dict[str, np.ndarray] = {}
+        kinds: Dict[str, str] = {}
+        for row in rows:
+            self._apply(values, row)
+            kinds.update(json.loads(row['fields']))
+        if not rows:
+            return pd.DataFrame()
+
+        n = rows[-1]['n_contracts']
+        contracts = pd.read_sql_query(
+            "SELECT contract_idx, expiry, strike, option_type, attributes FROM option_contracts "
+            "WHERE trade_date = ? AND underlying = ? AND contract_idx < ? ORDER BY contract_idx",
+            conn, params=(trade_date, underlying, n)
+        )
+        present = values.pop(PRESENT_FIELD, np.full(n, np.nan))
+        mask = ~np.isnan(present[contracts['contract_idx'].to_numpy()])
+        frame = contracts[mask].reset_index(drop=True)
+        rows_idx = contracts['contract_idx'].to_numpy()[mask]
+        for name, column in values.items():
+            frame[name] = column[rows_idx]
+        frame.attrs['kinds'] = {k: v for k, v in kinds.items() if k != PRESENT_FIELD}
+        return frame
+
+    def snapshot_at(self, conn: sqlite3.Connection, underlying: str, at) -> Optional[int]:
+        """Id do último snapshot do ativo até 'at' (mesmo dia de negociação)."""
+        at = _normalize_time(at)
+        row = conn.execute(
+            "SELECT MAX(id) FROM option_chain_snapshots WHERE underlying = ? AND trade_date = ? AND timestamp <= ?",
+            (underlying, at[:10], at)
+        ).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def to_records(frame: pd.DataFrame) -> List[Dict]:
+        """DataFrame de replay -> lista de dicts no formato original (sem campos NaN)."""
+        if frame is None or frame.empty:
+            return []
+        kinds = frame.attrs.get('kinds', {})
+        quote_fields = [name for name in kinds if name in frame.columns]
+        records = []
+        for row in frame.to_dict('records'):
+            option = json.loads(row['attributes']) if row['attributes'] else {}
+            option.update({'expiry': row['expiry'], 'strike': row['strike'], 'option_type': row['option_type']})
+            for name in quote_fields:
+                value = row[name]
+                if value == value:  # NaN = campo ausente neste contrato
+                    option[name] = int(value) if kinds[name] == 'i' else float(value)
+            records.append(option)
+        return records
@@ -6,13 +6,21 @@ Salva tudo em SQLite para acompanhamento e análise posterior.
 import sqlite3
 import json
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
 from contextlib import contextmanager
 import pandas as pd
 import logging
 import pytz
 
+try:
+    from .records import PROPOSAL_METRIC_FIELDS, RiskEvaluation, split_metadata
+    from .option_snapshots import OPTION_SNAPSHOTS_SQL, OptionChainStore
+except ImportError:
+    from records import PROPOSAL_METRIC_FIELDS, RiskEvaluation, split_metadata
+    from option_snapshots import OPTION_SNAPSHOTS_SQL, OptionChainStore
+
 # Timezone de São Paulo (B3)
 B3_TIMEZONE = pytz.timezone('America/Sao_Paulo')
 
@@ -40,6 +48,79 @@ def _migrate_database():
                 conn.execute("ALTER TABLE open_positions ADD COLUMN realized_pnl REAL")
                 logger.info("Coluna realized_pnl adicionada à tabela open_positions")
             
+            # Estratégia e ativo-objeto (agregação de P&L do mark-to-market)
+            if 'strategy' not in columns:
+                conn.execute("ALTER TABLE open_positions ADD COLUMN strategy TEXT")
+                logger.info("Coluna strategy adicionada à tabela open_positions")
+            
+            if 'underlying' not in columns:
+                conn.execute("ALTER TABLE open_positions ADD COLUMN underlying TEXT")
+                logger.info("Coluna underlying adicionada à tabela open_positions")
+            
+            # Proposta de origem (regras de saída TP/SL do ExitMonitor)
+            if 'proposal_id' not in columns:
+                conn.execute("ALTER TABLE open_positions ADD COLUMN proposal_id TEXT")
+                logger.info("Coluna proposal_id adicionada à tabela open_positions")
+            
+            # Métricas de primeira classe das propostas (antes só no JSON de metadata)
+            cursor.execute("PRAGMA table_info(proposals)")
+            proposal_columns = [row[1] for row in cursor.fetchall()]
+            added = [name for name in PROPOSAL_METRIC_FIELDS if name not in proposal_columns]
+            for name in added:
+                conn.execute(f"ALTER TABLE proposals ADD COLUMN {name} {PROPOSAL_METRIC_FIELDS[name]}")
+            if added:
+                # Preencher as colunas novas a partir do JSON das propostas existentes
+                conn.execute(
+                    "UPDATE proposals SET "
+                    + ", ".join(f"{name} = json_extract(metadata, '$.{name}')" for name in added)
+                    + " WHERE metadata IS NOT NULL AND json_valid(metadata)"
+                )
+                logger.info(f"Colunas de métricas adicionadas à tabela proposals: {', '.join(added)}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_proposals_underlying ON proposals (underlying)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_proposals_comparison_score ON proposals (comparison_score)")
+            
+            cursor.execute("PRAGMA table_info(risk_evaluations)")
+            evaluation_columns = [row[1] for row in cursor.fetchall()]
+            for name in ('strategy', 'symbol'):
+                if name not in evaluation_columns:
+                    conn.execute(f"ALTER TABLE risk_evaluations ADD COLUMN {name} TEXT")
+                    logger.info(f"Coluna {name} adicionada à tabela risk_evaluations")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_risk_eval_strategy ON risk_evaluations (strategy)")
+            
+            # Status da proposta (antes só via migrar_status_propostas.py)
+            if 'status' not in proposal_columns:
+                conn.execute("ALTER TABLE proposals ADD COLUMN status TEXT DEFAULT 'gerada'")
+                conn.execute("UPDATE proposals SET status = 'gerada' WHERE status IS NULL")
+                logger.info("Coluna status adicionada à tabela proposals")
+            if 'status_updated_at' not in proposal_columns:
+                conn.execute("ALTER TABLE proposals ADD COLUMN status_updated_at TEXT")
+            
+            # Cadeias de opções em snapshots delta (options_data fica NULL nessas capturas)
+            cursor.execute("PRAGMA table_info(market_data_captures)")
+            if 'chain_snapshot_id' not in [row[1] for row in cursor.fetchall()]:
+                conn.execute("ALTER TABLE market_data_captures ADD COLUMN chain_snapshot_id INTEGER")
+                logger.info("Coluna chain_snapshot_id adicionada à tabela market_data_captures")
+            conn.executescript(OPTION_SNAPSHOTS_SQL)
+            
+            # Estatísticas de captura (rollups por minuto/hora mantidos por trigger)
+            stats_exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'capture_stats'"
+            ).fetchone()
+            conn.executescript(CAPTURE_STATS_SQL)
+            if not stats_exists:
+                for statement in CAPTURE_STATS_BACKFILL_SQL:
+                    conn.execute(statement)
+                logger.info("Tabela capture_stats criada e preenchida a partir das capturas existentes")
+            
+            # Ciclo de vida materializado (uma linha por proposta, mantida por triggers)
+            lifecycle_exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'proposal_lifecycle'"
+            ).fetchone()
+            conn.executescript(LIFECYCLE_SQL)
+            if not lifecycle_exists:
+                conn.execute(LIFECYCLE_BACKFILL_SQL)
+                logger.info("Tabela proposal_lifecycle criada e preenchida a partir do histórico")
+            
             conn.commit()
     except Exception as e:
         logger.warning(f"Erro na migração do banco (pode ser normal se já migrado): {e}")
@@ -215,6 +296,270 @@ CREATE INDEX IF NOT EXISTS idx_telegram_messages_type ON telegram_messages_sent
 CREATE INDEX IF NOT EXISTS idx_telegram_messages_proposal_id ON telegram_messages_sent (proposal_id);
 """
 
+# Ciclo de vida das propostas: gerada -> avaliada (decisão) -> enviada -> aprovada/cancelada
+# -> executada -> encerrada. As triggers mantêm a tabela atualizada para qualquer escritor
+# (inclusive processos que gravam direto no SQLite, como o polling do Telegram).
+LIFECYCLE_SQL = """
+CREATE TABLE IF NOT EXISTS proposal_lifecycle (
+    proposal_id TEXT PRIMARY KEY,
+    trade_date TEXT,  -- YYYY-MM-DD da geração
+    strategy TEXT,
+    instrument_type TEXT,
+    symbol TEXT,
+    underlying TEXT,
+    side TEXT,
+    quantity REAL,
+    price REAL,
+    status TEXT NOT NULL DEFAULT 'gerada',
+    generated_at TEXT,
+    evaluated_at TEXT,
+    decision TEXT,
+    reason TEXT,
+    sent_at TEXT,
+    approved_at TEXT,
+    cancelled_at TEXT,
+    executed_at TEXT,
+    executed_quantity REAL,
+    executed_price REAL,
+    closed_at TEXT,
+    realized_pnl REAL,
+    source TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_lifecycle_trade_date ON proposal_lifecycle (trade_date);
+CREATE INDEX IF NOT EXISTS idx_lifecycle_strategy_generated ON proposal_lifecycle (strategy, generated_at);
+CREATE INDEX IF NOT EXISTS idx_lifecycle_generated_at ON proposal_lifecycle (generated_at);
+CREATE INDEX IF NOT EXISTS idx_lifecycle_symbol ON proposal_lifecycle (symbol);
+CREATE INDEX IF NOT EXISTS idx_lifecycle_status ON proposal_lifecycle (status);
+
+-- Recriada a cada migração: um ID reaproveitado (linha substituída em proposals) começa um
+-- ciclo novo, sem herdar avaliação, envio, execução ou status da proposta anterior
+DROP TRIGGER IF EXISTS trg_lifecycle_proposal_insert;
+CREATE TRIGGER trg_lifecycle_proposal_insert AFTER INSERT ON proposals
+BEGIN
+    INSERT INTO proposal_lifecycle
+        (proposal_id, trade_date, strategy, instrument_type, symbol, underlying, side,
+         quantity, price, status, generated_at, source, updated_at)
+    VALUES
+        (NEW.proposal_id, substr(NEW.timestamp, 1, 10), NEW.strategy, NEW.instrument_type,
+         NEW.symbol, COALESCE(NEW.underlying, NEW.symbol), NEW.side, NEW.quantity, NEW.price,
+         COALESCE(NEW.status, 'gerada'), NEW.timestamp, NEW.source, NEW.created_at)
+    ON CONFLICT (proposal_id) DO UPDATE SET
+        trade_date = excluded.trade_date, strategy = excluded.strategy,
+        instrument_type = excluded.instrument_type, symbol = excluded.symbol,
+        underlying = excluded.underlying, side = excluded.side, quantity = excluded.quantity,
+        price = excluded.price, generated_at = excluded.generated_at, source = excluded.source,
+        status = excluded.status, evaluated_at = NULL, decision = NULL, reason = NULL,
+        sent_at = NULL, approved_at = NULL, cancelled_at = NULL, executed_at = NULL,
+        executed_quantity = NULL, executed_price = NULL, closed_at = NULL, realized_pnl = NULL,
+        updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_lifecycle_proposal_status AFTER UPDATE OF status ON proposals
+WHEN NEW.status IS NOT OLD.status
+BEGIN
+    UPDATE proposal_lifecycle SET
+        status = NEW.status,
+        sent_at = CASE WHEN NEW.status = 'enviada' THEN COALESCE(sent_at, NEW.status_updated_at) ELSE sent_at END,
+        approved_at = CASE WHEN NEW.status = 'aprovada' THEN COALESCE(approved_at, NEW.status_updated_at) ELSE approved_at END,
+        cancelled_at = CASE WHEN NEW.status = 'cancelada' THEN COALESCE(cancelled_at, NEW.status_updated_at) ELSE cancelled_at END,
+        updated_at = NEW.status_updated_at
+    WHERE proposal_id = NEW.proposal_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_lifecycle_evaluation AFTER INSERT ON risk_evaluations
+BEGIN
+    UPDATE proposal_lifecycle SET
+        evaluated_at = NEW.timestamp,
+        decision = NEW.decision,
+        reason = NEW.reason,
+        status = CASE WHEN status IN ('gerada', 'rejeitada')
+                      THEN CASE WHEN NEW.decision = 'REJECT' THEN 'rejeitada' ELSE 'gerada' END
+                      ELSE status END,
+        updated_at = NEW.timestamp
+    WHERE proposal_id = NEW.proposal_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_lifecycle_approval AFTER INSERT ON proposal_approvals
+BEGIN
+    UPDATE proposal_lifecycle SET
+        approved_at = CASE WHEN NEW.action = 'APPROVE' THEN COALESCE(approved_at, NEW.timestamp) ELSE approved_at END,
+        cancelled_at = CASE WHEN NEW.action = 'CANCEL' THEN COALESCE(cancelled_at, NEW.timestamp) ELSE cancelled_at END,
+        status = CASE WHEN status IN ('executada', 'encerrada') THEN status
+                      WHEN NEW.action = 'APPROVE' THEN 'aprovada' ELSE 'cancelada' END,
+        updated_at = NEW.timestamp
+    WHERE proposal_id = NEW.proposal_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_lifecycle_execution AFTER INSERT ON executions
+WHEN NEW.status IN ('FILLED', 'PARTIAL')
+BEGIN
+    UPDATE proposal_lifecycle SET
+        executed_at = COALESCE(executed_at, NEW.timestamp),
+        executed_price = (COALESCE(executed_price * executed_quantity, 0) + NEW.price * NEW.quantity)
+                         / NULLIF(COALESCE(executed_quantity, 0) + NEW.quantity, 0),
+        executed_quantity = COALESCE(executed_quantity, 0) + NEW.quantity,
+        status = CASE WHEN status = 'encerrada' THEN status ELSE 'executada' END,
+        updated_at = NEW.timestamp
+    WHERE proposal_id = NEW.proposal_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_lifecycle_position_open AFTER INSERT ON open_positions
+WHEN NEW.proposal_id IS NOT NULL
+BEGIN
+    UPDATE proposal_lifecycle SET
+        executed_at = COALESCE(executed_at, NEW.opened_at),
+        executed_quantity = COALESCE(executed_quantity, NEW.quantity),
+        executed_price = COALESCE(executed_price, NEW.avg_price),
+        status = CASE WHEN status = 'encerrada' THEN status ELSE 'executada' END,
+        updated_at = NEW.opened_at
+    WHERE proposal_id = NEW.proposal_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_lifecycle_position_close AFTER UPDATE OF closed_at ON open_positions
+WHEN NEW.proposal_id IS NOT NULL AND NEW.closed_at IS NOT NULL AND OLD.closed_at IS NULL
+BEGIN
+    UPDATE proposal_lifecycle SET
+        closed_at = NEW.closed_at,
+        realized_pnl = COALESCE(realized_pnl, 0) + COALESCE(NEW.realized_pnl, 0),
+        status = 'encerrada',
+        updated_at = NEW.closed_at
+    WHERE proposal_id = NEW.proposal_id;
+END;
+"""
+
+# Preenchimento inicial a partir das tabelas existentes (executado uma vez, ao criar a tabela)
+LIFECYCLE_BACKFILL_SQL = """
+INSERT OR IGNORE INTO proposal_lifecycle
+    (proposal_id, trade_date, strategy, instrument_type, symbol, underlying, side, quantity, price,
+     status, generated_at, evaluated_at, decision, reason, sent_at, approved_at, cancelled_at,
+     executed_at, executed_quantity, executed_price, closed_at, realized_pnl, source, updated_at)
+SELECT
+    p.proposal_id, substr(p.timestamp, 1, 10), p.strategy, p.instrument_type, p.symbol,
+    COALESCE(p.underlying, p.symbol), p.side, p.quantity, p.price,
+    CASE
+        WHEN pos.closed_at IS NOT NULL THEN 'encerrada'
+        WHEN ex.executed_at IS NOT NULL OR pos.opened_at IS NOT NULL THEN 'executada'
+        WHEN p.status IS NOT NULL AND p.status != 'gerada' THEN p.status
+        WHEN ev.decision = 'REJECT' THEN 'rejeitada'
+        ELSE 'gerada'
+    END,
+    p.timestamp, ev.timestamp, ev.decision, ev.reason,
+    CASE WHEN p.status = 'enviada' THEN p.status_updated_at END,
+    ap.approved_at, ap.cancelled_at,
+    COALESCE(ex.executed_at, pos.opened_at), COALESCE(ex.quantity, pos.quantity),
+    COALESCE(ex.price, pos.avg_price), pos.closed_at, pos.realized_pnl, p.source,
+    COALESCE(p.status_updated_at, p.created_at)
+FROM proposals p
+LEFT JOIN (
+    SELECT proposal_id, timestamp, decision, reason,
+           ROW_NUMBER() OVER (PARTITION BY proposal_id ORDER BY timestamp DESC, id DESC) AS rn
+    FROM risk_evaluations
+) ev ON ev.proposal_id = p.proposal_id AND ev.rn = 1
+LEFT JOIN (
+    SELECT proposal_id,
+           MIN(CASE WHEN action = 'APPROVE' THEN timestamp END) AS approved_at,
+           MIN(CASE WHEN action = 'CANCEL' THEN timestamp END) AS cancelled_at
+    FROM proposal_approvals GROUP BY proposal_id
+) ap ON ap.proposal_id = p.proposal_id
+LEFT JOIN (
+    SELECT proposal_id, MIN(timestamp) AS executed_at, SUM(quantity) AS quantity,
+           SUM(price * quantity) / NULLIF(SUM(quantity), 0) AS price
+    FROM executions WHERE status IN ('FILLED', 'PARTIAL') GROUP BY proposal_id
+) ex ON ex.proposal_id = p.proposal_id
+LEFT JOIN (
+    SELECT proposal_id, MIN(opened_at) AS opened_at, SUM(quantity) AS quantity,
+           SUM(avg_price * quantity) / NULLIF(SUM(quantity), 0) AS avg_price,
+           MAX(closed_at) AS closed_at, SUM(realized_pnl) AS realized_pnl
+    FROM open_positions WHERE proposal_id IS NOT NULL GROUP BY proposal_id
+) pos ON pos.proposal_id = p.proposal_id
+"""
+
+
+# Contratos da cadeia gravada com a captura (snapshot delta: contratos do dia; JSON: tamanho da lista)
+_CAPTURE_CONTRACTS_EXPR = """
+    CASE WHEN {row}.chain_snapshot_id IS NOT NULL
+         THEN COALESCE((SELECT n_contracts FROM option_chain_snapshots WHERE id = {row}.chain_snapshot_id), 0)
+         WHEN {row}.options_data IS NOT NULL AND json_valid({row}.options_data)
+              AND json_type({row}.options_data) = 'array'
+         THEN json_array_length({row}.options_data)
+         ELSE 0 END
+"""
+_CAPTURE_HAS_OPTIONS_EXPR = """
+    ({row}.chain_snapshot_id IS NOT NULL
+     OR ({row}.options_data IS NOT NULL AND {row}.options_data NOT IN ('', 'null', '[]')))
+"""
+
+# Estatísticas de captura em buckets por minuto e por hora, mantidas na escrita
+CAPTURE_STATS_SQL = """
+CREATE TABLE IF NOT EXISTS capture_stats (
+    resolution TEXT NOT NULL CHECK (resolution IN ('minute', 'hour')),
+    bucket TEXT NOT NULL,  -- YYYY-MM-DDTHH:MM (minute) ou YYYY-MM-DDTHH (hour), horário B3
+    source TEXT NOT NULL,
+    captures INTEGER NOT NULL DEFAULT 0,
+    captures_with_options INTEGER NOT NULL DEFAULT 0,
+    option_contracts INTEGER NOT NULL DEFAULT 0,
+    scans INTEGER NOT NULL DEFAULT 0,
+    tickers_requested INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    latency_ms_sum REAL NOT NULL DEFAULT 0,
+    latency_ms_max REAL,
+    first_capture TEXT,
+    last_capture TEXT,
+    PRIMARY KEY (resolution, bucket, source)
+);
+CREATE TABLE IF NOT EXISTS capture_stats_ticker (
+    bucket TEXT NOT NULL,  -- YYYY-MM-DDTHH
+    ticker TEXT NOT NULL,
+    source TEXT NOT NULL,
+    captures INTEGER NOT NULL DEFAULT 0,
+    last_capture TEXT,
+    PRIMARY KEY (bucket, source, ticker)
+);
+CREATE INDEX IF NOT EXISTS idx_market_data_source_ts ON market_data_captures (source, timestamp);
+
+CREATE TRIGGER IF NOT EXISTS trg_capture_stats_insert AFTER INSERT ON market_data_captures
+BEGIN
+    INSERT INTO capture_stats
+        (resolution, bucket, source, captures, captures_with_options, option_contracts, first_capture, last_capture)
+    VALUES
+        ('minute', substr(NEW.timestamp, 1, 16), NEW.source, 1, {has_options}, {contracts}, NEW.timestamp, NEW.timestamp),
+        ('hour', substr(NEW.timestamp, 1, 13), NEW.source, 1, {has_options}, {contracts}, NEW.timestamp, NEW.timestamp)
+    ON CONFLICT (resolution, bucket, source) DO UPDATE SET
+        captures = captures + 1,
+        captures_with_options = captures_with_options + excluded.captures_with_options,
+        option_contracts = option_contracts + excluded.option_contracts,
+        first_capture = MIN(COALESCE(first_capture, excluded.first_capture), excluded.first_capture),
+        last_capture = MAX(COALESCE(last_capture, excluded.last_capture), excluded.last_capture);
+    
+    INSERT INTO capture_stats_ticker (bucket, ticker, source, captures, last_capture)
+    VALUES (substr(NEW.timestamp, 1, 13), NEW.ticker, NEW.source, 1, NEW.timestamp)
+    ON CONFLICT (bucket, source, ticker) DO UPDATE SET
+        captures = captures + 1,
+        last_capture = MAX(COALESCE(last_capture, excluded.last_capture), excluded.last_capture);
+END;
+""".format(has_options=_CAPTURE_HAS_OPTIONS_EXPR.format(row='NEW'),
+           contracts=_CAPTURE_CONTRACTS_EXPR.format(row='NEW'))
+
+# Preenche as estatísticas a partir das capturas já gravadas (criação da tabela)
+CAPTURE_STATS_BACKFILL_SQL = [
+    f"""
+    INSERT OR REPLACE INTO capture_stats
+        (resolution, bucket, source, captures, captures_with_options, option_contracts, first_capture, last_capture)
+    SELECT '{resolution}', substr(c.timestamp, 1, {length}), c.source, COUNT(*),
+           SUM({_CAPTURE_HAS_OPTIONS_EXPR.format(row='c')}), SUM({_CAPTURE_CONTRACTS_EXPR.format(row='c')}),
+           MIN(c.timestamp), MAX(c.timestamp)
+    FROM market_data_captures c
+    GROUP BY substr(c.timestamp, 1, {length}), c.source
+    """
+    for resolution, length in (('minute', 16), ('hour', 13))
+] + ["""
+    INSERT OR REPLACE INTO capture_stats_ticker (bucket, ticker, source, captures, last_capture)
+    SELECT substr(timestamp, 1, 13), ticker, source, COUNT(*), MAX(timestamp)
+    FROM market_data_captures
+    GROUP BY substr(timestamp, 1, 13), source, ticker
+"""]
+
 
 @contextmanager
 def _connect():
@@ -232,35 +577,206 @@ def _connect():
         conn.close()
 
 
-def init_db():
-    """Inicializa o banco de dados criando as tabelas se não existirem."""
+def get_max_proposal_seq(day: str) -> int:
+    """Maior sequência de proposta já gravada no dia (IDs AAAAMMDD-NNNN); 0 se nenhuma."""
+    if not os.path.exists(DB_PATH):
+        return 0
+    prefix = f"{day}-"
+    try:
+        with _connect() as conn:
+            row = conn.execute(
+                """SELECT MAX(CAST(substr(proposal_id, instr(proposal_id, ?) + ?) AS INTEGER))
+                   FROM proposals WHERE proposal_id LIKE ?""",
+                (prefix, len(prefix), f"%{prefix}%")
+            ).fetchone()
+            return int(row[0] or 0)
+    except Exception as e:
+        logger.error(f"Erro ao consultar sequência de propostas de {day}: {e}")
+        return 0
+
+
+# Bancos já inicializados/migrados neste processo
+_INITIALIZED_DBS: set = set()
+_INIT_LOCK = threading.Lock()
+
+
+def init_db(force: bool = False):
+    """
+    Inicializa o banco de dados criando as tabelas se não existirem.
+    Schema e migração rodam uma vez por processo e banco; force=True refaz.
+    """
+    with _INIT_LOCK:
+        key = (os.getpid(), os.path.abspath(DB_PATH))
+        if key in _INITIALIZED_DBS and not force:
+            return
+        with _connect() as conn:
+            conn.executescript(SCHEMA_SQL)
+        logger.info(f"Banco de dados inicializado: {DB_PATH}")
+        _migrate_database()
+        _TABLE_COLUMNS.clear()  # Migração pode ter adicionado colunas
+        _INITIALIZED_DBS.add(key)
+
+
+# Colunas por tabela (validação de projeção/filtros), por banco
+_TABLE_COLUMNS: Dict[Tuple[str, str], List[str]] = {}
+
+# Colunas JSON decodificadas por padrão nos getters
+_JSON_COLUMNS = {
+    'risk_evaluations': ('details',),
+    'performance_snapshots': ('details',),
+    'market_data_captures': ('options_data', 'raw_data'),
+}
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    key = (DB_PATH, table)
+    if key not in _TABLE_COLUMNS:
+        _TABLE_COLUMNS[key] = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    return _TABLE_COLUMNS[key]
+
+
+def _query_page(table: str, columns: Optional[List[str]] = None, filters: Optional[Dict] = None,
+                min_values: Optional[Dict] = None, start_date: str = None, end_date: str = None, time_column: str = 'timestamp',
+                descending: bool = True, limit: int = None, after: Optional[Tuple] = None,
+                decode_json: bool = True) -> pd.DataFrame:
+    """
+    SELECT com projeção, filtros e paginação por keyset empurrados para o SQLite.
+    
+    Args:
+        table: Tabela
+        columns: Colunas a retornar (None = todas). id e time_column entram sempre (cursor).
+        filters: coluna -> valor (lista/tupla = IN); valores None são ignorados
+        min_values: coluna -> limite inferior (coluna >= valor)
+        start_date, end_date: Intervalo sobre time_column
+        descending: Ordem por (time_column, id)
+        limit: Tamanho da página
+        after: Cursor (time_column, id) da última linha da página anterior (page_cursor)
+        decode_json: Decodifica as colunas JSON da tabela; False mantém o texto bruto
+    """
     with _connect() as conn:
-        conn.executescript(SCHEMA_SQL)
-    logger.info(f"Banco de dados inicializado: {DB_PATH}")
-    _migrate_database()
+        available = _table_columns(conn, table)
+        if columns:
+            unknown = [c for c in columns if c not in available]
+            if unknown:
+                raise ValueError(f"Colunas inexistentes em {table}: {unknown}")
+            selected = list(dict.fromkeys(['id', time_column, *columns]))
+        else:
+            selected = available
+        
+        query = f"SELECT {', '.join(selected)} FROM {table} WHERE 1=1"
+        params = []
+        
+        for column, value in (filters or {}).items():
+            if value is None:
+                continue
+            if column not in available:
+                raise ValueError(f"Coluna inexistente em {table}: {column}")
+            if isinstance(value, (list, tuple, set)):
+                values = list(value)
+                query += f" AND {column} IN ({','.join('?' * len(values))})"
+                params.extend(values)
+            else:
+                query += f" AND {column} = ?"
+                params.append(value)
+        
+        for column, value in (min_values or {}).items():
+            if value is None:
+                continue
+            if column not in available:
+                raise ValueError(f"Coluna inexistente em {table}: {column}")
+            query += f" AND {column} >= ?"
+            params.append(value)
+        
+        if start_date:
+            query += f" AND {time_column} >= ?"
+            params.append(start_date)
+        
+        if end_date:
+            query += f" AND {time_column} <= ?"
+            params.append(end_date)
+        
+        if after is not None:
+            query += f" AND ({time_column}, id) {'<' if descending else '>'} (?, ?)"
+            params.extend(after)
+        
+        direction = 'DESC' if descending else 'ASC'
+        query += f" ORDER BY {time_column} {direction}, id {direction}"
+        
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        
+        df = pd.read_sql_query(query, conn, params=params)
+    
+    if decode_json:
+        for column in _JSON_COLUMNS.get(table, ()):
+            if column in df.columns:
+                df[column] = [json.loads(x) if x else None for x in df[column]]
+    return df
+
+
+def page_cursor(df: pd.DataFrame, time_column: str = 'timestamp') -> Optional[Tuple]:
+    """Cursor (time_column, id) da última linha de uma página, para o parâmetro after."""
+    if df is None or df.empty:
+        return None
+    last = df.iloc[-1]
+    return (last[time_column], int(last['id']))
+
+
+def _json_default(obj):
+    """Serializa escalares numpy/pandas e datas no JSON de metadata."""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _merge_metadata(df: pd.DataFrame) -> pd.Series:
+    """Reconstrói o metadata completo (extra JSON + colunas de métricas não nulas)."""
+    metric_cols = [name for name in PROPOSAL_METRIC_FIELDS if name in df.columns]
+    extras = [json.loads(x) if x else {} for x in df['metadata']]
+    metrics = df[metric_cols].astype(object).where(df[metric_cols].notna(), None).to_dict('records')
+    merged = []
+    for extra, row in zip(extras, metrics):
+        extra.update({k: v for k, v in row.items() if v is not None})
+        merged.append(extra)
+    return pd.Series(merged, index=df.index, dtype=object)
 
 
 class OrdersRepository:
     """Repositório para persistir ordens e propostas dos agentes."""
     
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, config: Optional[Dict] = None):
         global DB_PATH
         if db_path:
             DB_PATH = db_path
         init_db()
+        self.option_chains = OptionChainStore(config)  # Cadeias de opções em snapshots delta
     
     def save_proposal(self, proposal: Dict) -> bool:
-        """Salva uma proposta gerada pelo TraderAgent."""
+        """
+        Salva uma proposta gerada pelo TraderAgent (OrderProposal.to_dict()).
+        
+        Métricas de PROPOSAL_METRIC_FIELDS vão para colunas próprias; chaves
+        conhecidas ainda dentro de 'metadata' (formato antigo) também são promovidas.
+        """
         try:
             created_at_b3 = get_b3_timestamp()
+            promoted, extra = split_metadata(proposal.get('metadata') or {})
+            metrics = [
+                proposal[name] if proposal.get(name) is not None else promoted.get(name)
+                for name in PROPOSAL_METRIC_FIELDS
+            ]
             
             with _connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT OR REPLACE INTO proposals 
+                cursor.execute(f"""
+                    INSERT INTO proposals 
                     (proposal_id, timestamp, strategy, instrument_type, symbol, 
-                     side, quantity, price, order_type, metadata, source, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     side, quantity, price, order_type, metadata, source, created_at,
+                     {', '.join(PROPOSAL_METRIC_FIELDS)})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?{', ?' * len(PROPOSAL_METRIC_FIELDS)})
                 """, (
                     proposal.get('proposal_id'),
                     proposal.get('timestamp', get_b3_timestamp()),
@@ -271,36 +787,82 @@ class OrdersRepository:
                     proposal.get('quantity', 0),
                     proposal.get('price', 0),
                     proposal.get('order_type', 'LIMIT'),
-                    json.dumps(proposal.get('metadata', {})),
+                    json.dumps(extra, default=_json_default),
                     proposal.get('source', 'real'),  # 'simulation' ou 'real'
-                    created_at_b3
+                    created_at_b3,
+                    *metrics
                 ))
                 return True
+        except sqlite3.IntegrityError:
+            # Nunca sobrescrever: o ciclo de vida (decisão, envio, execução) pertence à proposta existente
+            logger.error(f"Proposta {proposal.get('proposal_id')} já existe no banco; não foi sobrescrita")
+            return False
         except Exception as e:
             logger.error(f"Erro ao salvar proposta: {e}")
             return False
     
-    def save_risk_evaluation(self, evaluation: Dict) -> bool:
+    def proposal_seq_exists(self, day_seq: str) -> bool:
+        """Algum ID gravado já usa a sequência do dia AAAAMMDD-NNNN (inclusive com prefixo/sufixo de estratégia)?"""
+        try:
+            with _connect() as conn:
+                return conn.execute(
+                    "SELECT 1 FROM proposals WHERE proposal_id GLOB ? OR proposal_id GLOB ? LIMIT 1",
+                    (f"*{day_seq}", f"*{day_seq}_*")
+                ).fetchone() is not None
+        except Exception as e:
+            logger.error(f"Erro ao consultar sequência {day_seq}: {e}")
+            return False
+    
+    def resolve_proposal_id(self, ref: str) -> Optional[str]:
+        """
+        Resolve o ID completo de uma proposta a partir do ID ou do apelido de 4 dígitos
+        exibido no Telegram (sequência do dia; prioriza o pregão atual, depois a mais recente).
+        """
+        ref = str(ref).strip()
+        try:
+            with _connect() as conn:
+                row = conn.execute("SELECT proposal_id FROM proposals WHERE proposal_id = ?", (ref,)).fetchone()
+                if row is None and ref.isdigit():
+                    today = get_b3_timestamp()[:10].replace('-', '')
+                    row = conn.execute(
+                        "SELECT proposal_id FROM proposals WHERE proposal_id LIKE ? ORDER BY created_at DESC LIMIT 1",
+                        (f"%{today}-{ref}",)
+                    ).fetchone()
+                    if row is None:
+                        row = conn.execute(
+                            "SELECT proposal_id FROM proposals WHERE proposal_id LIKE ? ORDER BY created_at DESC LIMIT 1",
+                            (f"%-{ref}",)
+                        ).fetchone()
+                return row['proposal_id'] if row else None
+        except Exception as e:
+            logger.error(f"Erro ao resolver proposta {ref}: {e}")
+            return None
+    
+    def save_risk_evaluation(self, evaluation: Union[RiskEvaluation, Dict]) -> bool:
         """Salva avaliação do RiskAgent."""
         try:
             created_at_b3 = get_b3_timestamp()
+            if isinstance(evaluation, RiskEvaluation):
+                evaluation = evaluation.to_dict()
             
             with _connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO risk_evaluations 
                     (proposal_id, timestamp, decision, reason, details, 
-                     modified_quantity, modified_price, source, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     modified_quantity, modified_price, source, strategy, symbol, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     evaluation.get('proposal_id'),
                     evaluation.get('timestamp', get_b3_timestamp()),
                     evaluation.get('decision', 'REJECT'),
                     evaluation.get('reason', ''),
-                    json.dumps(evaluation.get('details', {})),
+                    json.dumps(evaluation.get('details') or {}, default=_json_default),
                     evaluation.get('modified_quantity'),
                     evaluation.get('modified_price'),
                     evaluation.get('source', 'real'),  # 'simulation' ou 'real'
+                    evaluation.get('strategy'),
+                    evaluation.get('symbol'),
                     created_at_b3
                 ))
                 return True
@@ -343,6 +905,56 @@ class OrdersRepository:
             logger.error(f"Erro ao salvar execução: {e}")
             return False
     
+    def save_executions(self, executions: Union[pd.DataFrame, List[Dict]]) -> int:
+        """
+        Salva execuções em lote (uma transação, executemany).
+        
+        Returns:
+            Quantidade de execuções gravadas (0 em caso de erro)
+        """
+        frame = pd.DataFrame(executions)
+        if frame.empty:
+            return 0
+        try:
+            created_at_b3 = get_b3_timestamp()
+            
+            def column(name, default):
+                return frame[name] if name in frame else pd.Series(default, index=frame.index)
+            
+            order_ids = column('order_id', None)
+            if 'fill_id' in frame:
+                order_ids = order_ids.fillna(frame['fill_id'])
+            # Listas de tipos Python nativos (bind do sqlite3 bem mais rápido que escalares numpy)
+            rows = zip(
+                order_ids.tolist(),
+                column('proposal_id', '').fillna('').tolist(),
+                column('timestamp', created_at_b3).fillna(created_at_b3).astype(str).tolist(),
+                column('symbol', '').tolist(),
+                column('side', 'BUY').tolist(),
+                column('quantity', 0).astype(float).tolist(),
+                column('price', 0).astype(float).tolist(),
+                column('market_price', None).tolist(),
+                column('slippage', 0).astype(float).tolist(),
+                column('commission', 0).astype(float).tolist(),
+                column('notional', 0).astype(float).tolist(),
+                column('total_cost', 0).astype(float).tolist(),
+                column('status', 'FILLED').tolist(),
+                column('source', 'real').tolist(),
+                [created_at_b3] * len(frame)
+            )
+            with _connect() as conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO executions 
+                    (order_id, proposal_id, timestamp, symbol, side, quantity, 
+                     price, market_price, slippage, commission, notional, 
+                     total_cost, status, source, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+            return len(frame)
+        except Exception as e:
+            logger.error(f"Erro ao salvar execuções em lote: {e}")
+            return 0
+    
     def save_performance_snapshot(self, snapshot: Dict) -> bool:
         """Salva snapshot de performance (backtest em tempo real)."""
         try:
@@ -379,110 +991,100 @@ class OrdersRepository:
             logger.error(f"Erro ao salvar snapshot: {e}")
             return False
     
-    def get_proposals(self, strategy: str = None, start_date: str = None, end_date: str = None) -> pd.DataFrame:
-        """Busca propostas com filtros opcionais."""
+    def get_proposals(self, strategy: str = None, start_date: str = None, end_date: str = None,
+                      underlying: str = None, min_comparison_score: float = None,
+                      parse_metadata: bool = True, status: str = None, symbol: str = None,
+                      columns: Optional[List[str]] = None, limit: int = None,
+                      after: Optional[Tuple] = None) -> pd.DataFrame:
+        """
+        Busca propostas com filtros opcionais.
+        
+        Métricas (delta, comparison_score, exit_price_tp, ...) vêm como colunas. Com
+        parse_metadata=True a coluna metadata traz o dict completo (extra + métricas);
+        com False ela fica com o JSON bruto do mapa de extensão (sem parse em Python).
+        columns/limit/after: projeção e paginação por keyset (ver page_cursor).
+        """
         try:
-            with _connect() as conn:
-                query = "SELECT * FROM proposals WHERE 1=1"
-                params = []
-                
-                if strategy:
-                    query += " AND strategy = ?"
-                    params.append(strategy)
-                
-                if start_date:
-                    query += " AND timestamp >= ?"
-                    params.append(start_date)
-                
-                if end_date:
-                    query += " AND timestamp <= ?"
-                    params.append(end_date)
-                
-                query += " ORDER BY timestamp DESC"
-                
-                df = pd.read_sql_query(query, conn, params=params)
-                
-                # Parsear metadata JSON
-                if 'metadata' in df.columns:
-                    df['metadata'] = df['metadata'].apply(lambda x: json.loads(x) if x else {})
-                
-                return df
+            df = _query_page(
+                'proposals', columns=columns,
+                filters={'strategy': strategy, 'underlying': underlying, 'status': status, 'symbol': symbol},
+                min_values={'comparison_score': min_comparison_score},
+                start_date=start_date, end_date=end_date, limit=limit, after=after
+            )
+            
+            # Parsear metadata JSON
+            if parse_metadata and 'metadata' in df.columns:
+                df['metadata'] = _merge_metadata(df)
+            
+            return df
         except Exception as e:
             logger.error(f"Erro ao buscar propostas: {e}")
             return pd.DataFrame()
     
-    def get_risk_evaluations(self, proposal_id: str = None) -> pd.DataFrame:
-        """Busca avaliações de risco."""
+    def get_risk_evaluations(self, proposal_id: str = None, start_date: str = None, end_date: str = None,
+                             decision: str = None, strategy: str = None,
+                             columns: Optional[List[str]] = None, limit: int = None,
+                             after: Optional[Tuple] = None, decode_json: bool = True) -> pd.DataFrame:
+        """
+        Busca avaliações de risco.
+        
+        Filtros, projeção (columns) e paginação (limit/after) vão para o SQL;
+        decode_json=False mantém details como texto.
+        """
         try:
-            with _connect() as conn:
-                query = "SELECT * FROM risk_evaluations WHERE 1=1"
-                params = []
-                
-                if proposal_id:
-                    query += " AND proposal_id = ?"
-                    params.append(proposal_id)
-                
-                query += " ORDER BY timestamp DESC"
-                
-                df = pd.read_sql_query(query, conn, params=params)
-                
-                if 'details' in df.columns:
-                    df['details'] = df['details'].apply(lambda x: json.loads(x) if x else {})
-                
-                return df
+            return _query_page(
+                'risk_evaluations', columns=columns,
+                filters={'proposal_id': proposal_id, 'decision': decision, 'strategy': strategy},
+                start_date=start_date, end_date=end_date, limit=limit, after=after,
+                decode_json=decode_json
+            )
         except Exception as e:
             logger.error(f"Erro ao buscar avaliações: {e}")
             return pd.DataFrame()
     
-    def get_executions(self, start_date: str = None, end_date: str = None) -> pd.DataFrame:
-        """Busca execuções."""
+    def get_executions(self, start_date: str = None, end_date: str = None, proposal_id: str = None,
+                       symbol: str = None, status: str = None, columns: Optional[List[str]] = None,
+                       limit: int = None, after: Optional[Tuple] = None) -> pd.DataFrame:
+        """Busca execuções (filtros, projeção e paginação por keyset no SQL)."""
         try:
-            with _connect() as conn:
-                query = "SELECT * FROM executions WHERE 1=1"
-                params = []
-                
-                if start_date:
-                    query += " AND timestamp >= ?"
-                    params.append(start_date)
-                
-                if end_date:
-                    query += " AND timestamp <= ?"
-                    params.append(end_date)
-                
-                query += " ORDER BY timestamp DESC"
-                
-                return pd.read_sql_query(query, conn, params=params)
+            return _query_page(
+                'executions', columns=columns,
+                filters={'proposal_id': proposal_id, 'symbol': symbol, 'status': status},
+                start_date=start_date, end_date=end_date, limit=limit, after=after
+            )
         except Exception as e:
             logger.error(f"Erro ao buscar execuções: {e}")
             return pd.DataFrame()
     
-    def get_performance_snapshots(self, start_date: str = None, end_date: str = None) -> pd.DataFrame:
-        """Busca snapshots de performance."""
+    def get_performance_snapshots(self, start_date: str = None, end_date: str = None,
+                                  columns: Optional[List[str]] = None, limit: int = None,
+                                  after: Optional[Tuple] = None, decode_json: bool = True) -> pd.DataFrame:
+        """Busca snapshots de performance (ordem cronológica)."""
         try:
-            with _connect() as conn:
-                query = "SELECT * FROM performance_snapshots WHERE 1=1"
-                params = []
-                
-                if start_date:
-                    query += " AND timestamp >= ?"
-                    params.append(start_date)
-                
-                if end_date:
-                    query += " AND timestamp <= ?"
-                    params.append(end_date)
-                
-                query += " ORDER BY timestamp ASC"
-                
-                df = pd.read_sql_query(query, conn, params=params)
-                
-                if 'details' in df.columns:
-                    df['details'] = df['details'].apply(lambda x: json.loads(x) if x else {})
-                
-                return df
+            return _query_page(
+                'performance_snapshots', columns=columns, start_date=start_date, end_date=end_date,
+                descending=False, limit=limit, after=after, decode_json=decode_json
+            )
         except Exception as e:
             logger.error(f"Erro ao buscar snapshots: {e}")
             return pd.DataFrame()
     
+    def get_latest_performance_snapshot(self) -> Optional[Dict]:
+        """Retorna o snapshot de performance mais recente (ou None)."""
+        try:
+            with _connect() as conn:
+                row = conn.execute(
+                    "SELECT * FROM performance_snapshots ORDER BY timestamp DESC, id DESC LIMIT 1"
+                ).fetchone()
+                if not row:
+                    return None
+                snapshot = dict(row)
+                snapshot['details'] = json.loads(snapshot['details']) if snapshot.get('details') else {}
+                return snapshot
+        except Exception as e:
+            logger.error(f"Erro ao buscar último snapshot: {e}")
+            return None
+    
     def save_market_data_capture(self, ticker: str, data_type: str, spot_data: Dict = None, options_data: List[Dict] = None, raw_data: Dict = None, source: str = 'real'):
         """Salva dados de mercado capturados para rastreabilidade."""
         try:
@@ -513,11 +1115,7 @@ class OrdersRepository:
                     return obj.to_dict()
                 raise TypeError(f"Type {type(obj)} not serializable")
             
-            try:
-                options_json = json.dumps(options_data, default=json_serializer) if options_data else None
-            except Exception as e:
-                logger.warning(f"Erro ao serializar options_data: {e}")
-                options_json = None
+            raw_json = None
             
             try:
                 raw_json = json.dumps(raw_data, default=json_serializer) if raw_data else None
@@ -529,59 +1127,193 @@ class OrdersRepository:
             created_at_b3 = get_b3_timestamp()
             
             with _connect() as conn:
+                # Cadeia de opções: snapshot delta; JSON apenas se a cadeia não puder ser codificada
+                options_json, snapshot_id = None, None
+                if options_data:
+                    try:
+                        snapshot_id = self.option_chains.write(conn, DB_PATH, ticker, timestamp, options_data)
+                    except Exception as e:
+                        logger.warning(f"Erro ao gravar snapshot da cadeia de {ticker}, mantendo JSON: {e}")
+                    if snapshot_id is None:
+                        try:
+                            options_json = json.dumps(options_data, default=json_serializer)
+                        except Exception as e:
+                            logger.warning(f"Erro ao serializar options_data: {e}")
+                
                 conn.execute("""
                     INSERT INTO market_data_captures 
                     (timestamp, ticker, data_type, open_price, high_price, low_price, close_price, 
-                     last_price, volume, adv, intraday_return, volume_ratio, options_data, raw_data, source, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     last_price, volume, adv, intraday_return, volume_ratio, options_data, raw_data, source, created_at,
+                     chain_snapshot_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     timestamp, ticker, data_type, open_price, high_price, low_price, close_price,
-                    last_price, volume, adv, intraday_return, volume_ratio, options_json, raw_json, source, created_at_b3
+                    last_price, volume, adv, intraday_return, volume_ratio, options_json, raw_json, source, created_at_b3,
+                    snapshot_id
                 ))
         except Exception as e:
             logger.error(f"Erro ao salvar captura de dados de mercado: {e}")
     
-    def get_market_data_captures(self, ticker: str = None, start_date: str = None, end_date: str = None, limit: int = None) -> pd.DataFrame:
-        """Busca dados de mercado capturados."""
+    def get_market_data_captures(self, ticker: str = None, start_date: str = None, end_date: str = None,
+                                 limit: int = None, data_type: str = None,
+                                 columns: Optional[List[str]] = None, after: Optional[Tuple] = None,
+                                 decode_json: bool = True) -> pd.DataFrame:
+        """
+        Busca dados de mercado capturados.
+        
+        Use columns (ex.: ['ticker', 'created_at']) para não trazer options_data/raw_data;
+        decode_json=False mantém as colunas JSON como texto. Com decode_json, options_data
+        das capturas gravadas em snapshot delta é reconstruído (chain_snapshot_id).
+        """
         try:
-            with _connect() as conn:
-                query = "SELECT * FROM market_data_captures WHERE 1=1"
-                params = []
-                
-                if ticker:
-                    query += " AND ticker = ?"
-                    params.append(ticker)
-                
-                if start_date:
-                    query += " AND timestamp >= ?"
-                    params.append(start_date)
-                
-                if end_date:
-                    query += " AND timestamp <= ?"
-                    params.append(end_date)
-                
-                query += " ORDER BY timestamp DESC"
-                
-                if limit:
-                    query += f" LIMIT {limit}"
-                
-                df = pd.read_sql_query(query, conn, params=params)
-                
-                # Parse JSON fields
-                if 'options_data' in df.columns:
-                    df['options_data'] = df['options_data'].apply(lambda x: json.loads(x) if x else None)
-                if 'raw_data' in df.columns:
-                    df['raw_data'] = df['raw_data'].apply(lambda x: json.loads(x) if x else None)
-                
-                return df
+            if decode_json and columns and 'options_data' in columns and 'chain_snapshot_id' not in columns:
+                columns = [*columns, 'chain_snapshot_id']
+            df = _query_page(
+                'market_data_captures', columns=columns,
+                filters={'ticker': ticker, 'data_type': data_type},
+                start_date=start_date, end_date=end_date, limit=limit, after=after,
+                decode_json=decode_json
+            )
+            if decode_json and 'options_data' in df.columns and 'chain_snapshot_id' in df.columns:
+                pending = df['options_data'].isna() & df['chain_snapshot_id'].notna()
+                if pending.any():
+                    with _connect() as conn:
+                        df.loc[pending, 'options_data'] = pd.Series([
+                            self.option_chains.to_records(self.option_chains.replay(conn, int(snapshot_id)))
+                            for snapshot_id in df.loc[pending, 'chain_snapshot_id']
+                        ], index=df.index[pending], dtype=object)
+            return df
         except Exception as e:
             logger.error(f"Erro ao buscar capturas de dados de mercado: {e}")
             return pd.DataFrame()
     
+    def get_option_chain(self, underlying: str, at=None, snapshot_id: int = None,
+                         as_records: bool = False) -> Union[pd.DataFrame, List[Dict]]:
+        """
+        Reconstrói a cadeia de opções de um ativo como estava em 'at' (último scan até esse
+        horário, no mesmo dia; padrão: agora) ou em um snapshot específico.
+        
+        Returns:
+            DataFrame (um contrato por linha) ou, com as_records, lista de dicts no formato
+            de market_data['options'][ticker]
+        """
+        try:
+            with _connect() as conn:
+                if snapshot_id is None:
+                    snapshot_id = self.option_chains.snapshot_at(conn, underlying, at or get_b3_timestamp())
+                frame = self.option_chains.replay(conn, snapshot_id) if snapshot_id is not None else None
+            if frame is None:
+                return [] if as_records else pd.DataFrame()
+            return self.option_chains.to_records(frame) if as_records else frame
+        except Exception as e:
+            logger.error(f"Erro ao reconstruir cadeia de opções de {underlying}: {e}")
+            return [] if as_records else pd.DataFrame()
+    
+    def record_scan_stats(self, tickers_requested: int, failures: int, latency_ms: float,
+                          source: str = 'real', timestamp: str = None):
+        """Registra um scan (tickers pedidos, falhas, latência da coleta) nos buckets de capture_stats."""
+        try:
+            timestamp = timestamp or get_b3_timestamp()
+            with _connect() as conn:
+                conn.executemany("""
+                    INSERT INTO capture_stats
+                        (resolution, bucket, source, scans, tickers_requested, failures, latency_ms_sum, latency_ms_max)
+                    VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+                    ON CONFLICT (resolution, bucket, source) DO UPDATE SET
+                        scans = scans + 1,
+                        tickers_requested = tickers_requested + excluded.tickers_requested,
+                        failures = failures + excluded.failures,
+                        latency_ms_sum = latency_ms_sum + excluded.latency_ms_sum,
+                        latency_ms_max = MAX(COALESCE(latency_ms_max, 0), excluded.latency_ms_max)
+                """, [
+                    (resolution, timestamp[:length], source, int(tickers_requested), int(failures),
+                     float(latency_ms), float(latency_ms))
+                    for resolution, length in (('minute', 16), ('hour', 13))
+                ])
+        except Exception as e:
+            logger.error(f"Erro ao registrar estatísticas do scan: {e}")
+    
+    def get_capture_stats(self, hours: float = 24, source: str = 'real', include_buckets: bool = False) -> Dict:
+        """
+        Estatísticas de captura das últimas `hours` horas, lidas dos rollups (O(buckets)).
+        
+        Janelas de até 6h usam buckets por minuto; acima disso, por hora (a janela começa
+        na hora cheia). Contagens por ticker sempre por hora.
+        
+        Returns:
+            total_captures, captures_with_options, option_contracts, ticker_captures,
+            first_capture, last_capture, scans, failures, failure_rate, avg_latency_ms,
+            max_latency_ms, resolution, hours (+ buckets se include_buckets)
+        """
+        since = (datetime.now(B3_TIMEZONE) - timedelta(hours=hours)).isoformat()
+        resolution, length = ('minute', 16) if hours <= 6 else ('hour', 13)
+        stats = {
+            'total_captures': 0, 'captures_with_options': 0, 'option_contracts': 0,
+            'ticker_captures': {}, 'first_capture': None, 'last_capture': None,
+            'scans': 0, 'failures': 0, 'failure_rate': 0.0,
+            'avg_latency_ms': None, 'max_latency_ms': None,
+            'resolution': resolution, 'hours': hours
+        }
+        try:
+            with _connect() as conn:
+                totals = conn.execute("""
+                    SELECT SUM(captures) AS captures, SUM(captures_with_options) AS with_options,
+                           SUM(option_contracts) AS contracts, MIN(first_capture) AS first_capture,
+                           MAX(last_capture) AS last_capture, SUM(scans) AS scans,
+                           SUM(tickers_requested) AS requested, SUM(failures) AS failures,
+                           SUM(latency_ms_sum) AS latency_sum, MAX(latency_ms_max) AS latency_max
+                    FROM capture_stats WHERE resolution = ? AND source = ? AND bucket >= ?
+                """, (resolution, source, since[:length])).fetchone()
+                tickers = conn.execute("""
+                    SELECT ticker, SUM(captures) FROM capture_stats_ticker
+                    WHERE source = ? AND bucket >= ? GROUP BY ticker ORDER BY 2 DESC
+                """, (source, since[:13])).fetchall()
+                if include_buckets:
+                    stats['buckets'] = [dict(row) for row in conn.execute("""
+                        SELECT bucket, captures, captures_with_options, option_contracts, scans, failures,
+                               latency_ms_sum / NULLIF(scans, 0) AS avg_latency_ms, latency_ms_max
+                        FROM capture_stats WHERE resolution = ? AND source = ? AND bucket >= ?
+                        ORDER BY bucket
+                    """, (resolution, source, since[:length]))]
+            
+            scans = totals['scans'] or 0
+            stats.update({
+                'total_captures': totals['captures'] or 0,
+                'captures_with_options': totals['with_options'] or 0,
+                'option_contracts': totals['contracts'] or 0,
+                'ticker_captures': {row[0]: row[1] for row in tickers},
+                'first_capture': totals['first_capture'],
+                'last_capture': totals['last_capture'],
+                'scans': scans,
+                'failures': totals['failures'] or 0,
+                'failure_rate': (totals['failures'] or 0) / totals['requested'] if totals['requested'] else 0.0,
+                'avg_latency_ms': totals['latency_sum'] / scans if scans else None,
+                'max_latency_ms': totals['latency_max']
+            })
+        except Exception as e:
+            logger.error(f"Erro ao buscar estatísticas de captura: {e}")
+            stats['error'] = str(e)
+        return stats
+    
+    def get_last_capture_time(self, source: str = 'real') -> Optional[str]:
+        """Timestamp da última captura (bucket por hora mais recente)."""
+        try:
+            with _connect() as conn:
+                row = conn.execute("""
+                    SELECT last_capture FROM capture_stats
+                    WHERE resolution = 'hour' AND source = ? AND last_capture IS NOT NULL
+                    ORDER BY bucket DESC LIMIT 1
+                """, (source,)).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Erro ao buscar última captura: {e}")
+            return None
+    
     def save_open_position(self, symbol: str, side: str, quantity: float, avg_price: float, 
                           current_price: float = None, delta: float = 0, gamma: float = 0, 
-                          vega: float = 0, unrealized_pnl: float = 0):
-        """Salva ou atualiza posição aberta."""
+                          vega: float = 0, unrealized_pnl: float = 0, strategy: str = None,
+                          underlying: str = None, proposal_id: str = None) -> Optional[int]:
+        """Salva ou atualiza posição aberta. Retorna o ID da posição (None em caso de erro)."""
         try:
             timestamp = get_b3_timestamp()
             
@@ -615,17 +1347,20 @@ class OrdersRepository:
                             updated_at = ?
                         WHERE id = ?
                     """, (new_qty, new_avg, current_price, unrealized_pnl, delta, gamma, vega, timestamp, existing['id']))
+                    return int(existing['id'])
                 else:
                     # Criar nova posição
-                    conn.execute("""
+                    inserted = conn.execute("""
                         INSERT INTO open_positions 
                         (symbol, side, quantity, avg_price, current_price, unrealized_pnl, 
-                         delta, gamma, vega, opened_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                         delta, gamma, vega, opened_at, strategy, underlying, proposal_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """, (symbol, side, quantity, avg_price, current_price, unrealized_pnl, 
-                          delta, gamma, vega, timestamp))
+                          delta, gamma, vega, timestamp, strategy, underlying, proposal_id))
+                    return int(inserted.lastrowid)
         except Exception as e:
             logger.error(f"Erro ao salvar posição aberta: {e}")
+            return None
     
     def get_open_positions(self) -> pd.DataFrame:
         """Busca posições abertas."""
@@ -637,6 +1372,51 @@ class OrdersRepository:
             logger.error(f"Erro ao buscar posições abertas: {e}")
             return pd.DataFrame()
     
+    def update_position_marks(self, marks: List[Dict]) -> int:
+        """
+        Atualiza marcação (preço, P&L não realizado e greeks) de várias posições abertas
+        em uma única transação.
+        
+        Args:
+            marks: Lista de dicts com id, current_price, unrealized_pnl, delta, gamma, vega
+        """
+        if not marks:
+            return 0
+        try:
+            timestamp = get_b3_timestamp()
+            with _connect() as conn:
+                conn.executemany("""
+                    UPDATE open_positions 
+                    SET current_price = ?, unrealized_pnl = ?, delta = ?, gamma = ?, vega = ?,
+                        updated_at = ?
+                    WHERE id = ? AND closed_at IS NULL
+                """, [
+                    (m.get('current_price'), m.get('unrealized_pnl', 0), m.get('delta', 0),
+                     m.get('gamma', 0), m.get('vega', 0), timestamp, m['id'])
+                    for m in marks
+                ])
+            return len(marks)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar marcação das posições: {e}")
+            return 0
+    
+    def get_closed_positions(self, start_date: str = None) -> pd.DataFrame:
+        """Busca posições fechadas (opcionalmente a partir de uma data)."""
+        try:
+            with _connect() as conn:
+                query = "SELECT * FROM open_positions WHERE closed_at IS NOT NULL"
+                params = []
+                
+                if start_date:
+                    query += " AND closed_at >= ?"
+                    params.append(start_date)
+                
+                query += " ORDER BY closed_at DESC"
+                return pd.read_sql_query(query, conn, params=params)
+        except Exception as e:
+            logger.error(f"Erro ao buscar posições fechadas: {e}")
+            return pd.DataFrame()
+    
     def close_position(self, position_id: int, close_price: float, realized_pnl: float = None) -> bool:
         """Fecha uma posição aberta (EOD - End of Day)."""
         try:
@@ -718,16 +1498,9 @@ class OrdersRepository:
         start = f"{date} 00:00:00"
         end = f"{date} 23:59:59"
         
-        proposals = self.get_proposals(start_date=start, end_date=end)
+        proposals = self.get_proposals(start_date=start, end_date=end, columns=['strategy'], parse_metadata=False)
         executions = self.get_executions(start_date=start, end_date=end)
-        evaluations = self.get_risk_evaluations()
-        
-        # Filtrar avaliações do dia
-        if not evaluations.empty:
-            evaluations = evaluations[
-                (evaluations['timestamp'] >= start) & 
-                (evaluations['timestamp'] <= end)
-            ]
+        evaluations = self.get_risk_evaluations(start_date=start, end_date=end, columns=['decision'])
         
         return {
             'date': date,
@@ -772,34 +1545,128 @@ class OrdersRepository:
             logger.error(f"Erro ao atualizar status da proposta {proposal_id}: {e}")
             return False
     
-    def get_proposals_by_status(self, status: str = None) -> pd.DataFrame:
+    def get_proposals_metadata(self, proposal_ids: List[str]) -> Dict[str, Dict]:
+        """Retorna metadata das propostas informadas (proposal_id -> dict, extra + métricas)."""
+        ids = [pid for pid in set(proposal_ids) if pid]
+        if not ids:
+            return {}
+        try:
+            with _connect() as conn:
+                placeholders = ','.join('?' * len(ids))
+                df = pd.read_sql_query(
+                    f"SELECT proposal_id, metadata, {', '.join(PROPOSAL_METRIC_FIELDS)} "
+                    f"FROM proposals WHERE proposal_id IN ({placeholders})",
+                    conn, params=ids
+                )
+                return dict(zip(df['proposal_id'], _merge_metadata(df)))
+        except Exception as e:
+            logger.error(f"Erro ao buscar metadata de propostas: {e}")
+            return {}
+    
+    def get_proposals_by_status(self, status: str = None, columns: Optional[List[str]] = None,
+                                limit: int = None, after: Optional[Tuple] = None) -> pd.DataFrame:
         """Busca propostas filtradas por status.
         
         Args:
             status: Status para filtrar ('gerada', 'enviada', 'aprovada', 'cancelada')
                    Se None, retorna todas
+            columns, limit, after: Projeção e paginação (ver get_proposals)
+        """
+        return self.get_proposals(status=status, columns=columns, limit=limit, after=after)
+    
+    def get_proposal_lifecycle(self, proposal_id: str = None, strategy: str = None, symbol: str = None,
+                               status: str = None, start_date: str = None, end_date: str = None,
+                               include_metadata: bool = False, limit: int = None) -> pd.DataFrame:
+        """
+        Busca o ciclo de vida das propostas (uma linha por proposta).
+
+        Args:
+            proposal_id: Proposta específica
+            strategy, symbol, status: Filtros indexados
+            start_date, end_date: Intervalo sobre generated_at (ISO)
+            include_metadata: Junta métricas/metadata da tabela proposals (coluna metadata = dict)
+            limit: Máximo de linhas (mais recentes primeiro)
         """
         try:
             with _connect() as conn:
-                query = "SELECT * FROM proposals WHERE 1=1"
+                if include_metadata:
+                    metric_cols = ', '.join(f"p.{name}" for name in PROPOSAL_METRIC_FIELDS if name != 'underlying')
+                    query = (f"SELECT l.*, p.metadata, {metric_cols} FROM proposal_lifecycle l "
+                             "LEFT JOIN proposals p ON p.proposal_id = l.proposal_id WHERE 1=1")
+                else:
+                    query = "SELECT l.* FROM proposal_lifecycle l WHERE 1=1"
                 params = []
-                
-                if status:
-                    query += " AND status = ?"
-                    params.append(status)
-                
-                query += " ORDER BY created_at DESC"
-                
+
+                for column, value in (('proposal_id', proposal_id), ('strategy', strategy),
+                                      ('symbol', symbol), ('status', status)):
+                    if value:
+                        query += f" AND l.{column} = ?"
+                        params.append(value)
+
+                if start_date:
+                    query += " AND l.generated_at >= ?"
+                    params.append(start_date)
+
+                if end_date:
+                    query += " AND l.generated_at <= ?"
+                    params.append(end_date)
+
+                query += " ORDER BY l.generated_at DESC"
+                if limit:
+                    query += " LIMIT ?"
+                    params.append(int(limit))
+
                 df = pd.read_sql_query(query, conn, params=params)
-                
-                if 'metadata' in df.columns:
-                    df['metadata'] = df['metadata'].apply(lambda x: json.loads(x) if x else {})
-                
+
+                if include_metadata and 'metadata' in df.columns:
+                    df['metadata'] = _merge_metadata(df)
+
                 return df
         except Exception as e:
-            logger.error(f"Erro ao buscar propostas por status: {e}")
+            logger.error(f"Erro ao buscar ciclo de vida das propostas: {e}")
             return pd.DataFrame()
-    
+
+    def get_lifecycle_summary(self, strategy: str = None, start_date: str = None) -> Dict:
+        """Contagens por status e por decisão do RiskAgent (agregadas no SQLite)."""
+        try:
+            with _connect() as conn:
+                where = "WHERE 1=1"
+                params = []
+                if strategy:
+                    where += " AND strategy = ?"
+                    params.append(strategy)
+                if start_date:
+                    where += " AND generated_at >= ?"
+                    params.append(start_date)
+
+                by_status = {row['status']: row['n'] for row in conn.execute(
+                    f"SELECT status, COUNT(*) AS n FROM proposal_lifecycle {where} GROUP BY status", params
+                )}
+                by_decision = {row['decision']: row['n'] for row in conn.execute(
+                    f"SELECT decision, COUNT(*) AS n FROM proposal_lifecycle {where} "
+                    "AND decision IS NOT NULL GROUP BY decision", params
+                )}
+                by_strategy = {row['strategy']: row['n'] for row in conn.execute(
+                    f"SELECT strategy, COUNT(*) AS n FROM proposal_lifecycle {where} GROUP BY strategy", params
+                )}
+                totals = conn.execute(
+                    f"SELECT COUNT(*) AS total, SUM(realized_pnl) AS realized_pnl, "
+                    f"MAX(generated_at) AS last_generated_at FROM proposal_lifecycle {where}", params
+                ).fetchone()
+
+                return {
+                    'total': totals['total'] or 0,
+                    'by_status': by_status,
+                    'by_decision': by_decision,
+                    'by_strategy': by_strategy,
+                    'realized_pnl': totals['realized_pnl'] or 0.0,
+                    'last_generated_at': totals['last_generated_at']
+                }
+        except Exception as e:
+            logger.error(f"Erro ao resumir ciclo de vida das propostas: {e}")
+            return {'total': 0, 'by_status': {}, 'by_decision': {}, 'by_strategy': {}, 'realized_pnl': 0.0,
+                    'last_generated_at': None}
+
     def save_telegram_message(self, message_text: str, message_type: str = 'other', title: str = None, 
                               priority: str = 'normal', proposal_id: str = None, success: bool = True, 
                               error_message: str = None, channel: str = 'telegram'):
@@ -843,40 +1710,26 @@ class OrdersRepository:
             return False
     
     def get_telegram_messages(self, start_date: str = None, end_date: str = None, 
-                              message_type: str = None, limit: int = None) -> pd.DataFrame:
+                              message_type: str = None, limit: int = None, proposal_id: str = None,
+                              columns: Optional[List[str]] = None,
+                              after: Optional[Tuple] = None) -> pd.DataFrame:
         """Busca mensagens Telegram enviadas.
         
         Args:
             start_date: Data inicial (formato 'YYYY-MM-DD HH:MM:SS')
             end_date: Data final (formato 'YYYY-MM-DD HH:MM:SS')
             message_type: Filtrar por tipo de mensagem
-            limit: Limite de resultados
+            limit: Limite de resultados (tamanho da página)
+            proposal_id: Filtrar mensagens de uma proposta
+            columns: Projeção (ex.: sem message_text)
+            after: Cursor da página anterior (page_cursor)
         """
         try:
-            with _connect() as conn:
-                query = "SELECT * FROM telegram_messages_sent WHERE 1=1"
-                params = []
-                
-                if start_date:
-                    query += " AND timestamp >= ?"
-                    params.append(start_date)
-                
-                if end_date:
-                    query += " AND timestamp <= ?"
-                    params.append(end_date)
-                
-                if message_type:
-                    query += " AND message_type = ?"
-                    params.append(message_type)
-                
-                query += " ORDER BY timestamp DESC"
-                
-                if limit:
-                    query += f" LIMIT {limit}"
-                
-                df = pd.read_sql_query(query, conn, params=params)
-                return df
+            return _query_page(
+                'telegram_messages_sent', columns=columns,
+                filters={'message_type': message_type, 'proposal_id': proposal_id},
+                start_date=start_date, end_date=end_date, limit=limit, after=after
+            )
         except Exception as e:
             logger.error(f"Erro ao buscar mensagens Telegram: {e}")
             return pd.DataFrame()
-
@@ -3,10 +3,26 @@ Módulo de precificação: Black-Scholes, greeks e implied volatility.
 """
 
 import numpy as np
-from scipy.stats import norm
-from scipy.optimize import brentq
+from scipy.special import ndtr
 from typing import Tuple, Dict
 
+_SQRT_2PI = np.sqrt(2.0 * np.pi)
+
+
+class _StandardNormal:
+    """cdf/pdf da normal padrão sem scipy.stats (import de ~1s, pesado para CLIs e API)."""
+    
+    @staticmethod
+    def cdf(x):
+        return ndtr(x)
+    
+    @staticmethod
+    def pdf(x):
+        return np.exp(-0.5 * np.square(x)) / _SQRT_2PI
+
+
+norm = _StandardNormal()
+
 
 class BlackScholes:
     """Implementação de Black-Scholes e greeks analíticos."""
@@ -127,6 +143,7 @@ class BlackScholes:
             return BlackScholes.price(S, K, T, r, sigma, option_type) - price
         
         try:
+            from scipy.optimize import brentq  # Só quem calcula IV paga o import
             iv = brentq(objective, 0.0001, 2.0, maxiter=100)
             return max(0.0, iv)
         except:
@@ -135,3 +152,49 @@ class BlackScholes:
                     return sigma
             return 0.25
 
+    
+    @staticmethod
+    def vectorized(S, K, T, r: float, sigma, is_call) -> Dict[str, np.ndarray]:
+        """
+        Preço e greeks para vários contratos de uma vez (arrays numpy).
+        Mesmas convenções das funções escalares: vega por 1 p.p. de vol e theta por dia.
+        """
+        S = np.asarray(S, dtype=float)
+        K = np.asarray(K, dtype=float)
+        T = np.asarray(T, dtype=float)
+        sigma = np.asarray(sigma, dtype=float)
+        is_call = np.asarray(is_call, dtype=bool)
+        S, K, T, sigma, is_call = np.broadcast_arrays(S, K, T, sigma, is_call)
+        
+        live = (T > 0) & (sigma > 0) & (S > 0) & (K > 0)
+        T_safe = np.where(live, T, 1.0)
+        sigma_safe = np.where(live, sigma, 1.0)
+        S_safe = np.where(live, S, 1.0)
+        K_safe = np.where(live, K, 1.0)
+        sqrt_T = np.sqrt(T_safe)
+        
+        d1 = (np.log(S_safe / K_safe) + (r + 0.5 * sigma_safe ** 2) * T_safe) / (sigma_safe * sqrt_T)
+        d2 = d1 - sigma_safe * sqrt_T
+        disc = K_safe * np.exp(-r * T_safe)
+        pdf_d1 = norm.pdf(d1)
+        
+        call_price = S_safe * norm.cdf(d1) - disc * norm.cdf(d2)
+        put_price = disc * norm.cdf(-d2) - S_safe * norm.cdf(-d1)
+        price = np.where(is_call, call_price, put_price)
+        delta = np.where(is_call, norm.cdf(d1), -norm.cdf(-d1))
+        gamma = pdf_d1 / (S_safe * sigma_safe * sqrt_T)
+        vega = S_safe * pdf_d1 * sqrt_T / 100.0
+        term1 = -S_safe * pdf_d1 * sigma_safe / (2 * sqrt_T)
+        theta = (term1 + np.where(is_call, -r * disc * norm.cdf(d2), r * disc * norm.cdf(-d2))) / 365.0
+        
+        # Contratos vencidos ou sem vol: valor intrínseco (mesmo tratamento de price/delta)
+        intrinsic = np.where(is_call, np.maximum(S - K, 0.0), np.maximum(K - S, 0.0))
+        intrinsic_delta = np.where(is_call, (S > K).astype(float), -(S < K).astype(float))
+        
+        return {
+            'price': np.maximum(np.where(live, price, intrinsic), 0.0),
+            'delta': np.where(live, delta, np.where(T <= 0, intrinsic_delta, 0.0)),
+            'gamma': np.where(live, gamma, 0.0),
+            'vega': np.where(live, vega, 0.0),
+            'theta': np.where(live, theta, 0.0)
+        }
@@ -0,0 +1,200 @@
+"""
+Registros tipados do caminho quente: propostas do TraderAgent e avaliações do RiskAgent.
+
+As métricas consultadas com frequência (greeks, TP/SL, scores, ativo-objeto) são campos
+próprios do registro e colunas reais da tabela proposals; o restante do antigo dict
+`metadata` fica no mapa de extensão `extra` (gravado como JSON).
+"""
+
+import re
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+
+
+@dataclass(slots=True, init=False)
+class OrderProposal:
+    """Proposta de ordem do TraderAgent."""
+    proposal_id: str
+    strategy: str
+    instrument_type: str  # 'spot', 'futures', 'options'
+    symbol: str
+    side: str  # 'BUY', 'SELL'
+    quantity: float
+    price: Optional[float]
+    order_type: str
+    # Métricas de primeira classe (colunas da tabela proposals)
+    underlying: Optional[str]
+    comparison_type: Optional[str]
+    strike: Optional[float]
+    expiry: Optional[str]
+    delta: Optional[float]
+    gamma: Optional[float]
+    vega: Optional[float]
+    iv: Optional[float]
+    intraday_return: Optional[float]
+    volume_ratio: Optional[float]
+    spread_pct: Optional[float]
+    comparison_score: Optional[float]
+    entry_price: Optional[float]
+    take_profit_pct: Optional[float]
+    stop_loss_pct: Optional[float]
+    exit_price_tp: Optional[float]
+    exit_price_sl: Optional[float]
+    gain_value: Optional[float]
+    loss_value: Optional[float]
+    # Demais metadados (mapa de extensão, gravado como JSON)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def __init__(self, proposal_id: str, strategy: str, instrument_type: str, symbol: str,
+                 side: str, quantity: float, price: Optional[float] = None, order_type: str = 'LIMIT',
+                 metadata: Optional[Mapping[str, Any]] = None, extra: Optional[Dict[str, Any]] = None,
+                 **metrics):
+        """
+        Aceita o `metadata` livre de antes: chaves de métricas conhecidas viram campos,
+        as demais vão para `extra`. Métricas também podem ser passadas como keyword.
+        """
+        self.proposal_id = proposal_id
+        self.strategy = strategy
+        self.instrument_type = instrument_type
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.order_type = order_type
+        for name in PROPOSAL_METRIC_FIELDS:
+            setattr(self, name, None)
+        self.extra = dict(extra) if extra else {}
+        if metadata:
+            promoted, rest = split_metadata(metadata)
+            for name, value in promoted.items():
+                setattr(self, name, value)
+            self.extra.update(rest)
+        for name, value in metrics.items():
+            if name not in PROPOSAL_METRIC_FIELDS:
+                raise TypeError(f"OrderProposal: campo desconhecido '{name}'")
+            setattr(self, name, value)
+
+    @property
+    def metadata(self) -> 'ProposalMetadata':
+        """Visão dict (leitura/escrita) sobre métricas + extra, para o código legado."""
+        return ProposalMetadata(self)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas preenchidas (sem None)."""
+        return {name: getattr(self, name) for name in PROPOSAL_METRIC_FIELDS
+                if getattr(self, name) is not None}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dict no formato de OrdersRepository.save_proposal (metadata = apenas extra)."""
+        record = {
+            'proposal_id': self.proposal_id,
+            'strategy': self.strategy,
+            'instrument_type': self.instrument_type,
+            'symbol': self.symbol,
+            'side': self.side,
+            'quantity': self.quantity,
+            'price': self.price,
+            'order_type': self.order_type,
+            'metadata': self.extra
+        }
+        record.update({name: getattr(self, name) for name in PROPOSAL_METRIC_FIELDS})
+        return record
+
+
+# Campos de métricas -> tipo SQLite da coluna correspondente em proposals
+PROPOSAL_METRIC_FIELDS: Dict[str, str] = {
+    f.name: 'TEXT' if f.type == Optional[str] else 'REAL'
+    for f in fields(OrderProposal)
+    if f.name not in ('proposal_id', 'strategy', 'instrument_type', 'symbol', 'side',
+                      'quantity', 'price', 'order_type', 'extra')
+}
+
+
+# ID de proposta: data do pregão + sequência do dia (AAAAMMDD-NNNN), com prefixo
+# de estratégia opcional (VOL_ARB_..., PAIRS_..._1)
+PROPOSAL_ID_PATTERN = re.compile(r'(\d{8})-(\d{4,})')
+
+
+def proposal_alias(proposal_id: str) -> str:
+    """Apelido curto da proposta (sequência do dia) usado nos comandos do Telegram."""
+    match = PROPOSAL_ID_PATTERN.search(str(proposal_id))
+    return match.group(2) if match else str(proposal_id)
+
+
+def split_metadata(metadata: Mapping[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Separa um metadata livre em (métricas de primeira classe, extra)."""
+    promoted, rest = {}, {}
+    for key, value in metadata.items():
+        if key in PROPOSAL_METRIC_FIELDS:
+            promoted[key] = value
+        else:
+            rest[key] = value
+    return promoted, rest
+
+
+class ProposalMetadata(MutableMapping):
+    """Visão de mapeamento sobre um OrderProposal (métricas None contam como ausentes)."""
+
+    __slots__ = ('_proposal',)
+
+    def __init__(self, proposal: OrderProposal):
+        self._proposal = proposal
+
+    def __getitem__(self, key: str) -> Any:
+        if key in PROPOSAL_METRIC_FIELDS:
+            value = getattr(self._proposal, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self._proposal.extra[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in PROPOSAL_METRIC_FIELDS:
+            value = getattr(self._proposal, key)
+            return default if value is None else value
+        return self._proposal.extra.get(key, default)
+
+    def __setitem__(self, key: str, value: Any):
+        if key in PROPOSAL_METRIC_FIELDS:
+            setattr(self._proposal, key, value)
+        else:
+            self._proposal.extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in PROPOSAL_METRIC_FIELDS:
+            if getattr(self._proposal, key) is None:
+                raise KeyError(key)
+            setattr(self._proposal, key, None)
+        else:
+            del self._proposal.extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        for name in PROPOSAL_METRIC_FIELDS:
+            if getattr(self._proposal, name) is not None:
+                yield name
+        yield from self._proposal.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+@dataclass(slots=True)
+class RiskEvaluation:
+    """Avaliação do RiskAgent sobre uma proposta (linha de risk_evaluations)."""
+    proposal_id: str
+    decision: str  # 'APPROVE', 'MODIFY', 'REJECT'
+    reason: str = ''
+    timestamp: Optional[str] = None
+    strategy: Optional[str] = None
+    symbol: Optional[str] = None
+    modified_quantity: Optional[float] = None
+    modified_price: Optional[float] = None
+    source: str = 'real'
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
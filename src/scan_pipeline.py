@@ -0,0 +1,487 @@
+"""
+Pipeline do scan em estágios com filas limitadas.
+
+    captura (N workers) -> normalização/pré-filtro -> cadeias de opções (M workers)
+        -> estratégia (micro-lotes) -> risco/notificação
+        -> persistência (capturas no banco)
+
+Cada ticker segue para o estágio seguinte assim que seus dados chegam, em vez de esperar
+o universo inteiro em cada etapa. O budget de daytrade_options (max_proposals_per_scan) é por
+score e em streaming: uma proposta segue na hora para o risco/Telegram se superar o k-ésimo
+melhor score visto no scan (ou o piso daytrade_admit_score); as demais esperam num buffer, e
+no fim da captura as de maior score completam o budget. As filas são limitadas: um estágio lento (ex.: banco ou
+Telegram) faz o anterior esperar (backpressure) em vez de acumular memória. Quando a captura
+termina, as atualizações que dependem do universo completo (prioridade, carteira, MTM, kill
+switch) e as estratégias entre ativos (pairs, MarketMonitor) rodam uma vez.
+
+Métricas por estágio (processados, erros, fila, espera por backpressure, latência) e o
+tempo até a primeira proposta ficam em ScanPipeline.get_status().
+
+Configuração (config['scan_pipeline']): enabled, capture_workers, options_workers,
+queue_size, strategy_batch_size, strategy_batch_wait_ms, max_proposals_per_scan,
+daytrade_admit_score, max_evaluations_per_scan.
+"""
+
+import heapq
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class PipelineStage:
+    """Estágio com fila limitada e workers próprios; handler recebe um lote de itens."""
+
+    def __init__(self, name: str, handler: Callable[[List[Any]], None], workers: int = 1,
+                 maxsize: int = 64, batch_size: int = 1, batch_wait: float = 0.0):
+        self.name = name
+        self.handler = handler
+        self.workers = max(int(workers), 1)
+        self.batch_size = max(int(batch_size), 1)
+        self.batch_wait = batch_wait
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=512)  # ms por lote
+        self._waits = deque(maxlen=512)  # ms na fila por item
+        self._counters = {'processed': 0, 'errors': 0, 'blocked_puts': 0, 'blocked_s': 0.0,
+                          'busy_s': 0.0, 'max_depth': 0}
+
+    def start(self) -> 'PipelineStage':
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"scan-{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def put(self, item: Any):
+        """Enfileira (bloqueia com a fila cheia: backpressure sobre o estágio anterior)."""
+        entry = (time.perf_counter(), item)
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            started = time.perf_counter()
+            self.queue.put(entry)
+            with self._lock:
+                self._counters['blocked_puts'] += 1
+                self._counters['blocked_s'] += time.perf_counter() - started
+        depth = self.queue.qsize()
+        if depth > self._counters['max_depth']:
+            with self._lock:
+                self._counters['max_depth'] = max(self._counters['max_depth'], depth)
+
+    def close(self):
+        """Sinaliza fim da entrada e espera os workers drenarem a fila."""
+        for _ in self._threads:
+            self.queue.put((time.perf_counter(), _STOP))
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _next_batch(self) -> Tuple[List[Any], bool]:
+        """Próximo lote (até batch_size itens ou batch_wait segundos) e se chegou o fim."""
+        enqueued, item = self.queue.get()
+        if item is _STOP:
+            return [], True
+        now = time.perf_counter()
+        waits, batch = [(now - enqueued) * 1000], [item]
+        deadline = now + self.batch_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                enqueued, item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._record_waits(waits)
+                return batch, True
+            waits.append((time.perf_counter() - enqueued) * 1000)
+            batch.append(item)
+        self._record_waits(waits)
+        return batch, False
+
+    def _record_waits(self, waits: List[float]):
+        with self._lock:
+            self._waits.extend(waits)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            failed = False
+            try:
+                self.handler(batch)
+            except Exception as e:
+                failed = True
+                logger.error(f"Erro no estágio '{self.name}': {e}")
+                import traceback
+                logger.debug(traceback.format_exc())
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._counters['processed'] += len(batch)
+                self._counters['errors'] += int(failed)
+                self._counters['busy_s'] += elapsed
+                self._latencies.append(elapsed * 1000)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores, fila atual/máxima, espera na fila (p95) e latência do handler (p50/p95)."""
+        with self._lock:
+            result = dict(self._counters)
+            latencies = sorted(self._latencies)
+            waits = sorted(self._waits)
+        result.update({'workers': self.workers, 'queue_depth': self.queue.qsize()})
+        if latencies:
+            result['latency_p50_ms'] = round(latencies[len(latencies) // 2], 1)
+            result['latency_p95_ms'] = round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 1)
+        if waits:
+            result['queue_wait_p95_ms'] = round(waits[min(int(len(waits) * 0.95), len(waits) - 1)], 1)
+        return result
+
+
+class _ScanRun:
+    """Estado de um scan em andamento (dados acumulados, propostas e contadores)."""
+
+    def __init__(self, b3_time: datetime, trading_status: str, should_generate_proposals: bool):
+        self.b3_time = b3_time
+        self.trading_status = trading_status
+        self.should_generate_proposals = should_generate_proposals
+        self.market_open = trading_status in ['PRE_MARKET', 'TRADING', 'POST_MARKET']
+        self.today = datetime.now().strftime('%Y-%m-%d')
+        self.market_data = {'spot': {}, 'options': {}, 'futures': {}}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.captured = 0
+        self.failed: List[str] = []
+        self.saved = 0
+        self.proposals: List = []
+        self.opportunities: List[Dict] = []
+        self.daytrade_top: List[float] = []  # Min-heap dos k melhores scores de daytrade vistos
+        self.daytrade_admitted = 0
+        self.daytrade_buffer: List[Tuple[float, pd.Timestamp, Any]] = []  # (score, geração, proposta)
+        self.evaluations = 0
+        self.decisions = {'APPROVE': 0, 'REJECT': 0, 'MODIFY': 0}
+        self.first_capture_s: Optional[float] = None
+        self.first_proposal_s: Optional[float] = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def view(self, tickers: Optional[List[str]] = None) -> Dict:
+        """Cópia rasa dos dados do scan (todos ou só tickers) para estágios concorrentes."""
+        with self.lock:
+            spot, options = self.market_data['spot'], self.market_data['options']
+            if tickers is None:
+                return {'spot': dict(spot), 'options': dict(options), 'futures': dict(self.market_data['futures'])}
+            return {
+                'spot': {t: spot[t] for t in tickers if t in spot},
+                'options': {t: options[t] for t in tickers if t in options},
+                'futures': {}
+            }
+
+
+class ScanPipeline:
+    """Scan do MonitoringService em estágios concorrentes com filas limitadas."""
+
+    def __init__(self, service, config: Optional[Dict] = None):
+        self.service = service
+        config = config or {}
+        self.capture_workers = config.get('capture_workers', 8)
+        self.options_workers = config.get('options_workers', 4)
+        self.queue_size = config.get('queue_size', 64)
+        self.strategy_batch_size = config.get('strategy_batch_size', 16)
+        self.strategy_batch_wait = config.get('strategy_batch_wait_ms', 200) / 1000
+        self.max_proposals = config.get('max_proposals_per_scan', 10)  # daytrade_options, como o top 10 sequencial
+        self.admit_score = config.get('daytrade_admit_score')  # Piso de score para envio imediato (None: só top-k)
+        self.max_evaluations = config.get('max_evaluations_per_scan', 50)
+        self.max_dte = service.config.get('daytrade_options', {}).get('max_dte', 7)
+        self.prescreen = service.config.get('options_prescreen', True)
+        self._last_status: Dict[str, Any] = {}
+        self._run: Optional[_ScanRun] = None
+        self._stages: Dict[str, PipelineStage] = {}
+
+    # ------------------------------------------------------------------ execução
+
+    def run(self, tickers: List[str], b3_time: datetime, trading_status: str,
+            should_generate_proposals: bool) -> Tuple[int, List[Dict], List]:
+        """
+        Executa um scan completo.
+
+        Returns:
+            (tickers com dados spot, oportunidades, propostas)
+        """
+        service = self.service
+        run = _ScanRun(b3_time, trading_status, should_generate_proposals)
+        held = {p.get('underlying') for p in service.mtm_engine.get_state()['positions']}
+        size = self.queue_size
+
+        persist = PipelineStage('persist', lambda batch: self._persist(run, batch), maxsize=size * 4, batch_size=32)
+        risk = PipelineStage('risk', lambda batch: self._evaluate(run, batch), maxsize=size)
+        # Com strategy_workers, um lote em voo por processo de estratégia
+        strategy_threads = service.strategy_pool.processes if service.strategy_pool else 1
+        strategy = PipelineStage('strategy', lambda batch: self._strategy(run, batch, risk),
+                                 workers=strategy_threads, maxsize=size, batch_size=self.strategy_batch_size, batch_wait=self.strategy_batch_wait)
+        options = PipelineStage('options', lambda batch: self._options(run, batch, strategy, persist),
+                                workers=self.options_workers, maxsize=size)
+        normalize = PipelineStage('normalize', lambda batch: self._normalize(run, batch, held, options, strategy, persist),
+                                  maxsize=size, batch_size=16)
+        capture = PipelineStage('capture', lambda batch: self._capture(run, batch, normalize),
+                                workers=self.capture_workers, maxsize=size)
+        stages = [capture, normalize, options, strategy, risk, persist]
+        self._run, self._stages = run, {stage.name: stage for stage in stages}
+        try:
+            for stage in stages:
+                stage.start()
+
+            logger.info(f"Pipeline de scan: {len(tickers)} tickers ({self.capture_workers} workers de captura)")
+            futures = service.config.get('monitored_futures', [])
+            if futures:
+                capture.put(('futures', futures))
+            for ticker in tickers:
+                capture.put(('spot', ticker))
+
+            # Fim da captura: estágios de coleta drenados, market_data não muda mais
+            for stage in (capture, normalize, options):
+                stage.close()
+            collection_ms = run.elapsed() * 1000
+            if run.failed:
+                logger.warning(f"Tickers com falha ({len(run.failed)}): {run.failed[:5]}")
+            logger.info(f"Dados coletados: {run.captured}/{len(tickers)} tickers com dados spot "
+                        f"({collection_ms:.0f}ms), opções para {len(run.market_data['options'])} tickers")
+
+            service._after_capture(run.market_data, b3_time)
+            if should_generate_proposals:
+                strategy.put(('universe', None))
+            strategy.close()
+            self._flush_daytrade(run, risk)
+        finally:
+            # Fecha (drena) todos os estágios, de montante para jusante, mesmo após erro:
+            # nenhuma thread fica presa e os itens já enfileirados (ex.: persistência) são gravados
+            for stage in stages:
+                try:
+                    stage.close()
+                except Exception as e:
+                    logger.error(f"Erro ao encerrar o estágio '{stage.name}': {e}")
+            self._last_status = self._status(run, len(tickers))
+            self._run = None
+
+        if service.orders_repo:
+            service.orders_repo.record_scan_stats(len(tickers), len(run.failed), collection_ms)
+        if run.saved:
+            logger.info(f"Dados salvos no banco: {run.saved} instrumentos (spot + futuros)")
+        if should_generate_proposals:
+            logger.info(f"Total de propostas geradas: {len(run.proposals)}; avaliação: "
+                        f"{run.decisions['APPROVE']} aprovadas, {run.decisions['REJECT']} rejeitadas, "
+                        f"{run.decisions['MODIFY']} modificadas")
+        elif run.captured:
+            logger.info(f"Dados coletados ({run.captured} tickers) mas sem propostas geradas (mercado fechado ou sem oportunidades)")
+        return run.captured, run.opportunities, run.proposals
+
+    def _admit_daytrade(self, run: _ScanRun, score: float) -> bool:
+        """
+        Envio imediato (chamado com run.lock): com budget restante, se o score superar o
+        k-ésimo melhor já visto no scan ou o piso daytrade_admit_score.
+        """
+        k = self.max_proposals
+        if k <= 0:
+            return False
+        top = run.daytrade_top
+        beats = len(top) >= k and score > top[0]
+        if len(top) < k:
+            heapq.heappush(top, score)
+        elif score > top[0]:
+            heapq.heapreplace(top, score)
+        if run.daytrade_admitted >= k:
+            return False
+        return beats or (self.admit_score is not None and score >= self.admit_score)
+
+    def _flush_daytrade(self, run: _ScanRun, risk: PipelineStage):
+        """Fim da captura: completa o budget de daytrade com as propostas do buffer de maior score."""
+        with run.lock:
+            buffered, run.daytrade_buffer = run.daytrade_buffer, []
+            remaining = max(self.max_proposals - run.daytrade_admitted, 0)
+            run.daytrade_admitted += min(remaining, len(buffered))
+        if not buffered:
+            return
+        buffered.sort(key=lambda entry: entry[0], reverse=True)
+        selected = buffered[:remaining]
+        proposals = []
+        for _, generated_at, proposal in selected:
+            proposals.extend(self.service.trader_agent.save_proposals(generated_at, [proposal]))
+        self._publish(run, proposals)
+        logger.info(f"Daytrade: {run.daytrade_admitted - len(selected)} enviadas durante a captura, "
+                    f"{len(selected)} de {len(buffered)} do buffer selecionadas por score")
+        for proposal in proposals:
+            if self.service._passes_gain_loss(proposal):
+                risk.put(proposal)
+
+    def _publish(self, run: _ScanRun, proposals: List):
+        if not proposals:
+            return
+        with run.lock:
+            run.proposals.extend(proposals)
+            if run.first_proposal_s is None:
+                run.first_proposal_s = run.elapsed()
+                logger.info(f"Primeira proposta do scan em {run.first_proposal_s:.1f}s")
+
+    # ------------------------------------------------------------------ estágios
+
+    def _capture(self, run: _ScanRun, batch: List[Tuple[str, Any]], normalize: PipelineStage):
+        gateway = self.service.market_data_gateway
+        for kind, payload in batch:
+            if kind == 'futures':
+                try:
+                    futures_data = gateway.get_all_futures_data(payload)
+                except Exception as e:
+                    logger.warning(f"Erro ao coletar dados de futuros: {e}")
+                    futures_data = None
+                if futures_data:
+                    normalize.put(('futures', futures_data))
+                continue
+            try:
+                snapshot = gateway.fetch_intraday_snapshot(payload, market_open=run.market_open)
+            except Exception as e:
+                logger.warning(f"Erro ao buscar dados para {payload}: {e}")
+                snapshot = None
+            if snapshot is None:
+                with run.lock:
+                    run.failed.append(payload)
+                continue
+            normalize.put(('spot', (payload, snapshot)))
+
+    def _normalize(self, run: _ScanRun, batch: List[Tuple[str, Any]], held: set,
+                   options: PipelineStage, strategy: PipelineStage, persist: PipelineStage):
+        service = self.service
+        spots = {}
+        for kind, payload in batch:
+            if kind == 'futures':
+                with run.lock:
+                    run.market_data['futures'] = payload
+                for symbol in payload:
+                    persist.put(('futures', symbol))
+                if run.should_generate_proposals:
+                    strategy.put(('futures', None))
+                continue
+            ticker, snapshot = payload
+            spots[ticker] = service._spot_from_snapshot(snapshot)
+        if not spots:
+            return
+
+        with run.lock:
+            run.market_data['spot'].update(spots)
+            run.captured += len(spots)
+            if run.first_capture_s is None:
+                run.first_capture_s = run.elapsed()
+        survivors = set(service.trader_agent.prescreen_options_universe(spots)) if self.prescreen else set(spots)
+        for ticker in spots:
+            if ticker in survivors or ticker in held:
+                options.put(ticker)
+            else:
+                persist.put(('spot', ticker))
+                if run.should_generate_proposals:
+                    strategy.put(('spot', ticker))
+
+    def _options(self, run: _ScanRun, batch: List[str], strategy: PipelineStage, persist: PipelineStage):
+        for ticker in batch:
+            try:
+                options_df = self.service.stock_api.fetch_options_chain(ticker, run.today, run.today, max_dte=self.max_dte)
+                if not options_df.empty:
+                    with run.lock:
+                        run.market_data['options'][ticker] = options_df.to_dict('records')
+            except Exception as opt_err:
+                logger.debug(f"Erro ao buscar opções para {ticker}: {opt_err}")
+            persist.put(('spot', ticker))
+            if run.should_generate_proposals:
+                strategy.put(('spot', ticker))
+
+    def _strategy(self, run: _ScanRun, batch: List[Tuple[str, Any]], risk: PipelineStage):
+        service = self.service
+        now = pd.to_datetime(datetime.now())
+        tickers = [payload for kind, payload in batch if kind == 'spot']
+        generated = []
+
+        if tickers:
+            proposals = service._ticker_proposals(now, run.view(tickers), cross_sectional=False, save=False)
+            for proposal in service._filter_brazilian(proposals):
+                if proposal.strategy == 'daytrade_options':
+                    score = (proposal.metadata or {}).get('comparison_score', 0)
+                    with run.lock:
+                        admitted = self._admit_daytrade(run, score)
+                        if admitted:
+                            run.daytrade_admitted += 1
+                        else:
+                            run.daytrade_buffer.append((score, now, proposal))  # Completa o budget no fim
+                    if not admitted:
+                        continue
+                generated.append(proposal)
+            generated = service.trader_agent.save_proposals(now, generated)
+            for proposal in generated:
+                if proposal.strategy == 'daytrade_options' and service._passes_gain_loss(proposal):
+                    risk.put(proposal)
+
+        for kind, _ in batch:
+            if kind == 'futures':
+                generated.extend(service._futures_proposals(run.view()['futures']))
+            elif kind == 'universe':
+                market_data = run.view()
+                universe = service.trader_agent.generate_universe_proposals(now, market_data)
+                generated.extend(service._filter_brazilian(universe))
+                run.opportunities = service._scan_opportunities(market_data)
+
+        self._publish(run, generated)
+
+    def _evaluate(self, run: _ScanRun, batch: List):
+        for proposal in batch:
+            if run.evaluations >= self.max_evaluations:
+                continue
+            run.evaluations += 1
+            decision = self.service._evaluate_and_notify(proposal, run.view())
+            if decision in run.decisions:
+                run.decisions[decision] += 1
+
+    def _persist(self, run: _ScanRun, batch: List[Tuple[str, str]]):
+        service = self.service
+        if not service.orders_repo:
+            return
+        with run.lock:
+            market_data = run.market_data
+            items = [(kind, symbol, (market_data['futures'] if kind == 'futures' else market_data['spot']).get(symbol),
+                      market_data['options'].get(symbol) if kind == 'spot' else None) for kind, symbol in batch]
+        for kind, symbol, data, options_list in items:
+            if data is not None:
+                run.saved += service._save_capture(symbol, kind, data, options_list, run.b3_time, run.trading_status)
+
+    # ------------------------------------------------------------------ métricas
+
+    def _status(self, run: _ScanRun, total: int) -> Dict[str, Any]:
+        return {
+            'last_scan': {
+                'tickers': total,
+                'captured': run.captured,
+                'failed': len(run.failed),
+                'proposals': len(run.proposals),
+                'evaluated': run.evaluations,
+                'duration_s': round(run.elapsed(), 2),
+                'time_to_first_capture_s': round(run.first_capture_s, 2) if run.first_capture_s is not None else None,
+                'time_to_first_proposal_s': round(run.first_proposal_s, 2) if run.first_proposal_s is not None else None,
+            },
+            'stages': {name: stage.stats() for name, stage in self._stages.items()},
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        """Métricas do último scan (ou do scan em andamento) por estágio."""
+        run = self._run
+        if run is not None:
+            return {'running': True, **self._status(run, run.captured + len(run.failed))}
+        return {'running': False, **self._last_status}
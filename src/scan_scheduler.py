@@ -0,0 +1,273 @@
+"""
+Agendador de jobs do monitoramento (scan, EOD, status, saúde).
+
+Os jobs periódicos rodam em cadência fixa alinhada às fronteiras do relógio
+(ex.: 10:00, 10:05, 10:10 para 300s), independente da duração de cada execução.
+Se uma execução ainda estiver rodando quando o próximo horário chegar, o tick é
+descartado (coalescido) em vez de acumular trabalho sobreposto. Jobs diários
+(fechamento EOD, relatórios) rodam uma vez por dia dentro de uma janela.
+
+O TickerPrioritizer decide quais tickers entram em cada scan: ativos "quentes"
+(posição aberta, pico de volume, movimento intradiário forte) a cada tick e os
+demais a cada N ticks.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, time as dt_time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Union
+
+try:
+    from .trading_schedule import B3_TIMEZONE
+except ImportError:
+    from trading_schedule import B3_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_hhmm(value: str) -> dt_time:
+    """Converte 'HH:MM' em datetime.time."""
+    hour, minute = str(value).split(':')[:2]
+    return dt_time(int(hour), int(minute))
+
+
+def next_aligned(now: datetime, interval_seconds: float) -> datetime:
+    """Próxima fronteira de relógio múltipla de interval_seconds estritamente após now."""
+    epoch = now.timestamp()
+    boundary = (int(epoch // interval_seconds) + 1) * interval_seconds
+    return datetime.fromtimestamp(boundary, tz=now.tzinfo)
+
+
+@dataclass
+class ScheduledJob:
+    """Job registrado no agendador."""
+    name: str
+    func: Callable[[], Any]
+    interval: Optional[Union[float, Callable[[datetime], Optional[float]]]] = None  # segundos (None = pausado)
+    wake_at: Optional[Callable[[datetime], Optional[datetime]]] = None  # antecipa o próximo disparo
+    daily_at: Optional[dt_time] = None
+    window_minutes: int = 60
+    day_filter: Optional[Callable[[datetime], bool]] = None
+    next_run: Optional[datetime] = None
+    running: bool = False
+    runs: int = 0
+    skipped: int = 0
+    failures: int = 0
+    last_started: Optional[datetime] = None
+    last_duration: Optional[float] = None
+    last_run_date: Any = None
+    timezone: Any = B3_TIMEZONE
+
+    def _daily_time(self, date) -> datetime:
+        return self.timezone.localize(datetime.combine(date, self.daily_at))
+
+    def interval_seconds(self, now: datetime) -> Optional[float]:
+        return self.interval(now) if callable(self.interval) else self.interval
+
+    def schedule_next(self, now: datetime):
+        """Calcula o próximo disparo a partir de now (descarta ticks perdidos)."""
+        if self.daily_at is not None:
+            candidate = self._daily_time(now.date())
+            if self.last_run_date == now.date() or now >= candidate + timedelta(minutes=self.window_minutes):
+                candidate = self._daily_time(now.date() + timedelta(days=1))
+            self.next_run = candidate  # dentro da janela e ainda não executado: dispara já
+            return
+
+        seconds = self.interval_seconds(now)
+        if not seconds or seconds <= 0:
+            wake = self.wake_at(now) if self.wake_at else None
+            # Pausado: dorme até wake_at (ex.: próxima sessão) ou reavalia em 1 min
+            self.next_run = wake if wake is not None and wake > now else now + timedelta(seconds=60)
+            return
+        self.next_run = next_aligned(now, seconds)
+        if self.wake_at:
+            wake = self.wake_at(now)
+            if wake is not None and now < wake < self.next_run:
+                self.next_run = wake
+
+
+class JobScheduler:
+    """Executa jobs periódicos e diários em threads próprias, sem sobreposição."""
+
+    def __init__(self, timezone=None):
+        self.timezone = timezone or B3_TIMEZONE
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self.is_running = False
+        self.thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def now(self) -> datetime:
+        return datetime.now(self.timezone)
+
+    def add_interval_job(self, name: str, func: Callable[[], Any],
+                         interval: Union[float, Callable[[datetime], Optional[float]]],
+                         wake_at: Optional[Callable[[datetime], Optional[datetime]]] = None,
+                         run_immediately: bool = False) -> ScheduledJob:
+        """
+        Registra job periódico alinhado ao relógio.
+        interval pode ser fixo ou uma função de now (ex.: cadência menor fora do pregão).
+        """
+        job = ScheduledJob(name=name, func=func, interval=interval, wake_at=wake_at)
+        now = self.now()
+        if run_immediately:
+            job.next_run = now
+        else:
+            job.schedule_next(now)
+        self._register(job)
+        return job
+
+    def add_daily_job(self, name: str, func: Callable[[], Any], at: str, window_minutes: int = 60,
+                      day_filter: Optional[Callable[[datetime], bool]] = None) -> ScheduledJob:
+        """Registra job diário às HH:MM (executa uma vez por dia dentro da janela)."""
+        job = ScheduledJob(name=name, func=func, daily_at=_parse_hhmm(at),
+                           window_minutes=window_minutes, day_filter=day_filter, timezone=self.timezone)
+        job.schedule_next(self.now())
+        self._register(job)
+        return job
+
+    def _register(self, job: ScheduledJob):
+        with self._lock:
+            self.jobs[job.name] = job
+        self._wakeup.set()
+        logger.debug(f"Job '{job.name}' agendado para {job.next_run}")
+
+    def remove_job(self, name: str):
+        with self._lock:
+            self.jobs.pop(name, None)
+
+    def _dispatch(self, job: ScheduledJob, now: datetime):
+        """Dispara job vencido (ou descarta o tick se a execução anterior ainda roda)."""
+        if job.running:
+            job.skipped += 1
+            logger.warning(f"Job '{job.name}' ainda em execução - tick de {now.strftime('%H:%M:%S')} descartado")
+            job.schedule_next(now)
+            return
+
+        if job.daily_at is not None:
+            job.last_run_date = now.date()
+            if job.day_filter and not job.day_filter(now):
+                job.schedule_next(now)
+                return
+
+        job.running = True
+        job.last_started = now
+        job.schedule_next(now)
+
+        def run():
+            started = self.now()
+            try:
+                job.func()
+                job.runs += 1
+            except Exception as e:
+                job.failures += 1
+                logger.error(f"Erro no job '{job.name}': {e}")
+                import traceback
+                logger.error(traceback.format_exc())
+            finally:
+                job.last_duration = (self.now() - started).total_seconds()
+                job.running = False
+                interval = job.interval_seconds(self.now()) if job.daily_at is None else None
+                if interval and job.last_duration > interval:
+                    logger.warning(f"Job '{job.name}' levou {job.last_duration:.0f}s (cadência {interval:.0f}s)")
+
+        threading.Thread(target=run, daemon=True, name=f"job-{job.name}").start()
+
+    def _loop(self):
+        while self.is_running:
+            now = self.now()
+            with self._lock:
+                jobs = list(self.jobs.values())
+            for job in jobs:
+                if job.next_run is not None and job.next_run <= now:
+                    self._dispatch(job, now)
+
+            upcoming = [j.next_run for j in jobs if j.next_run is not None]
+            wait = (min(upcoming) - self.now()).total_seconds() if upcoming else 60
+            self._wakeup.wait(timeout=min(max(wait, 0.05), 60))
+            self._wakeup.clear()
+
+    def start(self):
+        """Inicia o loop do agendador."""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True, name="JobScheduler")
+        self.thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Para o loop (jobs em execução terminam em suas threads)."""
+        self.is_running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+
+    def get_status(self) -> Dict[str, Dict]:
+        """Situação de cada job (próximo disparo, execuções, descartes)."""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return {
+            job.name: {
+                'next_run': job.next_run.isoformat() if job.next_run else None,
+                'running': job.running,
+                'runs': job.runs,
+                'skipped': job.skipped,
+                'failures': job.failures,
+                'last_started': job.last_started.isoformat() if job.last_started else None,
+                'last_duration': job.last_duration
+            }
+            for job in jobs
+        }
+
+
+class TickerPrioritizer:
+    """Seleciona tickers por atividade: quentes a cada scan, frios a cada N scans."""
+
+    def __init__(self, config: Dict):
+        cfg = config.get('scan_scheduler', {})
+        daytrade_cfg = config.get('daytrade_options', {})
+        self.cold_every_n_ticks = max(int(cfg.get('cold_every_n_ticks', 3)), 1)
+        self.hot_volume_spike = cfg.get('hot_volume_spike', 2.0)
+        self.hot_abs_return = cfg.get('hot_abs_return', daytrade_cfg.get('min_intraday_return', 0.005))
+        self.ewma_alpha = cfg.get('volume_ewma_alpha', 0.3)
+        self.tick = 0
+        self._last_volume: Dict[str, float] = {}
+        self._volume_ewma: Dict[str, float] = {}
+        self._hot: Set[str] = set()
+
+    def update(self, spot_data: Dict[str, Dict]):
+        """Atualiza atividade a partir dos dados spot do último scan."""
+        for ticker, info in spot_data.items():
+            volume = float(info.get('volume', 0) or 0)
+            previous = self._last_volume.get(ticker)
+            # Volume negociado desde o último scan (acumulado do dia reinicia na virada)
+            increment = volume - previous if previous is not None and volume >= previous else volume
+            self._last_volume[ticker] = volume
+
+            ewma = self._volume_ewma.get(ticker)
+            spike = increment / ewma if ewma and ewma > 0 and previous is not None else 0.0
+            self._volume_ewma[ticker] = increment if ewma is None else \
+                self.ewma_alpha * increment + (1 - self.ewma_alpha) * ewma
+
+            open_price = info.get('open') or 0
+            last_price = info.get('last', info.get('close')) or 0
+            intraday_return = (last_price / open_price - 1) if open_price else 0.0
+
+            if spike >= self.hot_volume_spike or abs(intraday_return) >= self.hot_abs_return:
+                self._hot.add(ticker)
+            else:
+                self._hot.discard(ticker)
+
+    def select(self, tickers: Iterable[str], held: Optional[Iterable[str]] = None) -> List[str]:
+        """Tickers do próximo scan (todos a cada N ticks; senão apenas os quentes)."""
+        tickers = list(tickers)
+        full_scan = self.tick % self.cold_every_n_ticks == 0 or not self._last_volume
+        self.tick += 1
+        if full_scan:
+            return tickers
+        hot = self._hot | set(held or [])
+        return [t for t in tickers if t in hot]
+
+    def get_status(self) -> Dict:
+        return {'tick': self.tick, 'hot_tickers': sorted(self._hot)}
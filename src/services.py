@@ -0,0 +1,182 @@
+"""
+Container de serviços do processo.
+
+MonitoringService, DataHealthMonitor, EODAnalyzer e os handlers da API usam a mesma
+instância de repositório (init_db/migração uma vez), notificador, horário B3 e clientes de
+dados de mercado, criados sob demanda no primeiro uso. Assim caches em memória (cadeias de
+opções, buffers de candles) e conexões HTTP são compartilhados em vez de duplicados.
+
+    services = get_services(config)
+    repo = services.orders_repo
+    api = services.market_data_gateway  # Todos os provedores, com hedge e failover
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from .http_client import configure_http_clients, get_http_client
+except ImportError:
+    from http_client import configure_http_clients, get_http_client
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """Singletons preguiçosos (thread-safe) de um processo."""
+
+    def __init__(self, config: Optional[Dict] = None):
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self.config = config or {}
+
+    @property
+    def config(self) -> Dict:
+        return self._config
+
+    @config.setter
+    def config(self, config: Dict):
+        self._config = config
+        configure_http_clients(config.get('http_clients'))
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = factory()
+                    self._instances[name] = instance
+                    logger.debug(f"Serviço criado: {name}")
+        return instance
+
+    @property
+    def orders_repo(self):
+        """OrdersRepository compartilhado."""
+        def factory():
+            try:
+                from .orders_repository import OrdersRepository
+            except ImportError:
+                from orders_repository import OrdersRepository
+            return OrdersRepository(config=self.config)
+        return self._get('orders_repo', factory)
+
+    @property
+    def notifier(self):
+        """UnifiedNotifier compartilhado (salva as mensagens no repositório compartilhado)."""
+        def factory():
+            try:
+                from .notifications import UnifiedNotifier
+            except ImportError:
+                from notifications import UnifiedNotifier
+            return UnifiedNotifier(self.config, orders_repo=self.orders_repo)
+        return self._get('notifier', factory)
+
+    @property
+    def trading_schedule(self):
+        """TradingSchedule compartilhado (calendário B3 com feriados de config['trading_calendar'])."""
+        def factory():
+            try:
+                from .trading_schedule import TradingSchedule, get_b3_calendar
+            except ImportError:
+                from trading_schedule import TradingSchedule, get_b3_calendar
+            return TradingSchedule(calendar=get_b3_calendar(self.config.get('trading_calendar')))
+        return self._get('trading_schedule', factory)
+
+    def market_data_api(self, api_type: str = 'yfinance', **kwargs):
+        """Cliente de dados de mercado por tipo (kwargs só valem na criação)."""
+        def factory():
+            try:
+                from .market_data_api import create_market_data_api
+            except ImportError:
+                from market_data_api import create_market_data_api
+            if api_type.lower() == 'simulated':
+                kwargs.setdefault('config', self.config.get('simulated_market', {}))
+            return create_market_data_api(api_type, **kwargs)
+        return self._get(f"market_data_api:{api_type.lower()}", factory)
+
+    @property
+    def simulated(self) -> bool:
+        """config['simulated_market']['enabled']: dados de mercado do market_data_simulator, sem rede."""
+        return bool(self.config.get('simulated_market', {}).get('enabled', False))
+
+    @property
+    def market_data_gateway(self):
+        """
+        MarketDataGateway sobre os provedores de config['market_data_gateway']['providers']
+        (padrão: market_data_api do config e brapi; só 'simulated' com simulated_market ativo)
+        e a API de futuros.
+        """
+        def factory():
+            try:
+                from .market_data_gateway import MarketDataGateway
+            except ImportError:
+                from market_data_gateway import MarketDataGateway
+            gateway_config = self.config.get('market_data_gateway', {})
+            default_names = ['simulated'] if self.simulated else [self.config.get('market_data_api', 'yfinance'), 'brapi']
+            names = gateway_config.get('providers', default_names)
+            providers = {}
+            for name in dict.fromkeys(name.lower() for name in names):
+                try:
+                    providers[name] = self.market_data_api(name)
+                except Exception as e:
+                    logger.warning(f"Provedor de dados {name} indisponível: {e}")
+            futures_name = 'simulated_futures' if self.simulated else 'yfinance_futures'
+            return MarketDataGateway(providers, {futures_name: self.futures_api}, gateway_config)
+        return self._get('market_data_gateway', factory)
+
+    @property
+    def futures_api(self):
+        """FuturesDataAPI compartilhada (buffers de candles de 1m)."""
+        def factory():
+            if self.simulated:
+                try:
+                    from .market_data_simulator import SimulatedFuturesAPI
+                except ImportError:
+                    from market_data_simulator import SimulatedFuturesAPI
+                return SimulatedFuturesAPI(config=self.config.get('simulated_market', {}))
+            try:
+                from .futures_data_api import create_futures_api
+            except ImportError:
+                from futures_data_api import create_futures_api
+            return create_futures_api()
+        return self._get('futures_api', factory)
+
+    def http_client(self, provider: str):
+        """HttpClient compartilhado do provedor (sessão, limite de taxa, retry)."""
+        return get_http_client(provider)
+
+    def reset(self, name: Optional[str] = None):
+        """Descarta uma instância (ou todas); a próxima chamada cria de novo."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def get_status(self) -> Dict:
+        """Serviços já criados neste processo."""
+        return {'pid': os.getpid(), 'services': sorted(self._instances)}
+
+
+_SERVICES: Optional[ServiceContainer] = None
+_SERVICES_PID: Optional[int] = None
+_SERVICES_LOCK = threading.Lock()
+
+
+def get_services(config: Optional[Dict] = None) -> ServiceContainer:
+    """
+    Container do processo. O primeiro config não vazio é adotado; instâncias criadas antes
+    dele (ex.: repositório aberto pela API sem config) são mantidas. Após fork, o processo
+    filho recebe um container novo (sessões HTTP e threads não são herdáveis).
+    """
+    global _SERVICES, _SERVICES_PID
+    with _SERVICES_LOCK:
+        if _SERVICES is None or _SERVICES_PID != os.getpid():
+            _SERVICES = ServiceContainer(config)
+            _SERVICES_PID = os.getpid()
+        elif config and not _SERVICES.config:
+            _SERVICES.config = config
+        return _SERVICES
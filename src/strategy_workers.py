@@ -0,0 +1,446 @@
+"""
+Estratégias por ativo em processos separados, com o universo dividido por ativo-objeto.
+
+O scan roda em threads de um único processo, então a parte de CPU das estratégias
+(precificação das cadeias, score da comparação) disputa o GIL com as threads de I/O.
+Com strategy_workers.enabled, cada ticker vai sempre para o mesmo processo
+(crc32(ticker) % processes) e cada processo roda seu próprio TraderAgent com
+cross_sectional=False. Assim o cálculo escala com os núcleos à medida que o universo cresce.
+
+- Dados: o lote do scan (spot + cadeias de opções de cada shard) vai em colunas num bloco de
+  memória compartilhada (multiprocessing.shared_memory): colunas numéricas como arrays
+  int64/float64 e colunas de texto/data como códigos int32 de categorias. Pelo pipe vai só o
+  esquema de cada shard (nomes, tipos, offsets, categorias); o worker lê as colunas direto do
+  bloco e remonta os registros, sem serializar as cadeias com pickle.
+- Propostas voltam ao processo principal e recebem IDs da sequência local (next_proposal_id),
+  porque a sequência de cada worker é independente. Gravação, budget e avaliação
+  continuam no coordenador (um único RiskAgent).
+- Saúde: cada worker atualiza um heartbeat. A thread de resultados reinicia workers mortos,
+  travados (task_timeout_s) ou sem heartbeat (heartbeat_timeout_s). O shard da tarefa
+  perdida é recalculado no processo principal, então nenhuma proposta se perde.
+
+Estratégias entre ativos (pairs, MarketMonitor) continuam no processo principal, uma vez
+por scan.
+
+Configuração (config['strategy_workers']): enabled, processes, start_method,
+task_timeout_s, heartbeat_interval_s, heartbeat_timeout_s.
+"""
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .agents import TraderAgent, next_proposal_id
+    from .records import PROPOSAL_ID_PATTERN
+except ImportError:
+    from agents import TraderAgent, next_proposal_id
+    from records import PROPOSAL_ID_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Seções da configuração que os workers não usam (credenciais ficam só no processo principal)
+_PRIVATE_CONFIG_KEYS = ('notifications', 'email', 'telegram', 'discord', 'brapi_api_key',
+                        'binance_api_key', 'binance_api_secret')
+
+
+class WorkerLost(Exception):
+    """Worker morreu ou travou com a tarefa em andamento."""
+
+
+def shard_for(ticker: str, processes: int) -> int:
+    """Shard do ativo-objeto (estável entre execuções, ao contrário de hash())."""
+    return zlib.crc32(str(ticker).encode('utf-8')) % max(processes, 1)
+
+
+_ALIGN = 8  # Alinhamento dos arrays dentro do bloco compartilhado
+
+
+def _encode_column(name: str, values: List, absent: List[int]) -> Dict[str, Any]:
+    """
+    Coluna de uma tabela de registros: 'i8'/'f8' (array numérico; None em nulls), 'cat'
+    (códigos int32 + categorias no esquema) ou 'obj' (valores no esquema, último recurso).
+    """
+    skip = set(absent)
+    present = [v for i, v in enumerate(values) if i not in skip and v is not None]
+    numeric = bool(present) and all(
+        isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, (bool, np.bool_)) for v in present
+    )
+    if numeric:
+        kind = 'i8' if all(isinstance(v, (int, np.integer)) for v in present) else 'f8'
+        nulls = [i for i, v in enumerate(values) if v is None and i not in skip]
+        try:
+            array = np.array([0 if v is None else v for v in values], dtype=kind)
+            return {'name': name, 'kind': kind, 'array': array, 'nulls': nulls, 'absent': absent}
+        except (OverflowError, ValueError):
+            pass
+    try:
+        lookup, categories = {}, []
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(categories)
+                categories.append(value)
+            codes[i] = code
+        return {'name': name, 'kind': 'cat', 'array': codes, 'categories': categories, 'absent': absent}
+    except TypeError:  # Valores não hasheáveis (listas, dicts)
+        return {'name': name, 'kind': 'obj', 'values': values, 'absent': absent}
+
+
+def _encode_table(rows: List[Dict]) -> Dict[str, Any]:
+    """Registros (dicts) em colunas; os arrays ainda não têm offset no bloco."""
+    names = list(dict.fromkeys(key for row in rows for key in row))
+    columns = []
+    for name in names:
+        absent = [i for i, row in enumerate(rows) if name not in row]
+        columns.append(_encode_column(name, [row.get(name) for row in rows], absent))
+    return {'rows': len(rows), 'columns': columns}
+
+
+def _decode_table(table: Dict[str, Any], buf) -> List[Dict]:
+    """Remonta os registros a partir das colunas no bloco compartilhado."""
+    count = table['rows']
+    rows = [{} for _ in range(count)]
+    for column in table['columns']:
+        kind = column['kind']
+        if kind in ('i8', 'f8'):
+            values = np.frombuffer(buf, dtype=kind, count=count, offset=column['offset']).tolist()
+            for i in column['nulls']:
+                values[i] = None
+        elif kind == 'cat':
+            categories = column['categories']
+            codes = np.frombuffer(buf, dtype=np.int32, count=count, offset=column['offset']).tolist()
+            values = [categories[code] for code in codes]
+        else:
+            values = column['values']
+        absent = set(column['absent'])
+        name = column['name']
+        for i, (row, value) in enumerate(zip(rows, values)):
+            if i not in absent:
+                row[name] = value
+    return rows
+
+
+def _encode_shard(shard: Dict) -> Dict[str, Any]:
+    """Esquema de um shard: tabela spot (uma linha por ticker) e tabela de opções (linhas por ticker)."""
+    tickers = list(shard['spot'])
+    option_rows, groups = [], []
+    for ticker, records in shard['options'].items():
+        groups.append((ticker, len(option_rows), len(option_rows) + len(records)))
+        option_rows.extend(records)
+    return {
+        'tickers': tickers,
+        'spot': _encode_table([shard['spot'][ticker] for ticker in tickers]),
+        'groups': groups,
+        'options': _encode_table(option_rows),
+    }
+
+
+def _decode_shard(schema: Dict[str, Any], buf) -> Dict:
+    spot_rows = _decode_table(schema['spot'], buf)
+    option_rows = _decode_table(schema['options'], buf)
+    return {
+        'spot': dict(zip(schema['tickers'], spot_rows)),
+        'options': {ticker: option_rows[start:stop] for ticker, start, stop in schema['groups']},
+        'futures': {},
+    }
+
+
+def _shard_arrays(schema: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [column for table in ('spot', 'options') for column in schema[table]['columns'] if 'array' in column]
+
+
+def _worker_main(config: Dict, conn, heartbeat, heartbeat_interval: float):
+    """Loop do processo worker: lê o trecho do bloco compartilhado e gera propostas."""
+    trader_agent = TraderAgent(config)
+    while True:
+        heartbeat.value = time.time()
+        try:
+            if not conn.poll(heartbeat_interval):
+                continue
+            task = conn.recv()
+        except (EOFError, OSError):
+            break  # Processo principal encerrou
+        if task is None:
+            break
+        task_id, date, block_name, schema = task
+        started = time.perf_counter()
+        try:
+            block = shared_memory.SharedMemory(name=block_name)
+            try:
+                market_data = _decode_shard(schema, block.buf)
+            finally:
+                block.close()
+            proposals = trader_agent.generate_proposals(date, market_data, cross_sectional=False, save=False)
+            conn.send((task_id, proposals, None, time.perf_counter() - started))
+        except Exception as e:
+            conn.send((task_id, [], f"{type(e).__name__}: {e}", time.perf_counter() - started))
+
+
+class _Worker:
+    """Processo worker de um shard e seus contadores."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None  # Pipe duplex: tarefas para o worker, resultados de volta
+        self.heartbeat = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.completed = 0
+        self.errors = 0
+        self.busy_s = 0.0
+
+
+class StrategyWorkerPool:
+    """Processos de estratégia por shard de ativo-objeto, coordenados pelo processo principal."""
+
+    def __init__(self, config: Dict, trader_agent: TraderAgent, pool_config: Optional[Dict] = None):
+        pool_config = pool_config or {}
+        self.config = {k: v for k, v in config.items() if k not in _PRIVATE_CONFIG_KEYS}
+        self.trader_agent = trader_agent  # Fallback no processo principal
+        self.processes = max(int(pool_config.get('processes', max((os.cpu_count() or 2) - 1, 1))), 1)
+        self.task_timeout = pool_config.get('task_timeout_s', 30)
+        self.heartbeat_interval = pool_config.get('heartbeat_interval_s', 1.0)
+        self.heartbeat_timeout = pool_config.get('heartbeat_timeout_s', 10)
+        self._context = multiprocessing.get_context(pool_config.get('start_method', 'spawn'))
+        self._workers = [_Worker(index) for index in range(self.processes)]
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._task_ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._reader: Optional[threading.Thread] = None
+        self._running = False
+        self._counters = {'batches': 0, 'tasks': 0, 'fallbacks': 0, 'restarts': 0, 'shared_bytes': 0}
+
+    # ------------------------------------------------------------------ ciclo de vida
+
+    def start(self) -> 'StrategyWorkerPool':
+        with self._lock:
+            if self._running:
+                return self
+            for worker in self._workers:
+                self._spawn(worker)
+            self._running = True
+            self._reader = threading.Thread(target=self._read_results, name='strategy-workers-results', daemon=True)
+            self._reader.start()
+            # Antes do atexit do multiprocessing, que mataria os workers e dispararia reinícios
+            atexit.register(self.stop)
+        logger.info(f"Workers de estratégia: {self.processes} processos (shard por ativo-objeto)")
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Encerra os workers (sentinela; kill após timeout) e falha tarefas pendentes."""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            for worker in self._workers:
+                try:
+                    worker.conn.send(None)
+                except Exception:
+                    pass
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join(1)
+        if self._reader:
+            self._reader.join(timeout)
+        with self._lock:
+            for task_id in list(self._pending):
+                self._fail(task_id, WorkerLost('pool encerrado'))
+        atexit.unregister(self.stop)
+        logger.info("Workers de estratégia encerrados")
+
+    def _spawn(self, worker: _Worker):
+        # Pipe próprio por worker: terminate() no meio de um envio não corrompe os outros
+        worker.conn, child_conn = self._context.Pipe(duplex=True)
+        worker.heartbeat = self._context.Value('d', time.time(), lock=False)
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(self.config, child_conn, worker.heartbeat, self.heartbeat_interval),
+            name=f"strategy-worker-{worker.index}", daemon=True
+        )
+        worker.process.start()
+        child_conn.close()
+        worker.started_at = time.time()
+
+    def _restart(self, worker: _Worker, reason: str):
+        """Reinicia o worker e falha suas tarefas pendentes (recalculadas pelo chamador)."""
+        logger.warning(f"Reiniciando worker de estratégia {worker.index} (pid {worker.process.pid}): {reason}")
+        if worker.process.is_alive():
+            worker.process.kill()  # SIGKILL: um processo travado ou parado ignora SIGTERM
+            worker.process.join(1)
+        worker.conn.close()
+        for task_id, task in list(self._pending.items()):
+            if task['worker'] == worker.index:
+                self._fail(task_id, WorkerLost(reason))
+        worker.restarts += 1
+        self._counters['restarts'] += 1
+        if self._running:
+            self._spawn(worker)
+
+    # ------------------------------------------------------------------ resultados e saúde
+
+    def _read_results(self):
+        while self._running or self._pending:
+            with self._lock:
+                conns = {worker.conn: worker for worker in self._workers if not worker.conn.closed}
+            ready = multiprocessing.connection.wait(list(conns), timeout=self.heartbeat_interval)
+            received = []
+            for conn in ready:
+                worker = conns[conn]
+                try:
+                    received.append((worker, conn.recv()))
+                except (EOFError, OSError):
+                    worker.process.join(0.5)  # Processo morreu: _check_health reinicia
+            with self._lock:
+                for worker, (task_id, proposals, error, elapsed) in received:
+                    worker.busy_s += elapsed
+                    if error:
+                        worker.errors += 1
+                    else:
+                        worker.completed += 1
+                    task = self._pending.pop(task_id, None)
+                    if task is not None:
+                        if error:
+                            task['future'].set_exception(RuntimeError(error))
+                        else:
+                            task['future'].set_result(proposals)
+                self._check_health()
+
+    def _check_health(self):
+        """Reinicia workers mortos, com tarefa além do prazo ou sem heartbeat (chamado com _lock)."""
+        if not self._running:
+            return
+        now = time.time()
+        for worker in self._workers:
+            overdue = [task for task in self._pending.values()
+                       if task['worker'] == worker.index and now > task['deadline']]
+            if not worker.process.is_alive():
+                self._restart(worker, f"processo terminou (exitcode {worker.process.exitcode})")
+            elif overdue:
+                self._restart(worker, f"tarefa acima de {self.task_timeout}s")
+            elif now - worker.heartbeat.value > self.heartbeat_timeout and now - worker.started_at > self.heartbeat_timeout:
+                self._restart(worker, f"sem heartbeat há {now - worker.heartbeat.value:.0f}s")
+
+    def _fail(self, task_id: int, error: Exception):
+        task = self._pending.pop(task_id, None)
+        if task is not None and not task['future'].done():
+            task['future'].set_exception(error)
+
+    # ------------------------------------------------------------------ propostas
+
+    def generate_proposals(self, date: pd.Timestamp, market_data: Dict) -> List:
+        """
+        Propostas das estratégias por ativo (equivalente a TraderAgent.generate_proposals com
+        cross_sectional=False e save=False), calculadas nos workers de cada shard.
+        """
+        spot = market_data.get('spot') or {}
+        options = market_data.get('options') or {}
+        if not spot:
+            return []
+        if not self._running:
+            self.start()
+
+        shards: Dict[int, Dict] = {}
+        for ticker, data in spot.items():
+            shard = shards.setdefault(shard_for(ticker, self.processes), {'spot': {}, 'options': {}, 'futures': {}})
+            shard['spot'][ticker] = data
+            if isinstance(options, dict) and ticker in options:
+                shard['options'][ticker] = options[ticker]
+
+        # Layout: arrays de todas as colunas de todos os shards, alinhados, em um único bloco
+        schemas = {index: _encode_shard(shard) for index, shard in shards.items()}
+        total = 0
+        for schema in schemas.values():
+            for column in _shard_arrays(schema):
+                column['offset'] = total
+                total += -(-column['array'].nbytes // _ALIGN) * _ALIGN
+        block = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        futures: Dict[int, Future] = {}
+        try:
+            for index, schema in schemas.items():
+                for column in _shard_arrays(schema):
+                    array = column.pop('array')
+                    target = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf, offset=column['offset'])
+                    target[:] = array
+                    del target  # Sem views abertas: block.close() exige o buffer livre
+                futures[index] = self._submit(index, (date, block.name, schema))
+            with self._lock:
+                self._counters['batches'] += 1
+                self._counters['tasks'] += len(schemas)
+                self._counters['shared_bytes'] += total
+
+            proposals = []
+            for index, future in futures.items():
+                try:
+                    # O prazo da tarefa é vigiado pela thread de resultados; aqui só um limite de segurança
+                    result = future.result(timeout=self.task_timeout + self.heartbeat_timeout + 5)
+                except Exception as e:
+                    logger.warning(f"Shard {index} calculado no processo principal ({type(e).__name__}: {e})")
+                    with self._lock:
+                        self._counters['fallbacks'] += 1
+                    result = self.trader_agent.generate_proposals(date, shards[index], cross_sectional=False, save=False)
+                    proposals.extend(result)
+                    continue
+                proposals.extend(self._adopt(result))
+            return proposals
+        finally:
+            block.close()
+            block.unlink()
+
+    def _submit(self, index: int, task: tuple) -> Future:
+        future: Future = Future()
+        with self._lock:
+            task_id = next(self._task_ids)
+            self._pending[task_id] = {'future': future, 'worker': index,
+                                      'deadline': time.time() + self.task_timeout}
+            try:
+                self._workers[index].conn.send((task_id, *task))
+            except (OSError, EOFError, ValueError) as e:
+                # Pipe quebrado/fechado (worker morto ou reiniciando): o shard cai no fallback local
+                self._fail(task_id, WorkerLost(f"envio ao worker {index} falhou: {e}"))
+        return future
+
+    def _adopt(self, proposals: List) -> List:
+        """IDs da sequência do processo principal (a sequência de cada worker é independente)."""
+        for proposal in proposals:
+            proposal.proposal_id = PROPOSAL_ID_PATTERN.sub(next_proposal_id(), proposal.proposal_id, count=1)
+        return proposals
+
+    # ------------------------------------------------------------------ métricas
+
+    def get_status(self) -> Dict[str, Any]:
+        """Contadores do pool e, por worker, pid, estado, reinícios e tempo ocupado."""
+        with self._lock:
+            now = time.time()
+            return {
+                'running': self._running,
+                'processes': self.processes,
+                'pending': len(self._pending),
+                **self._counters,
+                'workers': [{
+                    'index': worker.index,
+                    'pid': worker.process.pid if worker.process else None,
+                    'alive': bool(worker.process and worker.process.is_alive()),
+                    'heartbeat_age_s': round(now - worker.heartbeat.value, 1) if worker.heartbeat else None,
+                    'completed': worker.completed,
+                    'errors': worker.errors,
+                    'restarts': worker.restarts,
+                    'busy_s': round(worker.busy_s, 2),
+                } for worker in self._workers],
+            }
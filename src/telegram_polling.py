@@ -3,7 +3,6 @@ Sistema de Polling do Telegram para processar comandos e aprovações.
 Alternativa simples ao webhook - roda polling periódico.
 """
 
-import requests
 import json
 import time
 import logging
@@ -12,6 +11,11 @@ from datetime import datetime
 import sqlite3
 import os
 
+try:
+    from .http_client import get_http_client
+except ImportError:
+    from http_client import get_http_client
+
 logger = logging.getLogger(__name__)
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents_orders.db")
@@ -20,11 +24,13 @@ DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__)
 class TelegramPolling:
     """Processa comandos do Telegram via polling (sem webhook)."""
     
-    def __init__(self, bot_token: str, chat_id: str):
+    def __init__(self, bot_token: str, chat_id: str, api_base: Optional[str] = None):
         self.bot_token = bot_token
         self.chat_id = str(chat_id)
-        self.api_url = f"https://api.telegram.org/bot{bot_token}"
+        api_base = (api_base or os.getenv('TELEGRAM_API_BASE') or "https://api.telegram.org").rstrip('/')
+        self.api_url = f"{api_base}/bot{bot_token}"
         self.last_update_id = 0
+        self.http = get_http_client('telegram')  # Mesma sessão/limite do TelegramNotifier
         
     def get_updates(self) -> list:
         """Busca novas mensagens do Telegram."""
@@ -35,7 +41,7 @@ class TelegramPolling:
                 'timeout': 10,
                 'allowed_updates': ['message', 'callback_query']
             }
-            response = requests.get(url, params=params, timeout=15)
+            response = self.http.get(url, params=params, timeout=15, retries=0)  # Long polling: o laço já repete
             
             if response.status_code == 200:
                 data = response.json()
@@ -179,9 +185,20 @@ class TelegramPolling:
         
         return None
     
+    def _resolve_proposal_id(self, ref: str) -> str:
+        """ID completo da proposta a partir do apelido exibido no Telegram (ou o próprio ref)."""
+        try:
+            from src.orders_repository import OrdersRepository
+            return OrdersRepository().resolve_proposal_id(ref) or ref
+        except Exception as e:
+            logger.error(f"Erro ao resolver ID da proposta {ref}: {e}")
+            return ref
+    
     def approve_proposal(self, proposal_id: str, chat_id: str) -> bool:
-        """Aprova uma proposta."""
+        """Aprova uma proposta (ID completo ou apelido de 4 dígitos)."""
         try:
+            proposal_id = self._resolve_proposal_id(proposal_id)
+            
             # Verificar se proposta existe
             conn = sqlite3.connect(DB_PATH)
             cursor = conn.cursor()
@@ -253,8 +270,10 @@ class TelegramPolling:
             return False
     
     def cancel_proposal(self, proposal_id: str, chat_id: str) -> bool:
-        """Cancela uma proposta."""
+        """Cancela uma proposta (ID completo ou apelido de 4 dígitos)."""
         try:
+            proposal_id = self._resolve_proposal_id(proposal_id)
+            
             # Verificar se proposta existe
             conn = sqlite3.connect(DB_PATH)
             cursor = conn.cursor()
@@ -334,7 +353,7 @@ class TelegramPolling:
                 'text': text,
                 'parse_mode': parse_mode
             }
-            response = requests.post(url, json=payload, timeout=10)
+            response = self.http.post(url, json=payload, timeout=10)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Erro ao enviar mensagem: {e}")
@@ -349,7 +368,7 @@ class TelegramPolling:
                 'text': text,
                 'show_alert': show_alert
             }
-            response = requests.post(url, json=payload, timeout=10)
+            response = self.http.post(url, json=payload, timeout=10)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Erro ao responder callback: {e}")
@@ -1,9 +1,18 @@
 """
 Sistema de horário de funcionamento baseado no horário da B3.
+
+O B3Calendar pré-calcula, por ano, as sessões da B3 (feriados nacionais e móveis, dias sem
+pregão como 24/12 e 31/12, abertura tardia na Quarta-Feira de Cinzas) com pré-abertura,
+abertura, fechamento e pós-fechamento, além do calendário de vencimento de opções. Consultas
+de status, próxima abertura e tempo até o fechamento são buscas em dicionário.
 """
 
-from datetime import datetime, time, timedelta
-from typing import Tuple, Optional
+import threading
+from dataclasses import dataclass
+from datetime import date as date_cls, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 import pytz
 
 # Timezone da B3 (America/Sao_Paulo)
@@ -15,138 +24,398 @@ B3_OPEN = time(10, 0)      # 10:00 - Abertura
 B3_CLOSE = time(17, 0)     # 17:00 - Fechamento
 B3_POST_CLOSE = time(17, 30)  # 17:30 - Pós-fechamento
 
+# Quarta-Feira de Cinzas: pregão só à tarde
+ASH_WEDNESDAY_PRE_OPEN = time(12, 45)
+ASH_WEDNESDAY_OPEN = time(13, 0)
+
+
+def easter_sunday(year: int) -> date_cls:
+    """Domingo de Páscoa (algoritmo gregoriano anônimo)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date_cls(year, month, day + 1)
+
+
+def b3_holidays(year: int) -> Dict[date_cls, str]:
+    """Dias sem pregão na B3 no ano (inclui os que caem em fim de semana)."""
+    easter = easter_sunday(year)
+    holidays = {
+        date_cls(year, 1, 1): 'Confraternização Universal',
+        easter - timedelta(days=48): 'Carnaval',
+        easter - timedelta(days=47): 'Carnaval',
+        easter - timedelta(days=2): 'Sexta-Feira Santa',
+        date_cls(year, 4, 21): 'Tiradentes',
+        date_cls(year, 5, 1): 'Dia do Trabalho',
+        easter + timedelta(days=60): 'Corpus Christi',
+        date_cls(year, 9, 7): 'Independência',
+        date_cls(year, 10, 12): 'Nossa Senhora Aparecida',
+        date_cls(year, 11, 2): 'Finados',
+        date_cls(year, 11, 15): 'Proclamação da República',
+        date_cls(year, 12, 24): 'Véspera de Natal (sem pregão)',
+        date_cls(year, 12, 25): 'Natal',
+        date_cls(year, 12, 31): 'Último dia do ano (sem pregão)',
+    }
+    if year >= 2024:
+        holidays[date_cls(year, 11, 20)] = 'Dia Nacional de Zumbi e da Consciência Negra'
+    elif year < 2022:
+        # Até 2021 a B3 também fechava nos feriados de São Paulo
+        holidays[date_cls(year, 1, 25)] = 'Aniversário de São Paulo'
+        holidays[date_cls(year, 7, 9)] = 'Revolução Constitucionalista'
+        holidays[date_cls(year, 11, 20)] = 'Consciência Negra (São Paulo)'
+    return holidays
+
+
+def _parse_date(value) -> date_cls:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date_cls):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _parse_hhmm(value) -> time:
+    if isinstance(value, time):
+        return value
+    hour, minute = str(value).split(':')[:2]
+    return time(int(hour), int(minute))
+
+
+@dataclass(frozen=True)
+class TradingSession:
+    """Sessão de um dia de pregão (horários no timezone da B3)."""
+    date: date_cls
+    pre_open: datetime
+    open: datetime
+    close: datetime
+    post_close: datetime
+
+
+class B3Calendar:
+    """
+    Calendário de sessões da B3, pré-calculado por ano (sob demanda) e compartilhado.
+
+    Args:
+        extra_holidays: Datas adicionais sem pregão ('YYYY-MM-DD' ou {data: nome})
+        special_sessions: Horários especiais {'YYYY-MM-DD': {'open': 'HH:MM', 'close': 'HH:MM'}}
+    """
+
+    def __init__(self, timezone=None, extra_holidays=None, special_sessions: Optional[Dict] = None):
+        self.timezone = timezone or B3_TIMEZONE
+        if isinstance(extra_holidays, dict):
+            self.extra_holidays = {_parse_date(d): name for d, name in extra_holidays.items()}
+        else:
+            self.extra_holidays = {_parse_date(d): 'Sem pregão' for d in (extra_holidays or [])}
+        self.special_sessions = {_parse_date(d): hours for d, hours in (special_sessions or {}).items()}
+        self._lock = threading.Lock()
+        self._years: set = set()
+        self._holidays: Dict[date_cls, str] = {}
+        self._sessions: Dict[date_cls, TradingSession] = {}
+        self._session_index: Dict[date_cls, int] = {}
+        # (datas das sessões, dia -> índice da primeira sessão >= dia), publicados juntos
+        self._index: Tuple[List[date_cls], Dict[date_cls, int]] = ([], {})
+        self._holiday_array = np.array([], dtype='datetime64[D]')
+
+    # ------------------------------------------------------------------ construção
+
+    def _ensure_years(self, first: int, last: Optional[int] = None):
+        """Garante os anos [first - 1, last + 1] calculados (vizinhos cobrem as buscas de próxima sessão)."""
+        years = range(first - 1, (last if last is not None else first) + 2)
+        if all(y in self._years for y in years):
+            return
+        with self._lock:
+            missing = [y for y in years if y not in self._years]
+            if not missing:
+                return
+            # Leitores não usam o lock: tudo é montado em cópias e publicado no fim, com
+            # _years por último (quem vê o ano já encontra o índice completo)
+            all_holidays, sessions = dict(self._holidays), dict(self._sessions)
+            for year in missing:
+                self._build_year(year, all_holidays, sessions)
+            built = self._years | set(missing)
+            self._reindex(built, all_holidays, sessions)
+            self._years = built
+
+    def _build_year(self, year: int, all_holidays: Dict[date_cls, str], sessions: Dict[date_cls, TradingSession]):
+        holidays = b3_holidays(year)
+        holidays.update({d: n for d, n in self.extra_holidays.items() if d.year == year})
+        all_holidays.update(holidays)
+        ash_wednesday = easter_sunday(year) - timedelta(days=46)
+        day = date_cls(year, 1, 1)
+        while day.year == year:
+            if day.weekday() < 5 and day not in holidays:
+                pre_open, open_, close, post_close = B3_PRE_OPEN, B3_OPEN, B3_CLOSE, B3_POST_CLOSE
+                if day == ash_wednesday:
+                    pre_open, open_ = ASH_WEDNESDAY_PRE_OPEN, ASH_WEDNESDAY_OPEN
+                special = self.special_sessions.get(day)
+                if special:
+                    open_ = _parse_hhmm(special.get('open', open_))
+                    close = _parse_hhmm(special.get('close', close))
+                    pre_open = _parse_hhmm(special.get('pre_open', (datetime.combine(day, open_) - timedelta(minutes=15)).time()))
+                    post_close = _parse_hhmm(special.get('post_close', (datetime.combine(day, close) + timedelta(minutes=30)).time()))
+                sessions[day] = TradingSession(
+                    day, *(self.timezone.localize(datetime.combine(day, t)) for t in (pre_open, open_, close, post_close))
+                )
+            day += timedelta(days=1)
+
+    def _reindex(self, years: set, holidays: Dict[date_cls, str], sessions: Dict[date_cls, TradingSession]):
+        session_dates = sorted(sessions)
+        next_index = {}
+        day, end, index = date_cls(min(years), 1, 1), date_cls(max(years), 12, 31), 0
+        while day <= end:
+            while index < len(session_dates) and session_dates[index] < day:
+                index += 1
+            next_index[day] = index
+            day += timedelta(days=1)
+        self._holidays = holidays
+        self._sessions = sessions
+        self._holiday_array = np.array(sorted(d for d in holidays if d.weekday() < 5), dtype='datetime64[D]')
+        self._session_index = {d: i for i, d in enumerate(session_dates)}
+        self._index = (session_dates, next_index)
+
+    # ------------------------------------------------------------------ consultas
+
+    def _localize(self, moment: datetime) -> datetime:
+        if moment.tzinfo is None:
+            return self.timezone.localize(moment)
+        return moment.astimezone(self.timezone)
+
+    def is_session(self, day) -> bool:
+        """Há pregão na data?"""
+        day = _parse_date(day)
+        self._ensure_years(day.year)
+        return day in self._sessions
+
+    def holiday_name(self, day) -> Optional[str]:
+        """Nome do feriado/dia sem pregão (None se não for feriado)."""
+        day = _parse_date(day)
+        self._ensure_years(day.year)
+        return self._holidays.get(day)
+
+    def session(self, day) -> Optional[TradingSession]:
+        """Sessão da data (None em fins de semana e feriados)."""
+        day = _parse_date(day)
+        self._ensure_years(day.year)
+        return self._sessions.get(day)
+
+    def next_session(self, day, offset: int = 0) -> Optional[TradingSession]:
+        """Primeira sessão em ou após a data (offset=1: a seguinte, etc.)."""
+        day = _parse_date(day)
+        self._ensure_years(day.year, day.year + 1)
+        session_dates, next_index = self._index
+        index = next_index[day] + offset
+        if 0 <= index < len(session_dates):
+            return self._sessions[session_dates[index]]
+        return None
+
+    def previous_session(self, day) -> Optional[TradingSession]:
+        """Última sessão estritamente antes da data."""
+        day = _parse_date(day)
+        self._ensure_years(day.year - 1, day.year)
+        session_dates, next_index = self._index
+        index = next_index[day] - 1
+        return self._sessions[session_dates[index]] if index >= 0 else None
+
+    def current_or_next_session(self, now: datetime) -> Optional[TradingSession]:
+        """Sessão em andamento (até o fechamento) ou a próxima."""
+        now = self._localize(now)
+        session = self.next_session(now.date())
+        if session is not None and now >= session.close:
+            session = self.next_session(now.date(), offset=1)
+        return session
+
+    def status(self, now: datetime) -> Tuple[str, datetime]:
+        """
+        Status do mercado e o instante da próxima mudança.
+        Returns: ('PRE_MARKET' | 'TRADING' | 'POST_MARKET' | 'CLOSED', válido até)
+        """
+        now = self._localize(now)
+        today = self.session(now.date())
+        if today is not None and now < today.post_close:
+            if now < today.pre_open:
+                return 'CLOSED', today.pre_open
+            if now < today.open:
+                return 'PRE_MARKET', today.open
+            if now < today.close:
+                return 'TRADING', today.close
+            return 'POST_MARKET', today.post_close
+        upcoming = self.next_session(now.date(), offset=1 if today is not None else 0)
+        return 'CLOSED', upcoming.pre_open if upcoming else now + timedelta(days=1)
+
+    def time_to_close(self, now: datetime) -> Optional[float]:
+        """Segundos até o fechamento da sessão em andamento (None fora do pregão)."""
+        now = self._localize(now)
+        session = self.session(now.date())
+        if session is None or not session.open <= now < session.close:
+            return None
+        return (session.close - now).total_seconds()
+
+    def business_days(self, start, end):
+        """
+        Dias de pregão em [start, end) (dias úteis de hoje até o vencimento, base 252).
+        Aceita datas ou arrays datetime64; NaT conta 0.
+        """
+        start_days = np.asarray(start, dtype='datetime64[D]')
+        end_days = np.asarray(end, dtype='datetime64[D]')
+        valid = np.concatenate([np.atleast_1d(start_days), np.atleast_1d(end_days)])
+        valid = valid[~np.isnat(valid)]
+        if valid.size:
+            years = valid.astype('datetime64[Y]').astype(int) + 1970
+            self._ensure_years(int(years.min()), int(years.max()))
+        nat = np.isnat(start_days) | np.isnat(end_days)
+        counts = np.busday_count(np.where(nat, np.datetime64('1970-01-01'), start_days),
+                                 np.where(nat, np.datetime64('1970-01-01'), end_days),
+                                 holidays=self._holiday_array)
+        return int(counts) if np.ndim(counts) == 0 else counts
+
+    def add_business_days(self, day, n: int) -> date_cls:
+        """Data n sessões após (n > 0) ou antes (n < 0) da sessão em ou após day."""
+        day = _parse_date(day)
+        self._ensure_years(day.year - (abs(n) // 240 + 1), day.year + abs(n) // 240 + 1)
+        session_dates, next_index = self._index
+        index = next_index[day] + n
+        return session_dates[max(0, min(index, len(session_dates) - 1))]
+
+    def option_expiries(self, start, end, weekly: bool = False) -> List[date_cls]:
+        """
+        Vencimentos de opções de ações entre start e end: mensais na terceira sexta-feira do
+        mês (semanais: todas as sextas); sem pregão na data, vence na sessão anterior.
+        """
+        start, end = _parse_date(start), _parse_date(end)
+        self._ensure_years(start.year, end.year)
+        fridays = []
+        if weekly:
+            friday = start + timedelta(days=(4 - start.weekday()) % 7)
+            while friday <= end + timedelta(days=7):
+                fridays.append(friday)
+                friday += timedelta(days=7)
+        else:
+            year, month = start.year, start.month
+            while date_cls(year, month, 1) <= end:
+                first = date_cls(year, month, 1)
+                fridays.append(first + timedelta(days=(4 - first.weekday()) % 7 + 14))
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        expiries = []
+        for friday in fridays:
+            expiry = friday if friday in self._sessions else self.previous_session(friday).date
+            if start <= expiry <= end:
+                expiries.append(expiry)
+        return expiries
+
+
+_CALENDARS: Dict[str, B3Calendar] = {}
+_CALENDARS_LOCK = threading.Lock()
+
+
+def get_b3_calendar(config: Optional[Dict] = None) -> B3Calendar:
+    """Calendário compartilhado do processo (por config['trading_calendar'])."""
+    config = config or {}
+    key = repr(sorted((k, repr(v)) for k, v in config.items()))
+    with _CALENDARS_LOCK:
+        if key not in _CALENDARS:
+            _CALENDARS[key] = B3Calendar(extra_holidays=config.get('extra_holidays'),
+                                         special_sessions=config.get('special_sessions'))
+        return _CALENDARS[key]
+
 
 class TradingSchedule:
     """Gerencia horário de funcionamento baseado na B3."""
-    
-    def __init__(self, timezone=None):
+
+    def __init__(self, timezone=None, calendar: Optional[B3Calendar] = None):
         self.timezone = timezone or B3_TIMEZONE
-    
+        self.calendar = calendar or get_b3_calendar()
+        self._status_cache: Optional[Tuple[str, datetime]] = None
+
     def get_current_b3_time(self) -> datetime:
         """Retorna hora atual no timezone da B3."""
         return datetime.now(self.timezone)
-    
+
     def is_trading_day(self, date: Optional[datetime] = None) -> bool:
-        """
-        Verifica se é dia útil (segunda a sexta).
-        Não verifica feriados (pode ser adicionado depois).
-        """
+        """Verifica se há pregão na data (dia útil que não é feriado da B3)."""
         if date is None:
             date = self.get_current_b3_time()
-        
-        # Segunda = 0, Sexta = 4
-        return date.weekday() < 5
-    
+        return self.calendar.is_session(date)
+
     def is_trading_hours(self, current_time: Optional[datetime] = None) -> bool:
         """
         Verifica se está dentro do horário de negociação da B3.
-        Horário: 10:00 - 17:00 (horário de Brasília)
+        Horário: 10:00 - 17:00 (horário de Brasília; Quarta-Feira de Cinzas a partir das 13:00)
         """
-        if current_time is None:
-            current_time = self.get_current_b3_time()
-        
-        if not self.is_trading_day(current_time):
-            return False
-        
-        current_time_only = current_time.time()
-        
-        # Entre 10:00 e 17:00
-        return B3_OPEN <= current_time_only < B3_CLOSE
-    
+        return self.get_trading_status(current_time) == 'TRADING'
+
     def is_pre_market(self, current_time: Optional[datetime] = None) -> bool:
         """Verifica se está no pré-mercado (09:45 - 10:00)."""
-        if current_time is None:
-            current_time = self.get_current_b3_time()
-        
-        if not self.is_trading_day(current_time):
-            return False
-        
-        current_time_only = current_time.time()
-        return B3_PRE_OPEN <= current_time_only < B3_OPEN
-    
+        return self.get_trading_status(current_time) == 'PRE_MARKET'
+
     def is_post_market(self, current_time: Optional[datetime] = None) -> bool:
         """Verifica se está no pós-mercado (17:00 - 17:30)."""
-        if current_time is None:
-            current_time = self.get_current_b3_time()
-        
-        if not self.is_trading_day(current_time):
-            return False
-        
-        current_time_only = current_time.time()
-        return B3_CLOSE <= current_time_only < B3_POST_CLOSE
-    
+        return self.get_trading_status(current_time) == 'POST_MARKET'
+
     def get_trading_status(self, current_time: Optional[datetime] = None) -> str:
         """
         Retorna status atual do mercado.
         Returns: 'PRE_MARKET', 'TRADING', 'POST_MARKET', 'CLOSED'
         """
+        if current_time is not None:
+            return self.calendar.status(current_time)[0]
+
+        # Sem horário explícito: reaproveita o status até a próxima fronteira de sessão
+        now = self.get_current_b3_time()
+        cached = self._status_cache
+        if cached is None or now >= cached[1]:
+            cached = self.calendar.status(now)
+            self._status_cache = cached
+        return cached[0]
+
+    def get_next_trading_open(self, current_time: Optional[datetime] = None) -> Optional[datetime]:
+        """Retorna abertura da sessão em andamento (até o fechamento) ou da próxima."""
         if current_time is None:
             current_time = self.get_current_b3_time()
-        
-        if not self.is_trading_day(current_time):
-            return 'CLOSED'
-        
-        if self.is_pre_market(current_time):
-            return 'PRE_MARKET'
-        elif self.is_trading_hours(current_time):
-            return 'TRADING'
-        elif self.is_post_market(current_time):
-            return 'POST_MARKET'
-        else:
-            return 'CLOSED'
-    
-    def get_next_trading_open(self, current_time: Optional[datetime] = None) -> Optional[datetime]:
-        """Retorna próxima abertura do mercado."""
+        session = self.calendar.current_or_next_session(current_time)
+        return session.open if session else None
+
+    def get_next_pre_market(self, current_time: Optional[datetime] = None) -> Optional[datetime]:
+        """Início do próximo pré-mercado estritamente após current_time."""
         if current_time is None:
             current_time = self.get_current_b3_time()
-        
-        # Se já passou das 17:00 hoje, próxima abertura é amanhã
-        if current_time.time() >= B3_CLOSE:
-            next_day = current_time + timedelta(days=1)
-        else:
-            next_day = current_time
-        
-        # Encontrar próximo dia útil
-        while next_day.weekday() >= 5:  # Sábado ou Domingo
-            next_day = next_day + timedelta(days=1)
-        
-        # Combinar data com horário de abertura
-        return self.timezone.localize(
-            datetime.combine(next_day.date(), B3_OPEN)
-        )
-    
+        session = self.calendar.current_or_next_session(current_time)
+        if session is not None and session.pre_open <= current_time:
+            session = self.calendar.next_session(session.date, offset=1)
+        return session.pre_open if session else None
+
     def get_today_close(self, current_time: Optional[datetime] = None) -> Optional[datetime]:
         """Retorna fechamento do mercado hoje."""
         if current_time is None:
             current_time = self.get_current_b3_time()
-        
-        if not self.is_trading_day(current_time):
-            return None
-        
-        return self.timezone.localize(
-            datetime.combine(current_time.date(), B3_CLOSE)
-        )
-    
-    def should_start_trading(self, current_time: Optional[datetime] = None) -> bool:
-        """Verifica se deve iniciar trading (pré-mercado ou abertura)."""
+        session = self.calendar.session(current_time)
+        return session.close if session else None
+
+    def time_to_close(self, current_time: Optional[datetime] = None) -> Optional[float]:
+        """Segundos até o fechamento (None fora do pregão)."""
         if current_time is None:
             current_time = self.get_current_b3_time()
-        
-        if not self.is_trading_day(current_time):
-            return False
-        
-        current_time_only = current_time.time()
+        return self.calendar.time_to_close(current_time)
+
+    def should_start_trading(self, current_time: Optional[datetime] = None) -> bool:
+        """Verifica se deve iniciar trading (pré-mercado ou abertura)."""
         # Inicia no pré-mercado (09:45)
-        return B3_PRE_OPEN <= current_time_only < B3_CLOSE
-    
+        return self.get_trading_status(current_time) in ('PRE_MARKET', 'TRADING')
+
     def should_stop_trading(self, current_time: Optional[datetime] = None) -> bool:
         """Verifica se deve parar trading (após fechamento)."""
         if current_time is None:
             current_time = self.get_current_b3_time()
-        
-        current_time_only = current_time.time()
-        # Para após o fechamento (17:00)
-        return current_time_only >= B3_CLOSE
+        session = self.calendar.session(current_time)
+        if session is None:
+            return current_time.time() >= B3_CLOSE
+        # Para após o fechamento (17:00, ou horário especial da sessão)
+        return current_time >= session.close
 
 
 # Função auxiliar para uso rápido
@@ -160,9 +429,11 @@ if __name__ == '__main__':
     # Teste
     schedule = TradingSchedule()
     now = schedule.get_current_b3_time()
-    
+
     print(f"Horário atual (B3): {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
     print(f"É dia útil: {schedule.is_trading_day()}")
     print(f"Status: {schedule.get_trading_status()}")
     print(f"Horário de trading: {schedule.is_trading_hours()}")
-
+    print(f"Próxima abertura: {schedule.get_next_trading_open()}")
+    print(f"Feriados: {[(d.isoformat(), n) for d, n in sorted(b3_holidays(now.year).items())]}")
+    print(f"Vencimentos mensais: {schedule.calendar.option_expiries(now.date(), now.date() + timedelta(days=120))}")
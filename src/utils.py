@@ -2,39 +2,50 @@
 Utilitários: logging estruturado e métricas.
 """
 
-import json
-import logging
+import math
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any
-import pandas as pd
-import numpy as np
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+try:
+    from .decision_log import get_decision_log
+except ImportError:
+    from decision_log import get_decision_log
+
+if TYPE_CHECKING:  # pandas só para anotações: StructuredLogger não deve custar o import
+    import pandas as pd
 
 
 class StructuredLogger:
-    """Logger estruturado que salva em JSON lines."""
+    """Logger estruturado que salva em JSON lines (logs/decisions-YYYYMMDD.jsonl, indexado)."""
     
-    def __init__(self, log_dir: str = "logs"):
+    def __init__(self, log_dir: str = "logs", config: Optional[Dict] = None):
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(exist_ok=True)
-        today = datetime.now().strftime("%Y%m%d")
-        self.log_file = self.log_dir / f"decisions-{today}.jsonl"
-        self.logger = logging.getLogger("trading_agents")
-        self.logger.setLevel(logging.INFO)
-        
-        # Handler para arquivo JSONL
-        if not self.logger.handlers:
-            handler = logging.FileHandler(self.log_file, encoding='utf-8')
-            self.logger.addHandler(handler)
+        # Compartilhado por diretório; escrita em thread de fundo (config['decision_log'])
+        self.decision_log = get_decision_log(str(self.log_dir), (config or {}).get('decision_log'))
+    
+    @property
+    def log_file(self) -> Path:
+        """Arquivo JSONL do dia (rotação diária pelo timestamp de cada entrada)."""
+        return self.log_dir / f"decisions-{datetime.now().strftime('%Y%m%d')}.jsonl"
     
     def log_decision(self, event_type: str, data: Dict[str, Any]):
-        """Registra uma decisão em formato JSON."""
+        """Registra uma decisão em formato JSON (só enfileira; a gravação é em segundo plano)."""
         log_entry = {
             "timestamp": datetime.now().isoformat(),
             "event_type": event_type,
             **data
         }
-        self.logger.info(json.dumps(log_entry, ensure_ascii=False))
+        self.decision_log.append(log_entry)
+    
+    def flush(self):
+        """Espera as decisões pendentes serem gravadas no arquivo e no índice."""
+        self.decision_log.flush()
+    
+    def close(self):
+        """Drena a fila e encerra a thread de escrita."""
+        self.decision_log.close()
     
     def log_trader_proposal(self, proposal_id: str, strategy: str, details: Dict):
         """Registra proposta do TraderAgent."""
@@ -60,9 +71,17 @@ class StructuredLogger:
             "status": status,
             **details
         })
+    
+    def log_error(self, error_type: str, message: str, details: Dict = None):
+        """Registra erro de agente/estratégia."""
+        self.log_decision("error", {
+            "error_type": error_type,
+            "message": message,
+            **(details or {})
+        })
 
 
-def calculate_metrics(returns: pd.Series, nav_series: pd.Series) -> Dict[str, float]:
+def calculate_metrics(returns: 'pd.Series', nav_series: 'pd.Series') -> Dict[str, float]:
     """
     Calcula métricas de performance.
     
@@ -88,7 +107,7 @@ def calculate_metrics(returns: pd.Series, nav_series: pd.Series) -> Dict[str, fl
     
     # Sharpe ratio (anualizado, assumindo 252 dias úteis)
     if returns.std() > 0:
-        sharpe = np.sqrt(252) * returns.mean() / returns.std()
+        sharpe = math.sqrt(252) * returns.mean() / returns.std()
     else:
         sharpe = 0.0
     
@@ -99,7 +118,7 @@ def calculate_metrics(returns: pd.Series, nav_series: pd.Series) -> Dict[str, fl
     max_drawdown = abs(drawdown.min()) * 100
     
     # Volatilidade anualizada
-    volatility = returns.std() * np.sqrt(252) * 100
+    volatility = returns.std() * math.sqrt(252) * 100
     
     # Win rate
     positive_returns = returns[returns > 0]
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Teste do alinhamento dos disparos do agendador ao relógio (next_aligned)."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta
+
+from src.orders_repository import B3_TIMEZONE as B3
+from src.scan_scheduler import next_aligned
+
+
+def testar_fronteiras():
+    """Próxima fronteira múltipla do intervalo, estritamente depois de now."""
+    base = B3.localize(datetime(2026, 3, 10, 10, 7, 30))
+    casos = [
+        (base, 300, datetime(2026, 3, 10, 10, 10, 0)),
+        (base, 60, datetime(2026, 3, 10, 10, 8, 0)),
+        (base, 3600, datetime(2026, 3, 10, 11, 0, 0)),
+        # Exatamente na fronteira: vai para a seguinte (nunca dispara duas vezes no mesmo instante)
+        (B3.localize(datetime(2026, 3, 10, 10, 10, 0)), 300, datetime(2026, 3, 10, 10, 15, 0)),
+        (B3.localize(datetime(2026, 3, 10, 10, 14, 59, 999000)), 300, datetime(2026, 3, 10, 10, 15, 0)),
+    ]
+    for now, intervalo, esperado in casos:
+        proximo = next_aligned(now, intervalo)
+        print(f"  {now.strftime('%H:%M:%S.%f')[:-3]} a cada {intervalo:>4}s -> {proximo.strftime('%H:%M:%S')}")
+        assert proximo == B3.localize(esperado), f"esperado {esperado}, obtido {proximo}"
+        assert proximo.tzinfo is not None and proximo.utcoffset() == now.utcoffset()
+
+
+def testar_sequencia_sem_deriva():
+    """Disparos encadeados ficam no grid mesmo com execuções de duração variável."""
+    now = B3.localize(datetime(2026, 3, 10, 10, 0, 0))
+    disparos = []
+    for duracao in (3, 47, 299, 12):
+        now = next_aligned(now, 300)
+        disparos.append(now.strftime('%H:%M'))
+        now = now + timedelta(seconds=duracao)
+    print(f"  disparos: {disparos}")
+    assert disparos == ['10:05', '10:10', '10:15', '10:20']
+
+
+def testar_intervalo_fracionario():
+    now = B3.localize(datetime(2026, 3, 10, 10, 0, 0, 200000))
+    assert next_aligned(now, 0.5) == B3.localize(datetime(2026, 3, 10, 10, 0, 0, 500000))
+
+
+if __name__ == '__main__':
+    print('=' * 60)
+    print('TESTE DO ALINHAMENTO DO AGENDADOR')
+    print('=' * 60)
+    testar_fronteiras()
+    testar_sequencia_sem_deriva()
+    testar_intervalo_fracionario()
+    print('\n✅ Alinhamento OK')
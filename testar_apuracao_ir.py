@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Teste dos custos B3 em lote e da apuração mensal de IR com compensação de prejuízo."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from src.b3_costs import B3CostCalculator
+
+
+def testar_lote_igual_escalar():
+    """calculate_costs_batch reproduz calculate_total_costs operação a operação."""
+    operacoes = [
+        # (entrada, saída, instrumento, day trade, leva ao vencimento)
+        (10000.0, 10100.0, 'options', True, False),
+        (5000.0, 4700.0, 'options', True, False),
+        (20000.0, 21500.0, 'stocks', False, False),
+        (8000.0, 8000.0, 'options', False, True),
+        (0.0, 150.0, 'options', True, False),
+    ]
+    for calc in (B3CostCalculator(), B3CostCalculator(corretagem_pct=0.001, rlp_ativo=False),
+                 B3CostCalculator(corretagem_fixa=2.5, rlp_ativo=False)):
+        lote = calc.calculate_costs_batch(
+            [op[0] for op in operacoes], [op[1] for op in operacoes],
+            instrument_types=[op[2] for op in operacoes],
+            is_daytrade=[op[3] for op in operacoes],
+            levar_vencimento=[op[4] for op in operacoes]
+        )
+        for i, (entrada, saida, instrumento, daytrade, vencimento) in enumerate(operacoes):
+            escalar = calc.calculate_total_costs(entrada, saida, instrumento, levar_vencimento=vencimento,
+                                                 is_daytrade=daytrade)
+            linha = lote.iloc[i]
+            for campo in ('total_operational_costs', 'total_taxes', 'total_costs', 'profit_bruto',
+                          'profit_liquido', 'profit_pct_bruto', 'profit_pct_liquido'):
+                assert np.isclose(linha[campo], escalar[campo]), \
+                    f"operação {i} ({calc.corretagem_pct}/{calc.corretagem_fixa}) {campo}: {linha[campo]} != {escalar[campo]}"
+            assert np.isclose(linha['ir_retido'], escalar['tax_costs'].ir_retido)
+            assert np.isclose(linha['ir_a_pagar'], escalar['tax_costs'].ir_a_pagar)
+    print(f"  {len(operacoes)} operações x 3 corretagens: lote == escalar")
+
+
+def testar_compensacao_prejuizo():
+    """Day trade: +100, -150, +180 em meses seguidos -> DARF 19, 0, 4.2."""
+    calc = B3CostCalculator()
+    resultados = [100.0, -150.0, 180.0]
+    apuracao = calc.calculate_monthly_ir(
+        ['2026-01-15', '2026-02-10', '2026-03-20'], resultados, is_daytrade=True,
+        ir_retido=[r * calc.IR_RETIDO_PCT if r > 0 else 0.0 for r in resultados]
+    )
+    print(apuracao[['month', 'resultado', 'base_calculo', 'ir_devido', 'ir_retido', 'darf', 'prejuizo_acumulado']]
+          .to_string(index=False))
+    assert list(apuracao['month']) == ['2026-01', '2026-02', '2026-03']
+    assert np.allclose(apuracao['base_calculo'], [100.0, 0.0, 30.0])
+    assert np.allclose(apuracao['prejuizo_compensado'], [0.0, 0.0, 150.0])
+    assert np.allclose(apuracao['prejuizo_acumulado'], [0.0, 150.0, 0.0])  # Lucro já tributado não absorve o prejuízo
+    assert np.allclose(apuracao['darf'], [19.0, 0.0, 4.2])
+
+
+def testar_modalidades_separadas():
+    """Prejuízo de operações comuns não compensa lucro de day trade (e vice-versa)."""
+    calc = B3CostCalculator()
+    apuracao = calc.calculate_monthly_ir(
+        ['2026-01-05', '2026-01-06', '2026-02-05', '2026-02-06'],
+        [-300.0, 200.0, 100.0, 400.0],
+        is_daytrade=[False, True, True, False],
+        prejuizo_anterior_daytrade=50.0
+    )
+    daytrade = apuracao[apuracao['modalidade'] == 'daytrade']
+    swing = apuracao[apuracao['modalidade'] == 'swing']
+    assert np.allclose(daytrade['base_calculo'], [150.0, 100.0])  # Só o prejuízo anterior de day trade
+    assert np.allclose(daytrade['darf'], [30.0, 20.0])
+    assert np.allclose(swing['base_calculo'], [0.0, 100.0])  # 400 - 300 do mês anterior
+    assert np.allclose(swing['darf'], [0.0, 15.0])
+
+
+def testar_carry_forward():
+    """Saldo negativo acumulado e parcela tributável, com saldo inicial negativo."""
+    tributavel, saldo = B3CostCalculator._carry_forward(np.array([30.0, -10.0, 50.0, -100.0, 20.0]), -40.0)
+    assert np.allclose(tributavel, [0.0, 0.0, 30.0, 0.0, 0.0])
+    assert np.allclose(saldo, [-10.0, -20.0, 0.0, -100.0, -80.0])
+
+
+def testar_sem_operacoes():
+    apuracao = B3CostCalculator().calculate_monthly_ir([], [])
+    assert apuracao.empty and 'darf' in apuracao.columns
+
+
+if __name__ == '__main__':
+    print('=' * 60)
+    print('TESTE DE CUSTOS EM LOTE E APURAÇÃO DE IR')
+    print('=' * 60)
+    testar_lote_igual_escalar()
+    testar_compensacao_prejuizo()
+    testar_modalidades_separadas()
+    testar_carry_forward()
+    testar_sem_operacoes()
+    print('\n✅ Custos e apuração de IR OK')
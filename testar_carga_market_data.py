@@ -0,0 +1,118 @@
+"""
+Teste de carga dos clientes de dados de mercado e notificações contra o servidor simulado
+(src/market_data_simulator.py), sem rede nem limites dos provedores reais.
+
+    python testar_carga_market_data.py --tickers 300 --latency-ms 40 --jitter-ms 30 --error-rate 0.05
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.http_client import configure_http_clients, http_client_stats
+from src.market_data_api import BrapiAPI
+from src.market_data_gateway import MarketDataGateway
+from src.market_data_simulator import (FaultProfile, MarketDataStandInServer, SimulatedFuturesAPI,
+                                       SimulatedMarketDataAPI, SyntheticMarket, default_tickers)
+from src.notifications import TelegramNotifier
+
+
+def percentis(latencias):
+    latencias = sorted(latencias)
+    if not latencias:
+        return "sem amostras"
+    p = lambda q: latencias[min(int(len(latencias) * q), len(latencias) - 1)] * 1000
+    return f"p50={p(0.50):.0f}ms p90={p(0.90):.0f}ms p99={p(0.99):.0f}ms máx={latencias[-1] * 1000:.0f}ms"
+
+
+def medir(func, itens, workers):
+    latencias, falhas = [], 0
+
+    def chamada(item):
+        inicio = time.perf_counter()
+        resultado = func(item)
+        return time.perf_counter() - inicio, resultado
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for latencia, resultado in pool.map(chamada, itens):
+            latencias.append(latencia)
+            falhas += not resultado
+    return latencias, falhas, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tickers', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=40)
+    parser.add_argument('--jitter-ms', type=float, default=30)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--rate-limit', type=float, default=0, help='req/s no servidor (0 = sem limite)')
+    parser.add_argument('--mensagens', type=int, default=100)
+    args = parser.parse_args()
+
+    # Limites locais altos: o gargalo medido deve ser o servidor simulado, não o TokenBucket
+    configure_http_clients({'brapi': {'rate_per_second': 1000, 'burst': 100, 'backoff_base': 0.05},
+                            'telegram': {'rate_per_second': 1000, 'burst': 100, 'backoff_base': 0.05}})
+
+    tickers = default_tickers(args.tickers)
+    mercado = SyntheticMarket(tickers)
+    servidor = MarketDataStandInServer(
+        mercado, FaultProfile(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit, seed=1)
+    ).start()
+    print("=" * 70)
+    print(f"Servidor simulado: {servidor.base_url} | {len(tickers)} tickers | "
+          f"latência {args.latency_ms}±{args.jitter_ms}ms | erro {args.error_rate:.0%}")
+    print("=" * 70)
+
+    try:
+        gateway = MarketDataGateway(
+            {
+                'brapi': BrapiAPI(base_url=servidor.brapi_url),
+                'simulated': SimulatedMarketDataAPI(
+                    mercado, FaultProfile(args.latency_ms, args.jitter_ms, args.error_rate, seed=2)),
+            },
+            {'simulated_futures': SimulatedFuturesAPI(mercado, FaultProfile(args.latency_ms, seed=3))},
+        )
+
+        latencias, falhas, total = medir(gateway.fetch_intraday_snapshot, tickers, args.workers)
+        print(f"\n📈 Snapshots intraday: {len(tickers)} em {total:.2f}s ({len(tickers) / total:.0f}/s), "
+              f"falhas={falhas}\n   {percentis(latencias)}")
+
+        lotes = [tickers[i:i + 20] for i in range(0, len(tickers), 20)]
+        latencias, falhas, total = medir(gateway.fetch_quotes, lotes, args.workers)
+        print(f"\n💱 Cotações em lote: {len(lotes)} lotes em {total:.2f}s, falhas={falhas}\n   {percentis(latencias)}")
+
+        cadeias = tickers[:min(50, len(tickers))]
+        latencias, falhas, total = medir(
+            lambda t: not gateway.fetch_options_chain(t, '', '', max_dte=30).empty, cadeias, args.workers)
+        print(f"\n🧾 Cadeias de opções: {len(cadeias)} em {total:.2f}s, falhas={falhas}\n   {percentis(latencias)}")
+
+        inicio = time.perf_counter()
+        futuros = gateway.get_all_futures_data(['WIN', 'WDO', 'IND', 'DOL'])
+        print(f"\n📊 Futuros: {len(futuros)} contratos em {time.perf_counter() - inicio:.2f}s")
+
+        telegram = TelegramNotifier(bot_token='teste', chat_id='1', api_base=servidor.base_url)
+        latencias, falhas, total = medir(lambda i: telegram.send(f"Mensagem de carga {i}"),
+                                         range(args.mensagens), args.workers)
+        print(f"\n📨 Telegram: {args.mensagens} mensagens em {total:.2f}s, falhas={falhas}, "
+              f"recebidas={len(servidor.sent_messages)}\n   {percentis(latencias)}")
+
+        print("\nRanking de provedores:")
+        for nome, saude in gateway.get_status()['providers'].items():
+            print(f"   {nome}: {saude}")
+        print("\nClientes HTTP:")
+        for provedor, stats in http_client_stats().items():
+            print(f"   {provedor}: requisições={stats['requests']} erros={stats['errors']} "
+                  f"retries={stats['retries']} circuito={stats['circuit']}")
+        print(f"\nServidor: {servidor.faults.counters}")
+    finally:
+        servidor.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Teste do ciclo de vida materializado (proposal_lifecycle) com ID de proposta reaproveitado."""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import src.orders_repository as orders_repository
+from src.orders_repository import OrdersRepository, _connect
+
+PROPOSTA = {'proposal_id': '20260310-0001', 'timestamp': '2026-03-10T10:05:00-03:00',
+            'strategy': 'daytrade_options', 'instrument_type': 'options', 'symbol': 'PETRJ380',
+            'side': 'BUY', 'quantity': 100, 'price': 1.25}
+
+
+def ciclo(repo: OrdersRepository) -> dict:
+    return repo.get_proposal_lifecycle(proposal_id=PROPOSTA['proposal_id']).iloc[0].to_dict()
+
+
+def preparar_proposta_executada(repo: OrdersRepository):
+    """Proposta gerada, aprovada pelo risco, enviada e executada."""
+    assert repo.save_proposal(PROPOSTA)
+    repo.save_risk_evaluation({'proposal_id': PROPOSTA['proposal_id'], 'decision': 'APPROVE',
+                               'reason': 'ok', 'timestamp': '2026-03-10T10:05:01-03:00'})
+    repo.update_proposal_status(PROPOSTA['proposal_id'], 'enviada')
+    repo.save_executions([{'order_id': 'F1', 'proposal_id': PROPOSTA['proposal_id'], 'symbol': 'PETRJ380',
+                           'side': 'BUY', 'quantity': 100, 'price': 1.26, 'status': 'FILLED',
+                           'timestamp': '2026-03-10T10:06:00-03:00'}])
+    estado = ciclo(repo)
+    assert estado['status'] == 'executada' and estado['decision'] == 'APPROVE', estado
+    assert estado['sent_at'] and estado['executed_quantity'] == 100
+
+
+def testar_save_proposal_nao_sobrescreve(repo: OrdersRepository):
+    """save_proposal com ID existente falha e não mexe no ciclo de vida."""
+    assert repo.save_proposal({**PROPOSTA, 'symbol': 'VALEJ700'}) is False
+    estado = ciclo(repo)
+    assert estado['symbol'] == 'PETRJ380' and estado['status'] == 'executada'
+
+
+def testar_id_reaproveitado_reinicia_ciclo(repo: OrdersRepository):
+    """Linha substituída em proposals (escritor externo): o ciclo recomeça do zero."""
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO proposals (proposal_id, timestamp, strategy, instrument_type, symbol, "
+            "side, quantity, price, order_type, source, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (PROPOSTA['proposal_id'], '2026-03-11T11:00:00-03:00', 'daytrade_options', 'options',
+             'VALEJ700', 'SELL', 50, 0.80, 'LIMIT', 'real', '2026-03-11T11:00:00-03:00')
+        )
+    estado = ciclo(repo)
+    print(f"  após reaproveitar o ID: status={estado['status']} symbol={estado['symbol']}")
+    assert estado['status'] == 'gerada' and estado['symbol'] == 'VALEJ700'
+    assert estado['trade_date'] == '2026-03-11'
+    for campo in ('evaluated_at', 'decision', 'reason', 'sent_at', 'approved_at', 'cancelled_at',
+                  'executed_at', 'executed_quantity', 'executed_price', 'closed_at', 'realized_pnl'):
+        assert estado[campo] is None or estado[campo] != estado[campo], f"{campo} herdado: {estado[campo]}"
+
+
+if __name__ == '__main__':
+    print('=' * 60)
+    print('TESTE DO CICLO DE VIDA DAS PROPOSTAS')
+    print('=' * 60)
+    with tempfile.TemporaryDirectory() as pasta:
+        orders_repository.DB_PATH = os.path.join(pasta, 'ciclo_vida.db')
+        repo = OrdersRepository()
+        preparar_proposta_executada(repo)
+        testar_save_proposal_nao_sobrescreve(repo)
+        testar_id_reaproveitado_reinicia_ciclo(repo)
+    print('\n✅ Ciclo de vida OK')
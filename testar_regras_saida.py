@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Teste das regras de saída (TP/SL/time stop) do ExitMonitor."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from src.exit_monitor import (
+    evaluate_exit_rules, EXIT_NONE, EXIT_STOP_LOSS, EXIT_TAKE_PROFIT, EXIT_TIME_STOP
+)
+
+NAN = np.nan
+
+
+def testar_regras_saida():
+    """Uma posição por cenário: comprada/vendida, TP, SL, tempo, regra desativada e preço inválido."""
+    cenarios = [
+        # (descrição, preço, sinal, tp, sl, minutos, prazo, código esperado)
+        ('comprada sem gatilho', 10.0, 1, 11.0, 9.0, 5, 60, EXIT_NONE),
+        ('comprada no TP', 11.0, 1, 11.0, 9.0, 5, 60, EXIT_TAKE_PROFIT),
+        ('comprada abaixo do SL', 8.5, 1, 11.0, 9.0, 5, 60, EXIT_STOP_LOSS),
+        ('vendida no TP (preço caiu)', 9.0, -1, 9.0, 11.0, 5, 60, EXIT_TAKE_PROFIT),
+        ('vendida no SL (preço subiu)', 11.5, -1, 9.0, 11.0, 5, 60, EXIT_STOP_LOSS),
+        ('prazo estourado', 10.0, 1, 11.0, 9.0, 60, 60, EXIT_TIME_STOP),
+        ('SL vence o tempo', 8.0, 1, 11.0, 9.0, 90, 60, EXIT_STOP_LOSS),
+        ('TP/SL NaN desativados', 50.0, 1, NAN, NAN, 5, 60, EXIT_NONE),
+        ('prazo 0 desativa time stop', 10.0, 1, 11.0, 9.0, 500, 0, EXIT_NONE),
+        ('preço 0 (sem cotação) não dispara SL', 0.0, 1, 11.0, 9.0, 5, 60, EXIT_NONE),
+    ]
+    codigos = evaluate_exit_rules(
+        price=np.array([c[1] for c in cenarios], dtype=float),
+        sign=np.array([c[2] for c in cenarios], dtype=float),
+        tp_price=np.array([c[3] for c in cenarios], dtype=float),
+        sl_price=np.array([c[4] for c in cenarios], dtype=float),
+        held_minutes=np.array([c[5] for c in cenarios], dtype=float),
+        max_holding_minutes=np.array([c[6] for c in cenarios], dtype=float)
+    )
+    for cenario, codigo in zip(cenarios, codigos):
+        print(f"  {cenario[0]:<40} -> {int(codigo)}")
+        assert codigo == cenario[7], f"{cenario[0]}: esperado {cenario[7]}, obtido {codigo}"
+
+
+def testar_lote_vazio():
+    vazio = np.array([], dtype=float)
+    assert evaluate_exit_rules(vazio, vazio, vazio, vazio, vazio, vazio).size == 0
+
+
+if __name__ == '__main__':
+    print('=' * 60)
+    print('TESTE DAS REGRAS DE SAÍDA')
+    print('=' * 60)
+    testar_regras_saida()
+    testar_lote_vazio()
+    print('\n✅ Regras de saída OK')